@@ -27,16 +27,55 @@ from .dtype_list import *
 from .operator import *
 from .util import *
 from .eval import eval
-from .onnx import from_onnx
 from .quantizer import quantize
-
-from .verilog import to_ipxact, to_verilog, to_veriloggen
-from .verilog import header_reg
-from .verilog import control_reg_start, control_reg_busy, control_reg_reset
-from .verilog import control_reg_extern_send, control_reg_extern_recv
-from .verilog import control_reg_global_offset
-from .verilog import control_reg_global_addr
-from .verilog import control_reg_load_global_addr_map, control_reg_busy_global_addr_map, control_reg_addr_global_addr_map
+from .serialize import save, load
+from .folding import fold_constants, fold_pad, fold_upsampling
 
 from . import verify
-from . import sim
+
+# The HDL backend (veriloggen, pyverilog and Jinja2) and the ONNX frontend
+# are imported on the first access of the following attributes.
+_lazy_attrs = {
+    'from_onnx': 'onnx',
+    'optimize_layout': 'onnx',
+    'to_ipxact': 'verilog',
+    'to_verilog': 'verilog',
+    'to_veriloggen': 'verilog',
+    'make_module': 'verilog',
+    'estimate_resources': 'verilog',
+    'autotune': 'autotuner',
+    'header_reg': 'registers',
+    'control_reg_start': 'registers',
+    'control_reg_busy': 'registers',
+    'control_reg_reset': 'registers',
+    'control_reg_extern_send': 'registers',
+    'control_reg_extern_recv': 'registers',
+    'control_reg_global_offset': 'registers',
+    'control_reg_global_addr': 'registers',
+    'control_reg_load_global_addr_map': 'registers',
+    'control_reg_busy_global_addr_map': 'registers',
+    'control_reg_addr_global_addr_map': 'registers',
+}
+
+_lazy_submodules = ('verilog', 'onnx', 'sim', 'runtime', 'tlsim', 'resource',
+                    'autotuner', 'registers')
+
+
+def __getattr__(name):
+    import importlib
+
+    if name in _lazy_submodules:
+        return importlib.import_module('.' + name, __name__)
+
+    if name in _lazy_attrs:
+        module = importlib.import_module('.' + _lazy_attrs[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals().keys()) |
+                  set(_lazy_attrs.keys()) | set(_lazy_submodules))
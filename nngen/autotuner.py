@@ -0,0 +1,699 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+import inspect
+import collections
+import concurrent.futures
+
+from . import basic_types as bt
+from . import serialize
+from . import resource
+from . import verilog
+from .folding import fold_constants, fold_pad, fold_upsampling
+from .operator.conv2d import conv2d
+from .operator.pool import _pool
+
+# cycles to start a stream and to wait for its pipeline to drain
+stream_overhead = 32
+
+# increase of the utilization of the bottleneck resource
+# below which a move is regarded as free
+min_cost = 1e-3
+
+
+class AutotuneResult(collections.namedtuple('AutotuneResult',
+                                            ['attributes', 'latency', 'initial_latency',
+                                             'op_latencies', 'estimate', 'num_evaluations'])):
+    """
+    Result of autotune()
+
+    'attributes' is an OrderedDict of the operator and the dict of
+    the applied attributes, 'latency' and 'initial_latency' are the
+    modeled cycles of the whole network, 'op_latencies' is an OrderedDict
+    of the operator (the head of a chain) and its modeled cycles,
+    and 'estimate' is the ResourceEstimate of the on-chip RAMs,
+    the substreams and the streams. Both are keyed by the operator objects
+    of the given graph, so that unnamed operators are reported as well.
+    """
+
+
+def autotune(objs, device_budget, objective='latency', config=None,
+             max_par=None, processes=None, max_iterations=None, silent=False):
+    """
+    Search the parallelism attributes of the operators for a device budget
+
+    The per-layer attributes (par_ich, par_och, par_col, par_row,
+    concur_och and stationary of conv2d and matmul, and par of pooling,
+    elementwise and the other streaming operators) are improved
+    step by step by a greedy search.
+    A candidate is evaluated on a copy of the graph in a process pool:
+    the attributes are applied by attribute(), so that the alignment
+    requests of the arguments are reflected, and the on-chip RAMs and
+    substreams are allocated as to_veriloggen() does from
+    get_required_rams() and get_required_substreams().
+    Each move is chosen by the modeled latency gain per increase of
+    the utilization of the bottleneck resource, among the candidates
+    that fit in the budget.
+    The best attributes are finally applied to the given graph.
+
+    The latency model is analytic: an operator takes the longer of
+    its computation cycles and its DMA cycles over the AXI master,
+    plus a fixed overhead per stream run.
+
+    Parameters
+    ----------
+    objs : list
+        Output objects of the graph, before to_veriloggen()
+
+    device_budget : str, DeviceProfile or Resources
+        Target device (see nngen.resource.device_profiles) or
+        the available amount of resources
+
+    objective : str or callable
+        'latency' or a function of (latency, ResourceEstimate) that
+        returns a score to be minimized
+
+    config : dict, optional
+        Configuration of to_veriloggen()
+
+    max_par : int, optional
+        Upper bound of every parallelism attribute
+
+    processes : int, optional
+        Number of worker processes (default: number of CPUs).
+        If 1 or 0, candidates are evaluated in this process.
+
+    max_iterations : int, optional
+        Maximum number of moves
+
+    silent : bool
+        If False, the chosen attributes are printed
+
+    Returns
+    -------
+    result : AutotuneResult
+    """
+
+    if not isinstance(objs, (list, tuple)):
+        objs = [objs]
+
+    nodes = serialize._collect_nodes(objs)
+    for node in nodes:
+        if getattr(node, 'm', None) is not None:
+            raise ValueError("'%s' is already converted into hardware. "
+                             "autotune() must be called before to_veriloggen()." % str(node))
+
+    if objective != 'latency' and not callable(objective):
+        raise ValueError("objective must be 'latency' or callable, not '%s'" %
+                         str(objective))
+
+    if max_par is not None and (max_par < 1 or (max_par - 1) & max_par != 0):
+        raise ValueError('max_par must be power of 2')
+
+    profile = get_budget_profile(device_budget)
+    config = verilog.load_default_config(config)
+    units = make_units(nodes, max_par)
+
+    data = serialize._dumps(list(objs))
+    evaluator = _Evaluator(data, config, processes)
+
+    def evaluate(states):
+        keys = [to_state_key(state) for state in states]
+        new_keys = [key for key in collections.OrderedDict.fromkeys(keys)
+                    if key not in cache]
+        assignments = [to_assignment(units, key) for key in new_keys]
+        for key, ret in zip(new_keys, evaluator.map(assignments)):
+            cache[key] = _Candidate(key, ret, config, profile, objective)
+        return [cache[key] for key in keys]
+
+    cache = {}
+
+    try:
+        state = [unit.current for unit in units]
+        current = evaluate([state])[0]
+        if current.score is None:
+            raise ValueError('the current attributes of the graph are not feasible.')
+
+        initial = current
+        iteration = 0
+
+        while max_iterations is None or iteration < max_iterations:
+            neighbors = [s for unit_index, unit in enumerate(units)
+                         for s in unit.neighbors(state, unit_index)]
+            candidates = evaluate(neighbors)
+
+            best = None
+            best_state = None
+            for s, cand in zip(neighbors, candidates):
+                if not current.is_improved_by(cand):
+                    continue
+                if best is None or current.gain(cand) > current.gain(best):
+                    best = cand
+                    best_state = s
+
+            if best is None:
+                break
+
+            state = best_state
+            current = best
+            iteration += 1
+
+    finally:
+        evaluator.shutdown()
+
+    attributes = collections.OrderedDict()
+    for unit, values in zip(units, state):
+        for obj in unit.objs:
+            obj.attribute(**values)
+            attributes[obj] = dict(values)
+
+    # the latencies are evaluated on copies of the graph
+    node_dict = dict([(node.object_id, node) for node in nodes])
+    op_latencies = collections.OrderedDict(
+        [(node_dict[object_id], cycles)
+         for object_id, cycles in current.op_latencies.items()
+         if object_id in node_dict])
+
+    result = AutotuneResult(attributes, current.latency, initial.latency,
+                            op_latencies, current.estimate, len(cache))
+
+    if not silent:
+        print(to_str(result, profile))
+
+    return result
+
+
+def get_budget_profile(device_budget):
+    if isinstance(device_budget, resource.Resources):
+        return resource.DeviceProfile('budget', 'ultrascale+',
+                                      device_budget.lut, device_budget.ff,
+                                      device_budget.bram36, device_budget.uram,
+                                      device_budget.dsp)
+
+    profile = resource.get_device_profile(device_budget)
+    if profile is None:
+        raise ValueError('device_budget must be specified.')
+
+    return profile
+
+
+def to_str(result, profile):
+    s = []
+    s.append('[Autotune] (device: %s)' % profile.name)
+    s.append('  latency: %d cycles (initial: %d cycles), %d evaluations' %
+             (result.latency, result.initial_latency, result.num_evaluations))
+    for obj, values in result.attributes.items():
+        attrs = ' '.join(['%s:%s' % (k, str(v)) for k, v in sorted(values.items())])
+        cycles = result.op_latencies.get(obj, None)
+        cycles = '%d cycles' % cycles if cycles is not None else 'chained'
+        name = (obj.name if obj.name is not None else
+                '%s_%d' % (obj.__class__.__name__, obj.object_id))
+        s.append('  %s: %s (%s)' % (name, attrs, cycles))
+    s.append(result.estimate.to_str(profile).split('  (per operator')[0].rstrip())
+    return '\n'.join(s)
+
+
+class _Unit(object):
+    """ operators that share a set of attributes and their choices """
+
+    def __init__(self, objs, choices, current):
+        self.objs = objs
+        self.choices = choices  # OrderedDict: name -> list of values
+        self.current = current  # dict: name -> value
+
+    def neighbors(self, state, index):
+        values = state[index]
+        ret = []
+
+        for name, choices in self.choices.items():
+            pos = choices.index(values[name])
+            for new_pos in (pos - 1, pos + 1):
+                if new_pos < 0 or new_pos >= len(choices):
+                    continue
+
+                new_values = dict(values)
+                new_values[name] = choices[new_pos]
+
+                # concur_och must be a multiple of par_och
+                concur_och = new_values.get('concur_och', None)
+                if (name == 'par_och' and concur_och is not None and
+                        concur_och < new_values['par_och']):
+                    new_values['concur_och'] = new_values['par_och']
+
+                new_state = list(state)
+                new_state[index] = new_values
+                ret.append(new_state)
+
+        return ret
+
+
+def make_units(nodes, max_par=None):
+    units = []
+    grouped = set()
+
+    # chained operators must have the same par
+    groups = _UnionFind()
+    for node in nodes:
+        if not bt.is_operator(node):
+            continue
+        for arg in node.args:
+            if bt.are_chainable_operators(node, arg) and not arg.chain_head:
+                groups.union(node, arg)
+
+    for node in sorted(nodes, key=lambda x: x.object_id):
+        if not bt.is_operator(node) or bt.is_view(node) or bt.is_removable_reshape(node):
+            continue
+
+        if node in grouped:
+            continue
+
+        if isinstance(node, conv2d):
+            units.append(_conv2d_unit(node, max_par))
+            continue
+
+        if 'par' not in inspect.signature(node.attribute).parameters:
+            continue
+
+        objs = sorted(groups.members(node), key=lambda x: x.object_id)
+        grouped.update(objs)
+
+        num_ch = max([obj.shape[-1] for obj in objs])
+        choices = collections.OrderedDict()
+        choices['par'] = _pow2_choices(num_ch, max_par, objs[0].par)
+        units.append(_Unit(objs, choices, {'par': objs[0].par}))
+
+    return units
+
+
+def _conv2d_unit(node, max_par):
+    num_ich = node.input_shape[-1]
+    num_och = node.filter_shape[0]
+    num_row, num_col = node.orig_shape[-3:-1]
+
+    choices = collections.OrderedDict()
+    choices['par_ich'] = _pow2_choices(num_ich, max_par, node.par_ich)
+    choices['par_och'] = _pow2_choices(num_och, max_par, node.par_och)
+
+    if node.pool is None and node.algorithm != 'winograd':
+        choices['par_col'] = _pow2_choices(num_col, max_par, node.par_col)
+        choices['par_row'] = _pow2_choices(num_row, max_par, node.par_row)
+
+    concur_och = [None] + _pow2_choices(num_och, None, None)[1:]
+    if node.concur_och not in concur_och:
+        concur_och.append(node.concur_och)
+        concur_och = [None] + sorted(concur_och[1:])
+    choices['concur_och'] = concur_och
+
+    choices['stationary'] = ['filter', 'input']
+
+    current = {'par_ich': node.par_ich, 'par_och': node.par_och,
+               'concur_och': node.concur_och, 'stationary': node.stationary}
+    if 'par_col' in choices:
+        current['par_col'] = node.par_col
+        current['par_row'] = node.par_row
+
+    return _Unit([node], choices, current)
+
+
+def _pow2_choices(size, max_par=None, current=None):
+    limit = 2 ** int(math.ceil(math.log(max(size, 1), 2)))
+    if max_par is not None:
+        limit = min(limit, max_par)
+
+    choices = []
+    v = 1
+    while v <= limit:
+        choices.append(v)
+        v *= 2
+
+    if current is not None and current not in choices:
+        choices.append(current)
+        choices.sort()
+
+    return choices
+
+
+class _UnionFind(object):
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        while self.parent.get(x, x) is not x:
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        rx = self.find(x)
+        ry = self.find(y)
+        if rx is not ry:
+            self.parent[ry] = rx
+
+    def members(self, x):
+        r = self.find(x)
+        ret = [y for y in self.parent.keys() if self.find(y) is r]
+        if x not in ret:
+            ret.append(x)
+        return ret
+
+
+def to_state_key(state):
+    return tuple([tuple(sorted(values.items(), key=lambda x: x[0])) for values in state])
+
+
+def to_assignment(units, key):
+    return [(obj.object_id, values)
+            for unit, values in zip(units, key) for obj in unit.objs]
+
+
+class _Candidate(object):
+
+    def __init__(self, key, ret, config, profile, objective):
+        self.key = key
+
+        if ret is None:
+            self.latency = None
+            self.op_latencies = None
+            self.estimate = None
+            self.score = None
+            return
+
+        self.latency, self.op_latencies, rams, substreams, streams = ret
+
+        maxi_datawidth = config['maxi_datawidth']
+        ram_specs = []
+        for (width, length), num in rams:
+            numbanks = max(maxi_datawidth // width, 1)
+            depth = max(length // numbanks, 1)
+            ram_specs.extend([resource.RamSpec(None, width, depth, numbanks, 2)] * num)
+
+        self.estimate = resource.ResourceEstimate(ram_specs, substreams, streams,
+                                                  [], [], [], 0,
+                                                  config['onchip_ram_style'], profile,
+                                                  verilog.get_num_maxi_ports(config))
+        self.fits = self.estimate.fits()
+        self.cost = max(self.estimate.utilization().values())
+
+        if objective == 'latency':
+            self.score = self.latency
+        else:
+            self.score = objective(self.latency, self.estimate)
+
+    def is_improved_by(self, cand):
+        if cand.score is None:
+            return False
+
+        if not self.fits:
+            return cand.fits or cand.cost < self.cost
+
+        if not cand.fits:
+            return False
+
+        return cand.score < self.score
+
+    def gain(self, cand):
+        if not self.fits:
+            # a fitting one first, and then the smallest overuse
+            return (cand.fits, -cand.cost)
+
+        return (self.score - cand.score) / max(cand.cost - self.cost, min_cost)
+
+
+class _Evaluator(object):
+
+    def __init__(self, data, config, processes=None):
+        self.executor = None
+
+        if processes is None or processes > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                processes, initializer=_init_worker, initargs=(data, config))
+        else:
+            _init_worker(data, config)
+
+    def map(self, assignments):
+        if self.executor is None:
+            return [_evaluate(assignment) for assignment in assignments]
+
+        return list(self.executor.map(_evaluate, assignments))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+_worker_graph = None
+
+
+def _init_worker(data, config):
+    global _worker_graph
+    _worker_graph = (data, config)
+
+
+def _evaluate(assignment):
+    data, config = _worker_graph
+    objs = serialize._loads(data)
+    nodes = dict([(node.object_id, node) for node in serialize._collect_nodes(objs)])
+
+    try:
+        for object_id, values in assignment:
+            nodes[object_id].attribute(**dict(values))
+
+        return evaluate_graph(config, objs)
+
+    except ValueError:
+        return None
+
+
+def evaluate_graph(config, objs):
+    """
+    Allocate the on-chip RAMs and substreams of a graph as to_veriloggen()
+    does, and return (latency, op_latencies, rams, substreams, streams),
+    where op_latencies is keyed by the object_id of the operator
+    """
+
+    if not config['disable_pad_folding']:
+        fold_pad(objs)
+
+    if not config['disable_constant_folding']:
+        fold_constants(objs)
+
+    if not config['disable_upsampling_folding']:
+        fold_upsampling(objs)
+
+    (objs, num_storages,
+     num_input_storages, num_output_storages) = verilog.analyze(config, objs)
+
+    # a module is required for the alignments and the RAM widths
+    m, clk, rst, maxi, saxi = verilog.make_module(config, 'autotune', objs,
+                                                  num_storages, num_input_storages,
+                                                  num_output_storages)
+
+    schedule_table = verilog.schedule(config, objs)
+    verilog.assign_maxi_ports(config, schedule_table, verilog.module_maxi_ports[m])
+
+    verilog.set_storage_name(objs)
+    verilog.set_col_tiles(config, objs)
+    verilog.set_shared_attrs(objs)
+
+    onchip_bytes = verilog.select_onchip_activations(config, schedule_table)
+    verilog.dispatch_cores(config, schedule_table)
+
+    max_stream_rams = verilog.calc_max_stream_rams(config, schedule_table)
+    max_rams = verilog.calc_max_rams(config, schedule_table, max_stream_rams)
+    max_substrms = verilog.calc_max_substreams(config, schedule_table)
+
+    latency = 0
+    op_latencies = collections.OrderedDict()
+    streams = collections.OrderedDict()
+
+    for stage, stage_objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in stage_objs:
+            if not bt.is_operator(obj) or bt.is_view(obj) or bt.is_removable_reshape(obj):
+                continue
+
+            if bt.is_output_chainable_operator(obj) and not obj.chain_head:
+                continue
+
+            stream_hash = obj.get_stream_hash()
+            if stream_hash not in streams:
+                streams[stream_hash] = _stream_spec(max_stream_rams[stream_hash])
+
+            # replicated cores run concurrently with the first one
+            if obj.core_index > 0:
+                continue
+
+            if obj.core_origin is not None:
+                cores = [core for core in stage_objs
+                         if core.core_origin is obj.core_origin]
+                cycles = get_latency(config, obj, cores)
+                op_latencies[obj.core_origin.object_id] = cycles
+            else:
+                cycles = get_latency(config, obj)
+                op_latencies[obj.object_id] = cycles
+
+            latency += cycles
+
+    if onchip_bytes > 0:
+        width = config['maxi_datawidth']
+        max_rams[(width, int(math.ceil(onchip_bytes * 8 / width)))] += 1
+
+    rams = sorted(max_rams.items(), key=lambda x: x[0])
+    substreams = sorted(max_substrms.items(), key=lambda x: x[0])
+
+    return latency, op_latencies, rams, substreams, list(streams.values())
+
+
+def _stream_spec(stream_rams):
+    # a source or a sink per RAM, with the default pattern and address widths
+    num_patterns = sum([len(rams) for rams in stream_rams]) + 1
+    return resource.StreamSpec(None, num_patterns, 2, 4, 32, 32)
+
+
+def get_latency(config, obj, cores=None):
+    """ modeled cycles of an operator (the head of a chain),
+    or of its replicated cores running concurrently """
+
+    if cores is None:
+        cores = [obj]
+
+    computes = []
+    num_runs = []
+    # the traffic on different AXI master ports overlaps,
+    # while the cores share the ports
+    port_bytes = collections.defaultdict(int)
+
+    for core in cores:
+        if isinstance(core, conv2d):
+            compute, dma, runs = _conv2d_model(core)
+        elif isinstance(core, _pool):
+            compute, dma, runs = _pool_model(core)
+        else:
+            compute, dma, runs = _streaming_model(core)
+
+        computes.append(compute)
+        num_runs.append(runs)
+
+        for traffic, num_bytes in dma.items():
+            if traffic == 'onchip':
+                port_bytes['onchip'] += num_bytes
+            else:
+                port_bytes[core.get_maxi(traffic).name] += num_bytes
+
+    bytes_per_cycle = config['maxi_datawidth'] / 8
+    dma_cycles = math.ceil(max(port_bytes.values()) / bytes_per_cycle)
+    return int(max(max(computes), dma_cycles) + max(num_runs) * stream_overhead)
+
+
+def _num_bytes(obj):
+    return obj.get_aligned_length() * obj.get_ram_width() / 8
+
+
+def _traffic(obj):
+    # on-chip activations are transferred on the internal port
+    if obj.onchip_addr is not None:
+        return 'onchip'
+
+    return bt.get_traffic_class(obj)
+
+
+def _dma_bytes(args, output):
+    """ bytes of each traffic class to read args and to write output once """
+
+    dma = collections.OrderedDict([('act', 0), ('param', 0), ('output', 0), ('onchip', 0)])
+    for arg in args:
+        dma[_traffic(arg)] += _num_bytes(arg)
+    dma['onchip' if output.onchip_addr is not None else 'output'] += _num_bytes(output)
+    return dma
+
+
+def _conv2d_model(obj):
+    act = obj.args[0]
+    filter = obj.args[1]
+
+    num_bat, num_row, num_col, num_ich = obj.input_shape
+    num_och = obj.filter_shape[0]
+    out_num_row, out_num_col = obj.orig_shape[-3:-1]
+
+    # rows and columns of the convolution before a fused pooling
+    if obj.pool is not None:
+        out_num_row *= obj.pool_size[0]
+        out_num_col *= obj.pool_size[1]
+
+    filter_num_col, filter_num_row, stride_col, stride_row = obj.get_control_window()
+
+    aligned_num_ich = bt.align_word(num_ich, act.get_word_alignment())
+    row_steps = int(math.ceil(out_num_row / obj.par_row))
+
+    compute = (num_bat * row_steps *
+               int(math.ceil(out_num_col / obj.par_col)) *
+               int(math.ceil(num_och / obj.par_och)) *
+               int(math.ceil(aligned_num_ich / obj.par_ich)))
+
+    concur_och = obj.get_req_concur_och()
+    och_blocks = int(math.ceil(num_och / concur_och))
+
+    keep_input = (not obj.disable_keep_input and
+                  obj.stationary == 'filter' and
+                  num_row <= filter_num_row and
+                  num_bat == 1)
+    keep_filter = num_och <= concur_och
+
+    dma = _dma_bytes(obj.args, obj)
+    act_bytes = _num_bytes(act)
+
+    # a replicated core reads a batch slice of the input and the residual
+    if obj.core_origin is not None:
+        bat_ratio = num_bat / obj.core_origin.input_shape[0]
+        act_bytes *= bat_ratio
+        for index, arg in enumerate(obj.args):
+            if index == 0 or index == obj.args_dict.get('residual'):
+                dma[_traffic(arg)] -= _num_bytes(arg) * (1 - bat_ratio)
+
+    if obj.stationary == 'filter':
+        # the input is read again for each block of output channels
+        num_reads = 1 if keep_input else och_blocks
+        dma[_traffic(act)] += act_bytes * (num_reads - 1)
+    else:
+        # the filter is read again for each row of outputs
+        num_reads = 1 if keep_filter else num_bat * row_steps
+        dma[_traffic(filter)] += _num_bytes(filter) * (num_reads - 1)
+
+    runs = num_bat * row_steps * int(math.ceil(num_och / obj.par_och))
+
+    return compute, dma, runs
+
+
+def _pool_model(obj):
+    num_bat, out_num_row, out_num_col, num_ch = obj.shape
+    aligned_num_ch = bt.align_word(num_ch, obj.get_word_alignment())
+
+    compute = (num_bat * out_num_row * out_num_col *
+               int(math.ceil(aligned_num_ch / obj.par)))
+    dma = _dma_bytes(obj.args, obj)
+    runs = num_bat * out_num_row
+
+    return compute, dma, runs
+
+
+def _streaming_model(obj):
+    # arguments from outside of the chain
+    args = []
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        for arg in cur.args:
+            if bt.is_output_chainable_operator(arg) and not arg.chain_head:
+                stack.append(arg)
+            elif arg not in args:
+                args.append(arg)
+
+    par = getattr(obj, 'par', 1) or 1
+    shape = obj.get_aligned_shape()
+
+    compute = int(math.ceil(bt.shape_to_length(shape) / par))
+    dma = _dma_bytes(args, obj)
+    runs = bt.shape_to_length(shape[:-1]) if len(shape) > 1 else 1
+
+    return compute, dma, runs
@@ -2,17 +2,23 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import copy
 import inspect
 import math
 import functools
 import numpy as np
 from collections import OrderedDict, defaultdict
 
-import veriloggen as vg
-import veriloggen.thread as vthread
-from veriloggen.optimizer import try_optimize as optimize
-
 from . import dtype_list
+from .lazy import lazy_import
+
+vg = lazy_import('veriloggen')
+vthread = lazy_import('veriloggen.thread')
+voptimizer = lazy_import('veriloggen.optimizer')
+
+
+def optimize(node, width=32):
+    return voptimizer.try_optimize(node, width)
 
 
 # Object ID counter for object sorting key
@@ -32,6 +38,25 @@ class _Numeric(_Node):
 
     parallel_scheduling_allowed = True
 
+    # address in the on-chip activation memory and its AXI master port,
+    # if the value is kept on-chip instead of the off-chip memory
+    onchip_addr = None
+    onchip_maxi = None
+
+    # number of copies of the value in the off-chip memory, one for each
+    # frame in flight in the dataflow mode
+    frame_slots = 1
+
+    # bytes of a block (the filter of an output channel) and of the whole
+    # image, if the value is stored in the zero-skip compressed format
+    # (util.compress_weight) instead of the dense one
+    compression_block = None
+    compression_size = None
+
+    # S-AXI registers (registers.RegisterLayout) of the module generated
+    # with the value as an output
+    register_layout = None
+
     def __init__(self, dtype=None, shape=None, name=None):
         _Node.__init__(self)
 
@@ -149,6 +174,9 @@ class _Numeric(_Node):
 
     @property
     def memory_size(self):
+        if self.compression_size is not None:
+            return self.compression_size
+
         return int(math.ceil(self.aligned_length * self.dtype.width / 8))
 
     @property
@@ -350,6 +378,31 @@ class _Operator(_Numeric):
 
     shared_attr_names = ()
 
+    # dict of traffic class ('act', 'param' or 'output') and AXI master port
+    maxi_ports = None
+
+    # parameters can be read by the main FSM during the previous stage
+    prefetchable = False
+    prefetch_enabled = False
+    prefetch_target = False
+    params_prefetched = None
+
+    # batch slice of an operator computed on a replicated core (make_core)
+    core_index = 0
+    core_origin = None
+    core_addr_offset = 0
+    core_arg_addr_offsets = None
+
+    # segment of stages with its own control thread in the dataflow mode
+    dataflow_segment = 0
+
+    # control params proportional to the batch size in the dynamic batch mode,
+    # as {name: offset}, where value = value_per_batch * batch_size + offset
+    dynamic_batch_params = {}
+    # maximum batch size and the saxi register of the batch size (dynamic batch mode)
+    dynamic_batch = None
+    dynamic_batch_reg = None
+
     def __sub_str__(self):
         par = ' par:%d' % self.par if self.par > 1 else ''
         return par
@@ -422,6 +475,78 @@ class _Operator(_Numeric):
 
             self.add_alignment_request(self.par)
 
+    def set_maxi_ports(self, maxi_ports):
+        self.maxi_ports = maxi_ports
+
+    def get_maxi(self, traffic):
+        """ AXI master port of a traffic class ('act', 'param' or 'output') """
+
+        if traffic == 'output' and self.onchip_maxi is not None:
+            return self.onchip_maxi
+
+        if self.maxi_ports is None:
+            return self.maxi
+
+        return self.maxi_ports[traffic]
+
+    def get_arg_maxi(self, arg):
+        if arg.onchip_maxi is not None:
+            return arg.onchip_maxi
+
+        return self.get_maxi(get_traffic_class(arg))
+
+    def get_prefetch_ram_positions(self):
+        """ positions in the input RAMs of each prefetchable argument """
+        return OrderedDict()
+
+    def prefetch_params(self, fsm, maxi, arg_addrs):
+        """ read the parameters of the first run by the main FSM """
+        raise NotImplementedError()
+
+    def get_maxi_port_hash(self):
+        if self.maxi_ports is None:
+            ports = None
+        else:
+            ports = tuple([(traffic, maxi.name)
+                           for traffic, maxi in sorted(self.maxi_ports.items(),
+                                                       key=lambda x: x[0])])
+
+        # the output and the sources kept on-chip
+        onchip = tuple([obj.onchip_maxi is not None
+                        for obj in [self] + list(self.collect_sources())])
+
+        if any(onchip):
+            return (ports, onchip)
+
+        return ports
+
+    def get_core_batch(self):
+        """ number of batch elements which can be split among replicated cores,
+        or None if the operator runs on a single core """
+        return None
+
+    def make_core(self, core_index, bat_start, num_bat):
+        """ copy of the operator which computes num_bat batch elements
+        from bat_start on a replicated core """
+
+        core = copy.copy(self)
+        _Node.__init__(core)
+
+        if self.name is not None:
+            core.name = '%s_core%d' % (self.name, core_index)
+
+        core.shape = (num_bat,) + tuple(self.shape[1:])
+        core.consumers = []
+        core.core_index = core_index
+        core.core_origin = self
+        return core
+
+    def get_core_arg_addr_offsets(self):
+        if self.core_arg_addr_offsets is None:
+            return [0 for _ in self.collect_sources()]
+
+        return self.core_arg_addr_offsets
+
     def set_shared_attrs(self, obj):
         for attr in self.shared_attr_names:
             v = getattr(obj, attr)
@@ -613,6 +738,19 @@ class _Operator(_Numeric):
         clsinfo = tuple(clsinfo)
         dtype = self.dtype
         par = self.par
+
+        # the control params of the dynamic batch mode are the values per batch
+        if self.dynamic_batch is not None:
+            clsinfo = clsinfo + ('dynamic_batch',)
+
+        # each replicated core has its own streams, RAMs and control threads
+        if self.core_index > 0:
+            return (clsinfo, dtype, par, self.core_index)
+
+        # so does each segment of the dataflow mode
+        if self.dataflow_segment > 0:
+            return (clsinfo, dtype, par, 'segment', self.dataflow_segment)
+
         return (clsinfo, dtype, par)
 
     def get_stream_obj_hash(self):
@@ -679,6 +817,48 @@ class _Operator(_Numeric):
         ret.update(self.collect_local_control_param_values())
         return ret
 
+    def get_num_control_param_sets(self):
+        return 1
+
+    def to_dynamic_batch_values(self, values):
+        """ control param values per batch of the dynamic batch mode """
+
+        ret = OrderedDict(values)
+
+        for name, offset in self.dynamic_batch_params.items():
+            value, res = divmod(values[name] - offset, self.dynamic_batch)
+            if res != 0:
+                raise ValueError("control param '%s' of '%s' is not proportional "
+                                 "to the batch size" % (name, self.name))
+            ret[name] = value
+
+        return ret
+
+    def get_dynamic_control_param(self, name):
+        """ control param of the current batch size in the dynamic batch mode """
+
+        value = getattr(self, name)
+
+        if self.dynamic_batch is None or name not in self.dynamic_batch_params:
+            return value
+
+        offset = self.dynamic_batch_params[name]
+        value = value * self.dynamic_batch_reg
+
+        if offset > 0:
+            return value + offset
+        if offset < 0:
+            return value - (-offset)
+        return value
+
+    def collect_all_control_param_values_list(self):
+        """ control params of each run of the control sequence (e.g. column tiles) """
+        return [self.collect_all_control_param_values()]
+
+    def set_col_tiles(self, max_ram_capacity=None):
+        """ operators with a column tiling override this method """
+        pass
+
     def collect_local_control_param_names(self):
         return self.collect_local_control_param_values().keys()
 
@@ -933,6 +1113,10 @@ class _Operator(_Numeric):
         if control_func is None:
             return None
 
+        if self.prefetch_enabled:
+            # set by the main FSM if the parameters are read during the previous stage
+            self.params_prefetched = self.m.Reg(self._name('params_prefetched'), initval=0)
+
         name = '_'.join(
             ['control', self.__class__.__name__, str(self.object_id)])
 
@@ -963,16 +1147,17 @@ class _Operator(_Numeric):
         return self.m.Wire('cparam_%s' % self._name(name), *args, **kwargs)
 
     def set_control_params(self, fsm, control_param_len,
-                           use_param_ram=False, min_param_ram_len=0):
+                           use_param_ram=False, min_param_ram_len=0,
+                           control_param_offset=0):
         if control_param_len <= 1:
             return
 
         if not use_param_ram or control_param_len < min_param_ram_len:
-            return self.set_control_params_mux(fsm)
+            return self.set_control_params_mux(fsm, control_param_offset)
 
-        return self.set_control_params_ram(fsm)
+        return self.set_control_params_ram(fsm, control_param_offset)
 
-    def set_control_params_ram(self, fsm):
+    def set_control_params_ram(self, fsm, control_param_offset=0):
         dst_regs = []
         for name in self.collect_all_control_param_names():
             v = getattr(self, name)
@@ -984,7 +1169,8 @@ class _Operator(_Numeric):
         if not dst_regs:
             return
 
-        dst_value_vec = self.control_param_ram.read(fsm, self.control_param_index)
+        dst_value_vec = self.control_param_ram.read(
+            fsm, self.control_param_index + control_param_offset)
 
         lsb = 0
         for dst_reg in dst_regs:
@@ -997,9 +1183,9 @@ class _Operator(_Numeric):
 
         fsm.goto_next()
 
-    def set_control_params_mux(self, fsm):
+    def set_control_params_mux(self, fsm, control_param_offset=0):
         fsm(
-            self.control_param_index_reg(self.control_param_index)
+            self.control_param_index_reg(self.control_param_index + control_param_offset)
         )
 
         fsm.goto_next()
@@ -1023,7 +1209,8 @@ class _Operator(_Numeric):
         self.control.reset(fsm)
 
     def get_control_hash(self):
-        return (self.get_stream_obj_hash(), self.get_ram_set_obj_hash())
+        return (self.get_stream_obj_hash(), self.get_ram_set_obj_hash(),
+                self.get_maxi_port_hash())
 
     def copy_control_params(self, obj):
         for name in obj.collect_all_control_param_names():
@@ -1056,6 +1243,7 @@ class _Operator(_Numeric):
         self.objaddr = obj.objaddr
         self.arg_objaddrs = obj.arg_objaddrs
         self.control = obj.control
+        self.params_prefetched = obj.params_prefetched
 
     def eval(self, memo, input_dict, **kwargs):
         if id(self) in memo:
@@ -1223,6 +1411,8 @@ class _StreamingOperator(_Operator):
                             ('wrap_sizes', wrap_sizes)])
 
     def control_sequence(self, fsm):
+        num_comp = self.get_dynamic_control_param('num_comp')
+
         sources = self.collect_sources()
 
         arg_gaddrs = [self.m.Reg(self._name('arg_gaddr_%d' % i),
@@ -1308,18 +1498,18 @@ class _StreamingOperator(_Operator):
             # normal
             laddr = arg_page_dma_offset
             gaddr = arg_objaddr + arg_gaddr
-            bus_lock(self.maxi, fsm)
-            dma_read(self.maxi, fsm, ram, laddr, gaddr, self.dma_size)
-            bus_unlock(self.maxi, fsm)
+            bus_lock(self.get_arg_maxi(arg), fsm)
+            dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, self.dma_size)
+            bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             b_stride0 = fsm.current
             fsm.goto_next()
 
             # stride-0
-            bus_lock(self.maxi, fsm)
-            dma_read(self.maxi, fsm, ram, laddr, gaddr, 1)
-            bus_unlock(self.maxi, fsm)
+            bus_lock(self.get_arg_maxi(arg), fsm)
+            dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, 1)
+            bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             # for reuse
@@ -1384,10 +1574,10 @@ class _StreamingOperator(_Operator):
 
         laddr = out_page_dma_offset
         gaddr = self.objaddr + out_gaddr
-        bus_lock(self.maxi, fsm)
-        dma_write(self.maxi, fsm,
+        bus_lock(self.get_maxi('output'), fsm)
+        dma_write(self.get_maxi('output'), fsm,
                   self.output_rams[0], laddr, gaddr, self.dma_size, use_async=True)
-        bus_unlock(self.maxi, fsm)
+        bus_unlock(self.get_maxi('output'), fsm)
 
         fsm.goto_next()
 
@@ -1456,16 +1646,16 @@ class _StreamingOperator(_Operator):
         fsm(
             skip_write(0)
         )
-        fsm.If(comp_count == self.num_comp - 1)(
+        fsm.If(comp_count == num_comp - 1)(
             skip_read(1),
             skip_comp(1)
         )
 
-        fsm.If(comp_count < self.num_comp).goto(state_read)
-        fsm.If(comp_count == self.num_comp).goto_next()
+        fsm.If(comp_count < num_comp).goto(state_read)
+        fsm.If(comp_count == num_comp).goto_next()
 
         # wait for last DMA write
-        dma_wait_write(self.maxi, fsm)
+        dma_wait_write(self.get_maxi('output'), fsm)
 
     def eval(self, memo, input_dict, **kwargs):
         kwargs['par'] = self.par
@@ -1473,7 +1663,7 @@ class _StreamingOperator(_Operator):
 
 
 class _ElementwiseOperator(_StreamingOperator):
-    pass
+    dynamic_batch_params = {'num_comp': 0}
 
 
 class _ReductionOperator(_StreamingOperator):
@@ -1758,18 +1948,18 @@ class _ReductionOperator(_StreamingOperator):
             # normal
             laddr = arg_page_dma_offset
             gaddr = arg_objaddr + arg_gaddr
-            bus_lock(self.maxi, fsm)
-            dma_read(self.maxi, fsm, ram, laddr, gaddr, self.read_dma_size)
-            bus_unlock(self.maxi, fsm)
+            bus_lock(self.get_arg_maxi(arg), fsm)
+            dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, self.read_dma_size)
+            bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             b_stride0 = fsm.current
             fsm.goto_next()
 
             # stride-0
-            bus_lock(self.maxi, fsm)
-            dma_read(self.maxi, fsm, ram, laddr, gaddr, 1)
-            bus_unlock(self.maxi, fsm)
+            bus_lock(self.get_arg_maxi(arg), fsm)
+            dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, 1)
+            bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             # for reuse
@@ -1860,10 +2050,10 @@ class _ReductionOperator(_StreamingOperator):
         gaddr = self.objaddr + out_gaddr
         out_size = self.write_dma_size
 
-        bus_lock(self.maxi, fsm)
-        dma_write(self.maxi, fsm,
+        bus_lock(self.get_maxi('output'), fsm)
+        dma_write(self.get_maxi('output'), fsm,
                   self.output_rams[0], laddr, gaddr, out_size, use_async=True)
-        bus_unlock(self.maxi, fsm)
+        bus_unlock(self.get_maxi('output'), fsm)
 
         state_write_end = fsm.current
         fsm.If(skip_write).goto_from(state_write, state_write_end)
@@ -1963,7 +2153,7 @@ class _ReductionOperator(_StreamingOperator):
         fsm.If(comp_count == self.num_comp).goto_next()
 
         # wait for last DMA write
-        dma_wait_write(self.maxi, fsm)
+        dma_wait_write(self.get_maxi('output'), fsm)
 
     def eval(self, memo, input_dict, **kwargs):
         kwargs['axis'] = self.axis
@@ -2136,9 +2326,9 @@ class _Reshape(_Operator):
 
         gaddr = self.arg_objaddrs[0] + in_offset
 
-        bus_lock(self.maxi, fsm)
-        dma_read(self.maxi, fsm, in_ram, 0, gaddr, self.read_size)
-        bus_unlock(self.maxi, fsm)
+        bus_lock(self.get_arg_maxi(self.args[0]), fsm)
+        dma_read(self.get_arg_maxi(self.args[0]), fsm, in_ram, 0, gaddr, self.read_size)
+        bus_unlock(self.get_arg_maxi(self.args[0]), fsm)
 
         fsm(
             in_offset.add(self.in_offset_inc),
@@ -2203,9 +2393,9 @@ class _Reshape(_Operator):
 
         gaddr = self.objaddr + out_offset
 
-        bus_lock(self.maxi, fsm)
-        dma_write(self.maxi, fsm, out_ram, 0, gaddr, self.write_size)
-        bus_unlock(self.maxi, fsm)
+        bus_lock(self.get_maxi('output'), fsm)
+        dma_write(self.get_maxi('output'), fsm, out_ram, 0, gaddr, self.write_size)
+        bus_unlock(self.get_maxi('output'), fsm)
 
         fsm(
             total_count.add(self.write_size),
@@ -2397,6 +2587,15 @@ def are_chainable_operators(consumer, producer):
             consumer.par == producer.par)
 
 
+def get_traffic_class(obj):
+    """ 'param' for variables and constants, 'act' for the others """
+
+    if is_storage(obj) and not obj.is_input:
+        return 'param'
+
+    return 'act'
+
+
 def is_elementwise_operator(obj):
     return isinstance(obj, _ElementwiseOperator)
 
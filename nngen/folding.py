@@ -0,0 +1,560 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+import functools
+
+import numpy as np
+
+import nngen.basic_types as bt
+import nngen.storage as st
+import nngen.dtype_list as dtype_list
+import nngen.util as util
+from nngen.operator.extern import extern
+from nngen.operator.basic import reshape
+from nngen.operator.conv2d import conv2d
+from nngen.operator.matmul import matmul
+from nngen.operator.pool import _pool, max_pool
+from nngen.operator.pool_serial import max_pool_serial
+from nngen.operator.pad import pad
+from nngen.operator.relu import relu
+from nngen.operator.upsampling2d import upsampling2d
+
+
+class folded_variable(st.derived_variable):
+    """
+    Variable which holds the result of an operator subgraph
+    whose inputs are only variables and constants.
+    The value is evaluated from the original subgraph,
+    so that the values of the source variables can be assigned
+    after the hardware generation.
+    """
+
+    def __sub_str__(self):
+        return ' folded:%s' % self.src.__class__.__name__
+
+    def __init__(self, node):
+        st.derived_variable.__init__(self, node, name=node.name)
+        self.layout = node.layout
+        self.perm = node.perm
+
+
+def fold_constants(objs):
+    """
+    Replace operators whose inputs are only variables and constants
+    with a variable holding the result
+
+    Such operators (scaling of biases, shift amounts made by full_imm,
+    reshapes of weights) are evaluated at compile time
+    instead of occupying pipeline stages, RAMs and off-chip memory traffic
+    at inference time. Only the largest foldable subgraphs are replaced.
+    Operators which generate their values without any input (e.g. full_imm)
+    are kept, since they cost nothing as a stream source.
+    The pass must be applied after quantization.
+
+    Parameters
+    ----------
+    objs : list or nngen object
+        Output objects of the graph
+
+    Returns
+    -------
+    num_folded : int
+        Number of removed operators
+    """
+
+    if not isinstance(objs, (list, tuple)):
+        objs = [objs]
+
+    nodes = []
+    for obj in objs:
+        nodes.extend(obj.collect_numerics())
+    nodes = sorted(set(nodes), key=nodes.index)
+
+    outputs = set(objs)
+    foldable = set()
+    has_source = set()
+    for node in sorted(nodes, key=lambda x: x.object_id):
+        if node not in outputs and _is_foldable(node, foldable):
+            foldable.add(node)
+            if any([isinstance(arg, bt._Storage) or arg in has_source
+                    for arg in node.args]):
+                has_source.add(node)
+
+    folded = set()
+
+    for node in nodes:
+        if not isinstance(node, bt._Operator):
+            continue
+
+        for arg in node.args:
+            if arg not in foldable or arg not in has_source or node in foldable:
+                continue
+
+            var = _to_folded_variable(arg, folded)
+            node.args = tuple([var if a is arg else a for a in node.args])
+            var.add_consumer(node)
+
+            for key, value in list(node.__dict__.items()):
+                if value is arg:
+                    setattr(node, key, var)
+
+    removed = set()
+    for var in folded:
+        removed.update([obj for obj in var.src.collect_numerics()
+                        if isinstance(obj, bt._Operator)])
+
+    return len(removed)
+
+
+def fold_pad(objs):
+    """
+    Absorb pad operators into the padding of the consumer
+
+    A pad operator reads and writes the whole padded tensor
+    before the consumer reads it again. It is removed
+    and its padding is added to the padding of the consumer
+    (conv2d, depthwise_conv2d, pooling or another pad),
+    if the consumer has an explicit padding and is its only consumer.
+    A max pooling consumer is accepted only for a non-negative input,
+    since its padding value is the minimum, not zero.
+
+    Parameters
+    ----------
+    objs : list or nngen object
+        Output objects of the graph
+
+    Returns
+    -------
+    num_folded : int
+        Number of removed pad operators
+    """
+
+    if not isinstance(objs, (list, tuple)):
+        objs = [objs]
+
+    nodes = []
+    for obj in objs:
+        nodes.extend(obj.collect_numerics())
+    nodes = sorted(set(nodes), key=nodes.index)
+
+    consumers = {}
+    for node in nodes:
+        if isinstance(node, bt._Operator):
+            for arg in node.args:
+                consumers.setdefault(arg, [])
+                if node not in consumers[arg]:
+                    consumers[arg].append(node)
+
+    outputs = set(objs)
+    num_folded = 0
+
+    # from the input side, so that a chain of pads is merged into the last one
+    for node in sorted(nodes, key=lambda x: x.object_id):
+        if not isinstance(node, pad) or node in outputs:
+            continue
+
+        node_consumers = consumers.get(node, [])
+        if len(node_consumers) != 1:
+            continue
+
+        consumer = node_consumers[0]
+        padding = _merge_padding(node, consumer)
+        if padding is None:
+            continue
+
+        src = node.args[0]
+        consumer.args = tuple([src] + list(consumer.args[1:]))
+        consumer.padding = padding
+        if isinstance(consumer, conv2d):
+            consumer.input_shape = src.shape
+
+        if node in src.consumers:
+            src.consumers.remove(node)
+        src.add_consumer(consumer)
+
+        consumers[src] = [consumer if c is node else c for c in consumers[src]]
+        num_folded += 1
+
+    return num_folded
+
+
+def _merge_padding(node, consumer):
+    """ padding of consumer with the padding of node, or None if not foldable """
+
+    if consumer.args[0] is not node or node in consumer.args[1:]:
+        return None
+
+    src = node.args[0]
+    if node.dtype != src.dtype or node.scale_factor != src.scale_factor:
+        return None
+
+    if isinstance(consumer, conv2d):
+        if (isinstance(consumer, matmul) or consumer.algorithm is not None or
+                consumer.upsampling_row > 1):
+            return None
+        window = consumer.filter_shape[-3:-1]
+    elif isinstance(consumer, _pool):
+        window = consumer.ksize[-3:-1]
+    else:
+        return None
+
+    # the padding of max pooling is the minimum value
+    if isinstance(consumer, (max_pool, max_pool_serial)) and not _is_non_negative(src):
+        return None
+
+    pad_padding = _to_padding_tuple(node.padding, pad_same=True)
+    consumer_padding = _to_padding_tuple(consumer.padding)
+    if pad_padding is None or consumer_padding is None:
+        return None
+
+    padding = tuple([a + b for a, b in zip(pad_padding, consumer_padding)])
+
+    # each window must contain at least one input pixel
+    if not isinstance(consumer, pad):
+        if max(padding[0], padding[1]) >= window[0] or max(padding[2], padding[3]) >= window[1]:
+            return None
+
+    return padding
+
+
+def _to_padding_tuple(padding, pad_same=False):
+    """ (top, bottom, left, right) of an explicit padding """
+
+    if isinstance(padding, int):
+        return (padding, padding, padding, padding)
+
+    if isinstance(padding, (tuple, list)):
+        return tuple(padding)
+
+    # 'SAME' of pad (ksize 1, stride 1) means no padding
+    if padding == 'VALID' or (pad_same and padding == 'SAME'):
+        return (0, 0, 0, 0)
+
+    return None
+
+
+def _is_non_negative(node):
+    if node.dtype is not None and not node.dtype.signed:
+        return True
+
+    if isinstance(node, relu):
+        return True
+
+    act_func = getattr(node, 'act_func', None)
+    return isinstance(act_func, type) and issubclass(act_func, relu)
+
+
+def fold_upsampling(objs):
+    """
+    Fuse nearest-neighbour upsampling2d operators into the consuming conv2d
+
+    An upsampling2d operator writes the enlarged tensor
+    before the conv2d reads it again. It is removed, if the conv2d
+    is its only consumer, and the conv2d reads the original tensor.
+
+    - The rows are upsampled by the activation DMA of the conv2d
+      (upsampling_row), which reads each original row
+      for every upsampled row.
+    - The columns are folded into the filter: the output columns of each
+      phase (column % factor) are a stride-1 convolution of the original
+      columns by the sum of the filter columns which read the same
+      original column. The phases are computed as extra output channels,
+      which have the same memory layout as the upsampled output columns.
+      This is applied to a plain conv2d which is not an output,
+      with strides of 1 in the column, no rshift_mul, fused pooling,
+      residual nor column tiling, if the larger filter costs less
+      than the upsampled activation. The filter is stored
+      as a wider derived_variable. Otherwise only the rows are fused,
+      and the upsampling2d of the columns remains.
+
+    Parameters
+    ----------
+    objs : list or nngen object
+        Output objects of the graph
+
+    Returns
+    -------
+    num_folded : int
+        Number of fused upsampling2d operators
+    """
+
+    if not isinstance(objs, (list, tuple)):
+        objs = [objs]
+
+    nodes = []
+    for obj in objs:
+        nodes.extend(obj.collect_numerics())
+    nodes = sorted(set(nodes), key=nodes.index)
+
+    consumers = {}
+    for node in nodes:
+        if isinstance(node, bt._Operator):
+            for arg in node.args:
+                consumers.setdefault(arg, [])
+                if node not in consumers[arg]:
+                    consumers[arg].append(node)
+
+    outputs = set(objs)
+    num_folded = 0
+
+    for node in sorted(nodes, key=lambda x: x.object_id):
+        if not isinstance(node, upsampling2d) or node in outputs:
+            continue
+
+        node_consumers = consumers.get(node, [])
+        if len(node_consumers) != 1:
+            continue
+
+        consumer = node_consumers[0]
+        if not _is_upsampling_foldable(node, consumer):
+            continue
+
+        src = node.args[0]
+        factor_row = node.factors[1]
+        factor_col = node.factors[2]
+
+        if factor_col > 1:
+            new_consumer = (_upsampling_col_conv2d(consumer, src, factor_row, factor_col)
+                            if consumer not in outputs else None)
+
+            # the rows only: upsampling2d of the columns remains
+            if new_consumer is None:
+                if factor_row == 1:
+                    continue
+
+                node.factors = (1, 1, factor_col, 1)
+                node.shape = tuple([s * f for s, f in zip(src.shape, node.factors)])
+                consumer.upsampling_row = factor_row
+                num_folded += 1
+                continue
+
+            out = reshape(new_consumer, consumer.shape, dtype=consumer.dtype)
+            out.scale_factor = consumer.scale_factor
+            out.layout = consumer.layout
+
+            for c in consumers.get(consumer, []):
+                c.args = tuple([out if arg is consumer else arg for arg in c.args])
+                for key, value in list(c.__dict__.items()):
+                    if value is consumer:
+                        setattr(c, key, out)
+                out.add_consumer(c)
+
+            for arg in consumer.args:
+                if consumer in arg.consumers:
+                    arg.consumers.remove(consumer)
+
+            if node in src.consumers:
+                src.consumers.remove(node)
+
+            consumers[out] = consumers.pop(consumer, [])
+            consumer = new_consumer
+
+        else:
+            consumer.args = tuple([src] + list(consumer.args[1:]))
+            consumer.upsampling_row = factor_row
+
+            if node in src.consumers:
+                src.consumers.remove(node)
+            src.add_consumer(consumer)
+
+        consumers[src] = [consumer if c is node else c for c in consumers[src]]
+        num_folded += 1
+
+    return num_folded
+
+
+def _is_upsampling_foldable(node, consumer):
+    if not isinstance(consumer, conv2d) or isinstance(consumer, matmul):
+        return False
+
+    if consumer.args[0] is not node or node in consumer.args[1:]:
+        return False
+
+    src = node.args[0]
+    if node.dtype != src.dtype or node.scale_factor != src.scale_factor:
+        return False
+
+    return (consumer.algorithm is None and consumer.upsampling_row == 1 and
+            tuple(consumer.input_shape) == tuple(node.shape))
+
+
+def _upsampling_col_conv2d(node, src, factor_row, factor_col):
+    """ conv2d of the original columns with the phases as output channels,
+        or None if not applicable """
+
+    if type(node) is not conv2d:
+        return None
+
+    if (node.strides[2] != 1 or node.pool is not None or node.has_residual or
+            node.col_tile_size is not None):
+        return None
+
+    if node.has_vshamt_mul or (node.cshamt_mul is not None and node.cshamt_mul != 0):
+        return None
+
+    filter = node.args[1]
+    if (not isinstance(filter, bt._Storage) or filter.is_input or
+            tuple(filter.shape) != tuple(node.filter_shape)):
+        return None
+
+    padding = _conv2d_padding(node)
+    pad_left = padding[2]
+    filter_num_col = node.filter_shape[2]
+    out_num_col = node.shape[2]
+    if out_num_col % factor_col != 0:
+        return None
+
+    # original column offsets of the filter columns of all the phases
+    col_min = (-pad_left) // factor_col
+    col_max = (factor_col - 1 - pad_left + filter_num_col - 1) // factor_col
+    new_filter_num_col = col_max - col_min + 1
+    new_pad_left = -col_min
+    new_pad_right = (out_num_col // factor_col - 1 + new_filter_num_col -
+                     src.shape[2] - new_pad_left)
+    if new_pad_right < 0:
+        return None
+
+    # RAM words are power-of-2 width
+    max_terms = max([len([x for x in range(filter_num_col)
+                          if (phase - pad_left + x) // factor_col == col])
+                     for phase in range(factor_col)
+                     for col in range(col_min, col_max + 1)])
+    width = filter.dtype.width + int(math.ceil(math.log(max_terms, 2)))
+    width = 2 ** int(math.ceil(math.log(width, 2)))
+    if width > 32:
+        return None
+
+    dtype = dtype_list.dtype_info(filter.dtype.base, width,
+                                  filter.dtype.point, filter.dtype.signed)
+    shape = (node.filter_shape[0] * factor_col, node.filter_shape[1],
+             new_filter_num_col, node.filter_shape[3])
+
+    # the larger filter must not cost more than the upsampling2d of the columns,
+    # which writes and reads the activation of factor_col times
+    filter_bytes = (bt.shape_to_length(shape) * width -
+                    bt.shape_to_length(filter.shape) * filter.dtype.width) // 8
+    act_bytes = (bt.shape_to_length(src.shape) * src.dtype.width // 8 *
+                 (1 + factor_col + factor_row * factor_col - factor_row))
+    if filter_bytes >= act_bytes:
+        return None
+    name = filter.name + '_upsampling' if filter.name is not None else None
+    new_filter = st.derived_variable(
+        filter, functools.partial(upsampling_col_filter,
+                                  factor=factor_col, pad_left=pad_left),
+        dtype, shape, name)
+
+    # per-channel parameters are repeated for the phases
+    kwargs = {}
+    for key in ('bias', 'scale', 'vshamt_sum', 'vshamt_out'):
+        if key not in node.args_dict:
+            kwargs[key] = None
+            continue
+
+        arg = node.args[node.args_dict[key]]
+        if arg.shape[-1] != 1:
+            if not isinstance(arg, bt._Storage) or arg.is_input:
+                return None
+
+            name = arg.name + '_upsampling' if arg.name is not None else None
+            arg = st.derived_variable(
+                arg, functools.partial(np.tile, reps=factor_col),
+                arg.dtype, (arg.shape[-1] * factor_col,), name)
+
+        kwargs[key] = arg
+
+    rshift_sum = (kwargs['vshamt_sum'] if kwargs['vshamt_sum'] is not None
+                  else node.cshamt_sum)
+    rshift_out = (kwargs['vshamt_out'] if kwargs['vshamt_out'] is not None
+                  else node.cshamt_out)
+
+    new_node = conv2d(src, new_filter, node.strides,
+                      bias=kwargs['bias'], scale=kwargs['scale'],
+                      rshift_mul=node.cshamt_mul, rshift_sum=rshift_sum,
+                      rshift_out=rshift_out,
+                      act_func=node.act_func,
+                      padding=(padding[0], padding[1], new_pad_left, new_pad_right),
+                      dtype=node.dtype, mul_dtype=node.mul_dtype, sum_dtype=node.sum_dtype,
+                      name=node.name,
+                      par_ich=node.par_ich, par_och=node.par_och,
+                      par_col=node.par_col, par_row=node.par_row,
+                      concur_och=node.concur_och, stationary=node.stationary,
+                      input_ram_size=node.input_ram_size,
+                      filter_ram_size=node.filter_ram_size,
+                      bias_ram_size=node.bias_ram_size,
+                      scale_ram_size=node.scale_ram_size,
+                      vshamt_mul_ram_size=node.vshamt_mul_ram_size,
+                      vshamt_sum_ram_size=node.vshamt_sum_ram_size,
+                      vshamt_out_ram_size=node.vshamt_out_ram_size,
+                      out_ram_size=node.out_ram_size,
+                      disable_keep_input=node.disable_keep_input,
+                      upsampling_row=factor_row)
+    new_node.scale_factor = node.scale_factor
+    new_node.quantized = node.quantized
+
+    return new_node
+
+
+def upsampling_col_filter(value, factor, pad_left):
+    """ OHWI filter of the column phases as (factor * outchannel, H, W', I) """
+
+    num_och, num_row, num_col, num_ich = value.shape
+    col_min = (-pad_left) // factor
+    col_max = (factor - 1 - pad_left + num_col - 1) // factor
+
+    ret = np.zeros([factor, num_och, num_row, col_max - col_min + 1, num_ich],
+                   dtype=np.result_type(value.dtype, np.int64))
+
+    for phase in range(factor):
+        for x in range(num_col):
+            col = (phase - pad_left + x) // factor - col_min
+            ret[phase, :, :, col, :] += value[:, :, x, :]
+
+    return ret.reshape([factor * num_och, num_row, col_max - col_min + 1, num_ich])
+
+
+def _conv2d_padding(node):
+    """ (top, bottom, left, right) of conv2d """
+
+    if isinstance(node.padding, str) and node.padding == 'SAME':
+        # opposite order to pool
+        _, pad_col_right, pad_col_left = util.pad_size_split(
+            node.input_shape[2], node.filter_shape[2], node.strides[2])
+        _, pad_row_bottom, pad_row_top = util.pad_size_split(
+            node.input_shape[1], node.filter_shape[1], node.strides[1])
+        return (pad_row_top, pad_row_bottom, pad_col_left, pad_col_right)
+
+    return _to_padding_tuple(node.padding)
+
+
+def _is_foldable(node, foldable):
+    if not isinstance(node, bt._Operator) or isinstance(node, extern):
+        return False
+
+    for arg in node.args:
+        if isinstance(arg, bt._Storage) and not arg.is_input:
+            continue
+
+        if arg in foldable:
+            continue
+
+        return False
+
+    return True
+
+
+def _to_folded_variable(node, folded):
+    for f in folded:
+        if f.src is node:
+            return f
+
+    var = folded_variable(node)
+    folded.add(var)
+
+    for arg in node.args:
+        if node in arg.consumers:
+            arg.consumers.remove(node)
+
+    return var
+
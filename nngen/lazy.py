@@ -0,0 +1,45 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import importlib
+
+
+class LazyModule(object):
+    """
+    Module proxy which imports the actual module on the first attribute access.
+
+    The HDL toolchain (veriloggen, pyverilog and Jinja2) is imported
+    only when a hardware construction method actually uses it,
+    so that software-only users (eval, quantize) do not pay for it.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        if self._lazy_module is None:
+            self.__dict__['_lazy_module'] = importlib.import_module(self._lazy_name)
+
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if self._lazy_module is None:
+            return "<lazy module '%s' (not loaded)>" % self._lazy_name
+
+        return repr(self._lazy_module)
+
+
+def lazy_import(name):
+    """ return a module proxy of 'name' which is imported on first use """
+    return LazyModule(name)
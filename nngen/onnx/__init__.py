@@ -4,8 +4,11 @@ from __future__ import division
 
 import collections
 
+import nngen.basic_types as bt
 import nngen.storage as storage
 import nngen.dtype_list as dtype_list
+import nngen.operator as operator
+from nngen.folding import fold_pad
 
 from . import util
 from . import basic
@@ -21,6 +24,7 @@ from . import reshape
 from . import concat
 from . import gather
 from . import flatten
+from .layout import optimize_layout
 
 
 # describe custom ONNX converting methods here
@@ -291,6 +295,18 @@ def from_onnx(filename,
         elif name in constants:
             outputs[name] = constants[name]
 
+    # absorb Pad into the padding of the following Conv and pooling
+    if not disable_fusion:
+        objs = [obj for obj in outputs.values() if isinstance(obj, bt._Numeric)]
+        if fold_pad(objs) > 0:
+            used = set()
+            for obj in objs:
+                used.update(obj.collect_numerics())
+
+            for name, op in list(operators.items()):
+                if isinstance(op, operator.pad) and op not in used:
+                    del operators[name]
+
     return outputs, placeholders, variables, constants, operators
 
 
@@ -4,11 +4,14 @@ from __future__ import division
 
 import collections
 
+import nngen.basic_types as bt
 import nngen.storage as storage
 import nngen.operator as operator
 import nngen.dtype_list as dtype_list
 
 from . import util
+from . import batchnormalization
+from . import conv
 
 
 def _elementwise(method, visitor, node):
@@ -72,9 +75,73 @@ def _normalize_elementwise(method, pre_methods, visitor, node):
 
 def Add(visitor, node):
 
+    fused = _fuse_conv_residual(visitor, node)
+    if fused is not None:
+        return fused
+
     return _normalize_elementwise(operator.add, None, visitor, node)
 
 
+def _fuse_conv_residual(visitor, node, act_func=None):
+    """ Conv -> (BatchNormalization) -> Add into a single conv2d with a fused residual add """
+
+    if visitor.disable_fusion or len(node.input) != 2:
+        return None
+
+    node_name = util.get_name(node)
+
+    for i, src_name in enumerate(node.input):
+        src_node = util.search_node_from_model(visitor.model, src_name)
+
+        if (src_node is None or len(visitor.consumers[src_name]) != 1 or
+                src_name in visitor.operators):
+            continue
+
+        batchnorm_node = None
+        conv_name = src_name
+        conv_node = src_node
+
+        if src_node.op_type == 'BatchNormalization':
+            batchnorm_node = src_node
+            conv_name = src_node.input[0]
+            conv_node = util.search_node_from_model(visitor.model, conv_name)
+
+        if (conv_node is None or conv_node.op_type != 'Conv' or
+                len(visitor.consumers[conv_name]) != 1 or
+                conv_name in visitor.operators):
+            continue
+
+        if any([attribute.name == 'group' and attribute.i != 1
+                for attribute in conv_node.attribute]):
+            continue
+
+        residual = visitor.visit(node.input[1 - i])
+
+        # parameters and broadcasting operands are not fused
+        if isinstance(residual, bt._Storage) and residual.value is not None:
+            continue
+
+        if len(residual.shape) != 4:
+            continue
+
+        conv_dtype = visitor.value_dtypes.get(util.get_name(conv_node),
+                                              visitor.default_operator_dtype)
+        if residual.dtype != conv_dtype:
+            continue
+
+        if batchnorm_node is not None:
+            c = batchnormalization.BatchNormalization(visitor, batchnorm_node,
+                                                      act_func=act_func,
+                                                      residual=residual)
+        else:
+            c = conv.Conv(visitor, conv_node, act_func=act_func, residual=residual)
+
+        visitor.operators[node_name] = c
+        return c
+
+    return None
+
+
 def Sub(node, visitor):
 
     pre_methods = (None, operator.neg)
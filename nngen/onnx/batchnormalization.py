@@ -12,7 +12,7 @@ from . import conv
 from . import gemm
 
 
-def BatchNormalization(visitor, node, act_func=None):
+def BatchNormalization(visitor, node, act_func=None, residual=None):
 
     srcs = []
     for src in node.input[1:]:
@@ -42,7 +42,8 @@ def BatchNormalization(visitor, node, act_func=None):
         src_op = conv.Conv(visitor, src_node,
                            batchnorm_scale=scale_value,
                            batchnorm_bias=bias_value,
-                           act_func=act_func)
+                           act_func=act_func,
+                           residual=residual)
         visitor.operators[node_name] = src_op
         return src_op
 
@@ -4,6 +4,9 @@ from __future__ import division
 
 import collections
 
+import numpy as np
+
+import nngen.basic_types as bt
 import nngen.storage as storage
 import nngen.operator as operator
 import nngen.dtype_list as dtype_list
@@ -12,7 +15,8 @@ from . import util
 
 
 def Conv(visitor, node,
-         batchnorm_scale=None, batchnorm_bias=None, act_func=None):
+         batchnorm_scale=None, batchnorm_bias=None, act_func=None,
+         pool_size=None, residual=None):
 
     # input, filter
     srcs = []
@@ -24,9 +28,33 @@ def Conv(visitor, node,
     input = srcs[0]
     filter = srcs[1]
 
+    group = 1
+    for attribute in node.attribute:
+        if attribute.name == 'group':
+            group = attribute.i
+
     # transpose data layout to nngen-compatible format
     input = util.transpose_layout(input, 'NHWC', visitor.onnx_input_layout)
-    filter = util.transpose_layout(filter, 'OHWI', visitor.onnx_filter_layout)
+
+    num_och = filter.shape[visitor.onnx_filter_layout.index('O')]
+    depthwise = group > 1 and group == input.shape[-1] and group == num_och
+
+    # grouped convolutions are not expanded into dense filters
+    if group > 1 and group == input.shape[-1] and not depthwise:
+        raise ValueError('depthwise convolution with a channel multiplier is not supported: '
+                         'output channels %d != input channels %d' %
+                         (num_och, input.shape[-1]))
+
+    if group > 1 and not depthwise:
+        raise ValueError('grouped convolution is not supported, except depthwise '
+                         'convolution (group == channels): group %d != channels %d' %
+                         (group, input.shape[-1]))
+
+    if depthwise:
+        filter = util.transpose_layout(filter, 'HWOI', visitor.onnx_filter_layout)
+        filter = _to_depthwise_filter(filter)
+    else:
+        filter = util.transpose_layout(filter, 'OHWI', visitor.onnx_filter_layout)
 
     bias = srcs[2] if len(srcs) > 2 else None
 
@@ -83,9 +111,10 @@ def Conv(visitor, node,
             padding = 'SAME'
 
         elif attribute.name == 'pads':
+            # ONNX: (top, left, bottom, right)
             padding[0] = attribute.ints[0]
-            padding[1] = attribute.ints[1]
-            padding[2] = attribute.ints[2]
+            padding[1] = attribute.ints[2]
+            padding[2] = attribute.ints[1]
             padding[3] = attribute.ints[3]
 
         elif attribute.name == 'strides':
@@ -105,7 +134,37 @@ def Conv(visitor, node,
     kwargs['sum_dtype'] = sum_dtype
     kwargs['name'] = name
 
-    c = operator.conv2d(*args, **kwargs)
+    if pool_size is not None:
+        kwargs['pool'] = 'max'
+        kwargs['pool_size'] = tuple(pool_size)
+
+    if residual is not None:
+        kwargs['residual'] = util.transpose_layout(residual, 'NHWC',
+                                                   visitor.onnx_input_layout)
+
+    if depthwise:
+        c = operator.depthwise_conv2d(*args, **kwargs)
+    else:
+        c = operator.conv2d(*args, **kwargs)
+
     c.layout = 'NHWC'
 
     return c
+
+
+def _to_depthwise_filter(filter):
+    """ 'HWOI' (height, width, channel, 1) -> 'HWC' (height, width, channel) """
+
+    shape = tuple(filter.shape[:-1])
+
+    if not isinstance(filter, bt._Storage):
+        return operator.reshape(filter, shape)
+
+    filter.shape = shape
+    filter.layout = 'HWC'
+
+    if filter.value is not None:
+        filter.value = np.reshape(filter.value, shape)
+
+    return filter
+
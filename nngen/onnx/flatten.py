@@ -20,6 +20,9 @@ def Flatten(visitor, node):
 
     input = srcs[0]
 
+    # flattening order of ONNX
+    input = util.restore_layout(input, visitor.onnx_input_layout)
+
     for attribute in node.attribute:
         if attribute.name == 'axis':
             axis = attribute.i
@@ -0,0 +1,294 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+import nngen.basic_types as bt
+import nngen.operator as operator
+
+
+def optimize_layout(outputs):
+    """
+    Remove layout transposes from an ONNX-imported graph
+
+    The following rewrites are applied until none of them matches.
+
+    - transpose of a transpose: the pair is cancelled if the permutations
+      are inverse, otherwise merged into a single transpose
+    - transpose which moves only size-1 dimensions: replaced with a reshape
+    - reshape of a reshape: merged into a single reshape
+    - reshape to the same shape: removed
+    - transpose of an unshared placeholder, variable or constant:
+      folded into its shape, perm and value
+    - transpose followed by a flattening reshape and matmul:
+      folded into the column order of the matmul weight
+
+    Parameters
+    ----------
+    outputs : dict or list
+        Output NNgen nodes
+
+    Returns
+    -------
+    report : OrderedDict
+        'num_transposes': number of removed transposes,
+        'num_bytes': removed off-chip memory traffic in bytes
+    """
+
+    if isinstance(outputs, dict):
+        keys = list(outputs.keys())
+        objs = list(outputs.values())
+    elif isinstance(outputs, (list, tuple)):
+        keys = None
+        objs = list(outputs)
+    else:
+        keys = None
+        objs = [outputs]
+
+    report = OrderedDict([('num_transposes', 0), ('num_bytes', 0)])
+
+    rules = (_cancel_transpose_pair,
+             _transpose_to_reshape,
+             _merge_reshape_pair,
+             _remove_identity_reshape,
+             _fold_transpose_into_storage,
+             _fold_transpose_into_matmul_weight)
+
+    changed = True
+    while changed:
+        changed = False
+        for node in _collect_operators(objs):
+            for rule in rules:
+                if rule(node, objs, report):
+                    changed = True
+                    break
+            if changed:
+                break
+
+    # replaced output nodes
+    if keys is not None:
+        for key, obj in zip(keys, objs):
+            outputs[key] = obj
+    elif isinstance(outputs, list):
+        outputs[:] = objs
+
+    return report
+
+
+def _cancel_transpose_pair(node, outputs, report):
+    if not isinstance(node, operator.transpose):
+        return False
+
+    src = node.args[0]
+    if not isinstance(src, operator.transpose) or not _is_removable(src, outputs):
+        return False
+
+    perm = tuple([src.transpose_perm[p] for p in node.transpose_perm])
+    _set_args(node, src.args[0])
+    _detach(src)
+    _remove_transpose(src, report)
+
+    if perm == tuple(range(len(perm))):
+        _replace(node, node.args[0], outputs)
+        _detach(node)
+        _remove_transpose(node, report)
+        return True
+
+    node.transpose_perm = perm
+    return True
+
+
+def _transpose_to_reshape(node, outputs, report):
+    if not isinstance(node, operator.transpose):
+        return False
+
+    src = node.args[0]
+    if not _is_reshape_perm(src.shape, node.transpose_perm):
+        return False
+
+    new_node = operator.reshape(src, list(node.shape), dtype=node.dtype, name=node.name)
+    new_node.layout = node.layout
+    new_node.scale_factor = node.scale_factor
+    _replace(node, new_node, outputs)
+    _detach(node)
+    _remove_transpose(node, report)
+    return True
+
+
+def _merge_reshape_pair(node, outputs, report):
+    if not isinstance(node, bt._LazyReshape):
+        return False
+
+    src = node.args[0]
+    if (not isinstance(src, bt._LazyReshape) or
+            src.dtype != node.dtype or not _is_removable(src, outputs)):
+        return False
+
+    _set_args(node, src.args[0])
+    _detach(src)
+    return True
+
+
+def _remove_identity_reshape(node, outputs, report):
+    if not isinstance(node, bt._LazyReshape):
+        return False
+
+    src = node.args[0]
+    if (node.shape != src.shape or node.dtype != src.dtype or
+            _contains(outputs, node)):
+        return False
+
+    _replace(node, src, outputs)
+    _detach(node)
+    return True
+
+
+def _fold_transpose_into_storage(node, outputs, report):
+    if not isinstance(node, operator.transpose):
+        return False
+
+    src = node.args[0]
+    if not isinstance(src, bt._Storage) or not _is_removable(src, outputs):
+        return False
+
+    perm = node.transpose_perm
+    if src.perm is not None:
+        perm = tuple([src.perm[p] for p in perm])
+
+    if src.value is not None:
+        src.value = np.transpose(src.value, node.transpose_perm)
+
+    src.shape = node.shape
+    src.perm = tuple(perm)
+    src.layout = node.layout
+
+    _replace(node, src, outputs)
+    _detach(node)
+    _remove_transpose(node, report)
+    return True
+
+
+def _fold_transpose_into_matmul_weight(node, outputs, report):
+    # transpose -> reshape (N, -1) -> matmul
+    if not isinstance(node, operator.matmul):
+        return False
+
+    flatten = node.args[0]
+    if (not isinstance(flatten, bt._LazyReshape) or
+            not _is_removable(flatten, outputs)):
+        return False
+
+    trans = flatten.args[0]
+    if not isinstance(trans, operator.transpose) or not _is_removable(trans, outputs):
+        return False
+
+    perm = trans.transpose_perm
+    if (perm[0] != 0 or len(flatten.shape) != 2 or
+            flatten.shape[0] != trans.shape[0] or node.transposed_a):
+        return False
+
+    weight = node.args[1]
+    if (not isinstance(weight, bt._Storage) or weight.value is None or
+            len(weight.consumers) != 1):
+        return False
+
+    # weight columns follow the flattened order of the transposed input
+    value = weight.value if node.transposed_b else weight.value.T
+    num_och = value.shape[0]
+    value = value.reshape((num_och,) + tuple(trans.shape[1:]))
+    value = np.transpose(value, [0] + [perm.index(i) for i in range(1, len(perm))])
+    value = value.reshape((num_och, -1))
+    weight.value = value if node.transposed_b else value.T
+
+    _set_args(flatten, trans.args[0])
+    _detach(trans)
+    _remove_transpose(trans, report)
+    return True
+
+
+def _is_reshape_perm(shape, perm):
+    """ transpose which keeps the order of non-trivial dimensions """
+    order = [p for p in perm if shape[p] != 1]
+    return order == sorted(order)
+
+
+def _is_removable(node, outputs):
+    return len(node.consumers) == 1 and not _contains(outputs, node)
+
+
+def _contains(objs, node):
+    for obj in objs:
+        if obj is node:
+            return True
+    return False
+
+
+def _set_args(node, src):
+    """ replace the first argument of node with src """
+    old = node.args[0]
+    node.args = tuple([src] + list(node.args[1:]))
+
+    if node in old.consumers:
+        old.consumers.remove(node)
+
+    if node not in src.consumers:
+        src.consumers.append(node)
+
+
+def _replace(node, new_node, outputs):
+    """ redirect all consumers of node to new_node """
+    for consumer in list(node.consumers):
+        if consumer is new_node:
+            continue
+
+        consumer.args = tuple([new_node if arg is node else arg
+                               for arg in consumer.args])
+        if consumer not in new_node.consumers:
+            new_node.consumers.append(consumer)
+
+    node.consumers = []
+
+    for i, obj in enumerate(outputs):
+        if obj is node:
+            outputs[i] = new_node
+
+
+def _detach(node):
+    """ remove a dropped node from the consumers of its arguments """
+    for arg in node.args:
+        if isinstance(arg, bt._Numeric) and node in arg.consumers:
+            arg.consumers.remove(node)
+
+
+def _remove_transpose(node, report):
+    report['num_transposes'] += 1
+    report['num_bytes'] += _num_bytes(node.args[0]) + _num_bytes(node)
+
+
+def _num_bytes(node):
+    return int(math.ceil(node.length * node.dtype.width / 8))
+
+
+def _collect_operators(outputs):
+    visited = set()
+    ret = []
+
+    def visit(node):
+        if id(node) in visited or not isinstance(node, bt._Numeric):
+            return
+
+        visited.add(id(node))
+
+        if isinstance(node, bt._Operator):
+            for arg in node.args:
+                visit(arg)
+            ret.append(node)
+
+    for output in outputs:
+        visit(output)
+
+    return ret
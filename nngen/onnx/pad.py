@@ -2,6 +2,11 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import collections
+
+import numpy as np
+
+import nngen.basic_types as bt
 import nngen.operator as operator
 import nngen.dtype_list as dtype_list
 
@@ -10,25 +15,52 @@ from . import util
 
 def Pad(visitor, node):
 
-    padding = [0, 0, 0, 0]  # Top, Bottom, Left, Right
+    mode = 'constant'
+    pads = None
+    value = 0
 
     for attribute in node.attribute:
-        if attribute.name == 'pads':
-            all_pads_zero = True
-            for pad in attribute.ints:
-                if pad != 0:
-                    all_pads_zero = False
-
-            if all_pads_zero:
-                node_name = util.get_name(node)
-                src_name = node.input[0]
-                src_op = visitor.visit(node.input[0])
-                visitor.operators[node_name] = src_op
-                return src_op
+        if attribute.name == 'mode':
+            mode = attribute.s.decode() if isinstance(attribute.s, bytes) else attribute.s
+        elif attribute.name == 'pads':
+            pads = list(attribute.ints)
+        elif attribute.name == 'value':
+            value = attribute.f
+
+    # opset >= 11: pads and constant_value are inputs
+    if len(node.input) > 1 and node.input[1]:
+        pads = _to_ndarray(visitor.visit(node.input[1])).reshape([-1]).tolist()
+
+    if len(node.input) > 2 and node.input[2]:
+        value = _to_ndarray(visitor.visit(node.input[2])).reshape([-1])[0]
+
+    if mode != 'constant' or value != 0:
+        raise ValueError("only zero constant padding is supported: mode='%s', value=%s" %
+                         (mode, str(value)))
+
+    if pads is None or all([pad == 0 for pad in pads]):
+        node_name = util.get_name(node)
+        src_op = visitor.visit(node.input[0])
+        visitor.operators[node_name] = src_op
+        return src_op
+
+    layout = visitor.onnx_input_layout
+    if len(pads) != len(layout) * 2:
+        raise ValueError('pads rank must be %d, not %d' % (len(layout) * 2, len(pads)))
+
+    # pads: (begin of each axis, ..., end of each axis)
+    begins = pads[:len(layout)]
+    ends = pads[len(layout):]
+    for axis in ('N', 'C'):
+        if begins[layout.find(axis)] != 0 or ends[layout.find(axis)] != 0:
+            raise ValueError('padding of N and C axes is not supported.')
+
+    padding = [begins[layout.find('H')], ends[layout.find('H')],
+               begins[layout.find('W')], ends[layout.find('W')]]  # Top, Bottom, Left, Right
 
     srcs = []
 
-    for src in node.input:
+    for src in node.input[:1]:
         src_obj = visitor.visit(src)
         srcs.append(src_obj)
 
@@ -53,3 +85,10 @@ def Pad(visitor, node):
     c.layout = 'NHWC'
 
     return c
+
+
+def _to_ndarray(value):
+    if isinstance(value, bt._Storage):
+        value = value.value
+
+    return np.array(value)
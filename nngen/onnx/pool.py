@@ -8,6 +8,7 @@ import nngen.operator as operator
 import nngen.dtype_list as dtype_list
 
 from . import util
+from . import conv
 
 
 def _pool(pool_op, visitor, node, no_sum_dtype=False):
@@ -104,6 +105,10 @@ def MaxPool(visitor, node):
 
     ksize, strides, padding = _get_ksize_strides_padding(node)
 
+    fused = _fuse_conv_max_pool(visitor, node, ksize, strides, padding)
+    if fused is not None:
+        return fused
+
     if ksize == strides:
         op = operator.max_pool_serial
     else:
@@ -112,6 +117,51 @@ def MaxPool(visitor, node):
     return _pool(op, visitor, node, no_sum_dtype=True)
 
 
+def _fuse_conv_max_pool(visitor, node, ksize, strides, padding):
+    """ Conv -> (Relu) -> MaxPool into a single conv2d with a fused max pooling """
+
+    if visitor.disable_fusion:
+        return None
+
+    if ksize != strides or padding != [0, 0, 0, 0]:
+        return None
+
+    for attribute in node.attribute:
+        if attribute.name == 'ceil_mode' and attribute.i != 0:
+            return None
+        if attribute.name == 'dilations' and any([d != 1 for d in attribute.ints]):
+            return None
+
+    node_name = util.get_name(node)
+    pool_size = tuple(ksize[1:3])
+
+    src_name = node.input[0]
+    src_node = util.search_node_from_model(visitor.model, src_name)
+
+    act_func = None
+
+    if (src_node is not None and src_node.op_type == 'Relu' and
+            len(visitor.consumers[src_name]) == 1):
+
+        act_func = operator.relu
+        src_name = src_node.input[0]
+        src_node = util.search_node_from_model(visitor.model, src_name)
+
+    if (src_node is None or src_node.op_type != 'Conv' or
+            len(visitor.consumers[src_name]) != 1 or
+            src_name in visitor.operators):
+        return None
+
+    for attribute in src_node.attribute:
+        if attribute.name == 'group' and attribute.i != 1:
+            return None
+
+    c = conv.Conv(visitor, src_node, act_func=act_func, pool_size=pool_size)
+    visitor.operators[node_name] = c
+
+    return c
+
+
 def _get_ksize_strides_padding(node):
 
     ksize = [1, 1, 1, 1]  # B, H, W, C
@@ -123,9 +173,10 @@ def _get_ksize_strides_padding(node):
             padding = 'SAME'
 
         elif attribute.name == 'pads':
+            # ONNX: (top, left, bottom, right)
             padding[0] = attribute.ints[0]
-            padding[1] = attribute.ints[1]
-            padding[2] = attribute.ints[2]
+            padding[1] = attribute.ints[2]
+            padding[2] = attribute.ints[1]
             padding[3] = attribute.ints[3]
 
         elif attribute.name == 'strides':
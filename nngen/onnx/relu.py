@@ -41,6 +41,15 @@ def _relu(act_func, visitor, node):
         visitor.operators[node_name] = src_op
         return src_op
 
+    if (not visitor.disable_fusion and
+            src_node.op_type == 'Add' and len(visitor.consumers[src_name]) == 1 and
+            src_name not in visitor.operators):
+
+        src_op = basic._fuse_conv_residual(visitor, src_node, act_func=act_func)
+        if src_op is not None:
+            visitor.operators[node_name] = src_op
+            return src_op
+
     return basic._elementwise(act_func, visitor, node)
 
 
@@ -35,6 +35,8 @@ def Reshape(visitor, node):
         c = np.reshape(input, shape)
 
     else:
+        # reshaping order of ONNX
+        input = util.restore_layout(input, visitor.onnx_input_layout)
         c = operator.reshape(input, shape, name=name)
 
     return c
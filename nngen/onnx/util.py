@@ -76,6 +76,33 @@ def transpose_layout(value, expected_layout, default_layout):
     return value
 
 
+def restore_layout(value, onnx_layout):
+    """ transpose value back to the ONNX layout for layout-dependent ops (Flatten, Reshape) """
+
+    try:
+        current_layout = get_layout(value)
+    except ValueError:
+        return value
+
+    if current_layout is None or current_layout == onnx_layout:
+        return value
+
+    if len(current_layout) != len(onnx_layout):
+        return value
+
+    perm = [current_layout.find(e) for e in onnx_layout]
+
+    # only size-1 dimensions move: the data order is the same
+    order = [p for p in perm if value.shape[p] != 1]
+    if order == sorted(order):
+        return value
+
+    value = operator.transpose(value, perm)
+    value.layout = onnx_layout
+
+    return value
+
+
 def get_layout(value):
     if value.layout is not None:
         return value.layout
@@ -83,7 +110,11 @@ def get_layout(value):
     if not isinstance(value, bt._Operator):
         return None
 
-    if isinstance(value, operator.conv2d):
+    # Flatten and Reshape produce the ONNX order
+    if isinstance(value, bt._Reshape):
+        return None
+
+    if isinstance(value, (operator.conv2d, operator.depthwise_conv2d)):
         return get_layout(value.args[0])
 
     if isinstance(value, (operator.normalize, operator.scaled_add)):
@@ -7,6 +7,7 @@ from .relu import relu, relu6
 from .leaky_relu import leaky_relu, get_leaky_relu_op, leaky_relu_base
 from .matmul import matmul
 from .conv2d import conv2d
+from .depthwise_conv2d import depthwise_conv2d
 from .log_weight_conv2d import log_weight_conv2d
 from .binary_weight_conv2d import binary_weight_conv2d
 from .ternary_weight_conv2d import ternary_weight_conv2d
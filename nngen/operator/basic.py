@@ -4,11 +4,12 @@ from __future__ import division
 
 from collections import OrderedDict
 
-import veriloggen as vg
-from veriloggen.optimizer import try_optimize as optimize
-
 import nngen.basic_types as bt
 import nngen.util as util
+from nngen.basic_types import optimize
+from nngen.lazy import lazy_import
+
+vg = lazy_import('veriloggen')
 
 
 class add(bt._ElementwiseOperator):
@@ -875,9 +876,9 @@ class transpose(bt._Operator):
         gaddr = self.arg_objaddrs[0] + read_offset
         read_size = arg_shape[-1]
 
-        bt.bus_lock(self.maxi, fsm)
-        bt.dma_read(self.maxi, fsm, ram, laddr, gaddr, read_size)
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_lock(self.get_arg_maxi(self.args[0]), fsm)
+        bt.dma_read(self.get_arg_maxi(self.args[0]), fsm, ram, laddr, gaddr, read_size)
+        bt.bus_unlock(self.get_arg_maxi(self.args[0]), fsm)
 
         # read-modify-write
         modify_state = fsm.current
@@ -885,7 +886,7 @@ class transpose(bt._Operator):
         laddr = read_counts[0]
         gaddr = write_all_offset
 
-        bt.read_modify_write(self.m, fsm, self.maxi,
+        bt.read_modify_write(self.m, fsm, self.get_maxi('output'),
                              ram, self.output_rams[0],
                              laddr, gaddr)
 
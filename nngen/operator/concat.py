@@ -6,10 +6,11 @@ import math
 import functools
 from collections import OrderedDict
 
-import veriloggen as vg
-
 import nngen.basic_types as bt
 import nngen.util as util
+from nngen.lazy import lazy_import
+
+vg = lazy_import('veriloggen')
 
 
 class concat(bt._Operator):
@@ -198,9 +199,9 @@ class concat(bt._Operator):
             laddr = arg_laddr
             gaddr = arg_objaddr + arg_gaddr
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, self.input_rams[0], laddr, gaddr, arg_read_size)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_lock(self.get_arg_maxi(arg), fsm)
+            bt.dma_read(self.get_arg_maxi(arg), fsm, self.input_rams[0], laddr, gaddr, arg_read_size)
+            bt.bus_unlock(self.get_arg_maxi(arg), fsm)
 
             fsm(
                 arg_gaddr.add(arg_addr_inc),
@@ -268,10 +269,10 @@ class concat(bt._Operator):
 
         laddr = 0
         gaddr = self.objaddr + out_gaddr
-        bt.bus_lock(self.maxi, fsm)
-        bt.dma_write(self.maxi, fsm,
+        bt.bus_lock(self.get_maxi('output'), fsm)
+        bt.dma_write(self.get_maxi('output'), fsm,
                      self.output_rams[0], laddr, gaddr, self.out_write_size)
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_maxi('output'), fsm)
 
         fsm(
             copy_laddr(0),
@@ -287,10 +288,10 @@ class concat(bt._Operator):
 
         laddr = 0
         gaddr = self.objaddr + out_gaddr
-        bt.bus_lock(self.maxi, fsm)
-        bt.dma_write(self.maxi, fsm,
+        bt.bus_lock(self.get_maxi('output'), fsm)
+        bt.dma_write(self.get_maxi('output'), fsm,
                      self.input_rams[0], laddr, gaddr, copy_size)
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_maxi('output'), fsm)
 
         fsm(
             arg_laddr(0),
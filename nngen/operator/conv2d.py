@@ -5,16 +5,45 @@ from __future__ import division
 import math
 from collections import OrderedDict
 
-import veriloggen as vg
-
 import nngen.basic_types as bt
+import nngen.dtype_list as dtype_list
+import nngen.storage as st
 import nngen.util as util
+from nngen.lazy import lazy_import
+
+vg = lazy_import('veriloggen')
 
 
 STATIONARY_FILETER = 0
 STATIONARY_INPUT = 1
 
 
+def winograd_filter(filter):
+    """
+    Pre-transformed filter of Winograd F(2x2, 3x3) conv2d.
+    The value is derived from the original ``OHWI`` 3x3 filter
+    as (outchannel, 4, 4, inchannel), so that the parameter image
+    contains the transformed weights.
+    The words are stored in power-of-2 width,
+    and the multipliers use get_winograd_filter_width() bits of them.
+    """
+
+    width = 2 ** int(math.ceil(math.log(get_winograd_filter_width(filter), 2)))
+    dtype = dtype_list.dtype_int(width, signed=True)
+    shape = (filter.shape[0], util.winograd_tile_size,
+             util.winograd_tile_size, filter.shape[-1])
+    name = (filter.name + '_winograd'
+            if filter.name is not None else None)
+    return st.derived_variable(filter, util.winograd_filter_transform,
+                               dtype, shape, name)
+
+
+def get_winograd_filter_width(filter):
+    """ bit width of the transformed values of the original filter """
+
+    return filter.get_op_width() + util.winograd_filter_growth
+
+
 class conv2d(bt._Operator):
     """
     Computes a 2-D convolution given 4-D input and filter tensors.
@@ -154,6 +183,52 @@ class conv2d(bt._Operator):
         If this parameter is set to True, data will be reread from the main memory \
         even if the required amount of input data is full on the on-chip RAM.
 
+    algorithm : optional
+        Computation algorithm. If 'winograd' is specified, a 3x3 stride-1 \
+        convolution is computed by Winograd F(2x2, 3x3), \
+        which produces 2x2 outputs from a 4x4 input tile with 16 multiplications \
+        instead of 36 (par_col and par_row are fixed to 2). \
+        The filter is stored as pre-transformed (outchannel, 4, 4, inchannel) \
+        weights that are 4 bits wider than the original filter. \
+        rshift_mul and fixed-point input and filter are not supported.
+
+    pool : optional
+        Pooling fused into the convolution. If 'max' is specified, \
+        the convolution outputs (after act_func) are reduced by max pooling \
+        with a window and strides of pool_size and 'VALID' padding on-chip, \
+        so that the intermediate result is never written to the main memory. \
+        par_col and par_row must be 1.
+
+    pool_size : optional
+        Window size (int or (height, width)) of the fused pooling.
+
+    residual : optional
+        Residual operand of the same shape as the output. \
+        If specified, the convolution result is clipped to dtype and combined \
+        with the residual as in scaled_add before act_func is applied: \
+        act_func(clip((conv * residual_a_scale + residual * residual_b_scale) \
+        >> residual_shamt)). The residual is read into on-chip RAMs that mirror \
+        the output RAM layout and streamed alongside the output, \
+        so that the shortcut addition of a residual block does not \
+        require an extra pass over the main memory. \
+        The residual must have the same data width and point as the output.
+
+    residual_a_scale : optional
+        Multiplier of the convolution result for the residual addition.
+
+    residual_b_scale : optional
+        Multiplier of the residual for the residual addition.
+
+    residual_shamt : optional
+        Right shift amount after the residual addition.
+
+    upsampling_row : optional
+        Nearest-neighbour upsampling factor of the input rows. \
+        The input of (N, H, W, C) is convolved as (N, H * upsampling_row, W, C), \
+        where each upsampled row is read from the original row \
+        by the address of the DMA, so that the upsampled input \
+        is never written to the main memory.
+
     Notes
     --------
     Note that the original order of tensorflow's conv2d is ``HWIO``
@@ -167,8 +242,15 @@ class conv2d(bt._Operator):
     control_param_custom_width = {'act_offset_values': bt.get_maxi_addrwidth}
     control_param_custom_signed = {'act_offset_values': True}
 
+    # dynamic batch mode: max_bat_count = batch_size - 1
+    dynamic_batch_params = {'max_bat_count': -1}
+
     shared_attr_names = ('act_func',)
 
+    # filter, bias, scale and vshamt
+    prefetchable = True
+    prefetch_arg_names = ('bias', 'scale', 'vshamt_mul', 'vshamt_sum', 'vshamt_out')
+
     def __sub_str__(self):
         strides = str(self.strides)
 
@@ -215,6 +297,16 @@ class conv2d(bt._Operator):
         else:
             concur_och = ' concur_och:%s' % str(self.concur_och)
         stationary = ' stationary:%s' % self.stationary
+        algorithm = (' algorithm:%s' % self.algorithm
+                     if self.algorithm is not None else '')
+        pool = (' pool:%s pool_size:%s' % (self.pool, str(self.pool_size))
+                if self.pool is not None else '')
+        residual = (' residual:%s a_scale:%d b_scale:%d shamt:%d' %
+                    (str(self.args[self.args_dict['residual']].shape),
+                     self.residual_a_scale, self.residual_b_scale, self.residual_shamt)
+                    if 'residual' in self.args_dict else '')
+        upsampling_row = (' upsampling_row:%d' % self.upsampling_row
+                          if self.upsampling_row > 1 else '')
 
         input_ram_size = (' input_ram_size:%d' % self.input_ram_size
                           if self.input_ram_size is not None else '')
@@ -249,7 +341,8 @@ class conv2d(bt._Operator):
                               cshamt_mul, cshamt_sum, cshamt_out,
                               act_func, mul_dtype, sum_dtype,
                               par_ich, par_och, par_col, par_row,
-                              concur_och, stationary,
+                              concur_och, stationary, algorithm, pool, residual,
+                              upsampling_row,
                               input_ram_size, filter_ram_size,
                               bias_ram_size, scale_ram_size,
                               vshamt_mul_ram_size, vshamt_sum_ram_size, vshamt_out_ram_size,
@@ -274,7 +367,11 @@ class conv2d(bt._Operator):
                  disable_keep_input=False,
 
                  # for matmul
-                 input_shape=None, filter_shape=None, out_shape=None):
+                 input_shape=None, filter_shape=None, out_shape=None,
+
+                 algorithm=None, pool=None, pool_size=None,
+                 residual=None, residual_a_scale=1, residual_b_scale=1, residual_shamt=0,
+                 upsampling_row=1):
 
         if isinstance(padding, str) and padding != 'SAME' and padding != 'VALID':
             raise ValueError("padding options must be 'SAME', 'VALID', int, tuple, or list.")
@@ -294,6 +391,17 @@ class conv2d(bt._Operator):
         else:
             input_shape = input.shape
 
+        if not isinstance(upsampling_row, int) or upsampling_row < 1:
+            raise ValueError("upsampling_row must be a positive int, not '%s'" %
+                             str(upsampling_row))
+
+        if upsampling_row > 1:
+            if tuple(input_shape) != tuple(input.shape):
+                raise ValueError('upsampling_row is not supported with external input_shape.')
+
+            input_shape = (input_shape[0], input_shape[1] * upsampling_row,
+                           input_shape[2], input_shape[3])
+
         if filter_shape is not None:
             if filter_shape[-1] != filter.shape[-1]:
                 raise ValueError("""external filter_shape[-1] must have"""
@@ -343,6 +451,40 @@ class conv2d(bt._Operator):
                 shape.append(util.pix_size(sh + pd0 + pd1, fs, st, 'VALID'))
             shape.append(filter_shape[0])
 
+        if pool is not None and pool != 'max':
+            raise ValueError("pool must be None or 'max'.")
+
+        if pool is not None:
+            if pool_size is None:
+                raise ValueError('pool_size must be specified for pool.')
+
+            if isinstance(pool_size, int):
+                pool_size = (pool_size, pool_size)
+
+            pool_size = tuple(pool_size)
+
+            if len(pool_size) != 2 or pool_size[0] < 1 or pool_size[1] < 1:
+                raise ValueError('pool_size must be a positive int or a tuple of 2 ints.')
+
+            if algorithm is not None:
+                raise ValueError('pool is not supported with algorithm.')
+
+            if out_shape is not None:
+                raise ValueError('pool is not supported with external out_shape.')
+
+            if par_col != 1 or par_row != 1:
+                raise ValueError('par_col and par_row must be 1 for pool.')
+
+            if shape[1] < pool_size[0] or shape[2] < pool_size[1]:
+                raise ValueError('pool_size must not be larger than the convolution output.')
+
+            # VALID pooling with strides of pool_size
+            shape[1] = shape[1] // pool_size[0]
+            shape[2] = shape[2] // pool_size[1]
+
+        elif pool_size is not None:
+            raise ValueError('pool_size is specified without pool.')
+
         orig_shape = tuple(shape)
 
         if out_shape is not None:
@@ -369,6 +511,24 @@ class conv2d(bt._Operator):
                     (scale.shape[-1] != 1 and scale.shape[-1] != shape[-1])):
                 raise ValueError("shape of scale must be (1,) or (num_och,)")
 
+        if residual is not None:
+            if tuple(residual.shape) != tuple(shape):
+                raise ValueError("shape of residual must be same as output: %s != %s" %
+                                 (str(tuple(residual.shape)), str(tuple(shape))))
+
+            if pool is not None:
+                raise ValueError('residual is not supported with pool.')
+
+            if out_shape is not None:
+                raise ValueError('residual is not supported with external out_shape.')
+
+            for v, n in ((residual_a_scale, 'residual_a_scale'),
+                         (residual_b_scale, 'residual_b_scale'),
+                         (residual_shamt, 'residual_shamt')):
+                if not isinstance(v, int) or v < 0:
+                    raise ValueError("%s must be a non-negative int, not '%s'" %
+                                     (n, str(v)))
+
         if rshift_mul is None:
             vshamt_mul = None
             cshamt_mul = None
@@ -433,6 +593,31 @@ class conv2d(bt._Operator):
                 not issubclass(act_func, bt._ElementwiseOperator)):
             raise TypeError('act_func must be _ElementwiseOperator class.')
 
+        if algorithm is not None and algorithm != 'winograd':
+            raise ValueError("algorithm must be None or 'winograd'.")
+
+        if algorithm == 'winograd':
+            if (tuple(filter_shape[1:3]) !=
+                    (util.winograd_kernel_size, util.winograd_kernel_size)):
+                raise ValueError('winograd conv2d requires a 3x3 filter.')
+
+            if strides[1] != 1 or strides[2] != 1:
+                raise ValueError('winograd conv2d requires strides of 1.')
+
+            if vshamt_mul is not None or (cshamt_mul is not None and cshamt_mul != 0):
+                raise ValueError('winograd conv2d does not support rshift_mul.')
+
+            if input.get_op_point() != 0 or filter.get_op_point() != 0:
+                raise ValueError('winograd conv2d requires int input and filter.')
+
+            if get_winograd_filter_width(filter) > 32:
+                raise ValueError('winograd conv2d requires filter width of %d bits or less.' %
+                                 (32 - util.winograd_filter_growth))
+
+            par_col = util.winograd_out_size
+            par_row = util.winograd_out_size
+            filter = winograd_filter(filter)
+
         args = [input, filter]
         if bias is not None:
             args.append(bias)
@@ -464,6 +649,16 @@ class conv2d(bt._Operator):
         else:
             self.has_vshamt_out = False
 
+        if residual is not None:
+            args.append(residual)
+            self.has_residual = True
+        else:
+            self.has_residual = False
+
+        self.residual_a_scale = residual_a_scale
+        self.residual_b_scale = residual_b_scale
+        self.residual_shamt = residual_shamt
+
         self.cshamt_mul = cshamt_mul
         self.cshamt_sum = cshamt_sum
         self.cshamt_out = cshamt_out
@@ -491,12 +686,20 @@ class conv2d(bt._Operator):
             self.args_dict['vshamt_out'] = args_count
             args_count += 1
 
+        if self.has_residual:
+            self.args_dict['residual'] = args_count
+            args_count += 1
+
         bt._Operator.__init__(self, *args,
                               dtype=dtype, shape=shape, name=name)
 
         self.input_shape = input_shape
         self.filter_shape = filter_shape
         self.orig_shape = orig_shape
+        self.algorithm = algorithm
+        self.pool = pool
+        self.pool_size = pool_size
+        self.upsampling_row = upsampling_row
 
         self.strides = tuple(strides)
         self.padding = padding
@@ -521,6 +724,8 @@ class conv2d(bt._Operator):
         self.vshamt_out_ram_size = vshamt_out_ram_size
         self.out_ram_size = out_ram_size
         self.disable_keep_input = disable_keep_input
+        # output columns of a tile (set_col_tiles)
+        self.col_tile_size = None
         conv2d.attribute(self, None, None, None,
                          par_ich, par_och, par_col, par_row,
                          concur_och,
@@ -580,12 +785,26 @@ class conv2d(bt._Operator):
             if par_col < 1:
                 raise ValueError('par_col must be greater than 0')
 
+            if self.algorithm == 'winograd' and par_col != util.winograd_out_size:
+                raise ValueError('par_col must be %d for winograd' %
+                                 util.winograd_out_size)
+
+            if self.pool is not None and par_col != 1:
+                raise ValueError('par_col must be 1 for pool')
+
             self.par_col = par_col
 
         if par_row is not None:
             if par_row < 1:
                 raise ValueError('par_row must be greater than 0')
 
+            if self.algorithm == 'winograd' and par_row != util.winograd_out_size:
+                raise ValueError('par_row must be %d for winograd' %
+                                 util.winograd_out_size)
+
+            if self.pool is not None and par_row != 1:
+                raise ValueError('par_row must be 1 for pool')
+
             self.par_row = par_row
 
         if concur_och is not None:
@@ -673,6 +892,8 @@ class conv2d(bt._Operator):
                           if 'vshamt_sum' in self.args_dict else None)
         arg_vshamt_out = (self.args[self.args_dict['vshamt_out']]
                           if 'vshamt_out' in self.args_dict else None)
+        arg_residual = (self.args[self.args_dict['residual']]
+                        if 'residual' in self.args_dict else None)
 
         act = arg_input
         act_shape = to_aligned_shape(act, self.input_shape)
@@ -683,8 +904,6 @@ class conv2d(bt._Operator):
 
         filter = arg_filter
         filter_shape = to_aligned_shape(filter, self.filter_shape)
-        filter_num_col = filter_shape[-2]
-        filter_num_row = filter_shape[-3]
         filter_num_och = filter_shape[-4]
 
         out_shape = to_aligned_shape(self, self.orig_shape)
@@ -693,11 +912,15 @@ class conv2d(bt._Operator):
         out_num_row = out_shape[-3]
         out_num_bat = out_shape[-4]
 
-        stride_col = self.strides[-2]  # width
-        stride_row = self.strides[-3]  # height
+        filter_num_col, filter_num_row, stride_col, stride_row = self.get_control_window()
         src_num_col = filter_num_col + stride_col * (self.par_col - 1)
         src_num_row = filter_num_row + stride_row * (self.par_row - 1)
 
+        # column tiling: RAMs for the widest tile with halo columns
+        if self.col_tile_size is not None:
+            out_num_col = self.col_tile_size
+            act_num_col = min((out_num_col - 1) * stride_col + filter_num_col, act_num_col)
+
         req_concur_och = self.get_req_concur_och()
 
         # in set_thread_args, keep_input is determined precisely
@@ -785,6 +1008,14 @@ class conv2d(bt._Operator):
             output_min_size = self.out_ram_size
         output_width = self.get_ram_width() * self.par_och
 
+        # residual RAMs have the same layout as the output RAMs
+        if arg_residual is not None:
+            residual_min_size = output_min_size
+            residual_width = arg_residual.get_ram_width() * self.par_och
+        else:
+            residual_min_size = None
+            residual_width = None
+
         stride_col = self.strides[-2]  # width
         stride_row = self.strides[-3]  # height
 
@@ -795,7 +1026,7 @@ class conv2d(bt._Operator):
 
         # weight
         inputs.extend([(filter_width, filter_min_size)] *
-                      filter_num_col * filter_num_row * self.par_och)
+                      self.get_num_filter_weights() * self.par_och)
 
         # bias
         if bias_min_size is not None:
@@ -817,6 +1048,11 @@ class conv2d(bt._Operator):
         if vshamt_out_min_size is not None:
             inputs.append((vshamt_out_width, vshamt_out_min_size))
 
+        # residual
+        if residual_min_size is not None:
+            inputs.extend([(residual_width, residual_min_size)] *
+                          self.par_row * self.par_col)
+
         outputs = []
         # out
         outputs.extend([(output_width, output_min_size)] *
@@ -826,6 +1062,98 @@ class conv2d(bt._Operator):
 
         return inputs, outputs, temps
 
+    def set_col_tiles(self, max_ram_capacity=None):
+        """ split the output columns into tiles so that each activation
+        and output RAM fits within max_ram_capacity bits """
+
+        self.col_tile_size = None
+
+        if max_ram_capacity is None:
+            return
+
+        out_num_col = self.orig_shape[-2]
+        filter_num_col, filter_num_row, stride_col, stride_row = self.get_control_window()
+        src_num_col = filter_num_col + stride_col * (self.par_col - 1)
+        src_num_row = filter_num_row + stride_row * (self.par_row - 1)
+        num_srcs = src_num_col * src_num_row
+
+        num_tiles = 1
+        while True:
+            col_tile_size = int(math.ceil(out_num_col / num_tiles))
+            col_tile_size = int(math.ceil(col_tile_size / self.par_col)) * self.par_col
+            col_tile_size = min(col_tile_size, out_num_col)
+
+            self.col_tile_size = col_tile_size
+            inputs, outputs, temps = self.get_required_rams()
+
+            rams = list(inputs[:num_srcs]) + list(outputs)
+            if 'residual' in self.args_dict:
+                rams.extend(inputs[-self.par_row * self.par_col:])
+
+            capacity = max([width * 2 ** int(math.ceil(math.log(max(length, 1), 2)))
+                            for width, length in rams])
+
+            if capacity <= max_ram_capacity or col_tile_size <= self.par_col:
+                break
+
+            num_tiles += 1
+
+        if col_tile_size >= out_num_col:
+            self.col_tile_size = None
+
+    def get_col_tiles(self):
+        """ (start, end) output columns of each tile """
+
+        if self.col_tile_size is None:
+            return [None]
+
+        out_num_col = self.orig_shape[-2]
+        return [(start, min(start + self.col_tile_size, out_num_col))
+                for start in range(0, out_num_col, self.col_tile_size)]
+
+    def get_core_batch(self):
+        # a batch slice of the input and the output must be contiguous
+        if tuple(self.shape) != tuple(self.orig_shape):
+            return None
+
+        act = self.args[0]
+        if bt.get_rank(act.shape) != 4 or act.shape[0] != self.input_shape[0]:
+            return None
+
+        # column tiles run one after another
+        if self.get_num_control_param_sets() > 1:
+            return None
+
+        return self.orig_shape[0]
+
+    def make_core(self, core_index, bat_start, num_bat):
+        core = bt._Operator.make_core(self, core_index, bat_start, num_bat)
+        core.input_shape = (num_bat,) + tuple(self.input_shape[1:])
+        core.orig_shape = (num_bat,) + tuple(self.orig_shape[1:])
+
+        # act_bat_step and out_bat_step of get_control_param_values
+        act = self.args[0]
+        aligned_act_num_ch = bt.align_word(self.input_shape[-1],
+                                           act.get_word_alignment())
+        act_step = bt.to_byte(aligned_act_num_ch * act.get_ram_width())
+        act_bat_step = (act_step * self.input_shape[-2] *
+                        (self.input_shape[-3] // self.upsampling_row))
+
+        aligned_out_num_ch = bt.align_word(self.orig_shape[-1],
+                                           self.get_word_alignment())
+        out_step = bt.to_byte(aligned_out_num_ch * self.get_ram_width())
+        out_bat_step = out_step * self.orig_shape[-2] * self.orig_shape[-3]
+
+        core.core_addr_offset = out_bat_step * bat_start
+
+        offsets = [0 for _ in self.args]
+        offsets[0] = act_bat_step * bat_start
+        if 'residual' in self.args_dict:
+            offsets[self.args_dict['residual']] = out_bat_step * bat_start
+
+        core.core_arg_addr_offsets = offsets
+        return core
+
     def get_min_concur_och(self):
         if self.maxi.datawidth < self.get_ram_width():
             min_concur_och = 1
@@ -847,6 +1175,184 @@ class conv2d(bt._Operator):
         req_concur_och = int(math.ceil(req_concur_och / min_concur_och)) * min_concur_och
         return req_concur_och
 
+    def get_pixel_par(self):
+        # pixels computed at once by the stream
+        if self.pool is not None:
+            return self.pool_size
+
+        return self.par_row, self.par_col
+
+    def get_control_window(self):
+        # filter window and strides seen by the control sequence
+        filter_num_col = self.filter_shape[-2]
+        filter_num_row = self.filter_shape[-3]
+        stride_col = self.strides[-2]  # width
+        stride_row = self.strides[-3]  # height
+
+        if self.pool is not None:
+            pool_row, pool_col = self.pool_size
+            filter_num_col += stride_col * (pool_col - 1)
+            filter_num_row += stride_row * (pool_row - 1)
+            stride_col *= pool_col
+            stride_row *= pool_row
+
+        return filter_num_col, filter_num_row, stride_col, stride_row
+
+    def get_prefetch_ram_positions(self):
+        filter_num_col, filter_num_row, stride_col, stride_row = self.get_control_window()
+
+        src_num_col = filter_num_col + stride_col * (self.par_col - 1)
+        src_num_row = filter_num_row + stride_row * (self.par_row - 1)
+
+        num_srcs = src_num_col * src_num_row
+        num_filter_rams = self.get_num_filter_weights() * self.par_och
+
+        positions = OrderedDict()
+        positions[1] = list(range(num_srcs, num_srcs + num_filter_rams))
+
+        num_basic_args = 2
+        for name in self.prefetch_arg_names:
+            if name in self.args_dict:
+                index = self.args_dict[name]
+                positions[index] = [num_srcs + num_filter_rams + index - num_basic_args]
+
+        return positions
+
+    def prefetch_params(self, fsm, maxi, arg_addrs):
+        """
+        read the filters of the first output channels, the bias, the scale,
+        and the vshamts into the RAMs, as the first run of the control does
+        """
+
+        values = self.get_control_param_values()
+        positions = self.get_prefetch_ram_positions()
+
+        filter_rams = [self.input_rams[pos] for pos in positions[1]]
+
+        if len(filter_rams) == 1:
+            bt.dma_read(maxi, fsm, filter_rams[0], 0, arg_addrs[1],
+                        values['filter_read_size'], port=1)
+        else:
+            bt.dma_read_block(maxi, fsm, filter_rams, 0, arg_addrs[1],
+                              values['filter_read_size'],
+                              values['filter_read_block'], port=1)
+
+        for name in self.prefetch_arg_names:
+            if name not in self.args_dict:
+                continue
+
+            index = self.args_dict[name]
+            ram = self.input_rams[positions[index][0]]
+            bt.dma_read(maxi, fsm, ram, 0, arg_addrs[index],
+                        values[name + '_num'], port=1)
+
+    def read_compressed_filter(self, fsm, maxi, filter_rams, laddr, och_count):
+        """
+        read the filters of the output channels from och_count in the
+        zero-skip compressed format (util.compress_weight) into the RAMs,
+        as the DMA of the dense format does
+
+        The table entry of each output channel is read first. A nonzero
+        entry is the offset of the filter, which is read by DMA, and the
+        words of an all-zero filter are filled with 0 by the control thread.
+        """
+
+        num_weights = self.get_num_filter_weights()
+        entry_shift = int(math.log(bt.to_byte(maxi.datawidth), 2))
+
+        comp_och = self.m.Reg(self._name('comp_och'),
+                              self.maxi.addrwidth, initval=0)
+        comp_och_index = self.m.Reg(self._name('comp_och_index'),
+                                    self.maxi.addrwidth, initval=0)
+        comp_ram_select = self.m.Reg(self._name('comp_ram_select'),
+                                     bt.log_width(self.par_och), initval=0)
+        comp_laddr = self.m.Reg(self._name('comp_laddr'),
+                                self.maxi.addrwidth, initval=0)
+        comp_fill_laddr = self.m.Reg(self._name('comp_fill_laddr'),
+                                     self.maxi.addrwidth, initval=0)
+        comp_fill_count = self.m.Reg(self._name('comp_fill_count'),
+                                     self.maxi.addrwidth, initval=0)
+
+        # och_count is in the unit of par_och
+        fsm(
+            comp_och(och_count * self.par_och),
+            comp_och_index(0),
+            comp_ram_select(0),
+            comp_laddr(laddr)
+        )
+        fsm.goto_next()
+
+        # table entry, read while no DMA is in flight on the port
+        state_entry = fsm.current
+        bt.dma_wait_read(maxi, fsm)
+        entry = maxi.read(fsm, self.arg_objaddrs[1] + (comp_och << entry_shift))
+
+        state_dispatch = fsm.current
+        fsm(
+            comp_fill_laddr(comp_laddr),
+            comp_fill_count(0)
+        )
+        fsm.inc()
+
+        # nonzero: the filter of each tap goes to its RAM, as dma_read_block.
+        # a single RAM is read by dma_read as the dense format, since a RAM
+        # shared with the other operators allows only one DMA method per port.
+        state_dma_ends = []
+        for i in range(self.par_och):
+            rams = filter_rams[i * num_weights:(i + 1) * num_weights]
+            fsm.goto_from(state_dispatch, fsm.current,
+                          vg.Ands(entry != 0, comp_ram_select == i))
+            if len(rams) == 1:
+                bt.dma_read(maxi, fsm, rams[0], comp_laddr,
+                            self.arg_objaddrs[1] + entry, self.filter_comp_och_size,
+                            port=1)
+            else:
+                bt.dma_read_block(maxi, fsm, rams, comp_laddr,
+                                  self.arg_objaddrs[1] + entry, self.filter_comp_och_size,
+                                  self.filter_read_block, port=1)
+            state_dma_ends.append(fsm.current)
+            fsm.inc()
+
+        # all zero: the same words are filled with 0
+        fsm.goto_from(state_dispatch, fsm.current, entry == 0)
+        for i in range(self.par_och):
+            for ram in filter_rams[i * num_weights:(i + 1) * num_weights]:
+                ram.write_rtl(comp_fill_laddr, 0, port=1,
+                              cond=vg.Ands(fsm.here, comp_ram_select == i))
+
+        fsm(
+            comp_fill_laddr.inc(),
+            comp_fill_count.inc()
+        )
+        fsm.If(comp_fill_count >= self.filter_read_block - 1).goto_next()
+
+        for state_dma_end in state_dma_ends:
+            fsm.goto_from(state_dma_end, fsm.current)
+
+        fsm(
+            comp_och.inc(),
+            comp_och_index.inc(),
+            comp_ram_select.inc()
+        )
+        fsm.If(comp_ram_select == self.par_och - 1)(
+            comp_ram_select(0),
+            comp_laddr.add(self.filter_read_block)
+        )
+
+        fsm.goto_from(fsm.current, state_entry,
+                      vg.Ands(comp_och_index + 1 < self.filter_comp_num_och,
+                              comp_och + 1 < self.filter_num_och),
+                      fsm.current + 1)
+        fsm.inc()
+
+    def get_num_filter_weights(self):
+        if self.algorithm == 'winograd':
+            return util.winograd_tile_size ** 2
+
+        filter_num_col = self.filter_shape[-2]
+        filter_num_row = self.filter_shape[-3]
+        return filter_num_col * filter_num_row
+
     def get_required_substreams(self):
         arg_scale = (self.args[self.args_dict['scale']]
                      if 'scale' in self.args_dict else None)
@@ -858,6 +1364,13 @@ class conv2d(bt._Operator):
         y_point = self.args[1].get_op_point()
         y_signed = self.args[1].get_signed()
 
+        if self.algorithm == 'winograd':
+            # transformed input tile: B^T d B
+            x_datawidth += util.winograd_input_growth
+            x_signed = True
+            # transformed filter: not the power-of-2 word width
+            y_datawidth = get_winograd_filter_width(self.args[1].src)
+
         if self.mul_dtype is not None:
             mul_width = self.mul_dtype.width
         else:
@@ -911,9 +1424,8 @@ class conv2d(bt._Operator):
         out_point = self.get_op_point()
         out_signed = self.get_signed()
 
-        filter_num_col = self.filter_shape[-2]
-        filter_num_row = self.filter_shape[-3]
-        num_weights = filter_num_col * filter_num_row
+        num_weights = self.get_num_filter_weights()
+        par_row, par_col = self.get_pixel_par()
 
         args = (x_datawidth, x_point, x_signed,
                 y_datawidth, y_point, y_signed,
@@ -924,23 +1436,32 @@ class conv2d(bt._Operator):
         else:
             mulname = 'mul_rshift_round'
 
-        substrms = [(mulname, args)] * (num_weights * self.par_ich *
-                                        self.par_och * self.par_col * self.par_row)
+        if self.algorithm == 'winograd':
+            # one 4x4 tile (2x2 outputs) per multiplier set
+            substrms = [(mulname, args)] * (num_weights * self.par_ich * self.par_och)
 
-        substrms.extend([('add_tree',
-                          (sum_width, sum_point, sum_signed,
-                           num_weights * self.par_ich))] *
-                        self.par_och * self.par_col * self.par_row)
+            substrms.extend([('add_tree',
+                              (sum_width, sum_point, sum_signed,
+                               self.par_ich))] *
+                            num_weights * self.par_och)
+        else:
+            substrms = [(mulname, args)] * (num_weights * self.par_ich *
+                                            self.par_och * par_col * par_row)
+
+            substrms.extend([('add_tree',
+                              (sum_width, sum_point, sum_signed,
+                               num_weights * self.par_ich))] *
+                            self.par_och * par_col * par_row)
         substrms.extend([('acc_rshift_round_frac',
                           (sum_width, sum_point, sum_signed,
                            sum_width, sum_point, sum_signed))] *
-                        self.par_och * self.par_col * self.par_row)
+                        self.par_och * par_col * par_row)
         substrms.extend([('mul_rshift_clip',
                           (sum_width, sum_point, sum_signed,
                            scale_width, scale_point, scale_signed,
                            scl_width, scl_point, scl_signed,
                            out_width, out_point, out_signed))] *
-                        self.par_och * self.par_col * self.par_row)
+                        self.par_och * par_col * par_row)
 
         return substrms
 
@@ -950,15 +1471,27 @@ class conv2d(bt._Operator):
         filter_num_row = self.filter_shape[-3]
         stride_col = self.strides[-2]  # width
         stride_row = self.strides[-3]  # height
-        num_srcs = ((filter_num_col + stride_col * (self.par_col - 1)) *
-                    (filter_num_row + stride_row * (self.par_row - 1)))
-        num_weights = (filter_num_col * filter_num_row *
+        par_row, par_col = self.get_pixel_par()
+        num_srcs = ((filter_num_col + stride_col * (par_col - 1)) *
+                    (filter_num_row + stride_row * (par_row - 1)))
+        num_weights = (self.get_num_filter_weights() *
                        self.par_ich * self.par_och *
-                       self.par_col * self.par_row)
-        return (base, filter_num_col, filter_num_row,
-                self.mul_dtype, self.sum_dtype,
-                self.par_ich, self.par_och, self.par_col, self.par_row,
-                num_srcs, num_weights)
+                       par_col * par_row)
+        ret = (base, filter_num_col, filter_num_row,
+               self.mul_dtype, self.sum_dtype,
+               self.par_ich, self.par_och, self.par_col, self.par_row,
+               num_srcs, num_weights, self.algorithm, self.pool,
+               self.has_residual, self.upsampling_row)
+
+        # the filter is read by another control sequence
+        if self.args[1].compression_block is not None:
+            ret = ret + (('compressed',),)
+
+        # the base addresses are shifted by the column tile offsets
+        if self.col_tile_size is not None:
+            ret = ret + (('col_tiled',),)
+
+        return ret
 
     def get_stream_func(self):
 
@@ -980,10 +1513,11 @@ class conv2d(bt._Operator):
             filter_num_row = self.filter_shape[-3]
             stride_col = self.strides[-2]  # width
             stride_row = self.strides[-3]  # height
-            src_num_col = filter_num_col + stride_col * (self.par_col - 1)
-            src_num_row = filter_num_row + stride_row * (self.par_row - 1)
+            par_row, par_col = self.get_pixel_par()
+            src_num_col = filter_num_col + stride_col * (par_col - 1)
+            src_num_row = filter_num_row + stride_row * (par_row - 1)
             num_srcs = src_num_col * src_num_row
-            num_weights = filter_num_col * filter_num_row
+            num_weights = self.get_num_filter_weights()
 
             # constant
             size = strm.constant(datawidth=self.stream_reduce_size.bit_length(),
@@ -1077,6 +1611,15 @@ class conv2d(bt._Operator):
             act_func_index_width = max(len(self.shared_attrs['act_func']).bit_length(), 1)
             act_func_index = strm.constant(datawidth=act_func_index_width, signed=False)
 
+            # residual
+            if self.has_residual:
+                residual_a_scale = strm.constant(
+                    datawidth=max(self.residual_a_scale_value.bit_length(), 1), signed=False)
+                residual_b_scale = strm.constant(
+                    datawidth=max(self.residual_b_scale_value.bit_length(), 1), signed=False)
+                residual_shamt = strm.constant(
+                    datawidth=max(self.residual_shamt_value.bit_length(), 1), signed=False)
+
             # act
             act_rams = self.input_rams[:num_srcs]
 
@@ -1181,11 +1724,46 @@ class conv2d(bt._Operator):
 
                 filter_vars_list_och.append(filter_vars_list)
 
+            # residual (same order as the output RAMs)
+            if self.has_residual:
+                arg_residual = self.args[self.args_dict['residual']]
+                datawidth = arg_residual.get_op_width()
+                vec_datawidth = arg_residual.get_op_width() * self.par_och
+                point = arg_residual.get_op_point()
+                signed = arg_residual.get_signed()
+
+                residual_vars_list = []
+                for i in range(par_row * par_col):
+                    vec_residual_var = strm.source(datawidth=vec_datawidth, signed=False)
+                    if self.par_och == 1:
+                        residual_vars = [strm.ReinterpretCast(vec_residual_var,
+                                                              datawidth, point, signed)]
+                    else:
+                        residual_vars = strm.Split(vec_residual_var,
+                                                   datawidth, point, signed, reverse=True)
+                    residual_vars_list.append(residual_vars)
+
             mask_2d = line_to_2d(mask, src_num_col)
 
+            if self.algorithm == 'winograd':
+                num_mul_substreams = num_weights * self.par_ich * self.par_och
+                num_add_substreams = num_weights * self.par_och
+                winograd_sum_vars_och = self.make_winograd_sum_vars(
+                    strm, act_vars_list, filter_vars_list_och, mask,
+                    vshamt_mul_list, cshamt_mul)
+            else:
+                num_mul_substreams = (num_weights * self.par_ich * self.par_och *
+                                      par_col * par_row)
+                num_add_substreams = self.par_och * par_col * par_row
+
+            num_acc_substreams = self.par_och * par_col * par_row
+
+            pool_vars = []
+            pool_valids = []
+
             # pixel parallel
-            for pos_row in range(self.par_row):
-                for pos_col in range(self.par_col):
+            for pos_row in range(par_row):
+                for pos_col in range(par_col):
 
                     mask = []
                     for mask_row in mask_2d[pos_row * stride_row:
@@ -1202,66 +1780,18 @@ class conv2d(bt._Operator):
                             filter_vars_list_och, bias_list, scale_list,
                                  vshamt_mul_list, vshamt_sum_list, vshamt_out_list)):
 
-                        mul_vars = []
-
-                        # input channel parallel
-                        for ic, (act_vars, filter_vars) in enumerate(zip(
-                                act_vars_list, filter_vars_list)):
-
-                            act_vars_2d = line_to_2d(act_vars, src_num_col)
-                            used_act_vars = []
-                            masked_used_act_vars = []
-                            for act_row in act_vars_2d[pos_row * stride_row:
-                                                       pos_row * stride_row + filter_num_row]:
-                                used_act_vars.extend(act_row[pos_col * stride_col:
-                                                             pos_col * stride_col + filter_num_col])
-
-                            # mul
-                            if len(used_act_vars) > len(mask):
-                                raise ValueError('Not enough mask bits.')
-
-                            for used_act_var, pmask in zip(used_act_vars, mask):
-                                masked_var = strm.Mux(pmask, strm.Int(0), used_act_var)
-                                masked_used_act_vars.append(masked_var)
-
-                            for submul, act_var, filter_var in zip(
-                                    self.substreams[
-                                        num_weights *
-                                        (pos_row * self.par_col * self.par_och * self.par_ich +
-                                           pos_col * self.par_och * self.par_ich +
-                                         oc * self.par_ich + ic):],
-                                    masked_used_act_vars, filter_vars):
-
-                                mul = strm.substream(submul)
-                                mul.to_source('x', act_var)
-                                mul.to_source('y', filter_var)
-                                mul.to_source('rshift', vshamt_mul + cshamt_mul)
-                                mul_var = mul.from_sink('z')
-                                mul_vars.append(mul_var)
-
-                        # add, scale, bias, vshamt_sum, vshamt_out
-                        mul_vars_group = [mul_vars[i:i + num_weights]
-                                          for i in range(0, len(mul_vars), num_weights)]
-                        reshape_mul_vars = []
-                        for vs in zip(*mul_vars_group):
-                            for v in vs:
-                                reshape_mul_vars.append(v)
-
-                        addtree = strm.substream(self.substreams[
-                            num_weights *
-                            self.par_row * self.par_col * self.par_och * self.par_ich +
-                            pos_row * self.par_col * self.par_och +
-                            pos_col * self.par_och + oc])
-                        for i, mul_var in enumerate(reshape_mul_vars):
-                            addtree.to_source('var%d' % i, mul_var)
-
-                        sum_var = addtree.from_sink('sum')
+                        if self.algorithm == 'winograd':
+                            sum_var = winograd_sum_vars_och[oc][
+                                pos_row * par_col + pos_col]
+                        else:
+                            sum_var = self.make_sum_var(
+                                strm, act_vars_list, filter_vars_list, mask,
+                                vshamt_mul, cshamt_mul,
+                                pos_row, pos_col, oc, num_mul_substreams)
 
                         acc = strm.substream(self.substreams[
-                            num_weights *
-                            self.par_row * self.par_col * self.par_och * self.par_ich +
-                            self.par_row * self.par_col * self.par_och +
-                            pos_row * self.par_col * self.par_och +
+                            num_mul_substreams + num_add_substreams +
+                            pos_row * par_col * self.par_och +
                             pos_col * self.par_och + oc])
                         acc.to_source('x', sum_var)
                         acc.to_source('rshift', vshamt_sum + cshamt_sum)
@@ -1273,10 +1803,8 @@ class conv2d(bt._Operator):
                         out_var += bias
 
                         mul = strm.substream(self.substreams[
-                            num_weights *
-                            self.par_row * self.par_col * self.par_och * self.par_ich +
-                            self.par_row * self.par_col * self.par_och * 2 +
-                            pos_row * self.par_col * self.par_och +
+                            num_mul_substreams + num_add_substreams + num_acc_substreams +
+                            pos_row * par_col * self.par_och +
                             pos_col * self.par_och + oc])
                         mul.to_source('x', out_var)
                         mul.to_source('y', scale)
@@ -1284,6 +1812,12 @@ class conv2d(bt._Operator):
 
                         out_var = mul.from_sink('z')
 
+                        if self.has_residual:
+                            residual_var = residual_vars_list[pos_row * par_col + pos_col][oc]
+                            out_var = self.make_residual_var(
+                                strm, out_var, residual_var,
+                                residual_a_scale, residual_b_scale, residual_shamt)
+
                         act_func_vars = []
                         for act_func in self.shared_attrs['act_func']:
                             if act_func is not None:
@@ -1304,6 +1838,11 @@ class conv2d(bt._Operator):
                         out_var = bt.out_rcast(strm, out_var, width, point, signed)
                         out_vars.append(out_var)
 
+                    if self.pool is not None:
+                        pool_vars.append(out_vars)
+                        pool_valids.append(out_valids[0])
+                        continue
+
                     # out_vars -> vec_out_var
                     if self.par_och == 1:
                         vec_out_var = out_vars[0]
@@ -1313,9 +1852,223 @@ class conv2d(bt._Operator):
                     vec_out_valid = out_valids[0]
                     strm.sink(vec_out_var, when=vec_out_valid)
 
+            # fused max pooling over the pixel parallel outputs
+            if self.pool is not None:
+                out_vars = []
+                for oc in range(self.par_och):
+                    out_var = pool_vars[0][oc]
+                    for pos_vars in pool_vars[1:]:
+                        out_var = strm.Mux(pos_vars[oc] > out_var, pos_vars[oc], out_var)
+                    out_vars.append(out_var)
+
+                if self.par_och == 1:
+                    vec_out_var = out_vars[0]
+                else:
+                    vec_out_var = strm.Cat(*reversed(out_vars))
+
+                vec_out_valid = pool_valids[0]
+                strm.sink(vec_out_var, when=vec_out_valid)
+
         return func
 
-    def get_control_param_values(self):
+    def make_residual_var(self, strm, out_var, residual_var,
+                          residual_a_scale, residual_b_scale, residual_shamt):
+        """ clip((out_var * a_scale + residual_var * b_scale) >> shamt) as scaled_add """
+
+        width = self.get_op_width()
+        point = self.get_op_point()
+        signed = self.get_signed()
+
+        out_var = bt.out_rcast(strm, out_var, width, point, signed)
+
+        a_scale = strm.Cast(residual_a_scale, residual_a_scale.bit_length() + 1, 0, True)
+        b_scale = strm.Cast(residual_b_scale, residual_b_scale.bit_length() + 1, 0, True)
+
+        mul = strm.Times(out_var, a_scale)
+        mul.width = width + a_scale.bit_length()
+        mul.signed = True
+
+        madd = strm.Madd(residual_var, b_scale, mul)
+        madd.width = max(width + b_scale.bit_length(), mul.width) + 1
+        madd.signed = True
+
+        sra = strm.Sra(madd, residual_shamt)
+
+        p_th = (1 << (width - 1)) - 1
+        n_th = -1 * p_th
+
+        p = strm.Mux(sra > p_th, p_th, sra)
+        n = strm.Mux(sra < n_th, n_th, sra)
+        return strm.Mux(sra >= 0, p, n)
+
+    def make_sum_var(self, strm, act_vars_list, filter_vars_list, mask,
+                     vshamt_mul, cshamt_mul,
+                     pos_row, pos_col, oc, num_mul_substreams):
+
+        filter_num_col = self.filter_shape[-2]
+        filter_num_row = self.filter_shape[-3]
+        stride_col = self.strides[-2]  # width
+        stride_row = self.strides[-3]  # height
+        par_row, par_col = self.get_pixel_par()
+        src_num_col = filter_num_col + stride_col * (par_col - 1)
+        num_weights = self.get_num_filter_weights()
+
+        mul_vars = []
+
+        # input channel parallel
+        for ic, (act_vars, filter_vars) in enumerate(zip(
+                act_vars_list, filter_vars_list)):
+
+            act_vars_2d = line_to_2d(act_vars, src_num_col)
+            used_act_vars = []
+            masked_used_act_vars = []
+            for act_row in act_vars_2d[pos_row * stride_row:
+                                       pos_row * stride_row + filter_num_row]:
+                used_act_vars.extend(act_row[pos_col * stride_col:
+                                             pos_col * stride_col + filter_num_col])
+
+            # mul
+            if len(used_act_vars) > len(mask):
+                raise ValueError('Not enough mask bits.')
+
+            for used_act_var, pmask in zip(used_act_vars, mask):
+                masked_var = strm.Mux(pmask, strm.Int(0), used_act_var)
+                masked_used_act_vars.append(masked_var)
+
+            for submul, act_var, filter_var in zip(
+                    self.substreams[
+                        num_weights *
+                        (pos_row * par_col * self.par_och * self.par_ich +
+                           pos_col * self.par_och * self.par_ich +
+                         oc * self.par_ich + ic):],
+                    masked_used_act_vars, filter_vars):
+
+                mul = strm.substream(submul)
+                mul.to_source('x', act_var)
+                mul.to_source('y', filter_var)
+                mul.to_source('rshift', vshamt_mul + cshamt_mul)
+                mul_var = mul.from_sink('z')
+                mul_vars.append(mul_var)
+
+        # add
+        mul_vars_group = [mul_vars[i:i + num_weights]
+                          for i in range(0, len(mul_vars), num_weights)]
+        reshape_mul_vars = []
+        for vs in zip(*mul_vars_group):
+            for v in vs:
+                reshape_mul_vars.append(v)
+
+        addtree = strm.substream(self.substreams[
+            num_mul_substreams +
+            pos_row * par_col * self.par_och +
+            pos_col * self.par_och + oc])
+        for i, mul_var in enumerate(reshape_mul_vars):
+            addtree.to_source('var%d' % i, mul_var)
+
+        sum_var = addtree.from_sink('sum')
+        return sum_var
+
+    def make_winograd_sum_vars(self, strm, act_vars_list, filter_vars_list_och, mask,
+                               vshamt_mul_list, cshamt_mul):
+        """
+        Winograd F(2x2, 3x3): Y = A^T [ sum_ich (U * B^T d B) ] A,
+        where U is the pre-transformed filter.
+        Returns the 2x2 partial sums in row-major order for each output channel.
+        """
+
+        tile_size = util.winograd_tile_size
+        num_weights = tile_size ** 2
+        num_mul_substreams = num_weights * self.par_ich * self.par_och
+
+        datawidth = self.args[0].get_op_width() + util.winograd_input_growth
+        filter_datawidth = get_winograd_filter_width(self.args[1].src)
+
+        # input transform (shared among output channels)
+        v_vars_list = []
+        for act_vars in act_vars_list:
+            masked_act_vars = []
+            for act_var, pmask in zip(act_vars, mask):
+                masked_var = strm.Mux(pmask, strm.Int(0), act_var)
+                masked_var = strm.Cast(masked_var, datawidth, 0, True)
+                masked_act_vars.append(masked_var)
+
+            d = line_to_2d(masked_act_vars, tile_size)
+            v = winograd_transform(util.winograd_bt, d)
+            v = transpose_2d(winograd_transform(util.winograd_bt, transpose_2d(v)))
+            v_vars_list.append([var for line in v for var in line])
+
+        sum_vars_och = []
+
+        # output channel parallel
+        for oc, (filter_vars_list, vshamt_mul) in enumerate(zip(
+                filter_vars_list_och, vshamt_mul_list)):
+
+            # element-wise product (input channel parallel)
+            mul_vars_list = []
+            for ic, (v_vars, filter_vars) in enumerate(zip(
+                    v_vars_list, filter_vars_list)):
+
+                mul_vars = []
+                for submul, v_var, filter_var in zip(
+                        self.substreams[num_weights * (oc * self.par_ich + ic):],
+                        v_vars, filter_vars):
+
+                    filter_var = strm.Cast(filter_var, filter_datawidth, 0, True)
+                    mul = strm.substream(submul)
+                    mul.to_source('x', v_var)
+                    mul.to_source('y', filter_var)
+                    mul.to_source('rshift', vshamt_mul + cshamt_mul)
+                    mul_var = mul.from_sink('z')
+                    mul_vars.append(mul_var)
+
+                mul_vars_list.append(mul_vars)
+
+            # sum over input channels
+            m_vars = []
+            for i, mul_vars in enumerate(zip(*mul_vars_list)):
+                addtree = strm.substream(self.substreams[
+                    num_mul_substreams + oc * num_weights + i])
+                for j, mul_var in enumerate(mul_vars):
+                    addtree.to_source('var%d' % j, mul_var)
+
+                m_vars.append(addtree.from_sink('sum'))
+
+            width = m_vars[0].bit_length()
+            point = m_vars[0].get_point()
+            signed = m_vars[0].get_signed()
+
+            # output transform
+            m_vars = [strm.Cast(m_var, width + util.winograd_out_shift, point, True)
+                      for m_var in m_vars]
+            m = line_to_2d(m_vars, tile_size)
+            y = winograd_transform(util.winograd_at, m)
+            y = transpose_2d(winograd_transform(util.winograd_at, transpose_2d(y)))
+
+            sum_vars = []
+            for line in y:
+                for y_var in line:
+                    y_var = strm.Sra(y_var, util.winograd_out_shift)
+                    y_var = strm.ReinterpretCast(y_var, width, point, signed)
+                    sum_vars.append(y_var)
+
+            sum_vars_och.append(sum_vars)
+
+        return sum_vars_och
+
+    def get_num_control_param_sets(self):
+        return len(self.get_col_tiles())
+
+    def collect_all_control_param_values_list(self):
+        ret = []
+        for col_tile in self.get_col_tiles():
+            values = OrderedDict()
+            values.update(self.get_control_param_values(col_tile))
+            values.update(self.collect_local_control_param_values())
+            ret.append(values)
+
+        return ret
+
+    def get_control_param_values(self, col_tile=None):
         arg_input = self.args[0]
         arg_filter = self.args[1]
         arg_bias = (self.args[self.args_dict['bias']]
@@ -1328,6 +2081,8 @@ class conv2d(bt._Operator):
                           if 'vshamt_sum' in self.args_dict else None)
         arg_vshamt_out = (self.args[self.args_dict['vshamt_out']]
                           if 'vshamt_out' in self.args_dict else None)
+        arg_residual = (self.args[self.args_dict['residual']]
+                        if 'residual' in self.args_dict else None)
 
         act = arg_input
 
@@ -1405,17 +2160,38 @@ class conv2d(bt._Operator):
             pad_row_top = 0
             pad_row_bottom = 0
 
+        # a fused pooling window is regarded as a larger filter with a larger stride
+        filter_num_col, filter_num_row, stride_col, stride_row = self.get_control_window()
+
         # for __str__
         self.pad_col_left_value = pad_col_left
         self.pad_col_right_value = pad_col_right
         self.pad_row_top_value = pad_row_top
         self.pad_row_bottom_value = pad_row_bottom
 
+        # column tiling: a tile is a narrower convolution on the input columns
+        # under its output columns, and the rows keep the strides of the whole
+        act_row_num_col = act_num_col
+        out_row_num_col = out_num_col
+        act_col_start = 0
+        out_col_start = 0
+
+        if col_tile is not None:
+            out_col_start, out_col_end = col_tile
+            tile_start = out_col_start * stride_col - pad_col_left
+            tile_end = (out_col_end - 1) * stride_col + filter_num_col - pad_col_left
+            act_col_start = max(tile_start, 0)
+            act_num_col = min(tile_end, act_num_col) - act_col_start
+            pad_col_left = max(-tile_start, 0)
+            pad_col_right = max(tile_end - act_row_num_col, 0)
+            pad_col = pad_col_left + pad_col_right
+            out_num_col = out_col_end - out_col_start
+
         # actual concur_och based on the RAM sizes
         src_num_col = filter_num_col + stride_col * (self.par_col - 1)
         src_num_row = filter_num_row + stride_row * (self.par_row - 1)
         num_srcs = src_num_col * src_num_row
-        num_weights = filter_num_col * filter_num_row
+        num_weights = self.get_num_filter_weights()
         filter_rams = self.input_rams[num_srcs:
                                       num_srcs + num_weights * self.par_och]
         out_rams = self.output_rams
@@ -1472,13 +2248,32 @@ class conv2d(bt._Operator):
 
         act_step = bt.to_byte(aligned_act_num_ch * act.get_ram_width())
 
+        # upsampled rows: the offsets of the original rows for each phase
+        # (row_count % upsampling_row) of the first row of the window
+        upsampling_row = self.upsampling_row
         act_offset_values = []
-        for y in range(src_num_row):
-            v = act_num_col * (y - pad_row_top) * act_step
-            act_offset_values.append(v)
-
-        act_row_step = act_step * act_num_col * stride_row * self.par_row
-        act_bat_step = act_step * act_num_col * act_num_row
+        for phase in range(upsampling_row):
+            for y in range(src_num_row):
+                v = (act_row_num_col * ((phase + y - pad_row_top) // upsampling_row) *
+                     act_step)
+                act_offset_values.append(v)
+
+        act_col_offset = act_step * act_col_start
+        act_row_step = act_step * act_row_num_col * stride_row * self.par_row
+        act_bat_step = act_step * act_row_num_col * (act_num_row // upsampling_row)
+
+        if upsampling_row > 1:
+            act_row_phase_steps = []
+            act_row_phase_nexts = []
+            for phase in range(upsampling_row):
+                v = phase + stride_row * self.par_row
+                act_row_phase_steps.append(act_step * act_row_num_col * (v // upsampling_row))
+                act_row_phase_nexts.append(v % upsampling_row)
+
+            upsampling_params = [('act_row_phase_steps', act_row_phase_steps),
+                                 ('act_row_phase_nexts', act_row_phase_nexts)]
+        else:
+            upsampling_params = []
 
         act_read_size = (int(math.ceil(aligned_act_num_ch / self.par_ich)) *
                          act_num_col)
@@ -1492,11 +2287,11 @@ class conv2d(bt._Operator):
         filter_step = bt.to_byte(
             aligned_filter_num_ich * filter.get_ram_width())
 
-        filter_base_step = (filter_step * filter_num_col * filter_num_row *
+        filter_base_step = (filter_step * num_weights *
                             min(filter_num_och, concur_och))
 
         filter_read_size = (int(math.ceil(aligned_filter_num_ich / self.par_ich)) *
-                            filter_num_col * filter_num_row *
+                            num_weights *
                             min(filter_num_och, concur_och))
         filter_read_block = int(
             math.ceil(aligned_filter_num_ich / self.par_ich))
@@ -1511,12 +2306,13 @@ class conv2d(bt._Operator):
 
         out_offset_values = []
         for y in range(self.par_row):
-            v = y * out_num_col * out_step
+            v = y * out_row_num_col * out_step
             out_offset_values.append(v)
 
+        out_col_offset = out_step * out_col_start
         out_col_step = out_step
-        out_row_step = out_step * out_num_col * self.par_row
-        out_bat_step = out_step * out_num_col * out_num_row
+        out_row_step = out_step * out_row_num_col * self.par_row
+        out_bat_step = out_step * out_row_num_col * out_num_row
         out_och_step = bt.to_byte(
             self.get_ram_width() * min(out_num_ch, concur_och))
 
@@ -1631,6 +2427,33 @@ class conv2d(bt._Operator):
             inc_sync_out = 1
             inc_sync_out_res = (self.par_col - (out_num_col % self.par_col)) % self.par_col
 
+        # residual is read with the same offsets as the output
+        if arg_residual is not None:
+            if (arg_residual.get_ram_width() != self.get_ram_width() or
+                    bt.align_word(out_num_ch, arg_residual.get_word_alignment()) !=
+                    aligned_out_num_ch):
+                raise ValueError('residual must have the same memory layout as the output.')
+
+            residual_params = [('residual_a_scale_value', self.residual_a_scale),
+                               ('residual_b_scale_value', self.residual_b_scale),
+                               ('residual_shamt_value', self.residual_shamt)]
+        else:
+            residual_params = []
+
+        # filters of the output channels read at once in the compressed format
+        if filter.compression_block is not None:
+            compression_params = [('filter_comp_num_och', min(filter_num_och, concur_och)),
+                                  ('filter_comp_och_size', filter_read_block * num_weights)]
+        else:
+            compression_params = []
+
+        # column tiles share a control sequence with shifted base addresses
+        if self.col_tile_size is not None:
+            col_tile_params = [('act_col_offset', act_col_offset),
+                               ('out_col_offset', out_col_offset)]
+        else:
+            col_tile_params = []
+
         return OrderedDict([('act_num_col', act_num_col),
                             ('act_num_row', act_num_row),
                             ('filter_num_och', filter_num_och),
@@ -1701,9 +2524,14 @@ class conv2d(bt._Operator):
                             ('stream_act_local_small_flags', stream_act_local_small_flags),
                             ('stream_act_local_large_flags', stream_act_local_large_flags),
                             ('inc_sync_out', inc_sync_out),
-                            ('inc_sync_out_res', inc_sync_out_res)])
+                            ('inc_sync_out_res', inc_sync_out_res)] +
+                           residual_params + upsampling_params + compression_params +
+                           col_tile_params)
 
     def control_sequence(self, fsm):
+        max_row_count = self.get_dynamic_control_param('max_row_count')
+        max_bat_count = self.get_dynamic_control_param('max_bat_count')
+
         arg_input = self.args[0]
         arg_filter = self.args[1]
         arg_bias = (self.args[self.args_dict['bias']]
@@ -1717,16 +2545,13 @@ class conv2d(bt._Operator):
         arg_vshamt_out = (self.args[self.args_dict['vshamt_out']]
                           if 'vshamt_out' in self.args_dict else None)
 
-        filter_num_col = self.filter_shape[-2]
-        filter_num_row = self.filter_shape[-3]
-        stride_col = self.strides[-2]  # width
-        stride_row = self.strides[-3]  # height
+        filter_num_col, filter_num_row, stride_col, stride_row = self.get_control_window()
 
         src_num_col = filter_num_col + stride_col * (self.par_col - 1)
         src_num_row = filter_num_row + stride_row * (self.par_row - 1)
 
         num_srcs = src_num_col * src_num_row
-        num_weights = filter_num_col * filter_num_row
+        num_weights = self.get_num_filter_weights()
 
         self.stride_bat = 1
 
@@ -1751,6 +2576,12 @@ class conv2d(bt._Operator):
         vshamt_out_ram = (self.input_rams[len(act_rams) + len(filter_rams) +
                                           self.args_dict['vshamt_out'] - num_basic_args]
                           if 'vshamt_out' in self.args_dict else None)
+        residual_ram_index = (len(act_rams) + len(filter_rams) +
+                              self.args_dict['residual'] - num_basic_args
+                              if 'residual' in self.args_dict else None)
+        residual_rams = (self.input_rams[residual_ram_index:
+                                         residual_ram_index + len(out_rams)]
+                         if 'residual' in self.args_dict else None)
 
         act_base_offset = self.m.Wire(self._name('act_base_offset'),
                                       self.maxi.addrwidth, signed=True)
@@ -1759,7 +2590,18 @@ class conv2d(bt._Operator):
         act_base_offset_bat = self.m.Reg(self._name('act_base_offset_bat'),
                                          self.maxi.addrwidth, initval=0, signed=True)
 
-        act_base_offset.assign(act_base_offset_row + act_base_offset_bat)
+        if self.col_tile_size is not None:
+            act_base_offset.assign(act_base_offset_row + act_base_offset_bat +
+                                   self.act_col_offset)
+        else:
+            act_base_offset.assign(act_base_offset_row + act_base_offset_bat)
+
+        # upsampled rows: row_count % upsampling_row
+        if self.upsampling_row > 1:
+            act_row_phase = self.m.Reg(self._name('act_row_phase'),
+                                       bt.log_width(self.upsampling_row), initval=0)
+        else:
+            act_row_phase = None
 
         filter_base_offset = self.m.Reg(self._name('filter_base_offset'),
                                         self.maxi.addrwidth, initval=0, signed=True)
@@ -1780,9 +2622,12 @@ class conv2d(bt._Operator):
         out_base_offset_och = self.m.Reg(self._name('out_base_offset_och'),
                                          self.maxi.addrwidth, initval=0, signed=True)
 
-        out_base_offset.assign(out_base_offset_val + out_base_offset_col +
+        out_base_offset_sum = (out_base_offset_val + out_base_offset_col +
                                out_base_offset_row + out_base_offset_bat +
                                out_base_offset_och)
+        if self.col_tile_size is not None:
+            out_base_offset_sum = out_base_offset_sum + self.out_col_offset
+        out_base_offset.assign(out_base_offset_sum)
 
         dma_flags = [self.m.Reg(self._name('dma_flag_%d' % i), initval=0)
                      for i in range(src_num_row)]
@@ -1870,6 +2715,37 @@ class conv2d(bt._Operator):
         filter_page_size = filter_rams[0].length
         out_page_size = out_rams[0].length // 2
 
+        if residual_rams is not None:
+            residual_base_offset = self.m.Wire(self._name('residual_base_offset'),
+                                               self.maxi.addrwidth, signed=True)
+            residual_base_offset_col = self.m.Reg(self._name('residual_base_offset_col'),
+                                                  self.maxi.addrwidth, initval=0, signed=True)
+            residual_base_offset_row = self.m.Reg(self._name('residual_base_offset_row'),
+                                                  self.maxi.addrwidth, initval=0, signed=True)
+            residual_base_offset_bat = self.m.Reg(self._name('residual_base_offset_bat'),
+                                                  self.maxi.addrwidth, initval=0, signed=True)
+            residual_base_offset_och = self.m.Reg(self._name('residual_base_offset_och'),
+                                                  self.maxi.addrwidth, initval=0, signed=True)
+
+            residual_base_offset_sum = (residual_base_offset_col + residual_base_offset_row +
+                                        residual_base_offset_bat + residual_base_offset_och)
+            if self.col_tile_size is not None:
+                residual_base_offset_sum = residual_base_offset_sum + self.out_col_offset
+            residual_base_offset.assign(residual_base_offset_sum)
+
+            residual_row_count = self.m.Reg(self._name('residual_row_count'),
+                                            self.maxi.addrwidth, initval=0)
+            read_residual_count = self.m.Reg(self._name('read_residual_count'),
+                                             self.maxi.addrwidth, initval=0)
+            residual_ram_select = self.m.Reg(self._name('residual_ram_select'),
+                                             self.maxi.addrwidth, initval=0)
+            residual_laddr_offset = self.m.Reg(self._name('residual_laddr_offset'),
+                                               self.maxi.addrwidth, initval=0)
+
+        if self.prefetch_enabled:
+            skip_prefetched_filter = self.m.Reg(
+                self._name('skip_prefetched_filter'), initval=0)
+
         skip_read_filter = self.m.Reg(
             self._name('skip_read_filter'), initval=0)
         skip_read_act = self.m.Reg(self._name('skip_read_act'), initval=0)
@@ -1898,6 +2774,11 @@ class conv2d(bt._Operator):
             act_base_offset_bat(0)
         )
 
+        if act_row_phase is not None:
+            fsm(
+                act_row_phase(0)
+            )
+
         # ReadAct: DMA flag
         for y, dma_flag in enumerate(dma_flags):
             fsm(
@@ -1934,6 +2815,19 @@ class conv2d(bt._Operator):
             write_count(0)
         )
 
+        # ReadResidual: offset and counter
+        if residual_rams is not None:
+            fsm(
+                residual_base_offset_col(0),
+                residual_base_offset_row(0),
+                residual_base_offset_bat(0),
+                residual_base_offset_och(0),
+                residual_row_count(0),
+                read_residual_count(0),
+                residual_ram_select(0),
+                residual_laddr_offset(0)
+            )
+
         fsm(
             next_out_write_size(vg.Mux(self.max_och_count == 0,
                                        self.out_write_size_res,
@@ -1967,6 +2861,21 @@ class conv2d(bt._Operator):
             skip_write_out(1)
         )
 
+        if self.prefetch_enabled:
+            fsm(
+                skip_prefetched_filter(self.params_prefetched)
+            )
+
+        # AXI master ports of the traffic classes
+        act_maxi = self.get_arg_maxi(self.args[0])
+        filter_maxi = self.get_arg_maxi(self.args[1])
+        out_maxi = self.get_maxi('output')
+
+        # the filter is read on its own port while the input is read
+        async_filter = filter_maxi is not act_maxi
+
+        state_read_params = fsm.current
+
         # --------------------
         # ReadBias phase
         # --------------------
@@ -1974,11 +2883,12 @@ class conv2d(bt._Operator):
             bias_read_size = self.bias_num
             bias_laddr = 0
             bias_gaddr = self.arg_objaddrs[self.args_dict['bias']]
+            bias_maxi = self.get_arg_maxi(self.args[self.args_dict['bias']])
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, bias_ram, bias_laddr,
+            bt.bus_lock(bias_maxi, fsm)
+            bt.dma_read(bias_maxi, fsm, bias_ram, bias_laddr,
                         bias_gaddr, bias_read_size, port=1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_unlock(bias_maxi, fsm)
 
         # --------------------
         # ReadScale phase
@@ -1987,11 +2897,12 @@ class conv2d(bt._Operator):
             scale_read_size = self.scale_num
             scale_laddr = 0
             scale_gaddr = self.arg_objaddrs[self.args_dict['scale']]
+            scale_maxi = self.get_arg_maxi(self.args[self.args_dict['scale']])
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, scale_ram, scale_laddr,
+            bt.bus_lock(scale_maxi, fsm)
+            bt.dma_read(scale_maxi, fsm, scale_ram, scale_laddr,
                         scale_gaddr, scale_read_size, port=1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_unlock(scale_maxi, fsm)
 
         # --------------------
         # ReadVshamt phase
@@ -2000,31 +2911,37 @@ class conv2d(bt._Operator):
             vshamt_mul_read_size = self.vshamt_mul_num
             vshamt_mul_laddr = 0
             vshamt_mul_gaddr = self.arg_objaddrs[self.args_dict['vshamt_mul']]
+            vshamt_mul_maxi = self.get_arg_maxi(self.args[self.args_dict['vshamt_mul']])
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, vshamt_mul_ram, vshamt_mul_laddr,
+            bt.bus_lock(vshamt_mul_maxi, fsm)
+            bt.dma_read(vshamt_mul_maxi, fsm, vshamt_mul_ram, vshamt_mul_laddr,
                         vshamt_mul_gaddr, vshamt_mul_read_size, port=1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_unlock(vshamt_mul_maxi, fsm)
 
         if vshamt_sum_ram is not None:
             vshamt_sum_read_size = self.vshamt_sum_num
             vshamt_sum_laddr = 0
             vshamt_sum_gaddr = self.arg_objaddrs[self.args_dict['vshamt_sum']]
+            vshamt_sum_maxi = self.get_arg_maxi(self.args[self.args_dict['vshamt_sum']])
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, vshamt_sum_ram, vshamt_sum_laddr,
+            bt.bus_lock(vshamt_sum_maxi, fsm)
+            bt.dma_read(vshamt_sum_maxi, fsm, vshamt_sum_ram, vshamt_sum_laddr,
                         vshamt_sum_gaddr, vshamt_sum_read_size, port=1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_unlock(vshamt_sum_maxi, fsm)
 
         if vshamt_out_ram is not None:
             vshamt_out_read_size = self.vshamt_out_num
             vshamt_out_laddr = 0
             vshamt_out_gaddr = self.arg_objaddrs[self.args_dict['vshamt_out']]
+            vshamt_out_maxi = self.get_arg_maxi(self.args[self.args_dict['vshamt_out']])
 
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, vshamt_out_ram, vshamt_out_laddr,
+            bt.bus_lock(vshamt_out_maxi, fsm)
+            bt.dma_read(vshamt_out_maxi, fsm, vshamt_out_ram, vshamt_out_laddr,
                         vshamt_out_gaddr, vshamt_out_read_size, port=1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_unlock(vshamt_out_maxi, fsm)
+
+        if self.prefetch_enabled and fsm.current != state_read_params:
+            fsm.If(self.params_prefetched).goto_from(state_read_params, fsm.current)
 
         state_init = fsm.current
 
@@ -2039,20 +2956,29 @@ class conv2d(bt._Operator):
         filter_gaddr = self.arg_objaddrs[1] + filter_offset
         filter_laddr = filter_page_dma_offset
 
-        bt.bus_lock(self.maxi, fsm)
-        if len(filter_rams) == 1:
-            bt.dma_read(self.maxi, fsm, filter_rams[0], filter_laddr,
-                        filter_gaddr, self.filter_read_size, port=1)
+        bt.bus_lock(filter_maxi, fsm)
+        if arg_filter.compression_block is not None:
+            self.read_compressed_filter(fsm, filter_maxi, filter_rams, filter_laddr,
+                                        och_count)
+        elif len(filter_rams) == 1:
+            bt.dma_read(filter_maxi, fsm, filter_rams[0], filter_laddr,
+                        filter_gaddr, self.filter_read_size, port=1,
+                        use_async=async_filter)
         else:
-            bt.dma_read_block(self.maxi, fsm, filter_rams, filter_laddr,
+            bt.dma_read_block(filter_maxi, fsm, filter_rams, filter_laddr,
                               filter_gaddr, self.filter_read_size,
-                              self.filter_read_block, port=1)
-        bt.bus_unlock(self.maxi, fsm)
+                              self.filter_read_block, port=1,
+                              use_async=async_filter)
+        bt.bus_unlock(filter_maxi, fsm)
 
         fsm.goto_next()
         state_read_filter_end = fsm.current
         fsm.If(skip_read_filter).goto_from(
             state_read_filter, state_read_filter_end)
+
+        if self.prefetch_enabled:
+            fsm.If(skip_prefetched_filter).goto_from(
+                state_read_filter, state_read_filter_end)
         # state_read_act
         fsm.If(self.data_stationary == STATIONARY_FILETER).goto_next()
 
@@ -2061,8 +2987,14 @@ class conv2d(bt._Operator):
         # --------------------
         state_read_act = fsm.current
 
+        act_offset_values = self.act_offset_values[:src_num_row]
+        if act_row_phase is not None:
+            act_offset_values = [
+                mux_phase(self.act_offset_values[y::src_num_row], act_row_phase)
+                for y in range(src_num_row)]
+
         act_offsets = []
-        for v in self.act_offset_values:
+        for v in act_offset_values:
             act_offset = act_base_offset + v
             act_offsets.append(act_offset)
 
@@ -2106,7 +3038,7 @@ class conv2d(bt._Operator):
             mux_dma_flag.assign(mux_dma_flag_value)
             mux_dma_flags.append(mux_dma_flag)
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(act_maxi, fsm)
 
         for (act_rams_row, act_gaddr, act_page_dma_offset,
              dma_pad_mask, dma_flag) in zip(act_rams_2d, mux_act_gaddrs,
@@ -2118,10 +3050,10 @@ class conv2d(bt._Operator):
             fsm.goto_next()
 
             if len(act_rams_row) == 1:
-                bt.dma_read(self.maxi, fsm, act_rams_row[0], act_laddr,
+                bt.dma_read(act_maxi, fsm, act_rams_row[0], act_laddr,
                             act_gaddr, self.act_read_size, port=1)
             else:
-                bt.dma_read_block(self.maxi, fsm, act_rams_row, act_laddr,
+                bt.dma_read_block(act_maxi, fsm, act_rams_row, act_laddr,
                                   act_gaddr, self.act_read_size,
                                   self.act_read_block, port=1)
 
@@ -2130,7 +3062,7 @@ class conv2d(bt._Operator):
             fsm.If(vg.Ors(dma_pad_mask,
                           vg.Not(dma_flag))).goto_from(begin_state_read, end_state_read)
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(act_maxi, fsm)
 
         fsm.goto_next()
         state_read_act_end = fsm.current
@@ -2138,6 +3070,158 @@ class conv2d(bt._Operator):
         # state_read_act
         fsm.If(self.data_stationary == STATIONARY_FILETER).goto_next()
 
+        # --------------------
+        # ReadResidual phase
+        # --------------------
+        state_read_residual = fsm.current
+
+        if residual_rams is not None:
+            residual_maxi = self.get_arg_maxi(self.args[self.args_dict['residual']])
+
+            residual_gaddrs = []
+            for v in self.out_offset_values:
+                residual_gaddr = (self.arg_objaddrs[self.args_dict['residual']] +
+                                  residual_base_offset + v)
+                residual_gaddrs.append(residual_gaddr)
+
+            dma_residual_masks = []
+            for y in range(self.par_row):
+                v = residual_row_count + y >= self.out_num_row
+                w = self.m.Wire(self._name('dma_residual_mask_%d' % y))
+                w.assign(v)
+                dma_residual_masks.append(w)
+
+            # same size as the next WriteOut of this comp
+            residual_read_size = self.m.Wire(self._name('residual_read_size'),
+                                             self.maxi.addrwidth)
+            residual_read_size.assign(vg.Mux(och_count >= self.max_och_count,
+                                             self.out_write_size_res,
+                                             self.out_write_size))
+
+            # residual RAMs share the page of the output RAMs of the next comp
+            residual_laddr = residual_laddr_offset + out_page_comp_offset
+
+            residual_rams_2d = line_to_2d(residual_rams, self.par_col)
+
+            bt.bus_lock(residual_maxi, fsm)
+
+            for residual_rams_row, residual_gaddr, dma_residual_mask in zip(
+                    residual_rams_2d, residual_gaddrs, dma_residual_masks):
+
+                if len(residual_rams_row) == 1:
+                    b = fsm.current
+                    fsm.If(vg.Not(dma_residual_mask)).goto_next()
+
+                    bt.dma_read(residual_maxi, fsm, residual_rams_row[0], residual_laddr,
+                                residual_gaddr, residual_read_size, port=1)
+
+                    e = fsm.current
+
+                    fsm.If(dma_residual_mask).goto_from(b, e)
+                    fsm.goto_next()
+
+                else:
+                    ends = []
+
+                    state_mode_select = fsm.current
+
+                    # keep_filter or STATIONARY_INPUT
+                    b = fsm.current
+                    fsm.If(vg.Ors(
+                        vg.Ands(self.data_stationary == STATIONARY_FILETER, self.keep_filter),
+                        self.data_stationary == STATIONARY_INPUT)).goto_from(state_mode_select, b)
+
+                    fsm.If(vg.Not(dma_residual_mask)).goto_next()
+
+                    bt.dma_read_block(residual_maxi, fsm, residual_rams_row, residual_laddr,
+                                      residual_gaddr, residual_read_size,
+                                      self.out_write_block, port=1)
+
+                    e = fsm.current
+                    ends.append(e)
+
+                    fsm.If(dma_residual_mask).goto_from(b, e)
+                    fsm.inc()
+
+                    # not keep_filter and not STATIONARY_INPUT
+                    state_ram_select = fsm.current
+                    fsm.If(vg.Not(vg.Ors(
+                        vg.Ands(self.data_stationary == STATIONARY_FILETER, self.keep_filter),
+                        self.data_stationary == STATIONARY_INPUT))).goto_from(state_mode_select,
+                                                                              state_ram_select)
+                    fsm.inc()
+
+                    for sel, residual_ram in enumerate(residual_rams_row):
+
+                        b = fsm.current
+                        fsm.If(residual_ram_select == sel).goto_from(state_ram_select, b)
+
+                        fsm.If(vg.Not(dma_residual_mask)).goto_next()
+
+                        bt.dma_read(residual_maxi, fsm, residual_ram, residual_laddr,
+                                    residual_gaddr, residual_read_size, port=1)
+
+                        e = fsm.current
+                        ends.append(e)
+
+                        fsm.If(dma_residual_mask).goto_from(b, e)
+                        fsm.inc()
+
+                    done = fsm.current
+
+                    for e in ends:
+                        fsm.goto_from(e, done)
+
+            bt.bus_unlock(residual_maxi, fsm)
+
+            fsm(
+                read_residual_count.inc()
+            )
+
+            fsm.If(residual_ram_select == self.par_col - 1)(
+                residual_laddr_offset.add(residual_read_size)
+            )
+
+            fsm.If(self.data_stationary == STATIONARY_FILETER,
+                   vg.Not(self.keep_filter))(
+                residual_base_offset_col.add(self.out_col_step)
+            )
+
+            fsm(
+                residual_ram_select.inc()
+            )
+
+            fsm.If(residual_ram_select == self.par_col - 1)(
+                residual_ram_select(0)
+            )
+
+            # read the rest columns (not keep_filter)
+            read_residual_rep = vg.Ands(self.data_stationary == STATIONARY_FILETER,
+                                        vg.Not(self.keep_filter),
+                                        read_residual_count < self.out_num_col - 1)
+
+            fsm.If(read_residual_rep).goto(state_read_residual)
+
+            fsm.If(vg.Not(read_residual_rep))(
+                read_residual_count(0),
+                residual_laddr_offset(0),
+                residual_ram_select(0),
+                residual_base_offset_col(0)
+            )
+
+            fsm.If(vg.Not(read_residual_rep)).goto_next()
+
+            state_read_residual_end = fsm.current
+            fsm.If(skip_comp).goto_from(state_read_residual, state_read_residual_end)
+
+            # STATIONARY_INPUT: whole channels are read at the first och
+            fsm.If(self.data_stationary == STATIONARY_INPUT,
+                   och_count > 0).goto_from(state_read_residual, state_read_residual_end)
+
+        # wait for the filter read on the other port
+        if async_filter:
+            bt.dma_wait_read(filter_maxi, fsm)
+
         # --------------------
         # Comp phase
         # --------------------
@@ -2421,6 +3505,20 @@ class conv2d(bt._Operator):
         self.stream.set_constant(comp_fsm, name, self.act_func_index)
         comp_fsm.set_index(comp_fsm.current - 1)
 
+        # set_constant (residual)
+        if residual_rams is not None:
+            name = list(self.stream.constants.keys())[14]
+            self.stream.set_constant(comp_fsm, name, self.residual_a_scale_value)
+            comp_fsm.set_index(comp_fsm.current - 1)
+
+            name = list(self.stream.constants.keys())[15]
+            self.stream.set_constant(comp_fsm, name, self.residual_b_scale_value)
+            comp_fsm.set_index(comp_fsm.current - 1)
+
+            name = list(self.stream.constants.keys())[16]
+            self.stream.set_constant(comp_fsm, name, self.residual_shamt_value)
+            comp_fsm.set_index(comp_fsm.current - 1)
+
         # set_source (act)
         act_page_comp_offset_bufs_dup = []
         for act_page_comp_offset_buf in act_page_comp_offset_bufs:
@@ -2449,6 +3547,19 @@ class conv2d(bt._Operator):
                                            local, pat)
             comp_fsm.set_index(comp_fsm.current - 1)
 
+        # set_source (residual): same addresses as the sink
+        if residual_rams is not None:
+            stream_residual_names = list(self.stream.sources.keys())[
+                5 + num_srcs + len(filter_rams):]
+
+            for name, ram in zip(stream_residual_names, residual_rams):
+                local = stream_out_local + out_page_comp_offset_buf
+                pat = ((self.stream_reduce_size, 0),
+                       (next_stream_num_ops, 1))
+                self.stream.set_source_pattern(comp_fsm, name, ram,
+                                               local, pat)
+                comp_fsm.set_index(comp_fsm.current - 1)
+
         # set_sink (out)
         stream_out_names = list(self.stream.sinks.keys())
         # remove valid outputs
@@ -2577,7 +3688,7 @@ class conv2d(bt._Operator):
 
         out_rams_2d = line_to_2d(out_rams, self.par_col)
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(out_maxi, fsm)
 
         fsm.If(sync_comp_count >=
                sync_out_count + self.inc_sync_out).goto_next()
@@ -2589,7 +3700,7 @@ class conv2d(bt._Operator):
                 b = fsm.current
                 fsm.If(vg.Not(dma_out_mask)).goto_next()
 
-                bt.dma_write(self.maxi, fsm, out_rams_row[0], out_laddr,
+                bt.dma_write(out_maxi, fsm, out_rams_row[0], out_laddr,
                              out_gaddr, next_out_write_size,
                              port=1, use_async=True)
 
@@ -2611,7 +3722,7 @@ class conv2d(bt._Operator):
 
                 fsm.If(vg.Not(dma_out_mask)).goto_next()
 
-                bt.dma_write_block(self.maxi, fsm, out_rams_row, out_laddr,
+                bt.dma_write_block(out_maxi, fsm, out_rams_row, out_laddr,
                                    out_gaddr, next_out_write_size,
                                    self.out_write_block, port=1, use_async=True)
 
@@ -2636,7 +3747,7 @@ class conv2d(bt._Operator):
 
                     fsm.If(vg.Not(dma_out_mask)).goto_next()
 
-                    bt.dma_write(self.maxi, fsm, out_ram, out_laddr,
+                    bt.dma_write(out_maxi, fsm, out_ram, out_laddr,
                                  out_gaddr, next_out_write_size,
                                  port=1, use_async=True)
 
@@ -2651,7 +3762,7 @@ class conv2d(bt._Operator):
                 for e in ends:
                     fsm.goto_from(e, done)
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(out_maxi, fsm)
 
         # STATIONARY_FILTER
         fsm(
@@ -2712,8 +3823,8 @@ class conv2d(bt._Operator):
         update_filter = self.m.Wire(self._name('update_filter'))
         update_filter.assign(vg.Ors(
             vg.Ands(self.data_stationary == STATIONARY_FILETER,
-                    row_count >= self.max_row_count,
-                    bat_count >= self.max_bat_count),
+                    row_count >= max_row_count,
+                    bat_count >= max_bat_count),
             vg.Ands(self.data_stationary == STATIONARY_INPUT,
                     vg.Not(self.keep_filter))))
 
@@ -2755,17 +3866,28 @@ class conv2d(bt._Operator):
                     och_count >= self.max_och_count),
             self.data_stationary == STATIONARY_FILETER))
 
-        fsm.If(update_act)(
-            act_base_offset_row.add(self.act_row_step)
-        )
+        if act_row_phase is not None:
+            fsm.If(update_act)(
+                act_base_offset_row.add(
+                    mux_phase(self.act_row_phase_steps, act_row_phase)),
+                act_row_phase(mux_phase(self.act_row_phase_nexts, act_row_phase))
+            )
+            fsm.If(update_act,
+                   row_count >= max_row_count)(
+                act_row_phase(0)
+            )
+        else:
+            fsm.If(update_act)(
+                act_base_offset_row.add(self.act_row_step)
+            )
         fsm.If(update_act,
-               row_count >= self.max_row_count)(
+               row_count >= max_row_count)(
             act_base_offset_row(0),
             act_base_offset_bat.add(self.act_bat_step)
         )
         fsm.If(update_act,
-               row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               row_count >= max_row_count,
+               bat_count >= max_bat_count)(
             act_base_offset_bat(0)
         )
 
@@ -2779,25 +3901,25 @@ class conv2d(bt._Operator):
                 dma_flag(dma_flag_cond)
             )
             fsm.If(update_act,
-                   row_count >= self.max_row_count)(
+                   row_count >= max_row_count)(
                 dma_flag(1)
             )
 
             next_dma_flags.append(
-                vg.Mux(row_count >= self.max_row_count, 1, dma_flag_cond))
+                vg.Mux(row_count >= max_row_count, 1, dma_flag_cond))
 
         # ReadAct: counter
         fsm.If(update_act)(
             row_count.add(self.stride_row_par_row)
         )
         fsm.If(update_act,
-               row_count >= self.max_row_count)(
+               row_count >= max_row_count)(
             row_count(0),
             bat_count.add(self.stride_bat)
         )
         fsm.If(update_act,
-               row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               row_count >= max_row_count,
+               bat_count >= max_bat_count)(
             bat_count(0)
         )
 
@@ -2819,7 +3941,7 @@ class conv2d(bt._Operator):
         )
 
         fsm.If(update_act,
-               row_count >= self.max_row_count)(
+               row_count >= max_row_count)(
             row_select(0),
             prev_row_select(0)
         )
@@ -2848,8 +3970,8 @@ class conv2d(bt._Operator):
                 act_page_dma_offset(0)
             )
             fsm.If(self.data_stationary == STATIONARY_FILETER,
-                   row_count >= self.max_row_count,
-                   bat_count >= self.max_bat_count,
+                   row_count >= max_row_count,
+                   bat_count >= max_bat_count,
                    self.keep_input)(
                 act_page_comp_offset(0),
                 act_page_dma_offset(0)
@@ -2878,15 +4000,15 @@ class conv2d(bt._Operator):
         )
         fsm.If(self.data_stationary == STATIONARY_FILETER,
                vg.Not(skip_write_out),
-               prev_row_count >= self.max_row_count)(
+               prev_row_count >= max_row_count)(
             out_base_offset_row(0),
             out_base_offset_bat.add(self.out_bat_step),
             out_row_count(0)
         )
         fsm.If(self.data_stationary == STATIONARY_FILETER,
                vg.Not(skip_write_out),
-               prev_row_count >= self.max_row_count,
-               prev_bat_count >= self.max_bat_count)(
+               prev_row_count >= max_row_count,
+               prev_bat_count >= max_bat_count)(
             out_base_offset_bat(0),
             out_base_offset_och.add(self.out_och_step)
         )
@@ -2897,6 +4019,36 @@ class conv2d(bt._Operator):
             out_base_offset_row.add(self.out_row_step)
         )
 
+        # ReadResidual: offset for the next comp
+        if residual_rams is not None:
+            fsm.If(self.data_stationary == STATIONARY_FILETER)(
+                residual_base_offset_row.add(self.out_row_step),
+                residual_row_count.add(self.par_row)
+            )
+            fsm.If(self.data_stationary == STATIONARY_FILETER,
+                   row_count >= max_row_count)(
+                residual_base_offset_row(0),
+                residual_base_offset_bat.add(self.out_bat_step),
+                residual_row_count(0)
+            )
+            fsm.If(self.data_stationary == STATIONARY_FILETER,
+                   row_count >= max_row_count,
+                   bat_count >= max_bat_count)(
+                residual_base_offset_bat(0),
+                residual_base_offset_och.add(self.out_och_step)
+            )
+
+            fsm.If(self.data_stationary == STATIONARY_INPUT,
+                   och_count >= self.max_och_count)(
+                residual_base_offset_row.add(self.out_row_step),
+                residual_row_count.add(self.par_row)
+            )
+            fsm.If(self.data_stationary == STATIONARY_INPUT,
+                   och_count >= self.max_och_count,
+                   row_count >= max_row_count)(
+                residual_row_count(0)
+            )
+
         # WriteOut and Comp: double buffer
         fsm.If(self.data_stationary == STATIONARY_FILETER,
                vg.Not(out_page))(
@@ -2934,8 +4086,13 @@ class conv2d(bt._Operator):
         )
 
         # ReadFilter, ReadAct, Comp, WriteOut: skip
-        fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count,
+        if self.prefetch_enabled:
+            fsm(
+                skip_prefetched_filter(0)
+            )
+
+        fsm.If(row_count >= max_row_count,
+               bat_count >= max_bat_count,
                och_count >= self.max_och_count)(
             skip_read_filter(1)
         )
@@ -2945,21 +4102,21 @@ class conv2d(bt._Operator):
             skip_read_filter(1)
         )
 
-        fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count,
+        fsm.If(row_count >= max_row_count,
+               bat_count >= max_bat_count,
                och_count >= self.max_och_count)(
             skip_read_act(1)
         )
 
         fsm.If(self.data_stationary == STATIONARY_FILETER,
-               row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count,
+               row_count >= max_row_count,
+               bat_count >= max_bat_count,
                self.keep_input)(
             skip_read_act(1)
         )
 
-        fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count,
+        fsm.If(row_count >= max_row_count,
+               bat_count >= max_bat_count,
                och_count >= self.max_och_count)(
             skip_comp(1)
         )
@@ -2973,8 +4130,8 @@ class conv2d(bt._Operator):
 
         fsm.If(self.data_stationary == STATIONARY_FILETER).goto(state_read_act)
         fsm.If(self.data_stationary == STATIONARY_FILETER,
-               row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count).goto(state_read_filter)
+               row_count >= max_row_count,
+               bat_count >= max_bat_count).goto(state_read_filter)
 
         fsm.If(self.data_stationary == STATIONARY_INPUT).goto(state_read_filter)
         fsm.If(self.data_stationary == STATIONARY_INPUT,
@@ -2982,11 +4139,11 @@ class conv2d(bt._Operator):
 
         fsm.If(vg.Ands(vg.Not(skip_write_out),
                        prev_och_count >= self.max_och_count,
-                       prev_row_count >= self.max_row_count,
-                       prev_bat_count >= self.max_bat_count)).goto_next()
+                       prev_row_count >= max_row_count,
+                       prev_bat_count >= max_bat_count)).goto_next()
 
         # wait for last DMA write
-        bt.dma_wait_write(self.maxi, fsm)
+        bt.dma_wait_write(out_maxi, fsm)
 
         # --------------------
         # FSM controls for STATIONARY_INPUT (insert FSM transitions)
@@ -2996,7 +4153,7 @@ class conv2d(bt._Operator):
         fsm.If(self.data_stationary == STATIONARY_INPUT).goto_from(
             state_read_act_end, state_read_filter)
         fsm.If(self.data_stationary == STATIONARY_INPUT).goto_from(
-            state_read_filter_end, state_comp)
+            state_read_filter_end, state_read_residual)
 
     def eval(self, memo, input_dict, **kwargs):
         if id(self) in memo:
@@ -3041,6 +4198,15 @@ class conv2d(bt._Operator):
         kwargs['par_row'] = self.par_row
         kwargs['concur_och'] = self.concur_och
         kwargs['stationary'] = self.stationary
+        kwargs['algorithm'] = self.algorithm
+        kwargs['pool'] = self.pool
+        kwargs['pool_size'] = self.pool_size
+        kwargs['residual'] = (args[self.args_dict['residual']]
+                              if self.has_residual else None)
+        kwargs['residual_a_scale'] = self.residual_a_scale
+        kwargs['residual_b_scale'] = self.residual_b_scale
+        kwargs['residual_shamt'] = self.residual_shamt
+        kwargs['upsampling_row'] = self.upsampling_row
         kwargs['input_dtype'] = self.args[0].dtype
         kwargs['filter_dtype'] = self.args[1].dtype
         kwargs['bias_dtype'] = self.args[self.args_dict['bias']].dtype if self.has_bias else None
@@ -3052,6 +4218,28 @@ class conv2d(bt._Operator):
         return ret
 
 
+def winograd_transform(coefs, vars_2d):
+    """ coefs (with elements of -1, 0, or 1) x vars_2d """
+
+    ret = []
+    for coef_row in coefs:
+        line = []
+        for j in range(len(vars_2d[0])):
+            terms = [(coef, var_row[j])
+                     for coef, var_row in zip(coef_row, vars_2d) if coef != 0]
+            terms.sort(key=lambda x: x[0] < 0)
+
+            v = terms[0][1]
+            for coef, var in terms[1:]:
+                v = v + var if coef > 0 else v - var
+
+            line.append(v)
+
+        ret.append(line)
+
+    return ret
+
+
 def line_to_2d(lst, kx):
     row = []
     col = []
@@ -3111,6 +4299,14 @@ def mux_1d(line, select, size, width=1):
     return ret_list
 
 
+def mux_phase(values, phase):
+    ret = values[0]
+    for i, value in enumerate(values[1:], start=1):
+        ret = vg.Mux(phase == i, value, ret)
+
+    return ret
+
+
 def to_aligned_shape(obj, shape):
     if obj.maxi is None:
         raise ValueError("maxi is required to determine alignment.")
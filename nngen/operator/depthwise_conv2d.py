@@ -0,0 +1,660 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+from collections import OrderedDict
+
+import nngen.basic_types as bt
+import nngen.util as util
+from nngen.lazy import lazy_import
+from .pool import _pool, pool_out_shape
+
+vg = lazy_import('veriloggen')
+
+
+class depthwise_conv2d(_pool):
+    """
+    Computes a 2-D depthwise convolution given 4-D input and 3-D filter tensors.
+
+    Each input channel is convolved with its own filter,
+    so that the number of output channels equals the number of input channels.
+
+    Parameters
+    ----------
+    input :
+        ``NHWC`` (batch, height, width, channel)
+
+    filter :
+       ``HWC`` (height, width, channel)
+
+    stride :
+        ``NHWC`` (N and C are always 1)
+
+    bias : optional
+        Tensor for bias addition to outputs.
+
+    scale : optional
+        Tensor for scaling to outputs.
+
+    rshift_mul : optional
+        Constant arithmetic shift right amount applied to the result of \
+        activation and kernel multiplication.
+
+    rshift_sum : optional
+        Constant arithmetic shift right amount applied to the result of \
+        the window summation.
+
+    rshift_out : optional
+        Constant arithmetic shift right amount applied to the output value.
+
+    act_func : optional
+        The output value can be input to the activation function \
+        before writing to memory. \
+        The activation function that can be specified is the operator \
+        that inherited the element-wise class.
+
+    padding : optional
+        'SAME', 'VALID', int, or (top, bottom, left, right) tuple. \
+        The 'SAME' padding puts the larger half on the top and left sides, \
+        as same as conv2d.
+
+    dtype : optional
+        Output data type.
+
+    mul_dtype : optional
+        Data type of register that stores the result of multiplication \
+        of activation and kernel parameter.
+
+    sum_dtype : optional
+        Data type of register that stores summation result.
+
+    name : optional
+        A name for the operation (optional).
+
+    par : optional
+        Specifies the degree of operation parallelism \
+        in the channel direction.
+
+    input_ram_size : optional
+        Specify the word length of the input data RAM. \
+        If set to less than the minimum required word length \
+        (depends on the input data size), the set value is ignored.
+
+    out_ram_size : optional
+        Specifies the word length of the output data RAM. \
+        If set to less than the minimum required word length \
+        (depends on the output data size), the set value is ignored.
+
+    Notes
+    --------
+    Note that the original order of tensorflow's depthwise_conv2d filter is ``HWIM``
+    (height, width, inchannel, channel_multiplier). Only channel_multiplier=1 is supported.
+
+    """
+
+    control_param_custom_width = {'act_offset_values': bt.get_maxi_addrwidth,
+                                  'filter_offset_values': bt.get_maxi_addrwidth}
+    control_param_custom_signed = {'act_offset_values': True}
+
+    def __sub_str__(self):
+        act_func = (' act_func:%s' % str(self.act_func.__name__)
+                    if self.act_func is not None else '')
+        cshamt_mul = (' cshamt_mul:%s' % self.cshamt_mul
+                      if self.cshamt_mul is not None else '')
+        cshamt_sum = (' cshamt_sum:%s' % self.cshamt_sum
+                      if self.cshamt_sum is not None else '')
+        cshamt_out = (' cshamt_out:%s' % self.cshamt_out
+                      if self.cshamt_out is not None else '')
+        mul_dtype = (' mul_dtype:%s' % self.mul_dtype.to_str()
+                     if self.mul_dtype is not None else '')
+        sum_dtype = (' sum_dtype:%s' % self.sum_dtype.to_str()
+                     if self.sum_dtype is not None else '')
+
+        return ''.join([_pool.__sub_str__(self), act_func,
+                        cshamt_mul, cshamt_sum, cshamt_out,
+                        mul_dtype, sum_dtype])
+
+    def __init__(self, input, filter, strides,
+                 bias=None, scale=None,
+                 rshift_mul=None, rshift_sum=None, rshift_out=None,
+                 act_func=None, padding='SAME',
+                 dtype=None, mul_dtype=None, sum_dtype=None,
+                 name=None, par=1,
+                 input_ram_size=None, out_ram_size=None):
+
+        if isinstance(padding, str) and padding != 'SAME' and padding != 'VALID':
+            raise ValueError("padding options must be 'SAME', 'VALID', int, tuple, or list.")
+        elif isinstance(padding, (tuple, list)) and len(padding) != 4:
+            raise ValueError('padding rank must be 4.')
+
+        if bt.get_rank(input.shape) != 4:
+            raise ValueError('rank of input must be 4.')
+
+        if bt.get_rank(filter.shape) != 3:
+            raise ValueError('rank of filter must be 3.')
+
+        if len(strides) != 4:
+            raise ValueError('rank of strides must be 4.')
+
+        if strides[0] != 1 or strides[3] != 1:
+            raise ValueError('strides[0] and [3] must be 1')
+
+        if filter.shape[-1] != input.shape[-1]:
+            raise ValueError("filter channel size mismatch: %d != %d" %
+                             (filter.shape[-1], input.shape[-1]))
+
+        for shamt in (rshift_mul, rshift_sum, rshift_out):
+            if shamt is not None and not isinstance(shamt, int):
+                raise TypeError('shift amount must be int or None.')
+
+        if (act_func is not None and
+                not issubclass(act_func, bt._ElementwiseOperator)):
+            raise TypeError('act_func must be _ElementwiseOperator class.')
+
+        if input_ram_size is not None and input_ram_size < 1:
+            raise ValueError('input_ram_size must be greater than 0')
+
+        if out_ram_size is not None and out_ram_size < 1:
+            raise ValueError('out_ram_size must be greater than 0')
+
+        ksize = (1, filter.shape[0], filter.shape[1], 1)
+        shape = pool_out_shape(input.shape, ksize, strides, padding)
+
+        args = [input, filter]
+        self.args_dict = OrderedDict()
+
+        if bias is not None:
+            if bt.get_rank(bias.shape) != 1:
+                raise ValueError('rank of bias must be 1.')
+            if bias.shape[-1] != 1 and bias.shape[-1] != shape[-1]:
+                raise ValueError('bias size mismatch: %d != %d' %
+                                 (bias.shape[-1], shape[-1]))
+            self.args_dict['bias'] = len(args)
+            args.append(bias)
+
+        if scale is not None:
+            if bt.get_rank(scale.shape) != 1:
+                raise ValueError('rank of scale must be 1.')
+            if scale.shape[-1] != 1 and scale.shape[-1] != shape[-1]:
+                raise ValueError('scale size mismatch: %d != %d' %
+                                 (scale.shape[-1], shape[-1]))
+            self.args_dict['scale'] = len(args)
+            args.append(scale)
+
+        bt._Operator.__init__(self, *args,
+                              dtype=dtype, shape=shape, name=name, par=par)
+
+        self.ksize = ksize
+        self.strides = tuple(strides)
+        self.padding = padding
+
+        self.filter_shape = tuple(filter.shape)
+        self.act_func = act_func
+        self.mul_dtype = mul_dtype
+        self.sum_dtype = sum_dtype
+
+        self.cshamt_mul = rshift_mul
+        self.cshamt_sum = rshift_sum
+        self.cshamt_out = rshift_out
+
+        # compatible with the quantizer of conv2d
+        self.has_bias = bias is not None
+        self.has_scale = scale is not None
+        self.has_vshamt_mul = False
+        self.has_vshamt_sum = False
+        self.has_vshamt_out = False
+
+        # attribute
+        self.value_ram_size = input_ram_size
+        self.out_ram_size = out_ram_size
+        # output columns of a tile (set_col_tiles)
+        self.col_tile_size = None
+        depthwise_conv2d.attribute(self, par, input_ram_size, out_ram_size)
+
+    def attribute(self, par=None, input_ram_size=None, out_ram_size=None):
+        _pool.attribute(self, par, input_ram_size, out_ram_size)
+
+    def get_pad_value(self, strm):
+        return strm.Int(0)
+
+    def get_required_rams(self):
+        inputs, outputs, temps = _pool.get_required_rams(self)
+
+        ksize_col = self.ksize[-2]
+        ksize_row = self.ksize[-3]
+
+        filter = self.args[1]
+        filter_num_ch = filter.get_aligned_shape()[-1]
+        filter_width = filter.get_ram_width() * self.par
+        filter_size = int(math.ceil(filter_num_ch / self.par))
+        inputs.extend([(filter_width, filter_size)] * ksize_col * ksize_row)
+
+        for key in ('bias', 'scale'):
+            if key not in self.args_dict:
+                continue
+            arg = self.args[self.args_dict[key]]
+            width = arg.get_ram_width() * self.par
+            size = int(math.ceil(arg.get_aligned_shape()[-1] / self.par))
+            inputs.append((width, size))
+
+        return inputs, outputs, temps
+
+    def _get_mul_dtype_info(self):
+        x_datawidth = self.args[0].get_op_width()
+        y_datawidth = self.args[1].get_op_width()
+
+        if self.mul_dtype is not None:
+            return (self.mul_dtype.width, self.mul_dtype.point,
+                    self.mul_dtype.signed)
+
+        return (x_datawidth + y_datawidth, self.get_op_point(), self.get_signed())
+
+    def _get_sum_dtype_info(self):
+        if self.sum_dtype is not None:
+            return (self.sum_dtype.width, self.sum_dtype.point,
+                    self.sum_dtype.signed)
+
+        mul_width, mul_point, mul_signed = self._get_mul_dtype_info()
+        num_weights = self.ksize[-2] * self.ksize[-3]
+        sum_width = mul_width + max(int(math.ceil(math.log(num_weights, 2))), 1)
+        return (sum_width, mul_point, mul_signed)
+
+    def get_required_substreams(self):
+        arg_scale = (self.args[self.args_dict['scale']]
+                     if 'scale' in self.args_dict else None)
+
+        x_datawidth = self.args[0].get_op_width()
+        x_point = self.args[0].get_op_point()
+        x_signed = self.args[0].get_signed()
+        y_datawidth = self.args[1].get_op_width()
+        y_point = self.args[1].get_op_point()
+        y_signed = self.args[1].get_signed()
+
+        mul_width, mul_point, mul_signed = self._get_mul_dtype_info()
+        sum_width, sum_point, sum_signed = self._get_sum_dtype_info()
+
+        if arg_scale is not None:
+            scale_width = arg_scale.get_op_width()
+            scale_point = arg_scale.get_op_point()
+            scale_signed = arg_scale.get_signed()
+        else:
+            scale_width = self.get_op_width()
+            scale_point = self.get_op_point()
+            scale_signed = self.get_signed()
+
+        scl_width = sum_width + scale_width
+        scl_point = max(sum_point, scale_point)
+        scl_signed = sum_signed and scale_signed
+
+        out_width = self.get_op_width()
+        out_point = self.get_op_point()
+        out_signed = self.get_signed()
+
+        num_weights = self.ksize[-2] * self.ksize[-3]
+
+        args = (x_datawidth, x_point, x_signed,
+                y_datawidth, y_point, y_signed,
+                mul_width, mul_point, mul_signed)
+
+        if mul_point == 0:
+            mulname = 'mul_rshift_round_madd'
+        else:
+            mulname = 'mul_rshift_round'
+
+        substrms = [(mulname, args)] * (num_weights * self.par)
+
+        substrms.extend([('add_tree_rshift_round_frac',
+                          (sum_width, sum_point, sum_signed, num_weights))] * self.par)
+
+        substrms.extend([('mul_rshift_clip',
+                          (sum_width, sum_point, sum_signed,
+                           scale_width, scale_point, scale_signed,
+                           scl_width, scl_point, scl_signed,
+                           out_width, out_point, out_signed))] * self.par)
+
+        return substrms
+
+    def get_stream_hash(self):
+        base = _pool.get_stream_hash(self)
+        return (base, self.mul_dtype, self.sum_dtype, self.act_func)
+
+    def pad_size_split(self, size, ksize, stride):
+        """ (pad, before, after) of 'SAME' padding, the larger half before the input
+        as conv2d """
+
+        pad, after, before = util.pad_size_split(size, ksize, stride)
+        return pad, before, after
+
+    def get_stream_func(self):
+
+        def func(strm):
+            arg_input = self.args[0]
+            arg_filter = self.args[1]
+            arg_bias = (self.args[self.args_dict['bias']]
+                        if 'bias' in self.args_dict else None)
+            arg_scale = (self.args[self.args_dict['scale']]
+                         if 'scale' in self.args_dict else None)
+
+            ksize_col = self.ksize[-2]
+            ksize_row = self.ksize[-3]
+            num_weights = ksize_col * ksize_row
+
+            mask = strm.constant(datawidth=num_weights, signed=False)
+
+            # vec_act
+            datawidth = arg_input.get_op_width()
+            vec_datawidth = datawidth * self.par
+            point = arg_input.get_op_point()
+            signed = arg_input.get_signed()
+
+            vec_act_vars = [strm.source(datawidth=vec_datawidth, signed=False)
+                            for _ in range(num_weights)]
+
+            if self.par == 1:
+                act_vars_list = [[strm.ReinterpretCast(vec_act_var, datawidth, point, signed)
+                                  for vec_act_var in vec_act_vars]]
+            else:
+                split_vec_act_vars = [strm.Split(vec_act_var,
+                                                 datawidth, point, signed, reverse=True)
+                                      for vec_act_var in vec_act_vars]
+                act_vars_list = [[split_vec_act_var[i]
+                                  for split_vec_act_var in split_vec_act_vars]
+                                 for i in range(self.par)]
+
+            # vec_filter
+            datawidth = arg_filter.get_op_width()
+            vec_datawidth = datawidth * self.par
+            point = arg_filter.get_op_point()
+            signed = arg_filter.get_signed()
+
+            vec_filter_vars = [strm.source(datawidth=vec_datawidth, signed=False)
+                               for _ in range(num_weights)]
+
+            if self.par == 1:
+                filter_vars_list = [[strm.ReinterpretCast(vec_filter_var,
+                                                          datawidth, point, signed)
+                                     for vec_filter_var in vec_filter_vars]]
+            else:
+                split_vec_filter_vars = [strm.Split(vec_filter_var,
+                                                    datawidth, point, signed, reverse=True)
+                                         for vec_filter_var in vec_filter_vars]
+                filter_vars_list = [[split_vec_filter_var[i]
+                                     for split_vec_filter_var in split_vec_filter_vars]
+                                    for i in range(self.par)]
+
+            # bias
+            datawidth = (arg_bias.get_op_width()
+                         if arg_bias is not None else self.get_op_width())
+            vec_datawidth = datawidth * self.par
+            point = (arg_bias.get_op_point()
+                     if arg_bias is not None else self.get_op_point())
+            signed = (arg_bias.get_signed()
+                      if arg_bias is not None else self.get_signed())
+            dup_bias = strm.constant(datawidth=1, signed=False)
+            vec_bias = strm.source(datawidth=vec_datawidth, signed=False)
+
+            split_bias = strm.Split(vec_bias, datawidth, point, signed, reverse=True)
+            bias_list = [strm.Mux(dup_bias, split_bias[0], value) for value in split_bias]
+
+            # scale
+            datawidth = (arg_scale.get_op_width()
+                         if arg_scale is not None else self.get_op_width())
+            vec_datawidth = datawidth * self.par
+            point = (arg_scale.get_op_point()
+                     if arg_scale is not None else self.get_op_point())
+            signed = (arg_scale.get_signed()
+                      if arg_scale is not None else self.get_signed())
+            dup_scale = strm.constant(datawidth=1, signed=False)
+            vec_scale = strm.source(datawidth=vec_datawidth, signed=False)
+
+            split_scale = strm.Split(vec_scale, datawidth, point, signed, reverse=True)
+            scale_list = [strm.Mux(dup_scale, split_scale[0], value) for value in split_scale]
+
+            # cshamt
+            cshamt_mul = strm.constant(datawidth=self.cshamt_mul_value.bit_length(),
+                                       signed=False)
+            cshamt_sum = strm.constant(datawidth=self.cshamt_sum_value.bit_length(),
+                                       signed=False)
+            cshamt_out = strm.constant(datawidth=self.cshamt_out_value.bit_length(),
+                                       signed=False)
+
+            # channel parallel
+            out_vars = []
+
+            for i, (act_vars, filter_vars, bias, scale) in enumerate(
+                    zip(act_vars_list, filter_vars_list, bias_list, scale_list)):
+
+                mul_vars = []
+                for k, (act_var, filter_var, pmask) in enumerate(
+                        zip(act_vars, filter_vars, mask)):
+                    masked_var = strm.Mux(pmask, strm.Int(0), act_var)
+
+                    mul = strm.substream(self.substreams[i * num_weights + k])
+                    mul.to_source('x', masked_var)
+                    mul.to_source('y', filter_var)
+                    mul.to_source('rshift', cshamt_mul)
+                    mul_vars.append(mul.from_sink('z'))
+
+                addtree = strm.substream(self.substreams[
+                    num_weights * self.par + i])
+                for k, mul_var in enumerate(mul_vars):
+                    addtree.to_source('var%d' % k, mul_var)
+                addtree.to_source('rshift', cshamt_sum)
+                out_var = addtree.from_sink('sum')
+
+                out_var += bias
+
+                mul = strm.substream(self.substreams[
+                    num_weights * self.par + self.par + i])
+                mul.to_source('x', out_var)
+                mul.to_source('y', scale)
+                mul.to_source('rshift', cshamt_out)
+                out_var = mul.from_sink('z')
+
+                if self.act_func is not None:
+                    out_var = self.act_func.op(strm, out_var)
+
+                width = self.get_op_width()
+                point = self.get_op_point()
+                signed = self.get_signed()
+
+                out_var = bt.out_rcast(strm, out_var, width, point, signed)
+                out_vars.append(out_var)
+
+            if self.par == 1:
+                vec_out_var = out_vars[0]
+            else:
+                vec_out_var = strm.Cat(*reversed(out_vars))
+
+            strm.sink(vec_out_var)
+
+        return func
+
+    def get_control_param_values(self, col_tile=None):
+        params = _pool.get_control_param_values(self, col_tile)
+
+        arg_filter = self.args[1]
+        arg_bias = (self.args[self.args_dict['bias']]
+                    if 'bias' in self.args_dict else None)
+        arg_scale = (self.args[self.args_dict['scale']]
+                     if 'scale' in self.args_dict else None)
+
+        ksize_col = self.ksize[-2]
+        ksize_row = self.ksize[-3]
+
+        filter_num_ch = arg_filter.get_aligned_shape()[-1]
+        filter_step = bt.to_byte(bt.align_word(filter_num_ch,
+                                               arg_filter.get_word_alignment()) *
+                                 arg_filter.get_ram_width())
+        filter_offset_values = [filter_step * i
+                                for i in range(ksize_col * ksize_row)]
+        filter_read_size = int(math.ceil(filter_num_ch / self.par))
+
+        bias_scala = 1 if arg_bias is not None and arg_bias.shape[-1] == 1 else 0
+        bias_num = (int(math.ceil(arg_bias.shape[-1] / self.par))
+                    if arg_bias is not None else 0)
+        scale_scala = 1 if arg_scale is not None and arg_scale.shape[-1] == 1 else 0
+        scale_num = (int(math.ceil(arg_scale.shape[-1] / self.par))
+                     if arg_scale is not None else 0)
+
+        cshamt_mul_value = 0 if self.cshamt_mul is None else self.cshamt_mul
+        cshamt_sum_value = 0 if self.cshamt_sum is None else self.cshamt_sum
+        cshamt_out_value = 0 if self.cshamt_out is None else self.cshamt_out
+
+        params.update([('filter_offset_values', filter_offset_values),
+                       ('filter_read_size', filter_read_size),
+                       ('bias_scala', bias_scala),
+                       ('bias_num', bias_num),
+                       ('scale_scala', scale_scala),
+                       ('scale_num', scale_num),
+                       ('cshamt_mul_value', cshamt_mul_value),
+                       ('cshamt_sum_value', cshamt_sum_value),
+                       ('cshamt_out_value', cshamt_out_value)])
+
+        return params
+
+    def _get_param_rams(self):
+        num_weights = self.ksize[-2] * self.ksize[-3]
+        filter_rams = self.input_rams[num_weights:num_weights * 2]
+        index = num_weights * 2
+
+        if 'bias' in self.args_dict:
+            bias_ram = self.input_rams[index]
+            index += 1
+        else:
+            bias_ram = None
+
+        if 'scale' in self.args_dict:
+            scale_ram = self.input_rams[index]
+            index += 1
+        else:
+            scale_ram = None
+
+        return filter_rams, bias_ram, scale_ram
+
+    def read_params(self, fsm):
+        filter_rams, bias_ram, scale_ram = self._get_param_rams()
+
+        maxi = self.get_arg_maxi(self.args[1])
+        bt.bus_lock(maxi, fsm)
+
+        # ReadFilter
+        filter_gaddr_base = self.arg_objaddrs[1]
+        for filter_ram, filter_offset in zip(filter_rams, self.filter_offset_values):
+            filter_gaddr = filter_gaddr_base + filter_offset
+            bt.dma_read(maxi, fsm, filter_ram, 0,
+                        filter_gaddr, self.filter_read_size, port=1)
+
+        # ReadBias
+        if bias_ram is not None:
+            bias_gaddr = self.arg_objaddrs[self.args_dict['bias']]
+            bias_maxi = self.get_arg_maxi(self.args[self.args_dict['bias']])
+            bt.dma_read(bias_maxi, fsm, bias_ram, 0,
+                        bias_gaddr, self.bias_num, port=1)
+
+        # ReadScale
+        if scale_ram is not None:
+            scale_gaddr = self.arg_objaddrs[self.args_dict['scale']]
+            scale_maxi = self.get_arg_maxi(self.args[self.args_dict['scale']])
+            bt.dma_read(scale_maxi, fsm, scale_ram, 0,
+                        scale_gaddr, self.scale_num, port=1)
+
+        bt.bus_unlock(maxi, fsm)
+
+    def set_param_sources(self, comp_fsm):
+        filter_rams, bias_ram, scale_ram = self._get_param_rams()
+        num_weights = len(filter_rams)
+
+        source_names = list(self.stream.sources.keys())
+        constant_names = list(self.stream.constants.keys())
+
+        # filter: one word per channel block, shared by all columns
+        for name, filter_ram in zip(source_names[num_weights:num_weights * 2],
+                                    filter_rams):
+            self.stream.set_source(comp_fsm, name, filter_ram,
+                                   0, self.stream_size)
+            comp_fsm.set_index(comp_fsm.current - 1)
+
+        # bias
+        name = constant_names[1]
+        if bias_ram is not None:
+            self.stream.set_constant(comp_fsm, name, self.bias_scala)
+        else:
+            self.stream.set_constant(comp_fsm, name, 1)
+        comp_fsm.set_index(comp_fsm.current - 1)
+
+        name = source_names[num_weights * 2]
+        if bias_ram is not None:
+            stride = vg.Mux(self.bias_scala, 0, 1)
+            pat = ((self.stream_size, stride),)
+            self.stream.set_source_pattern(comp_fsm, name, bias_ram, 0, pat)
+        else:
+            self.stream.set_source_empty(comp_fsm, name, 0)
+        comp_fsm.set_index(comp_fsm.current - 1)
+
+        # scale
+        name = constant_names[2]
+        if scale_ram is not None:
+            self.stream.set_constant(comp_fsm, name, self.scale_scala)
+        else:
+            self.stream.set_constant(comp_fsm, name, 1)
+        comp_fsm.set_index(comp_fsm.current - 1)
+
+        name = source_names[num_weights * 2 + 1]
+        if scale_ram is not None:
+            stride = vg.Mux(self.scale_scala, 0, 1)
+            pat = ((self.stream_size, stride),)
+            self.stream.set_source_pattern(comp_fsm, name, scale_ram, 0, pat)
+        else:
+            self.stream.set_source_empty(comp_fsm, name, 1)
+        comp_fsm.set_index(comp_fsm.current - 1)
+
+        # cshamt
+        for name, value in zip(constant_names[3:6],
+                               (self.cshamt_mul_value,
+                                self.cshamt_sum_value,
+                                self.cshamt_out_value)):
+            self.stream.set_constant(comp_fsm, name, value)
+            comp_fsm.set_index(comp_fsm.current - 1)
+
+    def eval(self, memo, input_dict, **kwargs):
+        if id(self) in memo:
+            return memo[id(self)]
+
+        import nngen.verify as verify
+
+        name = self.__class__.__name__
+        method = getattr(verify, name, None)
+
+        args = [arg.eval(memo, input_dict)
+                for arg in self.args]
+
+        input = args[0]
+        filter = args[1]
+        strides = self.strides
+
+        bias = args[self.args_dict['bias']] if self.has_bias else None
+        scale = args[self.args_dict['scale']] if self.has_scale else None
+
+        kwargs['bias'] = bias
+        kwargs['scale'] = scale
+        kwargs['rshift_mul'] = self.cshamt_mul
+        kwargs['rshift_sum'] = self.cshamt_sum
+        kwargs['rshift_out'] = self.cshamt_out
+        kwargs['act_func'] = self.act_func
+        kwargs['padding'] = self.padding
+        kwargs['dtype'] = self.dtype
+        kwargs['mul_dtype'] = self.mul_dtype
+        kwargs['sum_dtype'] = self.sum_dtype
+        kwargs['name'] = self.name
+        kwargs['par'] = self.par
+        kwargs['input_dtype'] = self.args[0].dtype
+        kwargs['filter_dtype'] = self.args[1].dtype
+        kwargs['bias_dtype'] = self.args[self.args_dict['bias']].dtype if self.has_bias else None
+        kwargs['scale_dtype'] = self.args[self.args_dict['scale']].dtype if self.has_scale else None
+
+        ret = method(input, filter, strides, **kwargs)
+        memo[id(self)] = ret
+
+        return ret
@@ -5,7 +5,9 @@ from __future__ import division
 from collections import OrderedDict
 
 import nngen.basic_types as bt
-import nngen.verilog as verilog
+from nngen.lazy import lazy_import
+
+verilog = lazy_import('nngen.verilog')
 
 
 class extern(bt._Operator):
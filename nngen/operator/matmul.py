@@ -3,13 +3,13 @@ from __future__ import print_function
 
 import functools
 
-import veriloggen as vg
-from veriloggen.optimizer import try_optimize as optimize
-
 import nngen.basic_types as bt
+from nngen.lazy import lazy_import
 from . import basic
 from . import conv2d
 
+vg = lazy_import('veriloggen')
+
 
 def to_shape_2d(shape):
     if bt.get_rank(shape) == 1:
@@ -47,6 +47,10 @@ class matmul(conv2d.conv2d):
     input_chainable = False
     output_chainable = False
 
+    # dynamic batch mode: the batch is the first axis of the left matrix,
+    # whose rows are the rows of conv2d (max_row_count = num_rows - 1)
+    dynamic_batch_params = {'max_row_count': -1}
+
     @property
     def par_left_col(self):
         return self.par_ich
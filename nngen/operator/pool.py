@@ -5,10 +5,11 @@ from __future__ import division
 import math
 from collections import OrderedDict
 
-import veriloggen as vg
-
 import nngen.basic_types as bt
 import nngen.util as util
+from nngen.lazy import lazy_import
+
+vg = lazy_import('veriloggen')
 
 
 class _pool(bt._Operator):
@@ -22,6 +23,9 @@ class _pool(bt._Operator):
     control_param_custom_width = {'act_offset_values': bt.get_maxi_addrwidth}
     control_param_custom_signed = {'act_offset_values': True}
 
+    # dynamic batch mode: max_bat_count = batch_size - 1
+    dynamic_batch_params = {'max_bat_count': -1}
+
     def __sub_str__(self):
         ksize = str(self.ksize)
         strides = str(self.strides)
@@ -67,29 +71,7 @@ class _pool(bt._Operator):
         if strides[0] != 1 or strides[3] != 1:
             raise ValueError('strides[0] and [3] must be 1')
 
-        if isinstance(padding, str) and (padding == 'SAME' or padding == 'VALID'):
-            shape = []
-            shape.append(int(math.ceil(value.shape[0] / strides[0])))
-            for sh, st, fs in list(zip(value.shape, strides, ksize))[1:-1]:
-                shape.append(util.pix_size(sh, fs, st, padding))
-            shape.append(int(math.ceil(value.shape[3] / strides[3])))
-        elif isinstance(padding, int):
-            shape = []
-            shape.append(int(math.ceil(value.shape[0] / strides[0])))
-            for sh, st, fs in list(zip(value.shape, strides, ksize))[1:-1]:
-                shape.append(util.pix_size(sh + padding * 2, fs, st, 'VALID'))
-            shape.append(int(math.ceil(value.shape[3] / strides[3])))
-        elif isinstance(padding, (tuple, list)):
-            shape = []
-            shape.append(int(math.ceil(value.shape[0] / strides[0])))
-            for i, (sh, st, fs) in enumerate(
-                    list(zip(value.shape, strides, ksize))[1:-1]):
-                pd0 = padding[i * 2]
-                pd1 = padding[i * 2 + 1]
-                shape.append(util.pix_size(sh + pd0 + pd1, fs, st, 'VALID'))
-            shape.append(int(math.ceil(value.shape[3] / strides[3])))
-
-        shape = tuple(shape)
+        shape = pool_out_shape(value.shape, ksize, strides, padding)
 
         if value_ram_size is not None and value_ram_size < 1:
             raise ValueError('value_ram_size must be greater than 0')
@@ -107,6 +89,8 @@ class _pool(bt._Operator):
         # attribute
         self.value_ram_size = value_ram_size
         self.out_ram_size = out_ram_size
+        # output columns of a tile (set_col_tiles)
+        self.col_tile_size = None
         _pool.attribute(self, par, value_ram_size, out_ram_size)
 
     def get_pad_value(self, strm):
@@ -155,6 +139,11 @@ class _pool(bt._Operator):
         out_num_row = out_shape[-3]
         out_num_bat = out_shape[-4]
 
+        # column tiling: RAMs for the widest tile with halo columns
+        if self.col_tile_size is not None:
+            out_num_col = self.col_tile_size
+            act_num_col = min((out_num_col - 1) * self.strides[-2] + ksize_col, act_num_col)
+
         input_min_size = (int(math.ceil(act_num_ch / self.par))
                           * int(math.ceil(act_num_col / ksize_col)) * 2)
         if self.value_ram_size is not None and input_min_size < self.value_ram_size:
@@ -177,11 +166,75 @@ class _pool(bt._Operator):
 
         return inputs, outputs, temps
 
+    def set_col_tiles(self, max_ram_capacity=None):
+        """ split the output columns into tiles so that each value
+        and output RAM fits within max_ram_capacity bits """
+
+        self.col_tile_size = None
+
+        if max_ram_capacity is None:
+            return
+
+        out_num_col = self.shape[-2]
+
+        num_tiles = 1
+        while True:
+            col_tile_size = int(math.ceil(out_num_col / num_tiles))
+
+            self.col_tile_size = col_tile_size
+            inputs, outputs, temps = self.get_required_rams()
+
+            num_values = self.ksize[-2] * self.ksize[-3]
+            capacity = max([width * 2 ** int(math.ceil(math.log(max(length, 1), 2)))
+                            for width, length in list(inputs[:num_values]) + list(outputs)])
+
+            if capacity <= max_ram_capacity or col_tile_size <= 1:
+                break
+
+            num_tiles += 1
+
+        if col_tile_size >= out_num_col:
+            self.col_tile_size = None
+
+    def pad_size_split(self, size, ksize, stride):
+        """ (pad, before, after) of 'SAME' padding, the larger half after the input """
+
+        return util.pad_size_split(size, ksize, stride)
+
+    def get_col_tiles(self):
+        """ (start, end) output columns of each tile """
+
+        if self.col_tile_size is None:
+            return [None]
+
+        out_num_col = self.shape[-2]
+        return [(start, min(start + self.col_tile_size, out_num_col))
+                for start in range(0, out_num_col, self.col_tile_size)]
+
+    def get_num_control_param_sets(self):
+        return len(self.get_col_tiles())
+
+    def collect_all_control_param_values_list(self):
+        ret = []
+        for col_tile in self.get_col_tiles():
+            values = OrderedDict()
+            values.update(self.get_control_param_values(col_tile))
+            values.update(self.collect_local_control_param_values())
+            ret.append(values)
+
+        return ret
+
     def get_stream_hash(self):
         base = bt._Operator.get_stream_hash(self)
         ksize_col = self.ksize[-2]
         ksize_row = self.ksize[-3]
-        return (base, ksize_col, ksize_row, self.par)
+        ret = (base, ksize_col, ksize_row, self.par)
+
+        # the base addresses are shifted by the column tile offsets
+        if self.col_tile_size is not None:
+            ret = ret + (('col_tiled',),)
+
+        return ret
 
     def get_stream_func(self):
 
@@ -259,7 +312,7 @@ class _pool(bt._Operator):
         # return value
         raise NotImplementedError('not implemented')
 
-    def get_control_param_values(self):
+    def get_control_param_values(self, col_tile=None):
         act = self.args[0]
 
         ksize_ch = self.ksize[-1]
@@ -285,9 +338,9 @@ class _pool(bt._Operator):
         out_num_bat = out_shape[-4]
 
         if isinstance(self.padding, str) and self.padding == 'SAME':
-            pad_col, pad_col_left, pad_col_right = util.pad_size_split(
+            pad_col, pad_col_left, pad_col_right = self.pad_size_split(
                 act_num_col, ksize_col, stride_col)
-            pad_row, pad_row_top, pad_row_bottom = util.pad_size_split(
+            pad_row, pad_row_top, pad_row_bottom = self.pad_size_split(
                 act_num_row, ksize_row, stride_row)
         elif isinstance(self.padding, int):
             pad_col = self.padding * 2
@@ -317,6 +370,24 @@ class _pool(bt._Operator):
         self.pad_row_top_value = pad_row_top
         self.pad_row_bottom_value = pad_row_bottom
 
+        # column tiling: a tile is a narrower pooling on the input columns
+        # under its output columns, and the rows keep the strides of the whole
+        act_row_num_col = act_num_col
+        out_row_num_col = out_num_col
+        act_col_start = 0
+        out_col_start = 0
+
+        if col_tile is not None:
+            out_col_start, out_col_end = col_tile
+            tile_start = out_col_start * stride_col - pad_col_left
+            tile_end = (out_col_end - 1) * stride_col + ksize_col - pad_col_left
+            act_col_start = max(tile_start, 0)
+            act_num_col = min(tile_end, act_num_col) - act_col_start
+            pad_col_left = max(-tile_start, 0)
+            pad_col_right = max(tile_end - act_row_num_col, 0)
+            pad_col = pad_col_left + pad_col_right
+            out_num_col = out_col_end - out_col_start
+
         max_col_count = act_num_col + pad_col + 1 - ksize_col - stride_col
         if max_col_count < 0:
             max_col_count = 0
@@ -344,11 +415,12 @@ class _pool(bt._Operator):
 
         act_offset_values = []
         for y in range(ksize_row):
-            v = act_num_col * (y - pad_row_top) * act_step
+            v = act_row_num_col * (y - pad_row_top) * act_step
             act_offset_values.append(v)
 
-        act_row_step = act_step * act_num_col * stride_row
-        act_bat_step = act_step * act_num_col * act_num_row
+        act_col_offset = act_step * act_col_start
+        act_row_step = act_step * act_row_num_col * stride_row
+        act_bat_step = act_step * act_row_num_col * act_num_row
 
         act_read_size = (int(math.ceil(aligned_act_num_ch / self.par))
                          * act_num_col)
@@ -357,8 +429,9 @@ class _pool(bt._Operator):
         out_step = bt.to_byte(bt.align_word(out_num_ch, self.get_word_alignment())
                               * self.get_ram_width())
 
-        out_row_step = out_step * out_num_col
-        out_bat_step = out_step * out_num_col * out_num_row
+        out_col_offset = out_step * out_col_start
+        out_row_step = out_step * out_row_num_col
+        out_bat_step = out_step * out_row_num_col * out_num_row
 
         out_write_size = (int(math.ceil(out_num_ch / self.par))
                           * out_num_col)
@@ -403,6 +476,13 @@ class _pool(bt._Operator):
             stream_act_local_small_flags.append(s)
             stream_act_local_large_flags.append(s and l)
 
+        # column tiles share a control sequence with shifted base addresses
+        if self.col_tile_size is not None:
+            col_tile_params = [('act_col_offset', act_col_offset),
+                               ('out_col_offset', out_col_offset)]
+        else:
+            col_tile_params = []
+
         return OrderedDict([('act_num_col', act_num_col),
                             ('act_num_row', act_num_row),
                             ('stride_col', stride_col),
@@ -434,9 +514,12 @@ class _pool(bt._Operator):
                             ('stream_act_local_small_offset', stream_act_local_small_offset),
                             ('stream_act_local_large_offset', stream_act_local_large_offset),
                             ('stream_act_local_small_flags', stream_act_local_small_flags),
-                            ('stream_act_local_large_flags', stream_act_local_large_flags)])
+                            ('stream_act_local_large_flags', stream_act_local_large_flags)] +
+                           col_tile_params)
 
     def control_sequence(self, fsm):
+        max_bat_count = self.get_dynamic_control_param('max_bat_count')
+
         ksize_ch = self.ksize[-1]
         ksize_col = self.ksize[-2]
         ksize_row = self.ksize[-3]
@@ -444,7 +527,7 @@ class _pool(bt._Operator):
 
         self.stride_bat = 1
 
-        act_rams = self.input_rams
+        act_rams = self.input_rams[:ksize_col * ksize_row]
         out_ram = self.output_rams[0]
 
         act_base_offset = self.m.Wire(self._name('act_base_offset'),
@@ -454,8 +537,13 @@ class _pool(bt._Operator):
         act_base_offset_bat = self.m.Reg(self._name('act_base_offset_bat'),
                                          self.maxi.addrwidth, initval=0, signed=True)
 
-        act_base_offset.assign(act_base_offset_row
-                               + act_base_offset_bat)
+        if self.col_tile_size is not None:
+            act_base_offset.assign(act_base_offset_row
+                                   + act_base_offset_bat
+                                   + self.act_col_offset)
+        else:
+            act_base_offset.assign(act_base_offset_row
+                                   + act_base_offset_bat)
 
         out_base_offset = self.m.Wire(self._name('out_base_offset'),
                                       self.maxi.addrwidth, signed=True)
@@ -464,8 +552,13 @@ class _pool(bt._Operator):
         out_base_offset_bat = self.m.Reg(self._name('out_base_offset_bat'),
                                          self.maxi.addrwidth, initval=0, signed=True)
 
-        out_base_offset.assign(out_base_offset_row
-                               + out_base_offset_bat)
+        if self.col_tile_size is not None:
+            out_base_offset.assign(out_base_offset_row
+                                   + out_base_offset_bat
+                                   + self.out_col_offset)
+        else:
+            out_base_offset.assign(out_base_offset_row
+                                   + out_base_offset_bat)
 
         dma_flags = [self.m.Reg(self._name('dma_flag_%d' % i), initval=0)
                      for i in range(ksize_row)]
@@ -528,6 +621,9 @@ class _pool(bt._Operator):
         # --------------------
         # initialization phase
         # --------------------
+        # ReadParams
+        self.read_params(fsm)
+
         # ReadAct: offset
         fsm(
             act_base_offset_row(0),
@@ -639,7 +735,7 @@ class _pool(bt._Operator):
             mux_dma_flag.assign(mux_dma_flag_value)
             mux_dma_flags.append(mux_dma_flag)
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(self.get_arg_maxi(self.args[0]), fsm)
 
         for (act_rams_row, act_gaddr, act_page_dma_offset,
              dma_pad_mask, dma_flag) in zip(act_rams_2d, mux_act_gaddrs,
@@ -651,10 +747,10 @@ class _pool(bt._Operator):
             fsm.goto_next()
 
             if len(act_rams_row) == 1:
-                bt.dma_read(self.maxi, fsm, act_rams_row[0], act_laddr,
+                bt.dma_read(self.get_arg_maxi(self.args[0]), fsm, act_rams_row[0], act_laddr,
                             act_gaddr, self.act_read_size, port=1)
             else:
-                bt.dma_read_block(self.maxi, fsm, act_rams_row, act_laddr,
+                bt.dma_read_block(self.get_arg_maxi(self.args[0]), fsm, act_rams_row, act_laddr,
                                   act_gaddr, self.act_read_size,
                                   self.act_read_block, port=1)
 
@@ -663,7 +759,7 @@ class _pool(bt._Operator):
             fsm.If(vg.Ors(dma_pad_mask,
                           vg.Not(dma_flag))).goto_from(begin_state_read, end_state_read)
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_arg_maxi(self.args[0]), fsm)
 
         fsm.goto_next()
         state_read_act_end = fsm.current
@@ -786,6 +882,9 @@ class _pool(bt._Operator):
                                    local, self.stream_size)
             comp_fsm.set_index(comp_fsm.current - 1)
 
+        # set_constant and set_source (params)
+        self.set_param_sources(comp_fsm)
+
         # set_sink
         name = list(self.stream.sinks.keys())[0]
         local = stream_out_local + out_page_comp_offset_buf
@@ -879,12 +978,12 @@ class _pool(bt._Operator):
         out_laddr = out_page_dma_offset
         out_gaddr = self.objaddr + out_offset
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(self.get_maxi('output'), fsm)
 
-        bt.dma_write(self.maxi, fsm, out_ram, out_laddr,
+        bt.dma_write(self.get_maxi('output'), fsm, out_ram, out_laddr,
                      out_gaddr, self.out_write_size, port=1, use_async=True)
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_maxi('output'), fsm)
 
         fsm(
             out_count.add(self.out_write_size)
@@ -907,7 +1006,7 @@ class _pool(bt._Operator):
             act_base_offset_bat.add(self.act_bat_step)
         )
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             act_base_offset_bat(0)
         )
 
@@ -934,7 +1033,7 @@ class _pool(bt._Operator):
             bat_count.add(self.stride_bat)
         )
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             bat_count(0)
         )
 
@@ -994,7 +1093,7 @@ class _pool(bt._Operator):
         )
         fsm.If(vg.Not(skip_write_out),
                prev_row_count >= self.max_row_count,
-               prev_bat_count >= self.max_bat_count)(
+               prev_bat_count >= max_bat_count)(
             out_base_offset_bat(0)
         )
 
@@ -1018,12 +1117,12 @@ class _pool(bt._Operator):
 
         # ReadAct, Comp, WriteOut: skip
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             skip_read_act(1)
         )
 
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             skip_comp(1)
         )
 
@@ -1036,10 +1135,18 @@ class _pool(bt._Operator):
         fsm.goto(state_read_act)
         fsm.If(vg.Not(skip_write_out),
                prev_row_count >= self.max_row_count,
-               prev_bat_count >= self.max_bat_count).goto_next()
+               prev_bat_count >= max_bat_count).goto_next()
 
         # wait for last DMA write
-        bt.dma_wait_write(self.maxi, fsm)
+        bt.dma_wait_write(self.get_maxi('output'), fsm)
+
+    def read_params(self, fsm):
+        # DMA reads of operator parameters before the first row
+        pass
+
+    def set_param_sources(self, comp_fsm):
+        # stream constants and sources other than activations
+        pass
 
     def eval(self, memo, input_dict, **kwargs):
         if id(self) in memo:
@@ -1187,6 +1294,32 @@ class max_pool(_pool):
         return maxtree.from_sink('val')
 
 
+def pool_out_shape(value_shape, ksize, strides, padding):
+    if isinstance(padding, str) and (padding == 'SAME' or padding == 'VALID'):
+        shape = []
+        shape.append(int(math.ceil(value_shape[0] / strides[0])))
+        for sh, st, fs in list(zip(value_shape, strides, ksize))[1:-1]:
+            shape.append(util.pix_size(sh, fs, st, padding))
+        shape.append(int(math.ceil(value_shape[3] / strides[3])))
+    elif isinstance(padding, int):
+        shape = []
+        shape.append(int(math.ceil(value_shape[0] / strides[0])))
+        for sh, st, fs in list(zip(value_shape, strides, ksize))[1:-1]:
+            shape.append(util.pix_size(sh + padding * 2, fs, st, 'VALID'))
+        shape.append(int(math.ceil(value_shape[3] / strides[3])))
+    elif isinstance(padding, (tuple, list)):
+        shape = []
+        shape.append(int(math.ceil(value_shape[0] / strides[0])))
+        for i, (sh, st, fs) in enumerate(
+                list(zip(value_shape, strides, ksize))[1:-1]):
+            pd0 = padding[i * 2]
+            pd1 = padding[i * 2 + 1]
+            shape.append(util.pix_size(sh + pd0 + pd1, fs, st, 'VALID'))
+        shape.append(int(math.ceil(value_shape[3] / strides[3])))
+
+    return tuple(shape)
+
+
 def line_to_2d(lst, kx):
     row = []
     col = []
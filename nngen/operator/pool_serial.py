@@ -5,13 +5,14 @@ from __future__ import division
 import math
 from collections import OrderedDict
 
-import veriloggen as vg
-
 import nngen.basic_types as bt
 import nngen.util as util
+from nngen.lazy import lazy_import
 
 from .pool import _pool
 
+vg = lazy_import('veriloggen')
+
 
 class _pool_serial(_pool):
     # shape order
@@ -160,7 +161,11 @@ class _pool_serial(_pool):
         # return value
         raise NotImplementedError('not implemented')
 
-    def get_control_param_values(self):
+    def set_col_tiles(self, max_ram_capacity=None):
+        # serial pooling streams whole rows
+        self.col_tile_size = None
+
+    def get_control_param_values(self, col_tile=None):
         act = self.args[0]
 
         ksize_ch = self.ksize[-1]
@@ -300,6 +305,8 @@ class _pool_serial(_pool):
                             ('inc_out_laddr', inc_out_laddr)])
 
     def control_sequence(self, fsm):
+        max_bat_count = self.get_dynamic_control_param('max_bat_count')
+
         ksize_ch = self.ksize[-1]
         ksize_col = self.ksize[-2]
         ksize_row = self.ksize[-3]
@@ -493,7 +500,7 @@ class _pool_serial(_pool):
             mux_act_gaddrs = act_gaddrs
             mux_dma_pad_masks = dma_pad_masks
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(self.get_arg_maxi(self.args[0]), fsm)
 
         act_laddr = act_page_dma_offset
 
@@ -502,7 +509,7 @@ class _pool_serial(_pool):
             begin_state_read = fsm.current
             fsm.goto_next()
 
-            bt.dma_read(self.maxi, fsm, act_ram, act_laddr,
+            bt.dma_read(self.get_arg_maxi(self.args[0]), fsm, act_ram, act_laddr,
                         act_gaddr, self.act_read_size, port=1)
 
             end_state_read = fsm.current
@@ -512,7 +519,7 @@ class _pool_serial(_pool):
 
             act_laddr += self.act_read_size
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_arg_maxi(self.args[0]), fsm)
 
         fsm.goto_next()
         state_read_act_end = fsm.current
@@ -699,12 +706,12 @@ class _pool_serial(_pool):
         out_laddr = out_page_dma_offset
         out_gaddr = self.objaddr + out_offset
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(self.get_maxi('output'), fsm)
 
-        bt.dma_write(self.maxi, fsm, out_ram, out_laddr,
+        bt.dma_write(self.get_maxi('output'), fsm, out_ram, out_laddr,
                      out_gaddr, self.out_write_size, port=1, use_async=True)
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_maxi('output'), fsm)
 
         fsm(
             out_count.add(self.out_write_size)
@@ -727,7 +734,7 @@ class _pool_serial(_pool):
             act_base_offset_bat.add(self.act_bat_step)
         )
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             act_base_offset_bat(0)
         )
 
@@ -740,7 +747,7 @@ class _pool_serial(_pool):
             bat_count.add(self.stride_bat)
         )
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             bat_count(0)
         )
 
@@ -787,7 +794,7 @@ class _pool_serial(_pool):
         )
         fsm.If(vg.Not(skip_write_out),
                prev_row_count >= self.max_row_count,
-               prev_bat_count >= self.max_bat_count)(
+               prev_bat_count >= max_bat_count)(
             out_base_offset_bat(0)
         )
 
@@ -811,12 +818,12 @@ class _pool_serial(_pool):
 
         # ReadAct, Comp, WriteOut: skip
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             skip_read_act(1)
         )
 
         fsm.If(row_count >= self.max_row_count,
-               bat_count >= self.max_bat_count)(
+               bat_count >= max_bat_count)(
             skip_comp(1)
         )
 
@@ -829,10 +836,10 @@ class _pool_serial(_pool):
         fsm.goto(state_read_act)
         fsm.If(vg.Not(skip_write_out),
                prev_row_count >= self.max_row_count,
-               prev_bat_count >= self.max_bat_count).goto_next()
+               prev_bat_count >= max_bat_count).goto_next()
 
         # wait for last DMA write
-        bt.dma_wait_write(self.maxi, fsm)
+        bt.dma_wait_write(self.get_maxi('output'), fsm)
 
 
 class avg_pool_serial(_pool_serial):
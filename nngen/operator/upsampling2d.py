@@ -5,10 +5,11 @@ from __future__ import division
 import math
 from collections import OrderedDict
 
-import veriloggen as vg
-
 import nngen.basic_types as bt
 import nngen.util as util
+from nngen.lazy import lazy_import
+
+vg = lazy_import('veriloggen')
 
 
 class upsampling2d(bt._ElementwiseOperator):
@@ -110,6 +111,8 @@ class upsampling2d(bt._ElementwiseOperator):
                             ('wrap_sizes', wrap_sizes)])
 
     def control_sequence(self, fsm):
+        num_comp = self.get_dynamic_control_param('num_comp')
+
         sources = self.collect_sources()
 
         arg_gaddrs = [self.m.Reg(self._name('arg_gaddr_%d' % i),
@@ -210,18 +213,18 @@ class upsampling2d(bt._ElementwiseOperator):
             # normal
             laddr = arg_page_dma_offset
             gaddr = arg_objaddr + arg_gaddr
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, ram, laddr, gaddr, self.dma_size)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_lock(self.get_arg_maxi(arg), fsm)
+            bt.dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, self.dma_size)
+            bt.bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             b_stride0 = fsm.current
             fsm.goto_next()
 
             # stride-0
-            bt.bus_lock(self.maxi, fsm)
-            bt.dma_read(self.maxi, fsm, ram, laddr, gaddr, 1)
-            bt.bus_unlock(self.maxi, fsm)
+            bt.bus_lock(self.get_arg_maxi(arg), fsm)
+            bt.dma_read(self.get_arg_maxi(arg), fsm, ram, laddr, gaddr, 1)
+            bt.bus_unlock(self.get_arg_maxi(arg), fsm)
             fsm.goto_next()
 
             # for reuse
@@ -287,12 +290,12 @@ class upsampling2d(bt._ElementwiseOperator):
         laddr = out_page_dma_offset
         gaddr_base = self.objaddr + out_gaddr
 
-        bt.bus_lock(self.maxi, fsm)
+        bt.bus_lock(self.get_maxi('output'), fsm)
 
         b = fsm.current
 
         gaddr = gaddr_base + out_gaddr_offset
-        bt.dma_write(self.maxi, fsm,
+        bt.dma_write(self.get_maxi('output'), fsm,
                      self.output_rams[0], laddr, gaddr, self.dma_size, use_async=True)
 
         fsm(
@@ -309,7 +312,7 @@ class upsampling2d(bt._ElementwiseOperator):
         fsm.If(out_pos_col == self.max_out_pos_col,
                out_pos_row == self.max_out_pos_row).goto_next()
 
-        bt.bus_unlock(self.maxi, fsm)
+        bt.bus_unlock(self.get_maxi('output'), fsm)
 
         fsm.goto_next()
 
@@ -389,16 +392,16 @@ class upsampling2d(bt._ElementwiseOperator):
         fsm(
             skip_write(0)
         )
-        fsm.If(comp_count == self.num_comp - 1)(
+        fsm.If(comp_count == num_comp - 1)(
             skip_read(1),
             skip_comp(1)
         )
 
-        fsm.If(comp_count < self.num_comp).goto(state_read)
-        fsm.If(comp_count == self.num_comp).goto_next()
+        fsm.If(comp_count < num_comp).goto(state_read)
+        fsm.If(comp_count == num_comp).goto_next()
 
         # wait for last DMA write
-        bt.dma_wait_write(self.maxi, fsm)
+        bt.dma_wait_write(self.get_maxi('output'), fsm)
 
     def eval(self, memo, input_dict, **kwargs):
         if id(self) in memo:
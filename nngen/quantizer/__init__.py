@@ -2,16 +2,21 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import numpy as np
+
 import nngen.basic_types as bt
 
 from . import conv2d
 from . import matmul
 from . import normalize
+from . import cache as qcache
+from .cache import QuantizeCache
 
 
 # describe custom quantize methods here
 func_map = {
     'conv2d': conv2d.conv2d,
+    'depthwise_conv2d': conv2d.conv2d,
     'matmul': matmul.matmul,
     'normalize': normalize.normalize,
     'scaled_add': normalize.scaled_add,
@@ -32,9 +37,11 @@ def _get_func(op_type):
 
 class _QuantizeVisitor(object):
 
-    def __init__(self, value_ranges, num_trials=5):
+    def __init__(self, value_ranges, num_trials=5, cache=None, seed=None):
         self.value_ranges = value_ranges
         self.num_trials = num_trials
+        self.cache = cache
+        self.seed = seed
 
     def generic_visit(self, node):
 
@@ -70,12 +77,41 @@ class _QuantizeVisitor(object):
         if node_func is None:
             raise NotImplementedError()
 
-        node_func(self, node)
+        if self.cache is None and self.seed is None:
+            node_func(self, node)
+        else:
+            self.cached_visit(node, node_func)
+
         node.quantized = True
 
+    def cached_visit(self, node, node_func):
+
+        # the key depends on the quantized arguments
+        for arg in node.args:
+            self.visit(arg)
+
+        objs = qcache.get_state_objs(node)
+        key = qcache.make_key(node, objs, self.value_ranges, self.num_trials, self.seed)
+
+        # random trials of each node are independent of the other nodes
+        if self.seed is not None:
+            np.random.seed(int(key[:8], 16))
+
+        entry = self.cache.get(key) if self.cache is not None else None
+
+        if entry is not None:
+            qcache.apply_entry(objs, entry)
+            return
+
+        snapshots = [dict(obj.__dict__) for obj in objs]
+        node_func(self, node)
+
+        if self.cache is not None:
+            self.cache.put(key, qcache.make_entry(objs, snapshots))
+
 
 def quantize(outputs,
-             value_ranges=None, num_trials=5):
+             value_ranges=None, num_trials=5, cache=None, seed=None):
     """
     Quantize pre-trained weights and determine right-shift amounts
 
@@ -90,6 +126,15 @@ def quantize(outputs,
 
     num_trials : int
         number of sampling trials to determine right-shift amounts
+
+    cache : QuantizeCache or str
+        cache of the quantization results (or its directory name).
+        Only the changed nodes and their downstream nodes are recomputed.
+
+    seed : int
+        random seed of the sampling trials. If specified, the trials of
+        each node are seeded by its cache key, so that the results do not
+        depend on the visiting order or on cache hits of the other nodes.
     """
 
     if isinstance(outputs, dict):
@@ -98,7 +143,14 @@ def quantize(outputs,
     if value_ranges is None:
         value_ranges = {}
 
-    visitor = _QuantizeVisitor(value_ranges, num_trials=num_trials)
+    if seed is not None:
+        random_state = np.random.get_state()
+
+    visitor = _QuantizeVisitor(value_ranges, num_trials=num_trials,
+                               cache=qcache.to_cache(cache), seed=seed)
 
     for output in outputs:
         visitor.visit(output)
+
+    if seed is not None:
+        np.random.set_state(random_state)
@@ -0,0 +1,204 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os
+import hashlib
+import pickle
+import tempfile
+
+import numpy as np
+
+import nngen.basic_types as bt
+import nngen.dtype_list as dtype_list
+
+
+# attributes which do not affect the quantization result
+ignored_attrs = ('object_id', 'name', 'consumers', 'args', 'quantized', 'scale_factor')
+
+
+class QuantizeCache(object):
+    """
+    Content-addressed cache of quantization results
+
+    A result is stored per node by a hash of the node type, its attributes,
+    the dtypes, shapes, values and scale factors of its arguments,
+    the value ranges, num_trials and seed.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the results. If None, results are kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+        if self.path is not None and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+
+        if self.path is not None:
+            filename = self._filename(key)
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as f:
+                    entry = pickle.load(f)
+                self.entries[key] = entry
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+
+        if self.path is None:
+            return
+
+        # write and rename, so that concurrent workers never read a partial file
+        fd, tmpname = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, protocol=4)
+        os.replace(tmpname, self._filename(key))
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+
+def to_cache(cache):
+    if cache is None or isinstance(cache, QuantizeCache):
+        return cache
+
+    if isinstance(cache, str):
+        return QuantizeCache(cache)
+
+    raise TypeError("cache must be QuantizeCache, str, or None, not '%s'" %
+                    str(type(cache)))
+
+
+def get_state_objs(node):
+    """ node and its arguments, whose attributes the quantizer may update """
+
+    objs = [node]
+    for arg in node.args:
+        if isinstance(arg, bt._Numeric) and arg not in objs:
+            objs.append(arg)
+
+        # derived_variable (e.g. winograd_filter): the source is quantized
+        orig = getattr(arg, 'src', None)
+        if isinstance(orig, bt._Numeric) and orig not in objs:
+            objs.append(orig)
+
+    return objs
+
+
+def make_key(node, objs, value_ranges, num_trials, seed):
+    h = hashlib.sha256()
+
+    def update(*values):
+        for value in values:
+            h.update(_encode(value))
+            h.update(b'\x00')
+
+    update(node.__class__.__name__, num_trials, seed)
+
+    for i, obj in enumerate(objs):
+        update(i, obj.__class__.__name__)
+
+        for attr in sorted(obj.__dict__.keys()):
+            if attr in ignored_attrs:
+                continue
+            update(attr, obj.__dict__[attr])
+
+        # the input scale factor is the result of the upstream quantization
+        if i > 0:
+            update('scale_factor', getattr(obj, 'scale_factor', None))
+
+        if isinstance(obj, bt._Storage):
+            update('value', obj.value)
+
+        if obj.name is not None and obj.name in value_ranges:
+            update('value_range', tuple(value_ranges[obj.name]))
+
+    return h.hexdigest()
+
+
+def _encode(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return repr(value).encode()
+
+    if isinstance(value, (float, np.floating)):
+        return float(value).hex().encode()
+
+    if isinstance(value, np.integer):
+        return repr(int(value)).encode()
+
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return b'ndarray:' + str(value.dtype).encode() + repr(value.shape).encode() + \
+            hashlib.sha256(value.tobytes()).digest()
+
+    if isinstance(value, (tuple, list)):
+        return b'(' + b','.join([_encode(v) for v in value]) + b')'
+
+    if isinstance(value, dict):
+        return b'{' + b','.join([_encode(k) + b':' + _encode(v)
+                                 for k, v in sorted(value.items(), key=lambda x: repr(x[0]))]) + b'}'
+
+    if isinstance(value, dtype_list.dtype_info):
+        return ('dtype:' + value.to_str()).encode()
+
+    if isinstance(value, type):
+        # classes made by get_leaky_relu_op() have the parameters as attributes
+        return ('class:%s.%s:%s:%s' % (value.__module__, value.__name__,
+                                       getattr(value, 'slope', None),
+                                       getattr(value, 'rshift', None))).encode()
+
+    if isinstance(value, bt._Numeric):
+        # the other nodes are identified by the position in the arguments
+        return b'node'
+
+    return ('object:' + value.__class__.__name__).encode()
+
+
+def make_entry(objs, snapshots):
+    """ list of (object index, attribute, value) updated by the quantizer """
+
+    entry = []
+    for i, (obj, snapshot) in enumerate(zip(objs, snapshots)):
+        for attr, value in obj.__dict__.items():
+            if attr in ('consumers', 'args', 'quantized'):
+                continue
+
+            if attr in snapshot and _is_same(snapshot[attr], value):
+                continue
+
+            entry.append((i, attr, value))
+
+    return entry
+
+
+def apply_entry(objs, entry):
+    for i, attr, value in entry:
+        setattr(objs[i], attr, value)
+
+
+def _is_same(a, b):
+    if a is b:
+        return True
+
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return False
+
+    try:
+        return bool(a == b) and type(a) == type(b)
+    except (ValueError, TypeError):
+        return False
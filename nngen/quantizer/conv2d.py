@@ -5,6 +5,7 @@ from __future__ import division
 import numpy as np
 
 from . import util
+from . import normalize
 
 
 def conv2d(visitor, node):
@@ -40,10 +41,25 @@ def conv2d(visitor, node):
     if rshift_out is not None:
         visitor.visit(rshift_out)
 
+    residual = (node.args[node.args_dict['residual']]
+                if getattr(node, 'has_residual', False) else None)
+
+    if residual is not None:
+        visitor.visit(residual)
+
+    # winograd: quantize the original filter behind the transformed one
+    winograd_filter = None
+    if getattr(node, 'algorithm', None) == 'winograd':
+        winograd_filter = filter
+        filter = filter.src
+
     q_filter_value, filter_scale_factor = util.quantize_linear(filter.value, filter.dtype.width)
     filter.set_value(q_filter_value)
     filter.scale_factor = filter_scale_factor
 
+    if winograd_filter is not None:
+        winograd_filter.scale_factor = filter_scale_factor
+
     if bias is not None:
         bias_value = bias.value
         if isinstance(bias_value, (tuple, list)):
@@ -108,6 +124,28 @@ def conv2d(visitor, node):
         node.scale_factor = (input.scale_factor * filter_scale_factor *
                              scale_scale_factor)
 
+    if residual is not None:
+        quantize_residual(visitor, node, residual)
+
+
+def quantize_residual(visitor, node, residual):
+    """ fused residual add: same scales as scaled_add """
+
+    (q_a_scale_value, a_scale_scale_factor,
+     q_b_scale_value, b_scale_scale_factor) = normalize.find_scaled_add_scales(
+         node.scale_factor, node.dtype.width, residual.scale_factor, residual.dtype.width)
+
+    node.residual_a_scale = int(q_a_scale_value)
+    node.residual_b_scale = int(q_b_scale_value)
+
+    q_shamt = find_optimal_residual_shamt(node, residual,
+                                          node.residual_a_scale, node.residual_b_scale,
+                                          value_ranges=visitor.value_ranges,
+                                          num_trials=visitor.num_trials)
+    node.residual_shamt = q_shamt
+    node.scale_factor = max(node.scale_factor * a_scale_scale_factor,
+                            residual.scale_factor * b_scale_scale_factor) / (2 ** q_shamt)
+
 
 def find_optimal_rshift(node, filter, bias, scale,
                         value_ranges={}, num_trials=5,
@@ -176,12 +214,21 @@ def try_rshift(node, input, filter, bias, scale,
     kwargs['mul_dtype'] = node.mul_dtype
     kwargs['sum_dtype'] = node.sum_dtype
     kwargs['name'] = node.name
-    kwargs['par_ich'] = node.par_ich
-    kwargs['par_och'] = node.par_och
-    kwargs['par_col'] = node.par_col
-    kwargs['par_row'] = node.par_row
-    kwargs['concur_och'] = node.concur_och
-    kwargs['stationary'] = node.stationary
+    kwargs['par_ich'] = getattr(node, 'par_ich', 1)
+    kwargs['par_och'] = getattr(node, 'par_och', 1)
+    kwargs['par_col'] = getattr(node, 'par_col', 1)
+    kwargs['par_row'] = getattr(node, 'par_row', 1)
+    kwargs['concur_och'] = getattr(node, 'concur_och', None)
+    kwargs['stationary'] = getattr(node, 'stationary', 'filter')
+
+    if 'depthwise' in method.__name__:
+        del kwargs['par_ich']
+        del kwargs['par_och']
+        del kwargs['par_col']
+        del kwargs['par_row']
+        del kwargs['concur_och']
+        del kwargs['stationary']
+        kwargs['par'] = node.par
 
     if 'matmul' in method.__name__:
         del kwargs['strides']
@@ -202,3 +249,57 @@ def try_rshift(node, input, filter, bias, scale,
     num_overflow = np.sum(neg_overflow + pos_overflow)
 
     return num_overflow
+
+
+def find_optimal_residual_shamt(node, residual, a_scale, b_scale,
+                                value_ranges={}, num_trials=5,
+                                allowed_rate=0.05, input_threshold=3.0):
+
+    import nngen.verify as verify
+
+    shamt = 0
+
+    a_input_bits = node.dtype.width
+
+    if residual.name in value_ranges:
+        min_val, max_val = value_ranges[residual.name]
+        abs_min_val = abs(min_val)
+        abs_max_val = abs(max_val)
+        max_abs_range = max(abs_min_val, abs_max_val)
+        b_input_bits = max_abs_range.bit_length() + 1
+    else:
+        b_input_bits = residual.dtype.width
+
+    out_length = node.length
+
+    while True:
+        acc_overflow = 0
+
+        for _ in range(num_trials):
+            a_input = np.random.normal(size=node.length).reshape(node.shape)
+            a_input = np.clip(a_input, -input_threshold, input_threshold)
+            a_input = a_input * (2.0 ** (a_input_bits - 1) - 1) / input_threshold
+            a_input = np.round(a_input).astype(np.int64)
+
+            b_input = np.random.normal(size=residual.length).reshape(residual.shape)
+            b_input = np.clip(b_input, -input_threshold, input_threshold)
+            b_input = b_input * (2.0 ** (b_input_bits - 1) - 1) / input_threshold
+            b_input = np.round(b_input).astype(np.int64)
+
+            rslt = verify.scaled_add(a_input, b_input, a_scale, b_scale, shamt,
+                                     dtype=node.dtype, sum_dtype=node.sum_dtype)
+
+            half_range = (2 ** (node.dtype.width - 1)) - 1
+            neg_overflow = np.where(rslt <= - half_range,
+                                    np.ones_like(rslt), np.zeros_like(rslt))
+            pos_overflow = np.where(rslt >= half_range,
+                                    np.ones_like(rslt), np.zeros_like(rslt))
+            acc_overflow += np.sum(neg_overflow + pos_overflow)
+
+        rate = acc_overflow / (out_length * num_trials)
+        if rate <= allowed_rate:
+            break
+
+        shamt += 1
+
+    return shamt
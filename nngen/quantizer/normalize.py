@@ -116,22 +116,9 @@ def scaled_add(visitor, node):
     visitor.visit(a)
     visitor.visit(b)
 
-    max_scale_factor = max(a.scale_factor, b.scale_factor)
-    a_scale_value = max_scale_factor / a.scale_factor
-    b_scale_value = max_scale_factor / b.scale_factor
-
-    if max_scale_factor == a.scale_factor:
-        q_b_scale_value, b_scale_scale_factor = util.quantize_linear_scale(b_scale_value,
-                                                                           b.dtype.width)
-        a_scale_value = np.round(b_scale_scale_factor).astype(np.int64)
-        q_a_scale_value = a_scale_value
-        a_scale_scale_factor = a_scale_value
-    elif max_scale_factor == b.scale_factor:
-        q_a_scale_value, a_scale_scale_factor = util.quantize_linear_scale(a_scale_value,
-                                                                           a.dtype.width)
-        b_scale_value = np.round(a_scale_scale_factor).astype(np.int64)
-        q_b_scale_value = b_scale_value
-        b_scale_scale_factor = b_scale_value
+    (q_a_scale_value, a_scale_scale_factor,
+     q_b_scale_value, b_scale_scale_factor) = find_scaled_add_scales(
+         a.scale_factor, a.dtype.width, b.scale_factor, b.dtype.width)
 
     node.a_scale = int(q_a_scale_value)
     node.b_scale = int(q_b_scale_value)
@@ -144,6 +131,28 @@ def scaled_add(visitor, node):
                             b.scale_factor * b_scale_scale_factor) / (2 ** q_shamt)
 
 
+def find_scaled_add_scales(a_scale_factor, a_width, b_scale_factor, b_width):
+
+    max_scale_factor = max(a_scale_factor, b_scale_factor)
+    a_scale_value = max_scale_factor / a_scale_factor
+    b_scale_value = max_scale_factor / b_scale_factor
+
+    if max_scale_factor == a_scale_factor:
+        q_b_scale_value, b_scale_scale_factor = util.quantize_linear_scale(b_scale_value,
+                                                                           b_width)
+        a_scale_value = np.round(b_scale_scale_factor).astype(np.int64)
+        q_a_scale_value = a_scale_value
+        a_scale_scale_factor = a_scale_value
+    else:
+        q_a_scale_value, a_scale_scale_factor = util.quantize_linear_scale(a_scale_value,
+                                                                           a_width)
+        b_scale_value = np.round(a_scale_scale_factor).astype(np.int64)
+        q_b_scale_value = b_scale_value
+        b_scale_scale_factor = b_scale_value
+
+    return q_a_scale_value, a_scale_scale_factor, q_b_scale_value, b_scale_scale_factor
+
+
 def find_optimal_shamt_scaled_add(node, a_scale, b_scale,
                                   value_ranges={}, num_trials=5,
                                   allowed_rate=0.05, input_threshold=3.0):
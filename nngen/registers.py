@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import collections
+
+# S-AXI register indices of an NNgen IP-core.
+# This module does not import the HDL backend, so that the host runtime
+# (nngen.runtime) shares the indices with the hardware (nngen.verilog).
+
+num_header_regs = 4
+header_reg = 0
+
+num_control_regs = 6
+control_reg_start = num_header_regs + 0
+control_reg_busy = num_header_regs + 1
+control_reg_reset = num_header_regs + 2
+control_reg_extern_send = num_header_regs + 3
+control_reg_extern_recv = num_header_regs + 4
+control_reg_global_offset = num_header_regs + 5
+
+control_reg_global_addr = num_header_regs + num_control_regs
+
+# when config['use_map_ram'] is True
+num_addr_map_regs = 3
+control_reg_load_global_addr_map = num_header_regs + num_control_regs
+control_reg_busy_global_addr_map = num_header_regs + num_control_regs + 1
+control_reg_addr_global_addr_map = num_header_regs + num_control_regs + 2
+
+# when config['dataflow_segments'] is not 0, after the address map registers
+num_frame_queue_regs = 4
+frame_queue_reg_slots = 0
+frame_queue_reg_num = 1
+frame_queue_reg_queued = 2
+frame_queue_reg_done = 3
+
+
+class RegisterLayout(collections.namedtuple('RegisterLayout',
+                                            ['num_regs', 'frame_queue_reg', 'batch_reg'])):
+    """
+    S-AXI registers of a generated module
+
+    'num_regs' is the number of registers, 'frame_queue_reg' is the index
+    of the first frame queue register (None without dataflow_segments),
+    and 'batch_reg' is the index of the batch size register
+    (None without dynamic_batch).
+    """
+
+
+def make_register_layout(config, num_storages, num_input_storages, num_output_storages):
+    """ S-AXI registers of a module generated with config """
+
+    num_unified_storages = 1
+    num_temporal_storages = 1
+
+    if config['use_map_ram']:
+        num_regs = num_header_regs + num_control_regs + num_addr_map_regs
+    elif not config['use_map_reg']:
+        num_regs = (num_header_regs + num_control_regs +
+                    num_temporal_storages + num_input_storages + num_output_storages +
+                    num_unified_storages)
+    else:
+        num_regs = (num_header_regs + num_control_regs +
+                    num_temporal_storages + num_storages)
+
+    frame_queue_reg = None
+    if config['dataflow_segments']:
+        frame_queue_reg = num_regs
+        num_regs += num_frame_queue_regs
+
+    batch_reg = None
+    if config['dynamic_batch']:
+        batch_reg = num_regs
+        num_regs += 1
+
+    return RegisterLayout(num_regs, frame_queue_reg, batch_reg)
@@ -0,0 +1,487 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+import collections
+
+from . import basic_types as bt
+
+
+class Resources(collections.namedtuple('Resources',
+                                       ['lut', 'ff', 'bram18', 'uram', 'dsp'])):
+    """
+    Amount of FPGA primitives
+
+    'bram18' counts 18Kb block RAM halves, so that two of them are
+    one 36Kb block RAM tile.
+    """
+
+    def __new__(cls, lut=0, ff=0, bram18=0, uram=0, dsp=0):
+        return super(Resources, cls).__new__(cls, lut, ff, bram18, uram, dsp)
+
+    def __add__(self, other):
+        return Resources(*[a + b for a, b in zip(self, other)])
+
+    def __mul__(self, num):
+        return Resources(*[a * num for a in self])
+
+    @property
+    def bram36(self):
+        return self.bram18 / 2
+
+
+class DeviceProfile(collections.namedtuple('DeviceProfile',
+                                           ['name', 'family', 'lut', 'ff',
+                                            'bram36', 'uram', 'dsp'])):
+    """
+    Capacity of an FPGA device
+
+    'family' is '7series' (DSP48E1, 25x18 multiplier) or
+    'ultrascale+' (DSP48E2, 27x18 multiplier).
+    """
+
+
+device_profiles = collections.OrderedDict([
+    ('xc7z020', DeviceProfile('xc7z020', '7series', 53200, 106400, 140, 0, 220)),
+    ('xc7z045', DeviceProfile('xc7z045', '7series', 218600, 437200, 545, 0, 900)),
+    ('xczu3eg', DeviceProfile('xczu3eg', 'ultrascale+', 70560, 141120, 216, 0, 360)),
+    ('xczu7ev', DeviceProfile('xczu7ev', 'ultrascale+', 230400, 460800, 312, 96, 1728)),
+    ('xczu9eg', DeviceProfile('xczu9eg', 'ultrascale+', 274080, 548160, 912, 0, 2520)),
+    ('xcu250', DeviceProfile('xcu250', 'ultrascale+', 1728000, 3456000, 2688, 1280, 12288)),
+])
+
+# board names
+device_profiles['pynq-z1'] = device_profiles['xc7z020']
+device_profiles['pynq-z2'] = device_profiles['xc7z020']
+device_profiles['zc706'] = device_profiles['xc7z045']
+device_profiles['ultra96'] = device_profiles['xczu3eg']
+device_profiles['zcu104'] = device_profiles['xczu7ev']
+device_profiles['zcu102'] = device_profiles['xczu9eg']
+device_profiles['u250'] = device_profiles['xcu250']
+
+dsp_widths = {'7series': (25, 18), 'ultrascale+': (27, 18)}
+
+# (depth, width) aspect ratios of a true dual-port block RAM
+bram18_aspects = ((16384, 1), (8192, 2), (4096, 4), (2048, 9), (1024, 18))
+bram36_aspects = ((32768, 1), (16384, 2), (8192, 4), (4096, 9), (2048, 18), (1024, 36))
+uram_aspect = (4096, 72)
+
+# fabric cost of the logic around the primitives (per bit unless noted)
+lut_per_adder_bit = 1
+ff_per_pipeline_bit = 1
+lut_per_pattern_bit = 2
+ff_per_pattern_bit = 3
+lut_per_fsm_state = 4
+ff_per_reg_bit = 1
+lut_per_lutram_bit = 2 / 64
+axi_interface = Resources(lut=1500, ff=2000)
+maxi_port_interface = Resources(lut=600, ff=900)  # each additional AXI master port
+
+
+RamSpec = collections.namedtuple('RamSpec', ['name', 'width', 'depth', 'numbanks', 'numports'])
+StreamSpec = collections.namedtuple('StreamSpec',
+                                    ['name', 'num_patterns', 'num_constants',
+                                     'max_pattern_length', 'addrwidth', 'datawidth'])
+ControlParamSpec = collections.namedtuple('ControlParamSpec',
+                                          ['name', 'num_entries', 'width', 'use_ram'])
+OperatorUsage = collections.namedtuple('OperatorUsage',
+                                       ['stage', 'name', 'op', 'rams', 'substreams',
+                                        'stream', 'control_params'])
+
+
+class ResourceEstimate(object):
+    """
+    Pre-synthesis estimate of the FPGA resources of a generated module
+
+    On-chip RAMs are mapped onto 18Kb/36Kb block RAMs (or UltraRAMs,
+    if 'onchip_ram_style' requests them and the device has them),
+    multipliers of substreams onto DSP slices, and the adders, pipeline
+    registers, address generators of streams, control FSMs and control
+    parameter tables onto LUTs and FFs by a simple per-bit cost model.
+    The RAM and DSP counts follow the allocation exactly, while the LUT
+    and FF counts are rough.
+
+    RAMs and substreams are shared by the operators of different stages,
+    so that the usage of each operator ('operators') is what it requires
+    by itself, and the sum over the operators may exceed the total.
+
+    Parameters
+    ----------
+    rams : list
+        RamSpec of each RAM
+
+    substreams : list
+        (key, num) of substreams
+
+    streams : list
+        StreamSpec of each stream
+
+    controls : list
+        Number of states of each control FSM
+
+    control_params : list
+        ControlParamSpec of each control parameter table
+
+    operators : list
+        OperatorUsage of each operator
+
+    num_regs : int
+        Number of S-AXI registers
+
+    ram_style : str, optional
+        'onchip_ram_style' of the configuration
+
+    device : str or DeviceProfile, optional
+        Default target device of the report
+
+    maxi_ports : int, optional
+        Number of AXI master ports, including the ports of the replicated
+        cores and the dataflow segments, and the internal port to the
+        on-chip activation memory
+    """
+
+    def __init__(self, rams, substreams, streams, controls, control_params, operators,
+                 num_regs, ram_style=None, device=None, maxi_ports=1):
+        self.rams = rams
+        self.substreams = substreams
+        self.streams = streams
+        self.controls = controls
+        self.control_params = control_params
+        self.operators = operators
+        self.num_regs = num_regs
+        self.ram_style = ram_style
+        self.device = device
+        self.maxi_ports = maxi_ports
+
+    def _profile(self, device):
+        if device is None:
+            device = self.device
+        return get_device_profile(device)
+
+    def _family(self, profile):
+        return profile.family if profile is not None else 'ultrascale+'
+
+    def ram_resources(self, spec, device=None):
+        profile = self._profile(device)
+        use_uram = (profile is not None and profile.uram > 0 and
+                    self.ram_style is not None and 'ultra' in self.ram_style)
+        use_lutram = self.ram_style is not None and 'distributed' in self.ram_style
+        return map_ram(spec.width, spec.depth, use_uram, use_lutram) * spec.numbanks
+
+    def substream_resources(self, key, device=None):
+        return map_substream(key, self._family(self._profile(device)))
+
+    def stream_resources(self, spec):
+        return map_stream(spec)
+
+    def control_param_resources(self, spec):
+        return map_control_param(spec)
+
+    def total(self, device=None):
+        """ total resources of the module """
+
+        total = axi_interface
+        total += maxi_port_interface * (self.maxi_ports - 1)
+        total += Resources(lut=self.num_regs * 32 * lut_per_adder_bit // 2,
+                           ff=self.num_regs * 32 * ff_per_reg_bit)
+
+        for spec in self.rams:
+            total += self.ram_resources(spec, device)
+        for key, num in self.substreams:
+            total += self.substream_resources(key, device) * num
+        for spec in self.streams:
+            total += self.stream_resources(spec)
+        for num_states in self.controls:
+            total += map_fsm(num_states)
+        for spec in self.control_params:
+            total += self.control_param_resources(spec)
+
+        return Resources(*[int(math.ceil(v)) for v in total])
+
+    def operator_resources(self, usage, device=None):
+        """ resources required by an operator (OperatorUsage) by itself """
+
+        rams = collections.OrderedDict([(spec.name, spec) for spec in self.rams])
+        total = Resources()
+
+        for name in usage.rams:
+            total += self.ram_resources(rams[name], device)
+        for key, num in usage.substreams:
+            total += self.substream_resources(key, device) * num
+        if usage.stream is not None:
+            total += self.stream_resources(usage.stream)
+        if usage.control_params is not None:
+            total += self.control_param_resources(usage.control_params)
+
+        return Resources(*[int(math.ceil(v)) for v in total])
+
+    def utilization(self, device=None):
+        """ ratio of the total to the capacity of the device per resource """
+
+        profile = self._profile(device)
+        if profile is None:
+            raise ValueError('no device is specified.')
+
+        total = self.total(profile)
+        capacity = Resources(profile.lut, profile.ff, profile.bram36 * 2,
+                             profile.uram, profile.dsp)
+        return collections.OrderedDict(
+            [(name, (value / cap if cap > 0 else (0.0 if value == 0 else float('inf'))))
+             for name, value, cap in zip(Resources._fields, total, capacity)])
+
+    def fits(self, device=None):
+        """ whether the total fits in the device """
+
+        return all([ratio <= 1.0 for ratio in self.utilization(device).values()])
+
+    def to_str(self, device=None):
+        profile = self._profile(device)
+        total = self.total(profile)
+
+        s = []
+        s.append('[Resource Estimate] (device: %s)' %
+                 (profile.name if profile is not None else 'none'))
+
+        fmt = '  %-6s: %10s'
+        if profile is not None:
+            util = self.utilization(profile)
+            caps = (profile.lut, profile.ff, profile.bram36, profile.uram, profile.dsp)
+            values = (total.lut, total.ff, total.bram36, total.uram, total.dsp)
+            names = ('LUT', 'FF', 'BRAM36', 'URAM', 'DSP')
+            for name, value, cap, ratio in zip(names, values, caps, util.values()):
+                s.append((fmt + ' / %d (%.1f%%)') % (name, _num_str(value), cap, ratio * 100))
+            if not self.fits(profile):
+                s.append('  (does not fit)')
+        else:
+            s.append(fmt % ('LUT', _num_str(total.lut)))
+            s.append(fmt % ('FF', _num_str(total.ff)))
+            s.append(fmt % ('BRAM36', _num_str(total.bram36)))
+            s.append(fmt % ('URAM', _num_str(total.uram)))
+            s.append(fmt % ('DSP', _num_str(total.dsp)))
+
+        s.append('  (per operator: LUT, FF, BRAM36, URAM, DSP)')
+        for usage in self.operators:
+            r = self.operator_resources(usage, profile)
+            s.append('  (Stage %d) %s (%s): %d, %d, %s, %d, %d' %
+                     (usage.stage, usage.name, usage.op,
+                      r.lut, r.ff, _num_str(r.bram36), r.uram, r.dsp))
+
+        return '\n'.join(s)
+
+    def __str__(self):
+        return self.to_str()
+
+
+def get_device_profile(device):
+    if device is None or isinstance(device, DeviceProfile):
+        return device
+
+    key = device.lower()
+    if key not in device_profiles:
+        raise ValueError("unknown device: '%s'" % device)
+
+    return device_profiles[key]
+
+
+def map_ram(width, depth, use_uram=False, use_lutram=False):
+    """ primitives of a true dual-port RAM bank """
+
+    if use_uram:
+        num = int(math.ceil(depth / uram_aspect[0]) * math.ceil(width / uram_aspect[1]))
+        return Resources(uram=num)
+
+    if use_lutram:
+        return Resources(lut=width * depth * lut_per_lutram_bit)
+
+    num18 = min([int(math.ceil(depth / d) * math.ceil(width / w)) for d, w in bram18_aspects])
+    num36 = min([int(math.ceil(depth / d) * math.ceil(width / w)) for d, w in bram36_aspects])
+    return Resources(bram18=min(num18, num36 * 2))
+
+
+def map_multiplier(x_width, x_signed, y_width, y_signed, family='ultrascale+'):
+    """ primitives of a signed or unsigned multiplier """
+
+    # an unsigned operand takes a sign bit of the DSP input
+    x_width = x_width if x_signed else x_width + 1
+    y_width = y_width if y_signed else y_width + 1
+
+    # tiny multipliers are left to LUTs
+    if min(x_width, y_width) <= 2:
+        return Resources(lut=x_width * y_width, ff=x_width + y_width)
+
+    a, b = dsp_widths[family]
+    num = min(int(math.ceil(x_width / a) * math.ceil(y_width / b)),
+              int(math.ceil(y_width / a) * math.ceil(x_width / b)))
+    return Resources(dsp=num)
+
+
+def map_substream(key, family='ultrascale+'):
+    """ primitives of a substream by its key (method name, args) """
+
+    method_name, args = key
+
+    if method_name.startswith(('mul', 'mac', 'madd')):
+        x_width, _, x_signed, y_width, _, y_signed = args[:6]
+        r = map_multiplier(x_width, x_signed, y_width, y_signed, family)
+        out_width = max([w for w in args[6::3] if w is not None] + [x_width + y_width])
+        # shifter, rounding and clipping after the multiplier
+        return r + Resources(lut=out_width * lut_per_adder_bit,
+                             ff=out_width * 4 * ff_per_pipeline_bit)
+
+    if method_name.startswith(('div', 'div_const')):
+        width = max(args[0], args[3])
+        return Resources(lut=width * width * lut_per_adder_bit,
+                         ff=width * width * ff_per_pipeline_bit)
+
+    if method_name in ('add_tree', 'add_tree_rshift', 'add_tree_rshift_round',
+                       'add_tree_rshift_round_frac', '_max', 'average'):
+        width, _, _, num_vars = args[:4]
+        num_ops = max(num_vars - 1, 1)
+        depth = max(int(math.ceil(math.log(max(num_vars, 2), 3))), 1)
+        return Resources(lut=num_ops * width * lut_per_adder_bit,
+                         ff=(num_vars + depth) * width * ff_per_pipeline_bit)
+
+    # accumulators, shifters and comparators
+    widths = [w for w in args[0::3] if isinstance(w, int)]
+    width = max(widths) if widths else 32
+    return Resources(lut=2 * width * lut_per_adder_bit,
+                     ff=3 * width * ff_per_pipeline_bit)
+
+
+def map_stream(spec):
+    """ fabric of the address generators and the constant registers of a stream """
+
+    pattern_bits = (2 * spec.max_pattern_length + 1) * spec.addrwidth
+    return Resources(lut=spec.num_patterns * pattern_bits * lut_per_pattern_bit / 2,
+                     ff=(spec.num_patterns * pattern_bits * ff_per_pattern_bit / 3 +
+                         spec.num_constants * spec.datawidth * ff_per_reg_bit))
+
+
+def map_fsm(num_states):
+    width = max(int(math.ceil(math.log(max(num_states, 2), 2))), 1)
+    return Resources(lut=num_states * lut_per_fsm_state, ff=width + 32 * ff_per_reg_bit)
+
+
+def map_control_param(spec):
+    """ a multiplexer (or a RAM) of the control parameter values """
+
+    if spec.num_entries <= 1:
+        return Resources()
+
+    if spec.use_ram:
+        return map_ram(spec.width, spec.num_entries)
+
+    return Resources(lut=spec.width * int(math.ceil(spec.num_entries / 64)) *
+                     lut_per_adder_bit,
+                     ff=int(math.ceil(math.log(spec.num_entries, 2))))
+
+
+def estimate(config, schedule_table, ram_dict, substrm_dict, stream_cache,
+             control_param_dict, control_cache, main_fsm, num_regs):
+    """
+    Make a ResourceEstimate from the allocation of to_veriloggen()
+    """
+
+    from .verilog import (calc_control_param_width, get_num_maxi_ports,
+                          get_onchip_activation_bytes, module_dataflow_fsms)
+
+    rams = []
+    ram_names = {}
+    for (width, length), lst in sorted(ram_dict.items(), key=lambda x: x[0], reverse=True):
+        for ram in lst:
+            numbanks = getattr(ram, 'numbanks', 1)
+            spec = RamSpec(ram.name, width, 2 ** ram.addrwidth, numbanks, ram.numports)
+            rams.append(spec)
+            ram_names[id(ram)] = ram.name
+
+    # the on-chip activation memory and its internal AXI master port
+    num_maxi_ports = get_num_maxi_ports(config)
+    onchip_bytes = get_onchip_activation_bytes(config, schedule_table)
+    if onchip_bytes > 0:
+        width = config['maxi_datawidth']
+        depth = int(math.ceil(onchip_bytes * 8 / width))
+        rams.append(RamSpec('onchip_activation_mem', width, depth, 1, 2))
+        num_maxi_ports += 1
+
+    substreams = [(key, len(lst)) for key, lst in substrm_dict.items()]
+
+    stream_specs = {}
+    streams = []
+    for key, lst in stream_cache.items():
+        for strm, _ in lst:
+            if strm is None:
+                continue
+            spec = _stream_spec(strm)
+            streams.append(spec)
+            stream_specs[key] = spec
+
+    # the FSMs of the dataflow segments run along with the main FSM
+    controls = [_num_states(fsm) for fsm in
+                [main_fsm] + module_dataflow_fsms.get(main_fsm.m, [])]
+    for lst in control_cache.values():
+        for control, obj in lst:
+            controls.append(_num_states(control.fsm))
+
+    control_params = []
+    control_param_specs = {}
+    for key, values in control_param_dict.items():
+        width_dict, _ = calc_control_param_width(values)
+        width = sum([sum(w) if isinstance(w, (tuple, list)) else w
+                     for w in width_dict.values()])
+        use_ram = (config['use_param_ram'] and len(values) >= config['min_param_ram_len'])
+        name = stream_specs[key].name if key in stream_specs else None
+        spec = ControlParamSpec(name, len(values), width, use_ram)
+        control_params.append(spec)
+        control_param_specs[key] = spec
+
+    operators = []
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in objs:
+            if not bt.is_operator(obj) or bt.is_view(obj) or bt.is_removable_reshape(obj):
+                continue
+            if bt.is_output_chainable_operator(obj) and not obj.chain_head:
+                continue
+
+            used_rams = []
+            for ram in (list(getattr(obj, 'input_rams', None) or ()) +
+                        list(getattr(obj, 'output_rams', None) or ()) +
+                        list(getattr(obj, 'temp_rams', None) or ())):
+                if id(ram) in ram_names and ram_names[id(ram)] not in used_rams:
+                    used_rams.append(ram_names[id(ram)])
+
+            cnt = collections.Counter(obj.get_required_substreams())
+            key = obj.get_stream_hash()
+            operators.append(OperatorUsage(stage, obj.name, obj.__class__.__name__, used_rams,
+                                           sorted(cnt.items(), key=lambda x: x[0]),
+                                           stream_specs.get(key),
+                                           control_param_specs.get(key)))
+
+    return ResourceEstimate(rams, substreams, streams, controls, control_params, operators,
+                            num_regs, config['onchip_ram_style'], config['resource_device'],
+                            num_maxi_ports)
+
+
+def _stream_spec(strm):
+    num_patterns = 0
+    num_constants = 0
+    for name in strm.named_numerics.keys():
+        if '_source_' in name or '_sink_' in name:
+            num_patterns += 1
+        elif '_constant_' in name:
+            num_constants += 1
+
+    return StreamSpec(strm.name, num_patterns, num_constants,
+                      strm.max_pattern_length, strm.addrwidth, strm.datawidth)
+
+
+def _num_states(fsm):
+    indexes = set(fsm.body.keys())
+    indexes.update(set(fsm.jump.keys()))
+    return len(indexes)
+
+
+def _num_str(value):
+    if isinstance(value, float) and not value.is_integer():
+        return '%.1f' % value
+    return '%d' % value
@@ -0,0 +1,1038 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os
+import math
+import mmap
+import time
+import json
+import asyncio
+import threading
+import collections
+
+import numpy as np
+
+from . import basic_types as bt
+from . import storage as st
+from . import util
+from .operator.extern import extern
+from .registers import (RegisterLayout, control_reg_start, control_reg_busy,
+                        control_reg_reset, control_reg_extern_send,
+                        control_reg_extern_recv, control_reg_global_offset,
+                        control_reg_global_addr,
+                        frame_queue_reg_slots, frame_queue_reg_num,
+                        frame_queue_reg_queued, frame_queue_reg_done)
+
+wordsize_reg = 4
+
+
+class Region(collections.namedtuple('Region',
+                                    ['name', 'offset', 'shape', 'storage_shape',
+                                     'aligned_shape', 'width', 'signed',
+                                     'frame_slots', 'slot_size'])):
+    """
+    Placement of a storage in the off-chip buffer
+
+    'offset' is the byte offset from the global address offset,
+    'storage_shape' and 'aligned_shape' are the shape of the actual
+    storage before and after the word alignment of the last dimension,
+    and 'shape' is the shape seen by the user (an output may be a reshape).
+    In the dataflow mode, frame n is in slot (n % 'frame_slots')
+    of the 'frame_slots' copies placed 'slot_size' bytes apart.
+    """
+
+    @property
+    def memory_size(self):
+        return bt.shape_to_length(self.aligned_shape) * int(math.ceil(self.width / 8))
+
+
+class ExternRegion(collections.namedtuple('ExternRegion',
+                                          ['name', 'opcode', 'inputs', 'output'])):
+    """
+    Regions of the input values and the output of an extern operator
+    """
+
+
+class MemoryLayout(object):
+    """
+    Memory map of a compiled network in one off-chip buffer
+
+    Parameters
+    ----------
+    inputs : OrderedDict
+        Regions of placeholders
+
+    outputs : OrderedDict
+        Regions of outputs
+
+    variables : OrderedDict
+        Regions of variables and constants
+
+    params : np.ndarray
+        Image of variables and constants (np.uint8)
+
+    params_offset : int
+        Byte offset of the parameter image
+
+    size : int
+        Total size of the buffer in bytes including temporal storages
+
+    externs : list, optional
+        ExternRegion of extern operators in the execution order
+
+    registers : RegisterLayout, optional
+        S-AXI registers of the module
+    """
+
+    def __init__(self, inputs, outputs, variables, params, params_offset, size,
+                 externs=None, registers=None):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.variables = variables
+        self.params = params
+        self.params_offset = params_offset
+        self.size = size
+        self.externs = externs if externs is not None else []
+        self.registers = registers
+
+    def save(self, filename):
+        """ save the layout and the parameter image to a .npz file """
+
+        regions = collections.OrderedDict()
+        for key in ('inputs', 'outputs', 'variables'):
+            regions[key] = [list(region) for region in getattr(self, key).values()]
+
+        externs = [[e.name, e.opcode, [list(r) for r in e.inputs], list(e.output)]
+                   for e in self.externs]
+
+        meta = json.dumps({'regions': regions,
+                           'externs': externs,
+                           'registers': (list(self.registers)
+                                         if self.registers is not None else None),
+                           'params_offset': self.params_offset,
+                           'size': self.size})
+
+        with open(filename, 'wb') as f:
+            np.savez(f, meta=np.array(meta), params=self.params)
+
+    def __repr__(self):
+        return ('<MemoryLayout inputs:%s outputs:%s size:%d>' %
+                (list(self.inputs.keys()), list(self.outputs.keys()), self.size))
+
+
+def make_memory_layout(objs, chunk_size=64):
+    """
+    Extract the memory layout of a network converted by to_veriloggen()
+
+    Parameters
+    ----------
+    objs : list
+        Output objects passed to to_veriloggen()
+
+    chunk_size : int
+        'offchipram_chunk_bytes' of the configuration
+
+    Returns
+    -------
+    layout : MemoryLayout
+    """
+
+    if not isinstance(objs, (list, tuple)):
+        objs = [objs]
+
+    numerics = util._collect_numerics(objs)
+    if any([obj.addr < 0 for obj in numerics if bt.is_storage(obj) and obj.maxi is not None]):
+        raise ValueError('addresses are not assigned. call to_veriloggen() first.')
+
+    inputs = collections.OrderedDict()
+    variables = collections.OrderedDict()
+    param_objs = []
+
+    storages = [obj for obj in numerics
+                if bt.is_storage(obj) and obj.maxi is not None and obj.global_index is not None]
+
+    for obj in sorted(storages, key=lambda x: (x.global_index, x.addr)):
+        if isinstance(obj, st.placeholder):
+            inputs[obj.name] = _make_region(obj, obj, chunk_size)
+        elif isinstance(obj, (st.variable, st.constant)):
+            variables[obj.name] = _make_region(obj, obj, chunk_size)
+            param_objs.append(obj)
+
+    outputs = collections.OrderedDict()
+    for obj in objs:
+        src = _actual_storage(obj)
+        outputs[src.name] = _make_region(obj, src, chunk_size)
+
+    size = 0
+    for obj in numerics:
+        if obj.maxi is None or obj.addr < 0:
+            continue
+        size = max(size, obj.addr +
+                   util.aligned_size(obj.memory_size, chunk_size) * obj.frame_slots)
+
+    params = util.make_ndarray([obj for obj in param_objs if isinstance(obj, st.variable)],
+                               [obj for obj in param_objs if isinstance(obj, st.constant)],
+                               chunk_size)
+    params_offset = min([obj.addr for obj in param_objs]) if param_objs else 0
+
+    externs = [ExternRegion(obj.name, obj.opcode,
+                            [_make_region(arg, _actual_storage(arg), chunk_size)
+                             for arg in obj.args],
+                            _make_region(obj, obj, chunk_size))
+               for obj in _collect_externs(numerics)]
+
+    return MemoryLayout(inputs, outputs, variables, params, params_offset, size, externs,
+                        objs[0].register_layout)
+
+
+def load_memory_layout(filename):
+    """ load a layout saved by MemoryLayout.save() """
+
+    with np.load(filename) as f:
+        meta = json.loads(str(f['meta']))
+        params = f['params']
+
+    def to_region(r):
+        return Region(r[0], r[1], tuple(r[2]), tuple(r[3]), tuple(r[4]), r[5], r[6],
+                      r[7], r[8])
+
+    regions = []
+    for key in ('inputs', 'outputs', 'variables'):
+        regions.append(collections.OrderedDict(
+            [(r[0], to_region(r)) for r in meta['regions'][key]]))
+
+    externs = [ExternRegion(e[0], e[1], [to_region(r) for r in e[2]], to_region(e[3]))
+               for e in meta['externs']]
+
+    registers = meta.get('registers')
+    if registers is not None:
+        registers = RegisterLayout(*registers)
+
+    return MemoryLayout(regions[0], regions[1], regions[2],
+                        params, meta['params_offset'], meta['size'], externs, registers)
+
+
+def _make_region(obj, src, chunk_size):
+    return Region(src.name, src.addr, tuple(obj.shape), tuple(src.shape),
+                  tuple(src.get_aligned_shape()), src.dtype.width, src.dtype.signed,
+                  src.frame_slots, util.aligned_size(src.memory_size, chunk_size))
+
+
+def _actual_storage(obj):
+    while bt.is_view(obj) or bt.is_removable_reshape(obj):
+        obj = obj.args[0]
+    return obj
+
+
+def _collect_externs(numerics):
+    externs = [obj for obj in numerics if isinstance(obj, extern)]
+    return sorted(externs, key=lambda x: (x.stage, x.object_id))
+
+
+def _get_max_batch(layout):
+    """ declared batch size of the dynamic batch mode (the first axis of the first input) """
+
+    return list(layout.inputs.values())[0].shape[0]
+
+
+def make_view(memory, region, offset=0, frame=0):
+    """
+    Zero-copy numpy view of a region in a byte buffer
+
+    Parameters
+    ----------
+    memory : np.ndarray
+        Buffer (np.uint8)
+
+    region : Region
+        Target region
+
+    offset : int
+        Byte offset of the network in the buffer
+
+    frame : int
+        Frame of the dataflow mode, whose slot is viewed
+
+    Returns
+    -------
+    view : np.ndarray
+        Array of 'region.storage_shape'. The padding of the word alignment
+        is sliced away, so the view is not contiguous if the last dimension
+        is not aligned.
+    """
+
+    if region.width not in (8, 16, 32, 64):
+        raise TypeError('no numpy view of %d-bit storage: %s' %
+                        (region.width, region.name))
+
+    dtype = np.dtype('<%s%d' % ('i' if region.signed else 'u', region.width // 8))
+    start = offset + region.offset + (frame % region.frame_slots) * region.slot_size
+    array = memory[start:start + region.memory_size].view(dtype)
+    return array.reshape(region.aligned_shape)[..., :region.storage_shape[-1]]
+
+
+class _Device(object):
+    """
+    S-AXI registers (np.uint32) and DMA buffer (np.uint8) of an NNgen IP-core
+    """
+
+    phys_addr = 0
+    regs = None
+    memory = None
+
+    def read_reg(self, index):
+        return int(self.regs[index])
+
+    def write_reg(self, index, value):
+        self.regs[index] = value
+
+    def close(self):
+        pass
+
+
+class MmapDevice(_Device):
+    """
+    NNgen IP-core mapped into the process with mmap
+
+    Parameters
+    ----------
+    regs : int or str
+        Physical address of the S-AXI register block (mapped via /dev/mem),
+        or a UIO device ('uio0' or '/dev/uio0') whose first map is the register block
+
+    buf : int or str
+        Physical address of a physically contiguous DMA buffer (mapped via /dev/mem),
+        or a u-dma-buf device ('udmabuf0' or '/dev/udmabuf0')
+
+    buf_size : int, optional
+        Size of the DMA buffer in bytes (required for a physical address)
+
+    reg_size : int, optional
+        Size of the register block in bytes
+    """
+
+    def __init__(self, regs, buf, buf_size=None, reg_size=4096):
+        if isinstance(regs, str):
+            name = os.path.basename(regs)
+            sysfs = '/sys/class/uio/%s/maps/map0' % name
+            if os.path.exists(sysfs):
+                reg_size = _read_sysfs_int(sysfs + '/size')
+            self._reg_map = _map('/dev/' + name, 0, reg_size)
+        else:
+            self._reg_map = _map('/dev/mem', regs, reg_size)
+
+        if isinstance(buf, str):
+            name = os.path.basename(buf)
+            sysfs = '/sys/class/u-dma-buf/%s' % name
+            self.phys_addr = _read_sysfs_int(sysfs + '/phys_addr')
+            if buf_size is None:
+                buf_size = _read_sysfs_int(sysfs + '/size')
+            self._buf_map = _map('/dev/' + name, 0, buf_size)
+        else:
+            if buf_size is None:
+                raise ValueError('buf_size is required for a physical address.')
+            self.phys_addr = buf
+            self._buf_map = _map('/dev/mem', buf, buf_size)
+
+        self.regs = self._reg_map[0].view(np.uint32)
+        self.memory = self._buf_map[0]
+
+    def close(self):
+        self.regs = None
+        self.memory = None
+        for _, m in (self._reg_map, self._buf_map):
+            try:
+                m.close()
+            except BufferError:
+                # still referenced by numpy views, unmapped when they are released
+                pass
+
+
+def _map(path, addr, size):
+    """ mmap [addr, addr + size) of a device file and return (np.uint8 array, mmap) """
+
+    page = mmap.PAGESIZE
+    base = addr - addr % page
+    length = addr - base + size
+
+    fd = os.open(path, os.O_RDWR | os.O_SYNC)
+    try:
+        m = mmap.mmap(fd, length, mmap.MAP_SHARED,
+                      mmap.PROT_READ | mmap.PROT_WRITE, offset=base)
+    finally:
+        os.close(fd)
+
+    array = np.frombuffer(m, dtype=np.uint8)[addr - base:]
+    return array, m
+
+
+def _read_sysfs_int(path):
+    with open(path) as f:
+        return int(f.read().strip(), 0)
+
+
+class SimulatedDevice(_Device):
+    """
+    Software stand-in of an NNgen IP-core
+
+    The network is computed by the software model (ng.eval) in a worker
+    thread when started: placeholders, variables and constants are read
+    from the buffer and the outputs are written back, so that a host
+    program can be run without the FPGA. An extern operator writes its
+    input values to the buffer, sends its opcode and waits for the resume
+    from the host as the hardware does. In the dataflow mode, the frames
+    are computed one after another as they are queued by the host, and in
+    the dynamic batch mode, the first slices of the batch size register
+    are computed.
+
+    Parameters
+    ----------
+    objs : list
+        Output objects passed to to_veriloggen()
+
+    layout : MemoryLayout, optional
+        Memory layout of objs (make_memory_layout(objs) by default)
+
+    size : int, optional
+        Buffer size in bytes (layout.size by default)
+
+    phys_addr : int, optional
+        Physical address reported for the buffer
+
+    latency : float, optional
+        Additional execution time in seconds
+    """
+
+    def __init__(self, objs, layout=None, size=None, phys_addr=0, latency=0.0):
+        if not isinstance(objs, (list, tuple)):
+            objs = [objs]
+
+        if layout is None:
+            layout = make_memory_layout(objs)
+
+        if size is None:
+            size = layout.size
+
+        if layout.registers is None:
+            raise ValueError('the register layout is unknown. '
+                             'make the layout with make_memory_layout().')
+
+        self.objs = objs
+        self.layout = layout
+        self.phys_addr = phys_addr
+        self.latency = latency
+        self.regs = np.zeros([layout.registers.num_regs], dtype=np.uint32)
+        self.memory = np.zeros([size], dtype=np.uint8)
+        self.externs = _collect_externs(util._collect_numerics(objs))
+        self._thread = None
+        self._resume = threading.Event()
+        self._queue = threading.Condition()
+        self._aborted = False
+
+        # a single frame by default
+        frame_queue_reg = layout.registers.frame_queue_reg
+        if frame_queue_reg is not None:
+            self.regs[frame_queue_reg + frame_queue_reg_slots] = max(
+                [region.frame_slots for region in layout.inputs.values()] + [1])
+            self.regs[frame_queue_reg + frame_queue_reg_num] = 1
+            self.regs[frame_queue_reg + frame_queue_reg_queued] = 1
+
+        # the declared size by default
+        batch_reg = layout.registers.batch_reg
+        if batch_reg is not None:
+            self.regs[batch_reg] = _get_max_batch(layout)
+
+    def write_reg(self, index, value):
+        self.regs[index] = value
+
+        if index == control_reg_start and value and not self.regs[control_reg_busy]:
+            self.regs[control_reg_busy] = 1
+            self.regs[control_reg_start] = 0
+            self._aborted = False
+
+            frame_queue_reg = self.layout.registers.frame_queue_reg
+            if frame_queue_reg is not None:
+                self.regs[frame_queue_reg + frame_queue_reg_done] = 0
+
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+        elif index == control_reg_extern_recv and value:
+            self._resume.set()
+
+        elif index == control_reg_reset and value:
+            self._aborted = True
+            self._resume.set()
+            self.regs[control_reg_reset] = 0
+            self.regs[control_reg_extern_send] = 0
+            self.regs[control_reg_busy] = 0
+
+        # frames queued by the host, or the reset
+        with self._queue:
+            self._queue.notify_all()
+
+    def _run(self):
+        offset = int(self.regs[control_reg_global_offset]) - self.phys_addr
+
+        frame_queue_reg = self.layout.registers.frame_queue_reg
+        if frame_queue_reg is None:
+            self._run_frame(offset, 0)
+        else:
+            frame_regs = self.regs[frame_queue_reg:]
+            for frame in range(int(frame_regs[frame_queue_reg_num])):
+                # the inputs of the frame are written by the host
+                with self._queue:
+                    self._queue.wait_for(lambda: (self._aborted or
+                                                  frame < frame_regs[frame_queue_reg_queued]))
+
+                if self._aborted or not self._run_frame(offset, frame):
+                    return
+
+                frame_regs[frame_queue_reg_done] = frame + 1
+
+        if not self._aborted:
+            self.regs[control_reg_busy] = 0
+
+    def _run_frame(self, offset, frame):
+        batch_reg = self.layout.registers.batch_reg
+        batch = int(self.regs[batch_reg]) if batch_reg is not None else None
+
+        input_dict = {}
+        for regions in (self.layout.inputs, self.layout.variables):
+            for name, region in regions.items():
+                input_dict[name] = np.array(make_view(self.memory, region, offset, frame),
+                                            dtype=np.int64)
+
+        # the slices after the batch size are neither read nor written
+        if batch is not None:
+            for name in self.layout.inputs.keys():
+                input_dict[name][batch:] = 0
+
+        memo = {}
+        for obj, ext in zip(self.externs, self.layout.externs):
+            for arg, region in zip(obj.args, ext.inputs):
+                value = arg.eval(memo, input_dict)
+                make_view(self.memory, region, offset, frame)[...] = np.reshape(
+                    value, region.storage_shape)
+
+            self._resume.clear()
+            self.regs[control_reg_extern_send] = obj.opcode
+            self._resume.wait()
+
+            # the hardware clears the flag and then the opcode in the next cycle,
+            # which cannot be told apart by a register read of the host
+            self.regs[control_reg_extern_send] = 0
+            self.regs[control_reg_extern_recv] = 0
+
+            if self._aborted:
+                return False
+
+            memo[id(obj)] = np.array(np.reshape(make_view(self.memory, ext.output,
+                                                          offset, frame),
+                                                ext.output.shape), dtype=np.int64)
+
+        for obj, region in zip(self.objs, self.layout.outputs.values()):
+            value = obj.eval(memo, input_dict)
+            make_view(self.memory, region, offset, frame)[:batch] = np.reshape(
+                value, region.storage_shape)[:batch]
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        return True
+
+
+class Runtime(object):
+    """
+    Host runtime of an NNgen IP-core
+
+    Inputs and outputs are accessed through zero-copy numpy views of the
+    buffer ('inputs' and 'outputs'), and the parameter image is written
+    once on construction. An inference costs two register writes
+    (the global address offset and start) and the polling of the busy register.
+
+    Extern operators are serviced while waiting by the handlers registered
+    with register_extern(), which access the input values and the output
+    of the extern through zero-copy views.
+
+    In the dataflow mode, each input and output has a slot for each frame
+    in flight ('frame_inputs' and 'frame_outputs', and 'inputs' and 'outputs'
+    are those of slot 0). Frames are queued to the IP-core with start_frames()
+    and queue_frames() as their inputs are written, and run_frames() streams
+    any number of frames through the slots.
+
+    In the dynamic batch mode, set_batch() sets the batch size register,
+    and the inputs and the outputs are the first slices of the batch.
+
+    Parameters
+    ----------
+    device : MmapDevice or SimulatedDevice
+        Target device
+
+    layout : MemoryLayout
+        Memory layout of the network
+
+    offset : int, optional
+        Byte offset of the network in the device buffer,
+        to pool several networks in one buffer
+
+    load_params : bool, optional
+        Write the parameter image to the buffer
+    """
+
+    def __init__(self, device, layout, offset=0, load_params=True):
+        if offset + layout.size > device.memory.size:
+            raise ValueError('buffer is too small: %d bytes required, %d bytes available' %
+                             (offset + layout.size, device.memory.size))
+
+        self.device = device
+        self.layout = layout
+        self.offset = offset
+
+        self.num_frame_slots = max([region.frame_slots
+                                    for region in layout.inputs.values()] + [1])
+        self.frame_inputs = [collections.OrderedDict(
+            [(name, make_view(device.memory, region, offset, frame))
+             for name, region in layout.inputs.items()])
+            for frame in range(self.num_frame_slots)]
+        self.frame_outputs = [collections.OrderedDict(
+            [(name, make_view(device.memory, region, offset, frame))
+             for name, region in layout.outputs.items()])
+            for frame in range(self.num_frame_slots)]
+
+        self.inputs = self.frame_inputs[0]
+        self.outputs = self.frame_outputs[0]
+
+        # the declared size (None) until set_batch()
+        self.batch = None
+
+        self.extern_handlers = {}
+        self._extern_views = [([make_view(device.memory, region, offset)
+                                for region in ext.inputs],
+                               make_view(device.memory, ext.output, offset))
+                              for ext in layout.externs]
+        self._extern_index = 0
+
+        if load_params:
+            self.load_params()
+
+    def load_params(self, params=None):
+        """ write the parameter image (layout.params by default) to the buffer """
+
+        if params is None:
+            params = self.layout.params
+
+        start = self.offset + self.layout.params_offset
+        self.device.memory[start:start + params.size] = params
+
+    def set_inputs(self, *args, **kwargs):
+        """ copy input values into the buffer, in the order of 'inputs' or by name """
+
+        self.set_frame_inputs(0, *args, **kwargs)
+
+    def set_frame_inputs(self, frame, *args, **kwargs):
+        """ set_inputs() into the slot of a frame of the dataflow mode """
+
+        inputs = self.frame_inputs[frame % self.num_frame_slots]
+
+        for view, value in zip(inputs.values(), args):
+            view[:self.batch] = value
+
+        for name, value in kwargs.items():
+            if name not in inputs:
+                raise ValueError("no such input: '%s'" % name)
+            inputs[name][:self.batch] = value
+
+    def set_batch(self, batch):
+        """
+        Set the batch size of the dynamic batch mode
+
+        Parameters
+        ----------
+        batch : int
+            Batch size, up to the declared size (the declared size if None).
+            The inputs and the outputs are the first 'batch' slices of their
+            first axis until the next set_batch().
+        """
+
+        registers = self.layout.registers
+        if registers is None or registers.batch_reg is None:
+            raise ValueError("'batch' requires 'dynamic_batch'")
+
+        max_batch = _get_max_batch(self.layout)
+        value = max_batch if batch is None else batch
+        if value < 1 or value > max_batch:
+            raise ValueError("batch must be between 1 and the declared size (%d), not %d" %
+                             (max_batch, value))
+
+        self.device.write_reg(registers.batch_reg, value)
+        self.batch = batch
+
+    def register_extern(self, opcode, func, inplace=False):
+        """
+        Register a handler of extern operators
+
+        Parameters
+        ----------
+        opcode : int
+            Opcode of the extern operators
+
+        func : callable
+            Handler called with the input values, which returns the output
+            value as 'func' of ng.extern. If 'inplace' is True, the handler
+            is called with the output view as the keyword argument 'out'
+            and writes the output value into it.
+
+        inplace : bool, optional
+            Whether the handler writes the output value into 'out'
+        """
+
+        if not isinstance(opcode, int) or opcode <= 0:
+            raise ValueError('opcode must be a positive int.')
+
+        self.extern_handlers[opcode] = (func, inplace)
+
+    def register_extern_funcs(self, objs):
+        """ register 'func' of the extern operators in objs as handlers """
+
+        if not isinstance(objs, (list, tuple)):
+            objs = [objs]
+
+        for obj in _collect_externs(util._collect_numerics(objs)):
+            if obj.func is not None:
+                self.register_extern(obj.opcode, obj.func)
+
+    def _pending_extern(self):
+        opcode = self.device.read_reg(control_reg_extern_send)
+        if opcode == 0:
+            return None
+
+        candidates = [i for i, ext in enumerate(self.layout.externs) if ext.opcode == opcode]
+        if len(candidates) == 1:
+            index = candidates[0]
+        elif len(candidates) > 1 and self.layout.externs[self._extern_index].opcode == opcode:
+            index = self._extern_index
+        else:
+            raise ValueError('unexpected extern opcode: %d' % opcode)
+
+        if opcode not in self.extern_handlers:
+            raise ValueError('no handler is registered for extern opcode %d.' % opcode)
+
+        self._extern_index = index + 1
+
+        func, inplace = self.extern_handlers[opcode]
+        views, out = self._extern_views[index]
+        values = [np.reshape(view, region.shape)
+                  for view, region in zip(views, self.layout.externs[index].inputs)]
+
+        return func, inplace, values, out
+
+    def _call_extern(self, func, inplace, values, out):
+        if inplace:
+            func(*values, out=out)
+        else:
+            out[...] = np.reshape(func(*values), out.shape)
+
+    def _resume_extern(self):
+        self.device.write_reg(control_reg_extern_recv, 1)
+
+        # the opcode is still read until the IP-core takes the resume,
+        # which must not be serviced again
+        while (self.device.read_reg(control_reg_extern_send) and
+               self.device.read_reg(control_reg_extern_recv) and
+               self.device.read_reg(control_reg_busy)):
+            pass
+
+    def dispatch_extern(self):
+        """
+        Service a pending extern operator, if any
+
+        Returns
+        -------
+        dispatched : bool
+            True if an extern operator has been serviced
+        """
+
+        pending = self._pending_extern()
+        if pending is None:
+            return False
+
+        self._call_extern(*pending)
+        self._resume_extern()
+        return True
+
+    async def dispatch_extern_async(self, executor=None):
+        """
+        Coroutine version of dispatch_extern()
+
+        The handler is run by 'executor' (concurrent.futures.Executor) if given,
+        so that the event loop serves other requests meanwhile.
+        """
+
+        pending = self._pending_extern()
+        if pending is None:
+            return False
+
+        if executor is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(executor, self._call_extern, *pending)
+        else:
+            self._call_extern(*pending)
+
+        self._resume_extern()
+        return True
+
+    def start(self):
+        """ start an inference without waiting for the completion """
+
+        if self._get_frame_queue_reg(required=False) is not None:
+            self.start_frames(1)
+        else:
+            self._start()
+
+    def _start(self):
+        self._extern_index = 0
+        self.device.write_reg(control_reg_global_offset,
+                              self.device.phys_addr + self.offset)
+        self.device.write_reg(control_reg_start, 1)
+
+    def _get_frame_queue_reg(self, required=True):
+        registers = self.layout.registers
+        index = registers.frame_queue_reg if registers is not None else None
+        if index is None and required:
+            raise ValueError("frames require 'dataflow_segments'")
+        return index
+
+    def start_frames(self, num_frames, num_queued=None):
+        """
+        Start inferences of consecutive frames in the dataflow mode
+
+        Parameters
+        ----------
+        num_frames : int
+            Number of frames
+
+        num_queued : int, optional
+            Number of frames whose inputs are in their slots
+            (num_frames by default, up to the number of frame slots).
+            The other frames are queued by queue_frames().
+        """
+
+        index = self._get_frame_queue_reg()
+
+        if num_queued is None:
+            num_queued = min(num_frames, self.num_frame_slots)
+
+        if num_frames < 1:
+            raise ValueError('num_frames must be 1 or more, not %d' % num_frames)
+
+        self.device.write_reg(index + frame_queue_reg_num, num_frames)
+        self.device.write_reg(index + frame_queue_reg_queued, num_queued)
+        self._start()
+
+    def queue_frames(self, num_queued):
+        """ set the number of frames whose inputs are written, from the start """
+
+        index = self._get_frame_queue_reg()
+        self.device.write_reg(index + frame_queue_reg_queued, num_queued)
+
+    def frames_done(self):
+        """ number of frames whose outputs are written, from the start """
+
+        index = self._get_frame_queue_reg()
+        return self.device.read_reg(index + frame_queue_reg_done)
+
+    def is_busy(self):
+        return bool(self.device.read_reg(control_reg_start) or
+                    self.device.read_reg(control_reg_busy))
+
+    def wait(self, timeout=None, min_interval=None, max_interval=1e-3):
+        """
+        Wait for the completion
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Timeout in seconds (TimeoutError is raised)
+
+        min_interval : float, optional
+            First polling interval in seconds, doubled up to 'max_interval'
+            at every poll. The busy register is polled without sleeping
+            if None, for the lowest latency.
+
+        max_interval : float, optional
+            Maximum polling interval in seconds
+        """
+
+        self._wait(self.is_busy, timeout, min_interval, max_interval)
+
+    def wait_frames(self, num_frames, timeout=None, min_interval=None, max_interval=1e-3):
+        """
+        Wait until the outputs of 'num_frames' frames from the start are written,
+        or the IP-core stops (see wait() for the other arguments)
+
+        Returns
+        -------
+        num_done : int
+            Number of frames whose outputs are written
+        """
+
+        self._get_frame_queue_reg()
+        self._wait(lambda: self.frames_done() < num_frames and self.is_busy(),
+                   timeout, min_interval, max_interval)
+
+        return self.frames_done()
+
+    def _wait(self, cond, timeout, min_interval, max_interval):
+        deadline = None if timeout is None else time.time() + timeout
+        interval = min_interval
+
+        while cond():
+            if self.layout.externs and self.dispatch_extern():
+                interval = min_interval
+                continue
+
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError('NNgen IP-core did not finish in %f seconds.' % timeout)
+
+            if interval is not None:
+                time.sleep(interval)
+                interval = min(interval * 2, max_interval)
+
+    async def wait_async(self, timeout=None, min_interval=1e-5, max_interval=1e-3,
+                         executor=None):
+        """
+        Coroutine version of wait(), which polls with asyncio.sleep()
+
+        Handlers of extern operators are run by 'executor' if given
+        (see dispatch_extern_async()).
+        """
+
+        deadline = None if timeout is None else time.time() + timeout
+        interval = min_interval
+
+        while self.is_busy():
+            if self.layout.externs and await self.dispatch_extern_async(executor):
+                interval = min_interval
+                continue
+
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError('NNgen IP-core did not finish in %f seconds.' % timeout)
+
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
+    def run(self, *args, **kwargs):
+        """
+        Run an inference
+
+        Inputs are given in the order of 'inputs' or by name,
+        and those not given are taken from the buffer as they are.
+        Keyword arguments of wait() and 'batch' of set_batch()
+        are also accepted.
+
+        Returns
+        -------
+        outputs : list
+            Outputs by get_outputs(), valid until the next run
+        """
+
+        wait_kwargs = {key: kwargs.pop(key) for key in ('timeout', 'min_interval', 'max_interval')
+                       if key in kwargs}
+
+        if 'batch' in kwargs:
+            self.set_batch(kwargs.pop('batch'))
+
+        self.set_inputs(*args, **kwargs)
+        self.start()
+        self.wait(**wait_kwargs)
+
+        return self.get_outputs()
+
+    async def run_async(self, *args, **kwargs):
+        """ coroutine version of run() """
+
+        wait_kwargs = {key: kwargs.pop(key)
+                       for key in ('timeout', 'min_interval', 'max_interval', 'executor')
+                       if key in kwargs}
+
+        if 'batch' in kwargs:
+            self.set_batch(kwargs.pop('batch'))
+
+        self.set_inputs(*args, **kwargs)
+        self.start()
+        await self.wait_async(**wait_kwargs)
+
+        return self.get_outputs()
+
+    def run_frames(self, frames, **kwargs):
+        """
+        Run inferences of consecutive frames in the dataflow mode
+
+        The inputs of a frame are written to its slot as soon as the outputs
+        of the previous frame in the slot are read, while the IP-core works
+        on the other frames. Keyword arguments of wait() are also accepted.
+
+        Parameters
+        ----------
+        frames : list
+            Inputs of each frame, a list in the order of 'inputs' or a dict by name
+
+        Returns
+        -------
+        outputs : list
+            Copies of the outputs by get_outputs() of each frame
+        """
+
+        def set_frame(frame):
+            inputs = frames[frame]
+            if isinstance(inputs, dict):
+                self.set_frame_inputs(frame, **inputs)
+            else:
+                self.set_frame_inputs(frame, *inputs)
+
+        num_frames = len(frames)
+        num_queued = min(num_frames, self.num_frame_slots)
+
+        for frame in range(num_queued):
+            set_frame(frame)
+
+        self.start_frames(num_frames, num_queued)
+
+        rslts = []
+        while len(rslts) < num_frames:
+            num_done = self.wait_frames(len(rslts) + 1, **kwargs)
+            if num_done <= len(rslts):
+                raise RuntimeError('NNgen IP-core stopped after %d of %d frames.' %
+                                   (num_done, num_frames))
+
+            for frame in range(len(rslts), num_done):
+                rslts.append([np.array(value) for value in self.get_frame_outputs(frame)])
+
+                if num_queued < num_frames:
+                    set_frame(num_queued)
+                    num_queued += 1
+                    self.queue_frames(num_queued)
+
+        self.wait(**kwargs)
+
+        return rslts
+
+    def get_outputs(self):
+        """ outputs in the shape of the output objects (views where possible) """
+
+        return self.get_frame_outputs(0)
+
+    def get_frame_outputs(self, frame):
+        """ get_outputs() of the slot of a frame of the dataflow mode """
+
+        outputs = self.frame_outputs[frame % self.num_frame_slots]
+        return [np.reshape(view, region.shape)[:self.batch]
+                for view, region in zip(outputs.values(), self.layout.outputs.values())]
+
+    def reset(self):
+        """ software reset of the internal logic """
+
+        self.device.write_reg(control_reg_reset, 1)
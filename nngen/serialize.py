@@ -0,0 +1,225 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import io
+import inspect
+import pickle
+import struct
+
+import numpy as np
+
+import nngen.basic_types as bt
+from nngen.operator.leaky_relu import leaky_relu_base, get_leaky_relu_op
+
+
+_magic = b'\x93NNGEN'
+_format_version = 1
+_header_format = '<6sBxQ'
+_header_size = struct.calcsize(_header_format)
+_array_alignment = 64
+
+
+def save(objs, filename):
+    """
+    Save an NNgen graph to a file
+
+    The operator graph (node classes, arguments, dtypes, shapes, shift amounts,
+    parallelism attributes, scale factors and layouts) is serialized
+    together with the raw values of variables and constants,
+    which are stored aligned so that load() can memory-map them.
+
+    Parameters
+    ----------
+    objs : list or nngen object
+        Output objects of the graph
+
+    filename : str
+        File name to be written
+    """
+
+    nodes = _collect_nodes(objs if isinstance(objs, (list, tuple)) else [objs])
+    for node in nodes:
+        if getattr(node, 'm', None) is not None:
+            raise ValueError("'%s' is already converted into hardware. "
+                             "save() must be called before to_veriloggen()." % str(node))
+
+    with open(filename, 'wb') as f:
+        _dump(objs, f)
+
+
+def load(filename, mmap_mode='c'):
+    """
+    Load an NNgen graph saved by save()
+
+    Parameters
+    ----------
+    filename : str
+        File name to be read
+
+    mmap_mode : str or None
+        Memory-map mode of the values of variables and constants
+        ('r', 'c' or 'r+'). If None, the values are read into memory.
+
+    Returns
+    -------
+    objs : list or nngen object
+        Output objects of the graph, in the same form as given to save()
+
+    Notes
+    -----
+    The graph is stored with pickle; load only files from trusted sources.
+    """
+
+    with open(filename, 'rb') as f:
+        graph_size, graph = _read_header(f, filename)
+
+    data_offset = _aligned(_header_size + graph_size, _array_alignment)
+
+    if mmap_mode is None:
+        with open(filename, 'rb') as f:
+            f.seek(data_offset)
+            data = np.fromfile(f, dtype=np.uint8)
+    else:
+        try:
+            data = np.memmap(filename, dtype=np.uint8, mode=mmap_mode, offset=data_offset)
+        except ValueError:
+            # no array data
+            data = np.zeros([0], dtype=np.uint8)
+
+    return _load(graph, data)
+
+
+def _dump(objs, f):
+    arrays = []
+    buf = io.BytesIO()
+    pickler = _GraphPickler(buf, arrays)
+    pickler.dump(objs)
+    graph = buf.getvalue()
+
+    data_offset = _aligned(_header_size + len(graph), _array_alignment)
+
+    f.write(struct.pack(_header_format, _magic, _format_version, len(graph)))
+    f.write(graph)
+    f.write(b'\x00' * (data_offset - _header_size - len(graph)))
+
+    pos = 0
+    for offset, value in arrays:
+        f.write(b'\x00' * (offset - pos))
+        f.write(value.tobytes())
+        pos = offset + value.nbytes
+
+
+def _dumps(objs):
+    """ save() into bytes, e.g. to pass a graph to other processes """
+
+    f = io.BytesIO()
+    _dump(objs, f)
+    return f.getvalue()
+
+
+def _loads(s):
+    """ load() from bytes made by _dumps(); the values are read-only """
+
+    graph_size, graph = _read_header(io.BytesIO(s), 'bytes')
+    data_offset = _aligned(_header_size + graph_size, _array_alignment)
+    data = np.frombuffer(s, dtype=np.uint8, offset=min(data_offset, len(s)))
+    return _load(graph, data)
+
+
+def _read_header(f, name):
+    magic, version, graph_size = struct.unpack(_header_format, f.read(_header_size))
+
+    if magic != _magic:
+        raise ValueError("'%s' is not an NNgen graph file." % name)
+
+    if version != _format_version:
+        raise ValueError("unsupported NNgen graph file version: %d" % version)
+
+    graph = f.read(graph_size)
+
+    return graph_size, graph
+
+
+def _load(graph, data):
+    unpickler = _GraphUnpickler(io.BytesIO(graph), data)
+    objs = unpickler.load()
+
+    nodes = _collect_nodes(objs if isinstance(objs, (list, tuple)) else [objs])
+    max_object_id = max([node.object_id for node in nodes]) if nodes else -1
+    bt._object_counter = max(bt._object_counter, max_object_id + 1)
+
+    return objs
+
+
+class _GraphPickler(pickle.Pickler):
+
+    def __init__(self, file, arrays):
+        pickle.Pickler.__init__(self, file, protocol=4)
+        self.arrays = arrays
+        self.size = 0
+
+    def persistent_id(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype.hasobject:
+            return None
+
+        if isinstance(obj, np.ndarray):
+            value = np.ascontiguousarray(obj)
+            offset = _aligned(self.size, _array_alignment)
+            self.arrays.append((offset, value))
+            self.size = offset + value.nbytes
+            return ('array', offset, value.dtype.str, value.shape)
+
+        # classes made by get_leaky_relu_op() are rebuilt on loading
+        if (isinstance(obj, type) and issubclass(obj, leaky_relu_base) and
+                obj is not leaky_relu_base):
+            op = obj.__dict__['op'].__func__
+            dtype = inspect.getclosurevars(op).nonlocals.get('dtype', None)
+            return ('leaky_relu', obj.slope, obj.rshift, dtype)
+
+        return None
+
+
+class _GraphUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, data):
+        pickle.Unpickler.__init__(self, file)
+        self.data = data
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+
+        if kind == 'array':
+            _, offset, dtype, shape = pid
+            dtype = np.dtype(dtype)
+            size = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            return self.data[offset:offset + size].view(dtype).reshape(shape)
+
+        if kind == 'leaky_relu':
+            _, slope, rshift, dtype = pid
+            return get_leaky_relu_op(slope, rshift, dtype)
+
+        raise pickle.UnpicklingError("unknown persistent id: '%s'" % str(kind))
+
+
+def _collect_nodes(objs):
+    visited = set()
+    nodes = []
+    stack = list(objs)
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in visited or not isinstance(obj, bt._Numeric):
+            continue
+
+        visited.add(id(obj))
+        nodes.append(obj)
+
+        stack.extend(getattr(obj, 'args', ()))
+        stack.extend(obj.consumers)
+
+    return nodes
+
+
+def _aligned(size, alignment):
+    return (size + alignment - 1) // alignment * alignment
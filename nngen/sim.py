@@ -2,13 +2,35 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import os
+import re
+import math
+import shlex
+import shutil
+import hashlib
+import weakref
+import tempfile
+import subprocess
+
+import numpy as np
+
+from veriloggen import Module, Seq, Not, Delay, Systask
+import veriloggen.thread as vthread
+import veriloggen.types.axi as axi
+from veriloggen.simulation import simulation
+
 from . import verilog
+from . import storage as st
+from . import util
 
 
 __intrinsics__ = ('set_header', 'get_header',
                   'set_global_offset', 'set_global_addrs',
                   'set_global_addr_map', 'write_global_addr_map', 'load_global_addr_map',
-                  'start', 'wait', 'sw_rst')
+                  'start', 'wait', 'sw_rst', 'set_frames', 'set_batch')
+
+# commands of the compiled simulators of each module
+_builds = weakref.WeakKeyDictionary()
 
 
 def set_header(fsm, saxi, index, header, wordsize=4):
@@ -92,6 +114,20 @@ def wait(fsm, saxi, wordsize=4):
     fsm.If(v != 0).goto(b)
     fsm.If(v == 0).goto_next()
 
+
+def set_frames(fsm, saxi, index, num_frames, num_queued, wordsize=4):
+    awaddr = (index + verilog.frame_queue_reg_num) * wordsize
+    saxi.write(fsm, awaddr, num_frames)
+
+    awaddr = (index + verilog.frame_queue_reg_queued) * wordsize
+    saxi.write(fsm, awaddr, num_queued)
+
+
+def set_batch(fsm, saxi, index, batch, wordsize=4):
+    awaddr = index * wordsize
+    saxi.write(fsm, awaddr, batch)
+
+
 def sw_rst(fsm, saxi, wordsize=4):
     awaddr = verilog.control_reg_reset * wordsize
     saxi.write(fsm, awaddr, 1)
@@ -101,3 +137,379 @@ def sw_rst(fsm, saxi, wordsize=4):
     v = saxi.read(fsm, araddr)
     fsm.If(v != 0).goto(b)
     fsm.If(v == 0).goto_next()
+
+
+def run(targ, inputs, params=None, simtype='iverilog', cache_dir=None,
+        max_cycles=10000000, display=False, num_frames=1, batch=None):
+    """
+    Run the RTL simulation of a network converted by to_veriloggen()
+
+    The memory image is sized from the address map of the network,
+    and the compiled simulator is cached in 'cache_dir' by the hash of
+    the generated Verilog code. The testbench is elaborated once per
+    'targ', so that a rerun with new inputs only writes the memory image
+    and executes the cached simulator.
+
+    Parameters
+    ----------
+    targ : veriloggen.Module
+        Module returned by to_veriloggen()
+
+    inputs : dict
+        Values of placeholders by object or name
+
+    params : np.ndarray or dict, optional
+        Parameter image (as export_ndarray()) or values of variables
+        by object or name. The image of the current values by default.
+
+    simtype : str, optional
+        'iverilog' or 'verilator'
+
+    cache_dir : str, optional
+        Directory of the compiled simulators
+
+    max_cycles : int, optional
+        Timeout of the simulation in clock cycles
+
+    display : bool, optional
+        Print the output of the simulator
+
+    num_frames : int, optional
+        Number of frames processed in the dataflow mode, up to the number
+        of frame slots. If more than 1, each value of 'inputs' has the
+        frames in its first axis, and so does each output.
+
+    batch : int, optional
+        Batch size in the dynamic batch mode, up to the declared size of
+        the placeholders. Each value of 'inputs' and each output has
+        'batch' in its first axis. The declared size by default.
+
+    Returns
+    -------
+    outputs : list
+        Values of the output objects (np.ndarray)
+
+    cycles : int
+        Execution cycles from the start to the end of the network
+    """
+
+    if targ not in verilog.generated_modules:
+        raise ValueError('not a module returned by to_veriloggen()')
+
+    objs, config = verilog.generated_modules[targ]
+    if config['use_map_ram']:
+        raise ValueError("'use_map_ram' is not supported.")
+
+    num_frame_slots = verilog.get_num_frame_slots(config)
+    if num_frames < 1 or num_frames > num_frame_slots:
+        raise ValueError("num_frames must be between 1 and the number of frame slots (%d), "
+                         "not %d" % (num_frame_slots, num_frames))
+
+    batch_reg = verilog.module_dynamic_batch_regs.get(targ)
+    if batch is not None:
+        if batch_reg is None:
+            raise ValueError("'batch' requires 'dynamic_batch'")
+
+        max_batch = [obj for obj in util._collect_numerics(objs)
+                     if isinstance(obj, st.placeholder)][0].shape[0]
+        if batch < 1 or batch > max_batch:
+            raise ValueError("batch must be between 1 and the declared size (%d), not %d" %
+                             (max_batch, batch))
+
+    from . import runtime
+    from . import tlsim
+
+    layout = runtime.make_memory_layout(objs, config['offchipram_chunk_bytes'])
+    offset = config['default_global_addr_offset']
+    mem_addrwidth = max(12, int(math.ceil(math.log(offset + layout.size, 2))))
+
+    if simtype not in ('iverilog', 'verilator'):
+        raise ValueError("not supported simulator: '%s'" % simtype)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), 'nngen_sim')
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    builds = _builds.setdefault(targ, {})
+    key = (simtype, os.path.abspath(cache_dir), max_cycles, num_frames, batch)
+    if key not in builds:
+        tb = _make_testbench(targ, config, mem_addrwidth,
+                             offset, offset + layout.size, max_cycles, num_frames, batch)
+        builds[key] = _build(tb, simtype, cache_dir, display)
+
+    command = builds[key]
+
+    # memory image
+    numerics = util._collect_numerics(objs)
+    memory = np.zeros([2 ** mem_addrwidth], dtype=np.uint8)
+
+    if params is None or isinstance(params, dict):
+        image = layout.params
+    else:
+        image = np.asarray(params, dtype=np.uint8).reshape([-1])
+
+    start = offset + layout.params_offset
+    memory[start:start + image.size] = image
+
+    if isinstance(params, dict):
+        _write_values(memory, offset, numerics, (st.variable, st.constant), params)
+
+    if num_frames > 1:
+        for frame in range(num_frames):
+            _write_values(memory, offset, numerics, st.placeholder,
+                          dict([(name, value[frame]) for name, value in inputs.items()]),
+                          frame, config['offchipram_chunk_bytes'], batch)
+    else:
+        _write_values(memory, offset, numerics, st.placeholder, inputs, batch=batch)
+
+    # simulation
+    rundir = tempfile.mkdtemp(prefix='run_', dir=cache_dir)
+    try:
+        _write_memimg(os.path.join(rundir, 'memimg.hex'), memory)
+        rslt = _exec(command, display, cwd=rundir)
+
+        m = re.search(r'# execution cycles:\s*(\d+)', rslt)
+        if m is None:
+            raise RuntimeError('simulation timed out after %d cycles' % max_cycles)
+        cycles = int(m.group(1))
+
+        memory[offset:offset + layout.size] = _read_memimg(
+            os.path.join(rundir, 'dump.hex'), layout.size)
+
+    finally:
+        shutil.rmtree(rundir, ignore_errors=True)
+
+    outputs = []
+    for obj in objs:
+        src = tlsim._actual_storage(obj)
+        slot_size = util.aligned_size(src.memory_size, config['offchipram_chunk_bytes'])
+        values = []
+        for frame in range(num_frames):
+            value = tlsim.read_array(memory, offset + src.addr + frame * slot_size, src.shape,
+                                     src.get_aligned_shape(), src.dtype.width,
+                                     src.get_ram_width(), src.dtype.signed)
+            value = value.reshape(obj.shape)
+            values.append(value[:batch] if batch is not None else value)
+
+        outputs.append(np.stack(values) if num_frames > 1 else values[0])
+
+    return outputs, cycles
+
+
+class _AxiMemoryModel(axi.AxiMemoryModel):
+    """ memory model whose image is written by each run, not at the elaboration """
+
+    @staticmethod
+    def _make_img(filename, size, width, blksize=4096):
+        pass
+
+
+class _AxiMultiportMemoryModel(axi.AxiMultiportMemoryModel):
+    """ multiport version of _AxiMemoryModel """
+
+    @staticmethod
+    def _make_img(filename, size, width, blksize=4096):
+        pass
+
+
+def _make_testbench(targ, config, mem_addrwidth, dump_start, dump_end, max_cycles,
+                    num_frames=1, batch=None):
+    m = Module('test')
+    params = m.copy_params(targ)
+    ports = m.copy_sim_ports(targ)
+    clk = ports[config['clock_name']]
+    resetn = ports[config['reset_name']]
+    rst = m.Wire('RST')
+    rst.assign(Not(resetn) if 'low' in config['reset_polarity'] else resetn)
+
+    maxi_names = [port.name for port in verilog.get_all_maxi_ports(targ)]
+
+    if len(maxi_names) > 1:
+        # all the AXI master ports share a memory
+        memory = _AxiMultiportMemoryModel(m, 'memory', clk, rst,
+                                          datawidth=config['maxi_datawidth'],
+                                          numports=len(maxi_names),
+                                          mem_addrwidth=mem_addrwidth,
+                                          memimg_name='memimg.hex')
+        for i, name in enumerate(maxi_names):
+            memory.connect(i, ports, name)
+    else:
+        memory = _AxiMemoryModel(m, 'memory', clk, rst,
+                                 datawidth=config['maxi_datawidth'],
+                                 mem_addrwidth=mem_addrwidth,
+                                 memimg_name='memimg.hex')
+        memory.connect(ports, 'maxi')
+
+    _saxi = vthread.AXIMLite(m, '_saxi', clk, rst, noio=True)
+    _saxi.connect(ports, 'saxi')
+
+    time_counter = m.Reg('time_counter', 32, initval=0)
+    seq = Seq(m, 'seq', clk, rst)
+    seq(
+        time_counter.inc()
+    )
+
+    def dump(fsm):
+        fsm(
+            Systask('writememh', 'dump.hex', memory.mem, dump_start, dump_end - 1)
+        )
+        fsm.goto_next()
+
+    frame_queue_reg = verilog.module_frame_queue_regs.get(targ)
+
+    def queue_frames(fsm):
+        # all the frames are in the input slots before the start
+        if frame_queue_reg is not None:
+            set_frames(fsm, _saxi, frame_queue_reg, num_frames, num_frames)
+
+    batch_reg = verilog.module_dynamic_batch_regs.get(targ)
+
+    def set_batch_size(fsm):
+        # the declared size by default
+        if batch is not None:
+            set_batch(fsm, _saxi, batch_reg, batch)
+
+    def ctrl():
+        for i in range(100):
+            pass
+
+        queue_frames()
+        set_batch_size()
+        start_time = time_counter.value
+        start(_saxi)
+        wait(_saxi)
+        end_time = time_counter.value
+
+        print('# execution cycles: %d' % (end_time - start_time))
+        dump()
+        vthread.finish()
+
+    th = vthread.Thread(m, 'th_ctrl', clk, rst, ctrl)
+    th.add_intrinsics(start, wait, dump, queue_frames, set_batch_size)
+    th.start()
+
+    m.Instance(targ, 'uut',
+               params=m.connect_params(targ),
+               ports=m.connect_ports(targ))
+
+    simulation.setup_clock(m, clk, hperiod=5)
+    init = simulation.setup_reset(m, resetn, m.make_reset(), period=100,
+                                  polarity=config['reset_polarity'])
+    init.add(
+        Delay(max_cycles * 10),
+        Systask('finish'),
+    )
+
+    return m
+
+
+def _build(tb, simtype, cache_dir, display=False):
+    """ compile the testbench or reuse the compiled one, and return the command """
+
+    if simtype == 'iverilog':
+        code = tb.to_verilog()
+    else:
+        code = simulation.to_verilator_code(tb, [tb])
+
+    digest = hashlib.sha256(code.encode('utf-8')).hexdigest()[:32]
+    path = os.path.join(os.path.abspath(cache_dir), '_'.join([simtype, digest]))
+    binary = (os.path.join(path, 'sim.vvp') if simtype == 'iverilog' else
+              os.path.join(path, 'obj_dir', 'Vout'))
+
+    if not os.path.exists(binary):
+        tmp = tempfile.mkdtemp(prefix='build_', dir=cache_dir)
+        try:
+            if simtype == 'iverilog':
+                with open(os.path.join(tmp, 'out.v'), 'w') as f:
+                    f.write(code)
+                _exec('iverilog -s %s -o sim.vvp out.v' % tb.name, display, cwd=tmp)
+            else:
+                simulation.to_verilator(tb, [tb], outputdir=os.path.join(tmp, 'obj_dir'),
+                                        verilog_prefix='out', cpp_prefix='sim')
+                _exec('verilator --cc -Wno-lint --Mdir obj_dir obj_dir/out.v '
+                      '--exe obj_dir/sim.cpp', display, cwd=tmp)
+                _exec('make -C obj_dir -j -f Vout.mk Vout', display, cwd=tmp)
+
+            # a concurrent build of the same code may have been finished
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                pass
+
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if simtype == 'iverilog':
+        return 'vvp %s' % shlex.quote(binary)
+    return shlex.quote(binary)
+
+
+def _exec(cmd, display=False, cwd=None):
+    rslt = subprocess.check_output(cmd, shell=True, cwd=cwd).decode('utf-8')
+    if display:
+        print(rslt, end='')
+    return rslt
+
+
+def _write_values(memory, offset, numerics, cls, values, frame=0, chunk_size=64,
+                  batch=None):
+    if values is None:
+        return
+
+    from . import tlsim
+
+    storages = [obj for obj in numerics if isinstance(obj, cls) and obj.maxi is not None]
+
+    for key, value in values.items():
+        match = [obj for obj in storages if obj is key or obj.name == key]
+        if not match:
+            raise ValueError("no such storage: '%s'" % str(key))
+
+        obj = match[0]
+        addr = obj.addr + frame * util.aligned_size(obj.memory_size, chunk_size)
+
+        # the first slices of the batch in the dynamic batch mode
+        if batch is not None:
+            value = np.reshape(value, (batch,) + tuple(obj.shape[1:]))
+            value = np.concatenate([value, np.zeros((obj.shape[0] - batch,) + value.shape[1:],
+                                                    dtype=value.dtype)])
+
+        if obj.compression_block is not None:
+            image = util.compressed_image(obj, np.reshape(value, obj.shape))
+            memory[offset + addr:offset + addr + image.size] = image
+            continue
+
+        tlsim.write_array(memory, offset + addr, np.reshape(value, obj.shape),
+                          obj.get_aligned_shape(), obj.dtype.width, obj.get_ram_width())
+
+
+_hex_digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def _write_memimg(filename, memory):
+    """ write a byte image in the format of $readmemh """
+
+    lines = np.empty([memory.size, 3], dtype=np.uint8)
+    lines[:, 0] = _hex_digits[memory >> 4]
+    lines[:, 1] = _hex_digits[memory & 0xf]
+    lines[:, 2] = ord('\n')
+
+    with open(filename, 'wb') as f:
+        f.write(lines.tobytes())
+
+
+def _read_memimg(filename, size):
+    """ read a byte image written by $writememh """
+
+    with open(filename, 'r') as f:
+        words = [line.split('//')[0].strip() for line in f]
+
+    words = [word for word in words if word and not word.startswith('@')]
+    if len(words) != size:
+        raise RuntimeError('wrong size of the memory dump: %d != %d' % (len(words), size))
+
+    # undefined bits are read as 0
+    data = re.sub('[xXzZ]', '0', ''.join([word.zfill(2) for word in words]))
+    return np.frombuffer(bytes.fromhex(data), dtype=np.uint8)
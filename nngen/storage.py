@@ -23,6 +23,59 @@ class variable(bt._Storage):
                              is_input=False)
 
 
+class derived_variable(variable):
+    """
+    Variable whose value is derived from a source object by a function,
+    such as a filter rearranged or pre-transformed for an operator,
+    or the result of a folded operator subgraph (func=None).
+    The value is computed on demand, so that the values of the source
+    variables can be assigned after the hardware generation.
+    As the other storages, a value given to eval by the name
+    overrides the derived one.
+    """
+
+    def __sub_str__(self):
+        src = self.src.name if self.src.name is not None else self.src.__class__.__name__
+        return ' derived:%s' % src
+
+    def __init__(self, src, func=None, dtype=None, shape=None, name=None):
+        if dtype is None:
+            dtype = src.dtype
+        if shape is None:
+            shape = src.shape
+
+        variable.__init__(self, dtype=dtype, shape=shape, name=name)
+        self.src = src
+        self.func = func
+        self.scale_factor = src.scale_factor
+
+    @property
+    def value(self):
+        for leaf in self.src.collect_numerics():
+            if isinstance(leaf, bt._Storage) and leaf.value is None:
+                return None
+
+        return self.derive(self.src.eval({}, {}))
+
+    @value.setter
+    def value(self, value):
+        if value is not None:
+            raise ValueError('%s value is derived from the source.' %
+                             self.__class__.__name__)
+
+    def derive(self, value):
+        if self.func is None:
+            return value
+
+        return self.func(value)
+
+    def eval(self, memo, input_dict, **kwargs):
+        if self.name is not None and self.name in input_dict:
+            return input_dict[self.name]
+
+        return self.derive(self.src.eval(memo, input_dict, **kwargs))
+
+
 class constant(bt._Constant):
 
     def __init__(self, value, dtype=None, shape=None, name=None):
@@ -4,9 +4,11 @@ from __future__ import division
 
 import math
 
-import veriloggen as vg
-import veriloggen.thread as vthread
-import veriloggen.stream as vstream
+from .lazy import lazy_import
+
+vg = lazy_import('veriloggen')
+vthread = lazy_import('veriloggen.thread')
+vstream = lazy_import('veriloggen.stream')
 
 
 _tmp_counter = 0
@@ -0,0 +1,447 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import math
+import collections
+
+import numpy as np
+
+from . import basic_types as bt
+from . import storage as st
+from . import util
+
+
+Transaction = collections.namedtuple('Transaction', ['op', 'kind', 'name', 'addr', 'size'])
+
+
+class TransactionSimulator(object):
+    """
+    Transaction-level functional simulator of a compiled network
+
+    Each scheduled operator is executed in the order of the schedule:
+    its sources are read from a flat off-chip memory at the addresses
+    the hardware computes from the global and local address maps,
+    the operator is evaluated by the verify kernels, and the result is
+    written back to the address of the operator. Every access is logged
+    and checked against the owner of the bytes, so that an operator reading
+    data which has been overwritten or never written, or writing data
+    over live storage or outside the memory map, is reported.
+
+    Values are stored as the hardware does: an element occupies a word of
+    get_ram_width() bits and the last dimension is padded to the word alignment.
+    The padding words are not written.
+
+    Temporaries kept in the on-chip activation memory are stored in
+    a separate memory ('onchip_memory'), and their accesses are logged as
+    'onchip_read' and 'onchip_write' transactions.
+
+    Weights in the zero-skip compressed format ('weight_compression') are
+    read with the size of their compressed image and decompressed.
+
+    Parameters
+    ----------
+    objs : list
+        Output objects passed to to_veriloggen()
+
+    chunk_size : int, optional
+        'offchipram_chunk_bytes' of the configuration
+
+    global_offset : int, optional
+        Global address offset
+
+    global_addrs : dict, optional
+        Global addresses set by the host per global index (e.g. by
+        ng.sim.set_global_addrs), overriding the default address map
+
+    strict : bool, optional
+        Raise ValueError on the first error instead of recording it in 'errors'
+    """
+
+    def __init__(self, objs, chunk_size=64, global_offset=0, global_addrs=None,
+                 strict=True):
+
+        if not isinstance(objs, (list, tuple)):
+            objs = [objs]
+
+        self.objs = objs
+        self.numerics = util._collect_numerics(objs)
+        self.chunk_size = chunk_size
+        self.global_offset = global_offset
+        self.strict = strict
+
+        self.errors = []
+        self.transactions = []
+
+        for obj in self.numerics:
+            if bt.is_storage(obj) and obj.maxi is not None and obj.addr < 0:
+                raise ValueError('addresses are not assigned. call to_veriloggen() first.')
+
+        self.global_addr_map, self.local_addr_map = self._make_addr_maps()
+        if global_addrs is not None:
+            self.global_addr_map.update(global_addrs)
+
+        self.schedule = self._make_schedule()
+
+        size = 0
+        for obj in self.numerics:
+            if obj.maxi is None or obj.global_index is None:
+                continue
+            size = max(size, self.get_addr(obj) + _memory_size(obj))
+        self.size = util.aligned_size(size, chunk_size)
+
+        self.memory = np.zeros([self.size], dtype=np.uint8)
+        self.owners = np.zeros([self.size], dtype=np.int64)
+
+        onchip_size = 0
+        for obj in self.numerics:
+            if obj.onchip_addr is None:
+                continue
+            onchip_size = max(onchip_size, obj.onchip_addr + _memory_size(obj))
+
+        self.onchip_memory = np.zeros([onchip_size], dtype=np.uint8)
+        self.onchip_owners = np.zeros([onchip_size], dtype=np.int64)
+        self._owner_ids = {}
+        self._owner_objs = {}
+        self._remaining_reads = collections.Counter()
+
+    def _make_addr_maps(self):
+        """ global and local address maps, which must be consistent over all objects """
+
+        global_addr_map = collections.OrderedDict()
+        local_addr_map = collections.OrderedDict()
+
+        for obj in self.numerics:
+            if obj.maxi is None or obj.global_index is None:
+                continue
+
+            for index, addr, addr_map, kind in (
+                    (obj.global_index, obj.default_global_addr, global_addr_map, 'global'),
+                    (obj.local_index, obj.default_local_addr, local_addr_map, 'local')):
+
+                # local index 0: the default local address is used as it is
+                if kind == 'local' and index == 0:
+                    continue
+
+                if index in addr_map and addr_map[index] != addr:
+                    raise ValueError("inconsistent %s address map: index %d is %d for %s, "
+                                     "but %d for another object" %
+                                     (kind, index, addr, str(obj), addr_map[index]))
+                addr_map[index] = addr
+
+        return global_addr_map, local_addr_map
+
+    def _make_schedule(self):
+        ops = []
+        for obj in self.numerics:
+            if not bt.is_operator(obj):
+                continue
+            if bt.is_view(obj) or bt.is_removable_reshape(obj):
+                continue
+            if bt.is_output_chainable_operator(obj) and not obj.chain_head:
+                continue
+            if obj.stage is None:
+                raise ValueError('%s is not scheduled.' % str(obj))
+            ops.append(obj)
+
+        return sorted(ops, key=lambda x: (x.stage, x.object_id))
+
+    def get_addr(self, obj):
+        """ address of obj which the hardware uses """
+
+        if obj.local_index == 0:
+            laddr = obj.default_local_addr
+        else:
+            laddr = self.local_addr_map[obj.local_index]
+
+        return self.global_offset + self.global_addr_map[obj.global_index] + laddr
+
+    def _owner_id(self, obj):
+        obj = _actual_storage(obj)
+        if id(obj) not in self._owner_ids:
+            self._owner_ids[id(obj)] = len(self._owner_ids) + 1
+            self._owner_objs[self._owner_ids[id(obj)]] = obj
+        return self._owner_ids[id(obj)]
+
+    def _error(self, msg):
+        if self.strict:
+            raise ValueError(msg)
+        self.errors.append(msg)
+
+    def _check_range(self, op, obj, addr, size, memory):
+        if addr < 0 or addr + size > memory.size:
+            self._error("%s accesses %s at [%d, %d), outside the memory map (%d bytes)" %
+                        (_name(op), _name(obj), addr, addr + size, memory.size))
+            return False
+        return True
+
+    def _get_memory(self, obj):
+        """ memory, owners, address and transaction prefix of obj """
+
+        if obj.onchip_addr is not None:
+            return self.onchip_memory, self.onchip_owners, obj.onchip_addr, 'onchip_'
+
+        return self.memory, self.owners, self.get_addr(obj), ''
+
+    def write(self, obj, value, op=None):
+        """ write the value of obj to its address """
+
+        memory, owners, addr, prefix = self._get_memory(obj)
+        size = _memory_size(obj)
+        self.transactions.append(Transaction(_name(op), prefix + 'write', _name(obj),
+                                             addr, size))
+
+        if not self._check_range(op, obj, addr, size, memory):
+            return
+
+        owner = self._owner_id(obj)
+        for other in np.unique(owners[addr:addr + size]):
+            if other == 0 or other == owner:
+                continue
+            other_obj = self._owner_objs[other]
+            if self._is_live(other_obj):
+                self._error("%s writes %s at [%d, %d) over live data of %s" %
+                            (_name(op), _name(obj), addr, addr + size, _name(other_obj)))
+
+        write_array(memory, addr, value, obj.get_aligned_shape(),
+                    obj.dtype.width, obj.get_ram_width())
+        owners[addr:addr + size] = owner
+
+    def read(self, obj, op=None):
+        """ read the value of obj from its address """
+
+        memory, owners, addr, prefix = self._get_memory(obj)
+        size = _memory_size(obj)
+        self.transactions.append(Transaction(_name(op), prefix + 'read', _name(obj),
+                                             addr, size))
+
+        if not self._check_range(op, obj, addr, size, memory):
+            return np.zeros(obj.shape, dtype=np.int64)
+
+        owner = self._owner_id(obj)
+        writers = np.unique(owners[addr:addr + size])
+        if len(writers) != 1 or writers[0] != owner:
+            others = [_name(self._owner_objs[o]) if o != 0 else 'nothing' for o in writers
+                      if o != owner]
+            self._error("%s reads %s at [%d, %d), but the data was written by %s" %
+                        (_name(op), _name(obj), addr, addr + size, ', '.join(others)))
+
+        if obj.compression_block is not None:
+            dense = util.decompress_weight(memory[addr:addr + size], obj.shape[0],
+                                           obj.compression_block,
+                                           bt.to_byte(obj.maxi.datawidth))
+            return read_array(dense, 0, obj.shape, obj.get_aligned_shape(),
+                              obj.dtype.width, obj.get_ram_width(), obj.dtype.signed)
+
+        return read_array(memory, addr, obj.shape, obj.get_aligned_shape(),
+                          obj.dtype.width, obj.get_ram_width(), obj.dtype.signed)
+
+    def _is_live(self, obj):
+        if bt.is_storage(obj):
+            return True
+        if any([obj is _actual_storage(out) for out in self.objs]):
+            return True
+        return self._remaining_reads[id(obj)] > 0
+
+    def load_params(self, params=None):
+        """
+        Write variables and constants to the memory
+
+        The parameter image of export_ndarray() is written by default,
+        so that its placement is checked against the addresses of the hardware.
+        """
+
+        storages = [obj for obj in self.numerics
+                    if isinstance(obj, (st.variable, st.constant)) and obj.maxi is not None]
+        if not storages:
+            return
+
+        if params is None:
+            params = util.export_ndarray(self.objs, self.chunk_size)
+
+        start = self.global_offset + min([obj.addr for obj in storages])
+        self.transactions.append(Transaction(None, 'write', 'params', start, params.size))
+        self.memory[start:start + params.size] = params
+
+        for obj in storages:
+            addr = self.get_addr(obj)
+            self.owners[addr:addr + _memory_size(obj)] = self._owner_id(obj)
+
+    def set_input(self, name, value):
+        """ write the value of a placeholder """
+
+        for obj in self.numerics:
+            if isinstance(obj, st.placeholder) and obj.name == name:
+                self.write(obj, np.reshape(value, obj.shape))
+                return
+
+        raise ValueError("no such placeholder: '%s'" % name)
+
+    def run(self, **input_dict):
+        """
+        Execute the scheduled operators
+
+        Parameters
+        ----------
+        input_dict : dict
+            Values of placeholders by name, written before the execution
+
+        Returns
+        -------
+        outputs : list
+            Values of the output objects read from the memory
+        """
+
+        for name, value in input_dict.items():
+            self.set_input(name, value)
+
+        self._remaining_reads.clear()
+        for op in self.schedule:
+            for src in op.collect_sources():
+                self._remaining_reads[id(_actual_storage(src))] += 1
+
+        for op in self.schedule:
+            sources = op.collect_sources()
+
+            # operators are looked up in memo and storages in input_dict by eval
+            memo = {}
+            values = {}
+            for src in sources:
+                value = self.read(src, op)
+                if bt.is_storage(src):
+                    values[src.name] = value
+                else:
+                    memo[id(src)] = value
+
+            # sources are live while the output is written,
+            # since the hardware reads and writes them interleaved
+            value = op.eval(memo, values)
+            self.write(op, value, op)
+
+            for src in sources:
+                self._remaining_reads[id(_actual_storage(src))] -= 1
+
+        return [self.read(obj) for obj in self.objs]
+
+
+def simulate(objs, chunk_size=64, global_offset=0, global_addrs=None, strict=True,
+             **input_dict):
+    """
+    Run a compiled network on the transaction-level simulator
+
+    Parameters
+    ----------
+    objs : list
+        Output objects passed to to_veriloggen()
+
+    input_dict : dict
+        Values of placeholders by name
+
+    Returns
+    -------
+    sim : TransactionSimulator
+        Simulator after the execution: 'outputs', 'memory' (the expected
+        memory image), 'transactions' and 'errors' (if not strict)
+    """
+
+    sim = TransactionSimulator(objs, chunk_size, global_offset, global_addrs, strict)
+    sim.load_params()
+    sim.outputs = sim.run(**input_dict)
+    return sim
+
+
+def read_array(memory, addr, shape, aligned_shape, width, ram_width, signed):
+    """ read an array stored in words of 'ram_width' bits """
+
+    length = bt.shape_to_length(aligned_shape)
+    words = _unpack(memory, addr, length, ram_width)
+
+    mask = (1 << width) - 1 if width < 64 else None
+    if mask is not None:
+        words &= np.uint64(mask)
+
+    if width == 64:
+        values = words.view(np.int64) if signed else words.astype(np.int64)
+    else:
+        values = words.astype(np.int64)
+        if signed:
+            values = np.where(values >= (1 << (width - 1)), values - (1 << width), values)
+
+    values = values.reshape(aligned_shape)[..., :shape[-1]]
+    return np.array(values)
+
+
+def write_array(memory, addr, value, aligned_shape, width, ram_width):
+    """ write the valid elements of an array stored in words of 'ram_width' bits """
+
+    length = bt.shape_to_length(aligned_shape)
+    words = _unpack(memory, addr, length, ram_width).reshape(aligned_shape)
+
+    value = np.array(value, dtype=np.int64)
+    if width < 64:
+        value = value & ((1 << width) - 1)
+
+    num = words.shape[-1] if value.ndim == 0 else value.shape[-1]
+    words[..., :num] = value.reshape(words[..., :num].shape).astype(np.uint64)
+    _pack(memory, addr, words.reshape([-1]), ram_width)
+
+
+def _unpack(memory, addr, length, ram_width):
+    if ram_width >= 8:
+        num_bytes = ram_width // 8
+        raw = memory[addr:addr + length * num_bytes].reshape([length, num_bytes])
+        words = np.zeros([length], dtype=np.uint64)
+        for i in range(num_bytes):
+            words |= raw[:, i].astype(np.uint64) << np.uint64(8 * i)
+        return words
+
+    per_byte = 8 // ram_width
+    num_bytes = int(math.ceil(length / per_byte))
+    raw = memory[addr:addr + num_bytes].astype(np.uint64)
+    shifts = np.arange(per_byte, dtype=np.uint64) * np.uint64(ram_width)
+    words = (raw[:, None] >> shifts) & np.uint64((1 << ram_width) - 1)
+    return words.reshape([-1])[:length]
+
+
+def _pack(memory, addr, words, ram_width):
+    length = words.size
+
+    if ram_width >= 8:
+        num_bytes = ram_width // 8
+        raw = np.zeros([length, num_bytes], dtype=np.uint8)
+        for i in range(num_bytes):
+            raw[:, i] = (words >> np.uint64(8 * i)) & np.uint64(0xff)
+        memory[addr:addr + length * num_bytes] = raw.reshape([-1])
+        return
+
+    per_byte = 8 // ram_width
+    num_bytes = int(math.ceil(length / per_byte))
+    padded = np.zeros([num_bytes * per_byte], dtype=np.uint64)
+    padded[:length] = words
+    shifts = np.arange(per_byte, dtype=np.uint64) * np.uint64(ram_width)
+    raw = np.bitwise_or.reduce(padded.reshape([num_bytes, per_byte]) << shifts, axis=1)
+    memory[addr:addr + num_bytes] = raw.astype(np.uint8)
+
+
+def _memory_size(obj):
+    """ bytes of obj in the memory as the hardware stores it """
+
+    if obj.compression_size is not None:
+        return obj.compression_size
+
+    length = bt.shape_to_length(obj.get_aligned_shape())
+    return int(math.ceil(length * obj.get_ram_width() / 8))
+
+
+def _actual_storage(obj):
+    while bt.is_view(obj) or bt.is_removable_reshape(obj):
+        obj = obj.args[0]
+    return obj
+
+
+def _name(obj):
+    if obj is None:
+        return 'host'
+    if obj.name is not None:
+        return "'%s'" % obj.name
+    return '<%s>' % obj.__class__.__name__
@@ -6,10 +6,11 @@ import math
 import functools
 import numpy as np
 
-import veriloggen.types.axi as axi
-
 from . import basic_types as bt
 from . import storage as st
+from .lazy import lazy_import
+
+axi = lazy_import('veriloggen.types.axi')
 
 
 def to_axis(axis, rank):
@@ -86,6 +87,38 @@ def pad_size_split(size, ksize, stride):
     return pad, a, b
 
 
+# Winograd F(2x2, 3x3) transform matrices.
+# G is scaled by 2 so that the transformed filter stays integer;
+# the output transform is followed by an exact arithmetic shift by 2.
+winograd_tile_size = 4
+winograd_out_size = 2
+winograd_kernel_size = 3
+winograd_out_shift = 2
+
+# bit growth of the transformed filter and input tile
+winograd_filter_growth = 4
+winograd_input_growth = 2
+
+winograd_g = np.array([[2, 0, 0],
+                       [1, 1, 1],
+                       [1, -1, 1],
+                       [0, 0, 2]], dtype=np.int64)
+
+winograd_bt = np.array([[1, 0, -1, 0],
+                        [0, 1, 1, 0],
+                        [0, -1, 1, 0],
+                        [0, 1, 0, -1]], dtype=np.int64)
+
+winograd_at = np.array([[1, 1, 1, 0],
+                        [0, 1, -1, -1]], dtype=np.int64)
+
+
+def winograd_filter_transform(filter):
+    # OHWI (och, 3, 3, ich) -> (och, 4, 4, ich)
+    filter = np.array(filter).astype(np.int64)
+    return np.einsum('ik,oklc,jl->oijc', winograd_g, filter, winograd_g)
+
+
 def to_storage_dict(*args, **kwargs):
     d = {}
 
@@ -186,8 +219,14 @@ def make_ndarray(variables, constants, chunk_size=64):
         if variable.value is None:
             continue
 
-        src_width = variable.dtype.width
         dst_offset = variable.addr - min_addr
+
+        if variable.compression_block is not None:
+            image = compressed_image(variable, variable.value)
+            param[dst_offset:dst_offset + image.size] = image
+            continue
+
+        src_width = variable.dtype.width
         alignment = variable.get_word_alignment()
         axi.set_memory(param, variable.value, dst_width, src_width, dst_offset, alignment)
 
@@ -203,6 +242,63 @@ def make_ndarray(variables, constants, chunk_size=64):
     return param
 
 
+def compress_weight(data, num_blocks, entry_bytes):
+    """
+    Zero-skip compressed image of the bytes of a weight in the dense format
+
+    The bytes are split into 'num_blocks' blocks of the same size (the
+    filter of each output channel). The image starts with a table of an
+    entry of 'entry_bytes' for each block, which is the byte offset of the
+    block from the start of the image, or 0 if all bytes of the block are 0.
+    The blocks which are not all 0 follow the table in order.
+    """
+
+    blocks = np.reshape(np.asarray(data, dtype=np.uint8), [num_blocks, -1])
+    nonzero = np.any(blocks != 0, axis=1)
+
+    table_size = num_blocks * entry_bytes
+    offsets = table_size + (np.cumsum(nonzero) - 1) * blocks.shape[1]
+    offsets = np.where(nonzero, offsets, 0).astype(np.uint64)
+
+    table = np.zeros([num_blocks, entry_bytes], dtype=np.uint8)
+    for i in range(min(entry_bytes, 8)):
+        table[:, i] = (offsets >> np.uint64(8 * i)) & np.uint64(0xff)
+
+    return np.concatenate([table.reshape([-1]), blocks[nonzero].reshape([-1])])
+
+
+def decompress_weight(data, num_blocks, block_size, entry_bytes):
+    """ bytes of a weight in the dense format from its compressed image """
+
+    table = np.reshape(data[:num_blocks * entry_bytes], [num_blocks, entry_bytes])
+    blocks = np.zeros([num_blocks, block_size], dtype=np.uint8)
+
+    for i, entry in enumerate(table):
+        offset = sum([int(v) << (8 * j) for j, v in enumerate(entry[:8])])
+        if offset > 0:
+            blocks[i] = data[offset:offset + block_size]
+
+    return blocks.reshape([-1])
+
+
+def compressed_image(variable, value):
+    """
+    Compressed image of a value of a variable, whose block size is set
+    by to_veriloggen() with 'weight_compression'
+    """
+
+    dense = np.zeros([variable.shape[0] * variable.compression_block], dtype=np.uint8)
+    axi.set_memory(dense, value, 8, variable.dtype.width, 0, variable.get_word_alignment())
+    image = compress_weight(dense, variable.shape[0], bt.to_byte(variable.maxi.datawidth))
+
+    if variable.compression_size is not None and image.size > variable.compression_size:
+        raise ValueError("compressed image of variable '%s' (%d bytes) exceeds the space "
+                         "of its nonzero filters at the conversion (%d bytes)" %
+                         (variable.name, image.size, variable.compression_size))
+
+    return image
+
+
 def aligned_size(size, chunk_size):
     return int(math.ceil(size / chunk_size)) * chunk_size
 
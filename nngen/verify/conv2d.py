@@ -24,22 +24,37 @@ def conv2d(input, filter, strides,
            out_ram_size=None,
            disable_keep_input=False,
            input_shape=None, filter_shape=None, out_shape=None,
+           algorithm=None, pool=None, pool_size=None,
+           residual=None, residual_a_scale=1, residual_b_scale=1, residual_shamt=0,
+           upsampling_row=1,
            input_dtype=None, filter_dtype=None,
            bias_dtype=None, scale_dtype=None,
            vshamt_mul_dtype=None, vshamt_sum_dtype=None, vshamt_out_dtype=None):
 
+    # nearest-neighbour upsampling of the input rows
+    if upsampling_row > 1:
+        input = np.repeat(input, upsampling_row, axis=1)
+
+    # winograd: filter holds the transformed (och, 4, 4, ich) weights
+    if algorithm == 'winograd':
+        filter_num_row = util.winograd_kernel_size
+        filter_num_col = util.winograd_kernel_size
+    else:
+        filter_num_row = filter.shape[1]
+        filter_num_col = filter.shape[2]
+
     # opposite order to pool
     if isinstance(padding, str) and padding == 'SAME':
         pad_col, pad_col_right, pad_col_left = util.pad_size_split(
-            input.shape[2], filter.shape[2], strides[2])
+            input.shape[2], filter_num_col, strides[2])
         pad_row, pad_row_bottom, pad_row_top = util.pad_size_split(
-            input.shape[1], filter.shape[1], strides[1])
+            input.shape[1], filter_num_row, strides[1])
 
         shape = (int(math.ceil(input.shape[0] / strides[0])),
                  util.pix_size(input.shape[1],
-                               filter.shape[1], strides[1], 'SAME'),
+                               filter_num_row, strides[1], 'SAME'),
                  util.pix_size(input.shape[2],
-                               filter.shape[2], strides[2], 'SAME'),
+                               filter_num_col, strides[2], 'SAME'),
                  int(math.ceil(filter.shape[0] / strides[3])))
 
     elif isinstance(padding, str) and padding == 'VALID':
@@ -48,9 +63,9 @@ def conv2d(input, filter, strides,
 
         shape = (int(math.ceil(input.shape[0] / strides[0])),
                  util.pix_size(input.shape[1],
-                               filter.shape[1], strides[1], 'VALID'),
+                               filter_num_row, strides[1], 'VALID'),
                  util.pix_size(input.shape[2],
-                               filter.shape[2], strides[2], 'VALID'),
+                               filter_num_col, strides[2], 'VALID'),
                  int(math.ceil(filter.shape[0] / strides[3])))
 
     elif isinstance(padding, int):
@@ -59,9 +74,9 @@ def conv2d(input, filter, strides,
 
         shape = (int(math.ceil(input.shape[0] / strides[0])),
                  util.pix_size(input.shape[1] + padding * 2,
-                               filter.shape[1], strides[1], 'VALID'),
+                               filter_num_row, strides[1], 'VALID'),
                  util.pix_size(input.shape[2] + padding * 2,
-                               filter.shape[2], strides[2], 'VALID'),
+                               filter_num_col, strides[2], 'VALID'),
                  int(math.ceil(filter.shape[0] / strides[3])))
 
     elif isinstance(padding, (tuple, list)):
@@ -70,9 +85,9 @@ def conv2d(input, filter, strides,
 
         shape = (int(math.ceil(input.shape[0] / strides[0])),
                  util.pix_size(input.shape[1] + padding[0] + padding[1],
-                               filter.shape[1], strides[1], 'VALID'),
+                               filter_num_row, strides[1], 'VALID'),
                  util.pix_size(input.shape[2] + padding[2] + padding[3],
-                               filter.shape[2], strides[2], 'VALID'),
+                               filter_num_col, strides[2], 'VALID'),
                  int(math.ceil(filter.shape[0] / strides[3])))
     else:
         raise ValueError("padding options must be 'SAME', 'VALID', int, tuple, or list.")
@@ -201,6 +216,9 @@ def conv2d(input, filter, strides,
         mul = np.right_shift(mul, rshift_mul.reshape([rshift_mul.shape[-1], 1]))
         return np.add.reduce(mul, axis=1)
 
+    if algorithm == 'winograd' and (mul_shift != 0 or rshift_mul.any()):
+        raise ValueError('winograd conv2d does not support rshift_mul and fixed-point products.')
+
     if mul_shift == 0 and rshift_mul_round.all() == 0 and rshift_mul.all() == 0:
         my_matmul = my_matmul_by_matmul
     else:
@@ -214,6 +232,9 @@ def conv2d(input, filter, strides,
         import nngen.verify as verify
         act_op = getattr(verify, act_func.__name__)
 
+    if algorithm == 'winograd':
+        winograd_sum = conv2d_winograd_sum(input, filter, shape)
+
     for bat in range(shape[0]):
         w = filter.reshape([shape[3], -1])
 
@@ -224,12 +245,15 @@ def conv2d(input, filter, strides,
             for px in range(-pad_col_left, input.shape[2] + pad_col_right, strides[2]):
 
                 ys = py + pad_row_top
-                ye = ys + filter.shape[1]
+                ye = ys + filter_num_row
                 xs = px + pad_col_left
-                xe = xs + filter.shape[2]
+                xe = xs + filter_num_col
                 a = input[bat, ys: ye, xs: xe].reshape([-1])
 
-                sum = my_matmul(a, w)
+                if algorithm == 'winograd':
+                    sum = winograd_sum[bat, oy, ox]
+                else:
+                    sum = my_matmul(a, w)
 
                 sum = np.left_shift(sum, sum_shift)
                 sum = np.add(sum, rshift_sum_round)
@@ -239,6 +263,11 @@ def conv2d(input, filter, strides,
                 sum = np.right_shift(sum, rshift_out)
                 sum = np.where(sum > p_th, p_th, np.where(sum < n_th, n_th, sum))
 
+                if residual is not None:
+                    sum = conv2d_residual_add(sum, residual[bat][oy][ox],
+                                              residual_a_scale, residual_b_scale,
+                                              residual_shamt, out_width)
+
                 out[bat][oy][ox][:] = act_op(sum)
 
                 ox += 1
@@ -249,4 +278,73 @@ def conv2d(input, filter, strides,
             if oy >= out.shape[1]:
                 break
 
+    if pool == 'max':
+        out = conv2d_max_pool(out, pool_size)
+
     return out
+
+
+def conv2d_residual_add(value, residual, a_scale, b_scale, shamt, width):
+    """ fused residual add (same as scaled_add) """
+
+    v = (value.astype(np.int64) * a_scale +
+         np.array(residual).astype(np.int64) * b_scale) >> shamt
+
+    p_th = (1 << (width - 1)) - 1
+    n_th = -1 * p_th
+
+    return np.where(v > p_th, p_th, np.where(v < n_th, n_th, v))
+
+
+def conv2d_max_pool(value, pool_size):
+    """ fused max pooling (VALID, strides of pool_size) """
+
+    if isinstance(pool_size, int):
+        pool_size = (pool_size, pool_size)
+
+    ksize_row, ksize_col = pool_size
+    num_row = value.shape[1] // ksize_row
+    num_col = value.shape[2] // ksize_col
+
+    value = value[:, :num_row * ksize_row, :num_col * ksize_col, :]
+    value = value.reshape([value.shape[0], num_row, ksize_row,
+                           num_col, ksize_col, value.shape[-1]])
+
+    return np.max(value, axis=(2, 4))
+
+
+def conv2d_winograd_sum(input, filter, shape):
+    """
+    Accumulated sums of Winograd F(2x2, 3x3) for a padded input.
+    The filter is the transformed (och, 4, 4, ich) weights, and
+    every 4x4 input tile produces a 2x2 output tile.
+    """
+
+    tile_size = util.winograd_tile_size
+    out_size = util.winograd_out_size
+
+    num_tile_row = int(math.ceil(shape[1] / out_size))
+    num_tile_col = int(math.ceil(shape[2] / out_size))
+
+    # zero-fill the incomplete tiles at the bottom and right edges
+    res_row = max((num_tile_row - 1) * out_size + tile_size - input.shape[1], 0)
+    res_col = max((num_tile_col - 1) * out_size + tile_size - input.shape[2], 0)
+    input = np.pad(input.astype(np.int64),
+                   [(0, 0), (0, res_row), (0, res_col), (0, 0)], 'constant')
+    filter = filter.astype(np.int64)
+
+    sum = np.zeros([shape[0], num_tile_row * out_size, num_tile_col * out_size, shape[3]],
+                   dtype=np.int64)
+
+    for ty in range(num_tile_row):
+        for tx in range(num_tile_col):
+            ys = ty * out_size
+            xs = tx * out_size
+            d = input[:, ys:ys + tile_size, xs:xs + tile_size, :]
+            v = np.einsum('ik,bklc,jl->bijc', util.winograd_bt, d, util.winograd_bt)
+            m = np.einsum('bijc,oijc->boij', v, filter)
+            y = np.einsum('ik,bokl,jl->bijo', util.winograd_at, m, util.winograd_at)
+            sum[:, ys:ys + out_size, xs:xs + out_size, :] = np.right_shift(
+                y, util.winograd_out_shift)
+
+    return sum[:, :shape[1], :shape[2], :]
@@ -0,0 +1,152 @@
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+import nngen.util as util
+from nngen.operator.leaky_relu import leaky_relu_base
+from .leaky_relu import get_leaky_relu_op
+
+
+def depthwise_conv2d(input, filter, strides,
+                     bias=None, scale=None,
+                     rshift_mul=None, rshift_sum=None, rshift_out=None,
+                     act_func=None, padding='SAME',
+                     dtype=None, mul_dtype=None, sum_dtype=None,
+                     name=None, par=1,
+                     input_ram_size=None, out_ram_size=None,
+                     input_dtype=None, filter_dtype=None,
+                     bias_dtype=None, scale_dtype=None):
+
+    ksize_row = filter.shape[0]
+    ksize_col = filter.shape[1]
+    stride_row = strides[1]
+    stride_col = strides[2]
+
+    # same order as conv2d
+    if isinstance(padding, str) and padding == 'SAME':
+        pad_col, pad_col_right, pad_col_left = util.pad_size_split(
+            input.shape[2], ksize_col, stride_col)
+        pad_row, pad_row_bottom, pad_row_top = util.pad_size_split(
+            input.shape[1], ksize_row, stride_row)
+
+    elif isinstance(padding, str) and padding == 'VALID':
+        pad_col, pad_col_left, pad_col_right = 0, 0, 0
+        pad_row, pad_row_top, pad_row_bottom = 0, 0, 0
+
+    elif isinstance(padding, int):
+        pad_col, pad_col_left, pad_col_right = padding * 2, padding, padding
+        pad_row, pad_row_top, pad_row_bottom = padding * 2, padding, padding
+
+    elif isinstance(padding, (tuple, list)):
+        pad_col, pad_col_left, pad_col_right = padding[2] + padding[3], padding[2], padding[3]
+        pad_row, pad_row_top, pad_row_bottom = padding[0] + padding[1], padding[0], padding[1]
+
+    else:
+        raise ValueError("padding options must be 'SAME', 'VALID', int, tuple, or list.")
+
+    if isinstance(padding, str) and padding == 'SAME':
+        out_shape = (input.shape[0],
+                     util.pix_size(input.shape[1], ksize_row, stride_row, 'SAME'),
+                     util.pix_size(input.shape[2], ksize_col, stride_col, 'SAME'),
+                     input.shape[3])
+    else:
+        out_shape = (input.shape[0],
+                     util.pix_size(input.shape[1] + pad_row,
+                                   ksize_row, stride_row, 'VALID'),
+                     util.pix_size(input.shape[2] + pad_col,
+                                   ksize_col, stride_col, 'VALID'),
+                     input.shape[3])
+
+    num_ch = out_shape[-1]
+
+    def to_vector(value, default):
+        if value is None:
+            return np.full([num_ch], default, dtype=np.int64)
+        if not isinstance(value, np.ndarray):
+            return np.full([num_ch], value, dtype=np.int64)
+        if len(value.shape) == 1 and value.shape[0] == 1:
+            return np.full([num_ch], value[0], dtype=np.int64)
+        return value.astype(np.int64)
+
+    bias = to_vector(bias, 0)
+    scale = to_vector(scale, 1)
+    rshift_mul = to_vector(rshift_mul, 0)
+    rshift_sum = to_vector(rshift_sum, 0)
+    rshift_out = to_vector(rshift_out, 0)
+
+    rshift_mul_round = np.where(rshift_mul > 0,
+                                np.left_shift(1, np.maximum(rshift_mul - 1, 0)),
+                                0)
+    rshift_sum_round = np.where(rshift_sum > 0,
+                                np.left_shift(1, np.maximum(rshift_sum - 1, 0)),
+                                0)
+
+    input_point = 0 if input_dtype is None else input_dtype.point
+    filter_point = 0 if filter_dtype is None else filter_dtype.point
+    bias_point = 0 if bias_dtype is None else bias_dtype.point
+    scale_point = 0 if scale_dtype is None else scale_dtype.point
+    out_point = (max(input_point, filter_point)
+                 if dtype is None else dtype.point)
+    out_width = 32 if dtype is None else dtype.width
+
+    mul_point = max(input_point, filter_point)
+    mul_shift = min(input_point, filter_point)
+    sum_point = mul_point
+    add_point = max(sum_point, bias_point)
+
+    sum_shift = add_point - sum_point
+    bias_shift = add_point - bias_point
+    shifted_bias = np.left_shift(bias, bias_shift)
+
+    scl_point = max(sum_point, scale_point)
+    scl_shift = min(sum_point, scl_point)
+    shifted_scale = np.right_shift(scale, scl_shift)
+
+    p_th = (1 << (out_width - 1)) - 1
+    n_th = -1 * p_th
+    p_th = p_th >> out_point
+    n_th = n_th >> out_point
+
+    if act_func is None:
+        def act_op(x): return x
+    elif issubclass(act_func, leaky_relu_base):
+        act_op = get_leaky_relu_op(act_func.slope, act_func.rshift, dtype)
+    else:
+        import nngen.verify as verify
+        act_op = getattr(verify, act_func.__name__)
+
+    input = np.pad(input.astype(np.int64),
+                   [(0, 0),
+                    (pad_row_top, pad_row_bottom),
+                    (pad_col_left, pad_col_right),
+                    (0, 0)], 'constant')
+    filter = filter.astype(np.int64)
+
+    out = np.zeros(out_shape, dtype=np.int64)
+
+    for oy in range(out_shape[1]):
+        for ox in range(out_shape[2]):
+            ys = oy * stride_row
+            xs = ox * stride_col
+            a = input[:, ys:ys + ksize_row, xs:xs + ksize_col, :]
+
+            mul = np.multiply(a, filter)
+            mul = np.right_shift(mul, mul_shift)
+            mul = np.add(mul, rshift_mul_round)
+            mul = np.right_shift(mul, rshift_mul)
+
+            sum = np.add.reduce(mul.reshape([out_shape[0], -1, num_ch]), axis=1)
+
+            sum = np.left_shift(sum, sum_shift)
+            sum = np.add(sum, rshift_sum_round)
+            sum = np.right_shift(sum, rshift_sum)
+            sum = np.add(sum, shifted_bias)
+            sum = np.multiply(sum, shifted_scale)
+            sum = np.right_shift(sum, rshift_out)
+            sum = np.where(sum > p_th, p_th, np.where(sum < n_th, n_th, sum))
+
+            out[:, oy, ox, :] = act_op(sum)
+
+    return out
@@ -22,6 +22,9 @@ def ternary_weight_conv2d(input, filter, strides,
                           vshamt_out_ram_size=None,
                           out_ram_size=None,
                           disable_keep_input=False,
+                          algorithm=None, pool=None, pool_size=None,
+                          residual=None, residual_a_scale=1, residual_b_scale=1,
+                          residual_shamt=0, upsampling_row=1,
                           input_dtype=None, filter_dtype=None,
                           bias_dtype=None, scale_dtype=None):
 
@@ -42,5 +45,9 @@ def ternary_weight_conv2d(input, filter, strides,
                   vshamt_out_ram_size,
                   out_ram_size,
                   disable_keep_input,
-                  input_dtype, filter_dtype,
-                  bias_dtype, scale_dtype)
+                  algorithm=algorithm, pool=pool, pool_size=pool_size,
+                  residual=residual, residual_a_scale=residual_a_scale,
+                  residual_b_scale=residual_b_scale, residual_shamt=residual_shamt,
+                  upsampling_row=upsampling_row,
+                  input_dtype=input_dtype, filter_dtype=filter_dtype,
+                  bias_dtype=bias_dtype, scale_dtype=scale_dtype)
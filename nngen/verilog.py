@@ -7,6 +7,7 @@ import collections
 import copy
 import inspect
 import types
+import weakref
 
 import veriloggen as vg
 import veriloggen.types.axi as axi
@@ -18,6 +19,19 @@ from . import dtype_list
 from . import scheduler
 from . import version
 from . import substreams
+from . import resource
+from .folding import fold_constants, fold_pad, fold_upsampling
+from .registers import (num_header_regs, header_reg,
+                        num_control_regs, control_reg_start, control_reg_busy,
+                        control_reg_reset, control_reg_extern_send,
+                        control_reg_extern_recv, control_reg_global_offset,
+                        control_reg_global_addr,
+                        num_addr_map_regs, control_reg_load_global_addr_map,
+                        control_reg_busy_global_addr_map,
+                        control_reg_addr_global_addr_map,
+                        num_frame_queue_regs, frame_queue_reg_slots,
+                        frame_queue_reg_num, frame_queue_reg_queued,
+                        frame_queue_reg_done, make_register_layout)
 
 
 default_config = {
@@ -33,6 +47,8 @@ default_config = {
     'saxi_datawidth': 32,
     'saxi_addrwidth': 32,
     'default_global_addr_offset': 0,
+    'maxi_ports': 1,  # number of AXI master ports
+    'maxi_port_policy': 'traffic',  # 'traffic', 'operator', or dict of port indexes
     'use_map_reg': False,
     'use_map_ram': False,
     'use_param_ram': False,
@@ -41,8 +57,15 @@ default_config = {
     # default parameters
     'default_datawidth': 32,
     'min_onchip_ram_capacity': 32 * 128,
+    'max_onchip_ram_capacity': None,  # column tiling of conv2d and pool if specified
     'offchipram_chunk_bytes': 64,
     'max_parallel_ops': 1,
+    'weight_prefetch': False,  # read the parameters of conv2d during the previous stage
+    'onchip_activation_bytes': 0,  # keep temporaries read by a single operator on-chip
+    'num_cores': 1,  # replicated cores among which the batch of conv2d is split
+    'dataflow_segments': 0,  # pipelined segments of stages working on consecutive frames
+    'dynamic_batch': False,  # batch size of the placeholders set by a register at runtime
+    'weight_compression': False,  # zero-skip compressed filters of conv2d for pruned models
 
     # RAM style annotation
     'onchip_ram_style': None,  # '(* ram_style = "block" *)' for Xilinx
@@ -53,34 +76,55 @@ default_config = {
     # 'onchip_ram_priority': 'max_size',
     # 'onchip_ram_priority': (lambda cur, width, length, num: cur + width * length * num),
 
+    # target device of the resource estimate (see nngen.resource.device_profiles)
+    'resource_device': None,
+
     # for debug
     'fsm_as_module': False,
     'disable_stream_cache': False,
     'disable_control_cache': False,
+    'disable_constant_folding': False,
+    'disable_pad_folding': False,
+    'disable_upsampling_folding': False,
     'dump_stream': False,
     'dump_stream_base': 10,
 }
 
 max_burst_length = 256
 
-num_header_regs = 4
-header_reg = 0
+# output objects and configuration of each generated module
+generated_modules = weakref.WeakKeyDictionary()
+
+# ResourceEstimate of each generated module
+resource_estimates = weakref.WeakKeyDictionary()
+
+# AXI master ports of each generated module
+module_maxi_ports = weakref.WeakKeyDictionary()
+
+# AXI master ports of the replicated cores of each generated module
+module_core_maxi_ports = weakref.WeakKeyDictionary()
+
+# AXI master port of the weight prefetch of each generated module
+module_prefetch_maxi = weakref.WeakKeyDictionary()
+
+# AXI master ports of the dataflow segments of each generated module
+module_segment_maxi_ports = weakref.WeakKeyDictionary()
+
+# S-AXI registers (registers.RegisterLayout) of each generated module
+module_register_layouts = weakref.WeakKeyDictionary()
 
-num_control_regs = 6
-control_reg_start = num_header_regs + 0
-control_reg_busy = num_header_regs + 1
-control_reg_reset = num_header_regs + 2
-control_reg_extern_send = num_header_regs + 3
-control_reg_extern_recv = num_header_regs + 4
-control_reg_global_offset = num_header_regs + 5
+# index of the first frame queue register of each generated module
+module_frame_queue_regs = weakref.WeakKeyDictionary()
 
-control_reg_global_addr = num_header_regs + num_control_regs
+# FSMs of the dataflow segments of each generated module
+module_dataflow_fsms = weakref.WeakKeyDictionary()
+
+# index of the batch size register of each generated module
+module_dynamic_batch_regs = weakref.WeakKeyDictionary()
+
+# traffic classes of DMA transfers
+maxi_traffic_classes = ('act', 'param', 'output')
 
-# when config['use_map_ram'] is True
-num_addr_map_regs = 3
-control_reg_load_global_addr_map = num_header_regs + num_control_regs
-control_reg_busy_global_addr_map = num_header_regs + num_control_regs + 1
-control_reg_addr_global_addr_map = num_header_regs + num_control_regs + 2
 
 
 def to_veriloggen(objs, name, config=None, silent=False):
@@ -130,6 +174,45 @@ def to_ipxact(objs, name, ipname=None, config=None, silent=False):
     return m
 
 
+def estimate_resources(objs, config=None, device=None):
+    """
+    Estimate the FPGA resources of a network before the logic synthesis
+
+    Parameters
+    ----------
+    objs : list or veriloggen.Module
+        Output objects, or a module returned by to_veriloggen()
+
+    config : dict, optional
+        Configuration of to_veriloggen(), if objs are output objects
+
+    device : str, optional
+        Target device (see nngen.resource.device_profiles)
+
+    Returns
+    -------
+    estimate : nngen.resource.ResourceEstimate
+    """
+
+    if isinstance(objs, vg.Module):
+        if objs not in resource_estimates:
+            raise ValueError('not a module returned by to_veriloggen()')
+        m = objs
+
+    else:
+        config = load_default_config(config)
+        m = _to_veriloggen_module(objs, 'nngen_resource_estimate', config, silent=True)
+
+    estimate = resource_estimates[m]
+
+    if device is not None:
+        resource.get_device_profile(device)
+        estimate = copy.copy(estimate)
+        estimate.device = device
+
+    return estimate
+
+
 def load_default_config(config=None):
     my_config = copy.copy(default_config)
 
@@ -147,22 +230,46 @@ def _to_veriloggen_module(objs, name, config=None,
     if not isinstance(objs, (list, tuple)):
         objs = [objs]
 
+    outputs = list(objs)
+
+    if not config['disable_pad_folding']:
+        fold_pad(objs)
+
+    if not config['disable_constant_folding']:
+        fold_constants(objs)
+
+    if not config['disable_upsampling_folding']:
+        fold_upsampling(objs)
+
     (objs, num_storages,
      num_input_storages, num_output_storages) = analyze(config, objs)
     m, clk, rst, maxi, saxi = make_module(config, name, objs,
                                           num_storages, num_input_storages,
                                           num_output_storages)
 
+    # for the host runtime (runtime.make_memory_layout)
+    for obj in outputs:
+        obj.register_layout = module_register_layouts[m]
+
     schedule_table = schedule(config, objs)
 
+    maxi_port_map = assign_maxi_ports(config, schedule_table, module_maxi_ports[m])
+
     header_info = make_header_addr_map(config, saxi)
 
     (ram_dict, substrm_dict, ram_set_cache,
      stream_cache, control_cache, main_fsm,
-     global_map_info, global_mem_map) = allocate(config, m, clk, rst,
-                                                 maxi, saxi, objs, schedule_table)
+     global_map_info, global_mem_map,
+     control_param_dict) = allocate(config, m, clk, rst,
+                                    maxi, saxi, objs, schedule_table)
+
+    reg_map = make_reg_map(config, global_map_info, header_info,
+                           module_frame_queue_regs.get(m),
+                           module_dynamic_batch_regs.get(m))
 
-    reg_map = make_reg_map(config, global_map_info, header_info)
+    estimate = resource.estimate(config, schedule_table, ram_dict, substrm_dict,
+                                 stream_cache, control_param_dict, control_cache,
+                                 main_fsm, len(reg_map))
 
     if not silent:
         dump_config(config, where_from, output)
@@ -172,7 +279,24 @@ def _to_veriloggen_module(objs, name, config=None,
         dump_streams(stream_cache)
         dump_controls(control_cache, main_fsm)
         dump_register_map(reg_map)
+        if config['maxi_ports'] > 1:
+            dump_maxi_ports(maxi_port_map)
+        if config['weight_prefetch']:
+            dump_prefetch(schedule_table)
+        if config['onchip_activation_bytes']:
+            dump_onchip_activations(config, schedule_table)
+        if config['dataflow_segments']:
+            dump_dataflow_segments(config, schedule_table)
+        if config['dynamic_batch']:
+            dump_dynamic_batch(schedule_table)
+        if config['weight_compression']:
+            dump_weight_compression(schedule_table)
         dump_memory_map(global_mem_map)
+        dump_resources(estimate)
+
+    # for ng.sim.run()
+    generated_modules[m] = (outputs, config)
+    resource_estimates[m] = estimate
 
     return m
 
@@ -260,35 +384,106 @@ def make_module(config, name, objs, num_storages, num_input_storages, num_output
     prot_mode = axi.AxPROT_COHERENT if config['axi_coherent'] else axi.AxPROT_NONCOHERENT
     user_mode = axi.AxUSER_COHERENT if config['axi_coherent'] else axi.AxUSER_NONCOHERENT
 
-    maxi = vthread.AXIM(m, 'maxi', clk, rst, datawidth, addrwidth,
-                        waddr_cache_mode=cache_mode, raddr_cache_mode=cache_mode,
-                        waddr_prot_mode=prot_mode, raddr_prot_mode=prot_mode,
-                        waddr_user_mode=user_mode, raddr_user_mode=user_mode,
-                        enable_async=True, use_global_base_addr=True,
-                        fsm_as_module=config['fsm_as_module'])
+    if config['maxi_ports'] < 1:
+        raise ValueError("maxi_ports must be 1 or more, not %d" %
+                         config['maxi_ports'])
+
+    if not isinstance(config['num_cores'], int) or config['num_cores'] < 1:
+        raise ValueError("num_cores must be 1 or more, not %s" %
+                         str(config['num_cores']))
+
+    num_segments = config['dataflow_segments']
+    if not isinstance(num_segments, int) or num_segments < 0:
+        raise ValueError("dataflow_segments must be 0 or more, not %s" %
+                         str(num_segments))
+
+    if num_segments:
+        for key in ('weight_prefetch', 'onchip_activation_bytes', 'use_map_ram'):
+            if config[key]:
+                raise ValueError("dataflow_segments cannot be combined with '%s'" % key)
+
+        if config['num_cores'] > 1:
+            raise ValueError("dataflow_segments cannot be combined with 'num_cores'")
+
+    if config['dynamic_batch'] and config['num_cores'] > 1:
+        raise ValueError("dynamic_batch cannot be combined with 'num_cores'")
+
+    if config['weight_compression'] and config['weight_prefetch']:
+        raise ValueError("weight_compression cannot be combined with 'weight_prefetch'")
+
+    port_names = ['maxi' if i == 0 else 'maxi%d' % i
+                  for i in range(config['maxi_ports'])]
+
+    # transfers of concurrent control threads on an AXI master port are not
+    # arbitrated, so that each replicated core has its own ports
+    for core_index in range(1, config['num_cores']):
+        port_names.extend(['maxi_core%d' % core_index if i == 0 else
+                           'maxi_core%d_%d' % (core_index, i)
+                           for i in range(config['maxi_ports'])])
+
+    # so does each dataflow segment
+    for segment in range(1, num_segments):
+        port_names.extend(['maxi_segment%d' % segment if i == 0 else
+                           'maxi_segment%d_%d' % (segment, i)
+                           for i in range(config['maxi_ports'])])
+
+    if config['weight_prefetch']:
+        port_names.append('maxi_prefetch')
+
+    all_maxi_ports = []
+    for port_name in port_names:
+        port = vthread.AXIM(m, port_name, clk, rst, datawidth, addrwidth,
+                            waddr_cache_mode=cache_mode, raddr_cache_mode=cache_mode,
+                            waddr_prot_mode=prot_mode, raddr_prot_mode=prot_mode,
+                            waddr_user_mode=user_mode, raddr_user_mode=user_mode,
+                            enable_async=True, use_global_base_addr=True,
+                            fsm_as_module=config['fsm_as_module'])
+        all_maxi_ports.append(port)
+
+    maxi_ports = all_maxi_ports[:config['maxi_ports']]
+    maxi = maxi_ports[0]
+    module_maxi_ports[m] = maxi_ports
+
+    module_core_maxi_ports[m] = [
+        all_maxi_ports[core_index * config['maxi_ports']:
+                       (core_index + 1) * config['maxi_ports']]
+        for core_index in range(1, config['num_cores'])]
+
+    module_segment_maxi_ports[m] = [
+        all_maxi_ports[(config['num_cores'] + segment - 1) * config['maxi_ports']:
+                       (config['num_cores'] + segment) * config['maxi_ports']]
+        for segment in range(1, num_segments)]
+
+    if config['weight_prefetch']:
+        module_prefetch_maxi[m] = all_maxi_ports[-1]
 
     datawidth = config['saxi_datawidth']
     addrwidth = config['saxi_addrwidth']
 
-    num_unified_storages = 1
-    num_temporal_storages = 1
+    reg_layout = make_register_layout(config, num_storages,
+                                      num_input_storages, num_output_storages)
+    module_register_layouts[m] = reg_layout
 
-    if config['use_map_ram']:
-        length = num_header_regs + num_control_regs + num_addr_map_regs
-    elif not config['use_map_reg']:
-        length = (num_header_regs + num_control_regs +
-                  num_temporal_storages + num_input_storages + num_output_storages +
-                  num_unified_storages)
-    else:
-        length = (num_header_regs + num_control_regs +
-                  num_temporal_storages + num_storages)
+    if reg_layout.frame_queue_reg is not None:
+        module_frame_queue_regs[m] = reg_layout.frame_queue_reg
+
+    if reg_layout.batch_reg is not None:
+        module_dynamic_batch_regs[m] = reg_layout.batch_reg
 
     saxi = vthread.AXISLiteRegister(m, 'saxi', clk, rst,
-                                    datawidth, addrwidth, length=length,
+                                    datawidth, addrwidth, length=reg_layout.num_regs,
                                     fsm_as_module=config['fsm_as_module'])
 
+    # a single frame by default
+    if num_segments:
+        frame_regs = saxi.register[module_frame_queue_regs[m]:]
+        frame_regs[frame_queue_reg_slots].initval = get_num_frame_slots(config)
+        frame_regs[frame_queue_reg_num].initval = 1
+        frame_regs[frame_queue_reg_queued].initval = 1
+
     maxi_idle = m.Wire('maxi_idle')
-    maxi_idle.assign(vg.And(maxi.write_idle, maxi.read_idle))
+    maxi_idle.assign(vg.Ands(*[vg.And(port.write_idle, port.read_idle)
+                               for port in all_maxi_ports]))
 
     sw_rst_logic = m.Wire('sw_rst_logic')
     sw_rst_logic.assign(vg.And(maxi_idle, saxi.register[control_reg_reset]))
@@ -311,12 +506,290 @@ def make_module(config, name, objs, num_storages, num_input_storages, num_output
     return m, clk, sys_rst, maxi, saxi
 
 
+def get_all_maxi_ports(m):
+    """ AXI master ports of a generated module including the ports of
+    the replicated cores, the dataflow segments and the prefetch port """
+
+    ports = list(module_maxi_ports[m])
+    for core_ports in module_core_maxi_ports[m]:
+        ports.extend(core_ports)
+
+    for segment_ports in module_segment_maxi_ports[m]:
+        ports.extend(segment_ports)
+
+    if m in module_prefetch_maxi:
+        ports.append(module_prefetch_maxi[m])
+
+    return ports
+
+
+def get_num_maxi_ports(config):
+    return (config['maxi_ports'] * config['num_cores'] +
+            config['maxi_ports'] * max(config['dataflow_segments'] - 1, 0) +
+            (1 if config['weight_prefetch'] else 0))
+
+
+def get_num_frame_slots(config):
+    """ number of frames of each input and output in the off-chip memory
+    in the dataflow mode, a power of 2 to hold the frames in flight
+    and the next frame written by the host """
+
+    num_segments = config['dataflow_segments']
+    if not num_segments:
+        return 1
+
+    return 2 ** int(math.ceil(math.log(num_segments + 1, 2)))
+
+
 def schedule(config, objs):
     s = scheduler.OperationScheduler(config)
     s.schedule(objs)
     return s.result
 
 
+def get_control_operators(objs):
+    """ operators that own a control thread, in the order of execution """
+
+    ret = []
+    for obj in objs:
+        if not bt.is_operator(obj):
+            continue
+
+        if bt.is_view(obj):
+            continue
+
+        if bt.is_removable_reshape(obj):
+            continue
+
+        if (bt.is_output_chainable_operator(obj) and
+                not obj.chain_head):
+            continue
+
+        ret.append(obj)
+
+    return ret
+
+
+def assign_maxi_ports(config, schedule_table, maxi_ports):
+    """ assign an AXI master port to each traffic class of each operator """
+
+    policy = config['maxi_port_policy']
+    num_ports = len(maxi_ports)
+
+    if isinstance(policy, dict):
+        for traffic in maxi_traffic_classes:
+            if traffic not in policy:
+                raise ValueError("no AXI master port is assigned to '%s' traffic" %
+                                 traffic)
+            index = policy[traffic]
+            if not isinstance(index, int) or index < 0 or index >= num_ports:
+                raise ValueError("AXI master port index of '%s' traffic is out of range: %s" %
+                                 (traffic, str(index)))
+
+    elif policy not in ('traffic', 'operator'):
+        raise ValueError("unsupported maxi_port_policy: '%s'" % str(policy))
+
+    maxi_port_map = collections.OrderedDict()
+    count = 0
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            if isinstance(policy, dict):
+                indexes = [policy[traffic] for traffic in maxi_traffic_classes]
+            elif policy == 'traffic':
+                indexes = [0, 1 % num_ports, 2 % num_ports]
+            else:
+                # operators of a stage run concurrently on different ports
+                indexes = [count % num_ports] * len(maxi_traffic_classes)
+                count += 1
+
+            ports = collections.OrderedDict(
+                [(traffic, maxi_ports[index])
+                 for traffic, index in zip(maxi_traffic_classes, indexes)])
+
+            # a single port keeps the control threads as they were
+            obj.set_maxi_ports(ports if num_ports > 1 else None)
+
+            maxi_port_map[(stage, obj.name)] = ports
+
+    return maxi_port_map
+
+
+def select_onchip_activations(config, schedule_table):
+    """
+    Select the temporaries kept in the on-chip activation memory,
+    and return the size of the memory in bytes
+
+    The output of an operator is kept on-chip, if it is read by a single
+    operator only and it fits in the rest of 'onchip_activation_bytes'.
+    The space is reused after the stage of the consumer.
+    """
+
+    capacity = config['onchip_activation_bytes']
+    chunk_size = config['offchipram_chunk_bytes']
+
+    if capacity is None or capacity < 0:
+        raise ValueError("onchip_activation_bytes must be 0 or more, not %s" %
+                         str(capacity))
+
+    objs = []
+    for stage, stage_objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        objs.extend(get_control_operators(stage_objs))
+
+    readers = collections.defaultdict(list)
+    for obj in objs:
+        obj.onchip_addr = None
+        obj.onchip_maxi = None
+
+        for src in obj.collect_sources():
+            if id(obj) not in [id(reader) for reader in readers[id(src)]]:
+                readers[id(src)].append(obj)
+
+    if not capacity:
+        return 0
+
+    # (start, end, stage of the consumer)
+    spaces = []
+    num_bytes = 0
+
+    for obj in objs:
+        if obj.is_output:
+            continue
+
+        # the consumer reads the output directly, not through a view or a chain
+        consumers = readers[id(obj)]
+        if len(consumers) != 1:
+            continue
+
+        consumer = consumers[0]
+        if any([c is not consumer for c in obj.consumers]):
+            continue
+
+        space_size = align_space(obj.dtype.width, obj.get_aligned_length(), chunk_size)
+
+        live = sorted([(start, end) for start, end, stage in spaces
+                       if stage >= obj.stage])
+
+        addr = 0
+        for start, end in live:
+            if addr + space_size <= start:
+                break
+            addr = max(addr, end)
+
+        if addr + space_size > capacity:
+            continue
+
+        obj.onchip_addr = addr
+        spaces.append((addr, addr + space_size, consumer.stage))
+        num_bytes = max(num_bytes, addr + space_size)
+
+    return num_bytes
+
+
+def get_onchip_activations(schedule_table):
+    ret = []
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            if obj.onchip_addr is not None:
+                ret.append(obj)
+
+    return ret
+
+
+def get_onchip_activation_bytes(config, schedule_table):
+    chunk_size = config['offchipram_chunk_bytes']
+    return max([obj.onchip_addr + align_space(obj.dtype.width, obj.get_aligned_length(),
+                                              chunk_size)
+                for obj in get_onchip_activations(schedule_table)] + [0])
+
+
+def make_onchip_memory(config, m, clk, rst, num_bytes):
+    """
+    Make the on-chip activation memory and an internal AXI master port to it
+
+    The memory serves a burst at a time with a word per cycle,
+    so that the DMA transfers of the control threads work as they are.
+    """
+
+    datawidth = config['maxi_datawidth']
+    addrwidth = config['maxi_addrwidth']
+
+    maxi = vthread.AXIM(m, 'maxi_onchip', clk, rst, datawidth, addrwidth,
+                        noio=True, enable_async=True,
+                        fsm_as_module=config['fsm_as_module'])
+
+    # not an interface of the IP
+    m.masterbus.remove(maxi)
+
+    word_bytes = datawidth // 8
+    shift = int(math.log(word_bytes, 2))
+    num_words = int(math.ceil(num_bytes / word_bytes))
+    mem_addrwidth = max(int(math.ceil(math.log(num_words, 2))), 1)
+
+    mem = m.Reg('onchip_activation_mem', datawidth, num_words)
+    write_addr = m.Reg('onchip_activation_write_addr', mem_addrwidth, initval=0)
+    read_addr = m.Reg('onchip_activation_read_addr', mem_addrwidth, initval=0)
+    read_count = m.Reg('onchip_activation_read_count', max_burst_length.bit_length(),
+                       initval=0)
+    read_data = m.Reg('onchip_activation_read_data', datawidth, initval=0)
+
+    state_idle, state_write, state_write_resp, state_read_wait, state_read = range(5)
+    fsm = vg.FSM(m, 'onchip_activation_fsm', clk, rst)
+
+    maxi.waddr.awready.assign(vg.Ands(fsm.state == state_idle, maxi.waddr.awvalid))
+    maxi.raddr.arready.assign(vg.Ands(fsm.state == state_idle,
+                                      vg.Not(maxi.waddr.awvalid), maxi.raddr.arvalid))
+    maxi.wdata.wready.assign(fsm.state == state_write)
+    maxi.wresp.bvalid.assign(fsm.state == state_write_resp)
+    maxi.wresp.bresp.assign(0)
+    maxi.rdata.rvalid.assign(fsm.state == state_read)
+    maxi.rdata.rdata.assign(read_data)
+    maxi.rdata.rresp.assign(0)
+    maxi.rdata.rlast.assign(vg.Ands(fsm.state == state_read, read_count == 1))
+
+    read_ack = vg.Ands(maxi.rdata.rvalid, maxi.rdata.rready)
+
+    # a synchronous read of the next word
+    fsm.seq(
+        read_data(mem[vg.Mux(read_ack, read_addr + 1, read_addr)])
+    )
+
+    # idle: a write request first
+    fsm.If(maxi.waddr.awvalid)(
+        write_addr(maxi.waddr.awaddr >> shift)
+    )
+    fsm.If(maxi.waddr.awvalid).goto(state_write)
+    fsm.If(vg.Not(maxi.waddr.awvalid), maxi.raddr.arvalid)(
+        read_addr(maxi.raddr.araddr >> shift),
+        read_count(maxi.raddr.arlen + 1)
+    )
+    fsm.If(vg.Not(maxi.waddr.awvalid), maxi.raddr.arvalid).goto(state_read_wait)
+
+    # write
+    fsm.set_index(state_write)
+    fsm.If(maxi.wdata.wvalid)(
+        mem[write_addr](maxi.wdata.wdata),
+        write_addr.inc()
+    )
+    fsm.If(maxi.wdata.wvalid, maxi.wdata.wlast).goto(state_write_resp)
+
+    fsm.set_index(state_write_resp)
+    fsm.If(maxi.wresp.bready).goto(state_idle)
+
+    # read
+    fsm.set_index(state_read_wait)
+    fsm.goto(state_read)
+
+    fsm.set_index(state_read)
+    fsm.If(maxi.rdata.rready)(
+        read_addr.inc(),
+        read_count.dec()
+    )
+    fsm.If(maxi.rdata.rready, read_count == 1).goto(state_idle)
+
+    return maxi
+
+
 def make_header_addr_map(config, saxi):
     header_info = collections.OrderedDict()
     header_regs = saxi.register[:num_header_regs]
@@ -331,17 +804,33 @@ def make_header_addr_map(config, saxi):
 
 
 def allocate(config, m, clk, rst, maxi, saxi, objs, schedule_table):
+    assign_dynamic_batch(config, m, saxi, objs)
+    assign_weight_compression(config, objs)
+
     set_storage_name(objs)
+    # column tiling changes the stream hashes
+    set_col_tiles(config, objs)
     set_shared_attrs(objs)
 
-    max_stream_rams = calc_max_stream_rams(config, schedule_table)
-    ram_dict = make_rams(config, m, clk, rst, maxi, schedule_table, max_stream_rams)
-    ram_set_cache = make_ram_sets(config, schedule_table, ram_dict, max_stream_rams)
+    onchip_bytes = select_onchip_activations(config, schedule_table)
+    if onchip_bytes > 0:
+        onchip_maxi = make_onchip_memory(config, m, clk, rst, onchip_bytes)
+        for obj in get_onchip_activations(schedule_table):
+            obj.onchip_maxi = onchip_maxi
+
+    dispatch_cores(config, schedule_table)
+
+    # the stages are allocated together if the segments run concurrently
+    alloc_table = assign_dataflow_segments(config, schedule_table)
+
+    max_stream_rams = calc_max_stream_rams(config, alloc_table)
+    ram_dict = make_rams(config, m, clk, rst, maxi, alloc_table, max_stream_rams)
+    ram_set_cache = make_ram_sets(config, alloc_table, ram_dict, max_stream_rams)
 
-    control_param_dict = make_control_params(config, schedule_table)
+    control_param_dict = make_control_params(config, alloc_table)
 
-    substrm_dict = make_substreams(config, m, clk, rst, maxi, schedule_table)
-    stream_cache = make_streams(config, schedule_table, ram_dict, substrm_dict)
+    substrm_dict = make_substreams(config, m, clk, rst, maxi, alloc_table)
+    stream_cache = make_streams(config, alloc_table, ram_dict, substrm_dict)
 
     (global_addr_map, local_addr_map,
      global_map_info, global_mem_map) = make_addr_map(config, objs, saxi)
@@ -362,7 +851,260 @@ def allocate(config, m, clk, rst, maxi, saxi, objs, schedule_table):
     disable_unused_ram_ports(ram_dict)
 
     return (ram_dict, substrm_dict, ram_set_cache, stream_cache, control_cache,
-            main_fsm, global_map_info, global_mem_map)
+            main_fsm, global_map_info, global_mem_map, control_param_dict)
+
+
+def dispatch_cores(config, schedule_table):
+    """
+    Split the batch of the operators among 'num_cores' replicated cores
+
+    Each core computes a contiguous slice of the batch with a copy of the
+    operator (make_core), which has its own stream, RAMs, control thread
+    and AXI master ports. The copies replace the operator in its stage,
+    so that they run concurrently. Operators reading or writing the
+    on-chip activation memory run on a single core, since the memory
+    has a single port.
+    """
+
+    num_cores = config['num_cores']
+
+    if num_cores == 1:
+        return
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        new_objs = []
+
+        for obj in objs:
+            num_bat = (obj.get_core_batch()
+                       if bt.is_operator(obj) and not bt.is_view(obj) else None)
+
+            if num_bat is None or num_bat == 1:
+                new_objs.append(obj)
+                continue
+
+            if any([o.onchip_addr is not None
+                    for o in [obj] + list(obj.collect_sources())]):
+                new_objs.append(obj)
+                continue
+
+            maxi_ports = module_maxi_ports[obj.m]
+            port_indexes = [[id(port) for port in maxi_ports].index(id(obj.get_maxi(traffic)))
+                            for traffic in maxi_traffic_classes]
+
+            core_num_bat = int(math.ceil(num_bat / num_cores))
+            for core_index, bat_start in enumerate(range(0, num_bat, core_num_bat)):
+                core = obj.make_core(core_index, bat_start,
+                                     min(core_num_bat, num_bat - bat_start))
+
+                # the same traffic classes on the ports of the core
+                if core_index > 0:
+                    core_ports = module_core_maxi_ports[obj.m][core_index - 1]
+                    core.set_maxi_ports(collections.OrderedDict(
+                        [(traffic, core_ports[index])
+                         for traffic, index in zip(maxi_traffic_classes, port_indexes)]))
+
+                new_objs.append(core)
+
+        schedule_table[stage] = new_objs
+
+
+def assign_dataflow_segments(config, schedule_table):
+    """
+    Split the stages into 'dataflow_segments' segments of consecutive
+    stages, and return the table for the allocation of the hardware
+
+    Each segment has its own control thread (FSM) and AXI master ports,
+    and works on a frame while the next segment works on the previous
+    frame. Since the segments run concurrently, the stages are allocated
+    as a single stage, so that no RAM, stream or substream is shared.
+    The placeholders and the outputs have get_num_frame_slots() copies,
+    one for each frame in flight, and a temporary read by a later segment
+    has a copy for each frame between its producer and its last reader.
+    """
+
+    num_segments = config['dataflow_segments']
+
+    if not num_segments:
+        return schedule_table
+
+    from .operator.extern import extern
+
+    stages = [stage for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0])
+              if get_control_operators(objs)]
+
+    if num_segments > len(stages):
+        raise ValueError("dataflow_segments must not exceed the number of stages (%d), not %d" %
+                         (len(stages), num_segments))
+
+    for i, stage in enumerate(stages):
+        segment = i * num_segments // len(stages)
+
+        for obj in get_control_operators(schedule_table[stage]):
+            if isinstance(obj, extern):
+                raise ValueError("extern operator '%s' is not supported in the dataflow mode" %
+                                 obj.name)
+
+            obj.dataflow_segment = segment
+
+            if segment == 0:
+                continue
+
+            # the same traffic classes on the ports of the segment
+            maxi_ports = module_maxi_ports[obj.m]
+            segment_ports = module_segment_maxi_ports[obj.m][segment - 1]
+            obj.set_maxi_ports(collections.OrderedDict(
+                [(traffic, segment_ports[[id(port) for port in maxi_ports].index(
+                    id(obj.get_maxi(traffic)))])
+                 for traffic in maxi_traffic_classes]))
+
+    num_frame_slots = get_num_frame_slots(config)
+
+    for objs in schedule_table.values():
+        for obj in objs:
+            if obj.is_output:
+                get_actual_storage(obj).frame_slots = num_frame_slots
+
+    for src, last_segment in get_dataflow_consumers(schedule_table).values():
+        if bt.is_input_storage(src):
+            src.frame_slots = num_frame_slots
+        elif bt.is_operator(src) and not src.is_output:
+            num_frames = last_segment - src.dataflow_segment + 1
+            src.frame_slots = 2 ** int(math.ceil(math.log(num_frames, 2)))
+
+    merged = []
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        merged.extend(objs)
+
+    return {0: merged}
+
+
+def assign_dynamic_batch(config, m, saxi, objs):
+    """
+    Set the batch size register to the operators depending on the
+    placeholders in the dynamic batch mode
+
+    The first axis of each placeholder is the batch, whose declared size
+    is the maximum. The RAMs and the address map are sized for the
+    maximum, and the control params proportional to the batch size
+    (dynamic_batch_params) are computed from the register by the control
+    threads, so that a smaller batch uses the first slices of each value.
+    """
+
+    if not config['dynamic_batch']:
+        return
+
+    placeholders = [obj for obj in objs if bt.is_input_storage(obj)]
+
+    if not placeholders:
+        raise ValueError("dynamic_batch requires a placeholder")
+
+    max_batch = placeholders[0].shape[0]
+    for obj in placeholders:
+        if obj.shape[0] != max_batch:
+            raise ValueError("placeholders must have the same batch size in the dynamic batch "
+                             "mode, not %d and %d" % (max_batch, obj.shape[0]))
+
+    batch_reg = saxi.register[module_dynamic_batch_regs[m]]
+    batch_reg.initval = max_batch
+
+    memo = {}
+
+    def depends_on_batch(obj):
+        if id(obj) in memo:
+            return memo[id(obj)]
+
+        ret = (bt.is_input_storage(obj) or
+               (bt.is_operator(obj) and any([depends_on_batch(arg) for arg in obj.args])))
+        memo[id(obj)] = ret
+        return ret
+
+    for obj in objs:
+        if not bt.is_operator(obj) or not depends_on_batch(obj):
+            continue
+
+        if obj.shape[0] != max_batch:
+            raise ValueError("operator '%s' must keep the batch size (%d) in the first axis "
+                             "in the dynamic batch mode" % (obj.name, max_batch))
+
+        if not get_control_operators([obj]):
+            continue
+
+        if not obj.dynamic_batch_params:
+            raise ValueError("operator '%s' (%s) is not supported in the dynamic batch mode" %
+                             (obj.name, obj.__class__.__name__))
+
+        obj.dynamic_batch = max_batch
+        obj.dynamic_batch_reg = batch_reg
+
+
+def assign_weight_compression(config, objs):
+    """
+    Store the filters of conv2d in the zero-skip compressed format
+    (util.compress_weight) if 'weight_compression' is enabled
+
+    A variable is compressed if each of its consumers reads it as the
+    filter, and the filter of an output channel is a block of whole bus
+    words. The control thread reads the table entry of each output channel
+    and skips the DMA of an all-zero filter, whose words in the filter RAMs
+    are filled with 0 instead, so that a pruned model loads fewer bytes.
+    The space of the image is sized by the current value (the table and
+    the dense filters if no value is set), so that a value set later must
+    not have more nonzero filters.
+    """
+
+    if not config['weight_compression']:
+        return
+
+    from . import storage as st
+    from . import util
+    from .operator.conv2d import conv2d
+
+    for obj in objs:
+        if not isinstance(obj, st.variable) or obj.maxi is None or not obj.consumers:
+            continue
+
+        if not all([isinstance(consumer, conv2d) and
+                    consumer.args[1] is obj and
+                    consumer.algorithm != 'winograd' and
+                    consumer.filter_shape[0] == obj.shape[0] and
+                    bt.shape_to_length(consumer.filter_shape) == obj.length
+                    for consumer in obj.consumers]):
+            continue
+
+        entry_bytes = bt.to_byte(obj.maxi.datawidth)
+        block = obj.memory_size // obj.shape[0]
+
+        if block * obj.shape[0] != obj.memory_size or block % entry_bytes != 0:
+            continue
+
+        obj.compression_block = block
+
+        if obj.value is None:
+            obj.compression_size = obj.shape[0] * entry_bytes + obj.shape[0] * block
+        else:
+            obj.compression_size = util.compressed_image(obj, obj.value).size
+
+
+def get_dataflow_consumers(schedule_table):
+    """ values read by the operators and the last segment reading each
+    value, by the id of the value """
+
+    consumers = collections.OrderedDict()
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            for src in obj.collect_sources():
+                src = get_actual_storage(src)
+                consumers[id(src)] = (src, obj.dataflow_segment)
+
+    return consumers
+
+
+def get_actual_storage(obj):
+    while bt.is_view(obj) or bt.is_removable_reshape(obj):
+        obj = obj.args[0]
+
+    return obj
 
 
 def set_storage_name(objs):
@@ -397,6 +1139,16 @@ def set_shared_attrs(objs):
         orig.set_shared_attrs(obj)
 
 
+def set_col_tiles(config, objs):
+    max_ram_capacity = config['max_onchip_ram_capacity']
+
+    for obj in objs:
+        if not bt.is_operator(obj):
+            continue
+
+        obj.set_col_tiles(max_ram_capacity)
+
+
 def calc_max_stream_rams(config, schedule_table):
     max_stream_rams = {}  # key: stream_hash, value: max RAM sizes
 
@@ -545,28 +1297,90 @@ def calc_max_stage_rams(config, schedule_table, max_stream_rams):
 
         max_stage_rams[stage] = cnt
 
+    # spare RAMs for the parameters of the next stage read during the stage
+    stages = sorted(schedule_table.keys())
+    for stage, next_stage in zip(stages[:-1], stages[1:]):
+        if not get_control_operators(schedule_table[stage]):
+            continue
+
+        for obj in get_control_operators(schedule_table[next_stage]):
+            if not is_prefetch_candidate(config, obj):
+                continue
+
+            stream_hash = obj.get_stream_hash()
+            input_rams, output_rams, temp_rams = max_stream_rams[stream_hash]
+
+            for positions in obj.get_prefetch_ram_positions().values():
+                for pos in positions:
+                    key = to_actual_ram_spec(config, *input_rams[pos])
+                    max_stage_rams[stage][key] += 1
+
     return max_stage_rams
 
 
+def is_prefetch_candidate(config, obj):
+    """ whether the parameters of an operator can be read during the previous stage """
+
+    if not config['weight_prefetch'] or not obj.prefetchable:
+        return False
+
+    # column tiles read the parameters for each tile
+    if obj.get_num_control_param_sets() > 1:
+        return False
+
+    # parameters produced by an operator of the previous stage are not ready
+    for index in obj.get_prefetch_ram_positions().keys():
+        if not bt.is_storage(obj.args[index]):
+            return False
+
+    return True
+
+
 def max_tuple(*tuples):
     return tuple([max(*values) for values in zip(*tuples)])
 
 
 def make_ram_sets(config, schedule_table, ram_dict, max_stream_rams):
     ram_set_cache = collections.defaultdict(list)
+    prev_stage_rams = None
 
     for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
-        make_stage_ram_sets(config, schedule_table, ram_dict, max_stream_rams,
-                            stage, objs, ram_set_cache)
+        prev_stage_rams = make_stage_ram_sets(config, schedule_table, ram_dict,
+                                              max_stream_rams, stage, objs,
+                                              ram_set_cache, prev_stage_rams)
 
     return ram_set_cache
 
 
 def make_stage_ram_sets(config, schedule_table, ram_dict, max_stream_rams,
-                        stage, objs, ram_set_cache):
+                        stage, objs, ram_set_cache, prev_stage_rams=None):
+    """
+    assign RAM sets to the operators of a stage, and return the RAMs used
+    in the stage
+
+    If prev_stage_rams (the RAMs used in the previous stage) is given,
+    the parameter RAMs of prefetch candidates are taken from the others,
+    so that the parameters can be read during the previous stage.
+    """
 
     ram_index_set = collections.defaultdict(set)
 
+    for obj in get_control_operators(objs):
+        obj.prefetch_enabled = config['weight_prefetch'] and obj.prefetchable
+        obj.prefetch_target = (prev_stage_rams is not None and
+                               is_prefetch_candidate(config, obj))
+
+    def get_prefetch_positions(obj):
+        if not obj.prefetch_target:
+            return set()
+
+        return set([pos for positions in obj.get_prefetch_ram_positions().values()
+                    for pos in positions])
+
+    def is_prefetch_ready(obj, input_rams):
+        return all([id(input_rams[pos]) not in prev_stage_rams
+                    for pos in get_prefetch_positions(obj)])
+
     # cache check
     for obj in objs:
         if not bt.is_operator(obj):
@@ -583,6 +1397,9 @@ def make_stage_ram_sets(config, schedule_table, ram_dict, max_stream_rams,
             satisfied = obj.check_ram_requirements(input_rams,
                                                    output_rams, temp_rams)
 
+            if obj.prefetch_target and not is_prefetch_ready(obj, input_rams):
+                satisfied = False
+
             for key, ram_indexes in used_ram_index_dict.items():
                 for ram_index in ram_indexes:
                     if ram_index in ram_index_set[key]:
@@ -620,48 +1437,85 @@ def make_stage_ram_sets(config, schedule_table, ram_dict, max_stream_rams,
         req_rams.extend([(width, length, 'temp', i)
                          for i, (width, length) in enumerate(req_temps)])
 
-        input_rams = [None for _ in req_inputs]
-        output_rams = [None for _ in req_outputs]
-        temp_rams = [None for _ in req_temps]
+        prefetch_positions = get_prefetch_positions(obj)
 
-        # smallest request first
-        for width, length, ram_type, pos in sorted(req_rams,
-                                                   key=lambda x: (x[0], x[1])):
-            width, length = to_actual_ram_spec(config, width, length)
-            key = (width, length)
+        while True:
+            input_rams = [None for _ in req_inputs]
+            output_rams = [None for _ in req_outputs]
+            temp_rams = [None for _ in req_temps]
+            allocated = []
 
-            found = False
-            # smallest RAM first
-            for ram_key, rams in sorted(ram_dict.items(), key=lambda x: x[0]):
-                if found:
-                    break
+            # the parameters to be prefetched first, then the smallest request first
+            for width, length, ram_type, pos in sorted(
+                    req_rams, key=lambda x: (not (x[2] == 'input' and x[3] in prefetch_positions),
+                                             x[0], x[1])):
+                width, length = to_actual_ram_spec(config, width, length)
+                key = (width, length)
 
-                for i, ram in enumerate(rams):
-                    if i in ram_index_set[ram_key]:
-                        continue
+                # a RAM not used in the previous stage
+                spare = ram_type == 'input' and pos in prefetch_positions
 
-                    ram_width, ram_length = ram_key
+                found = False
+                # smallest RAM first
+                for ram_key, rams in sorted(ram_dict.items(), key=lambda x: x[0]):
+                    if found:
+                        break
 
-                    if ram_width != width:
-                        continue
+                    for i, ram in enumerate(rams):
+                        if i in ram_index_set[ram_key]:
+                            continue
 
-                    if ram_length >= length:
-                        if ram_type == 'input':
-                            input_rams[pos] = ram
-                        elif ram_type == 'output':
-                            output_rams[pos] = ram
-                        elif ram_type == 'temp':
-                            temp_rams[pos] = ram
-
-                        ram_index_set[ram_key].add(i)
-                        used_ram_index_dict[key].append(i)
-                        found = True
-                        break
+                        if spare and id(ram) in prev_stage_rams:
+                            continue
+
+                        ram_width, ram_length = ram_key
+
+                        if ram_width != width:
+                            continue
+
+                        if ram_length >= length:
+                            if ram_type == 'input':
+                                input_rams[pos] = ram
+                            elif ram_type == 'output':
+                                output_rams[pos] = ram
+                            elif ram_type == 'temp':
+                                temp_rams[pos] = ram
+
+                            ram_index_set[ram_key].add(i)
+                            used_ram_index_dict[key].append(i)
+                            allocated.append((ram_key, i))
+                            found = True
+                            break
+
+            if all([input_rams[pos] is not None for pos in prefetch_positions]):
+                break
+
+            # no spare RAM: the parameters are read by the operator itself
+            for ram_key, i in allocated:
+                ram_index_set[ram_key].discard(i)
+
+            used_ram_index_dict = collections.defaultdict(list)
+            obj.prefetch_target = False
+            prefetch_positions = set()
 
         obj.set_rams(input_rams, output_rams, temp_rams)
         ram_set_cache[stream_hash].append((input_rams, output_rams,
                                            temp_rams, used_ram_index_dict))
 
+    control_objs = get_control_operators(objs)
+
+    # nothing to overlap with
+    if not control_objs:
+        return None
+
+    stage_rams = set()
+    for obj in control_objs:
+        for ram in (list(obj.input_rams) + list(obj.output_rams) +
+                    list(obj.temp_rams)):
+            stage_rams.add(id(ram))
+
+    return stage_rams
+
 
 def to_actual_ram_spec(config, width, length):
     if width == 0:
@@ -757,10 +1611,13 @@ def get_control_param_dict(schedule_table):
             key = obj.get_stream_hash()
             index = index_dict[key]
             obj.set_control_param_index(index)
-            index_dict[key] += 1
 
-            values = obj.collect_all_control_param_values()
-            control_param_dict[key].append(values)
+            values_list = obj.collect_all_control_param_values_list()
+            if obj.dynamic_batch is not None:
+                values_list = [obj.to_dynamic_batch_values(values) for values in values_list]
+
+            control_param_dict[key].extend(values_list)
+            index_dict[key] += len(values_list)
 
     return control_param_dict
 
@@ -1009,7 +1866,7 @@ def make_addr_map(config, objs, saxi):
 
             width = obj.dtype.width
             length = obj.get_aligned_length()
-            space_size = align_space(width, length, chunk_size)
+            space_size = align_space(width, length, chunk_size) * obj.frame_slots
             default_global_addr = storage_used
 
             obj.set_global_index(global_index)
@@ -1032,6 +1889,9 @@ def make_addr_map(config, objs, saxi):
                   (str(tuple(obj.get_aligned_shape()))
                    if isinstance(obj.shape, (tuple, list)) else '()')))
 
+            if obj.frame_slots > 1:
+                i += ', %d frame slots' % obj.frame_slots
+
             global_mem_map[(default_global_addr,
                             default_global_addr + space_size - 1)] = i
 
@@ -1073,7 +1933,7 @@ def make_addr_map(config, objs, saxi):
             # source
             width = src.dtype.width
             length = src.get_aligned_length()
-            space_size = align_space(width, length, chunk_size)
+            space_size = align_space(width, length, chunk_size) * src.frame_slots
             default_global_addr = storage_used
 
             src.set_global_index(global_index)
@@ -1097,6 +1957,9 @@ def make_addr_map(config, objs, saxi):
                   (str(tuple(src.get_aligned_shape()))
                    if isinstance(src.shape, (tuple, list)) else '()')))
 
+            if src.frame_slots > 1:
+                i += ', %d frame slots' % src.frame_slots
+
             global_mem_map[(default_global_addr,
                             default_global_addr + space_size - 1)] = i
 
@@ -1144,7 +2007,10 @@ def make_addr_map(config, objs, saxi):
             # source
             width = src.dtype.width
             length = src.get_aligned_length()
-            space_size = align_space(width, length, chunk_size)
+            if src.compression_size is not None:
+                space_size = align_space(8, src.memory_size, chunk_size)
+            else:
+                space_size = align_space(width, length, chunk_size)
             default_global_addr = storage_used
 
             if not config['use_map_ram'] and not config['use_map_reg']:
@@ -1225,10 +2091,14 @@ def make_addr_map(config, objs, saxi):
             if bt.is_storage(src):
                 continue
 
+            # kept in the on-chip activation memory
+            if src.onchip_addr is not None:
+                continue
+
             # temporal
             width = src.dtype.width
             length = src.get_aligned_length()
-            space_size = align_space(width, length, chunk_size)
+            space_size = align_space(width, length, chunk_size) * src.frame_slots
 
             default_global_addr = storage_used
             default_local_addr = temporal_used
@@ -1332,13 +2202,15 @@ def make_controls(config, m, clk, rst, maxi, saxi,
     if config['use_map_ram']:
         global_map_ram.disable_write(0)
         local_map_ram.disable_write(0)
+        map_regs = None
     else:
         map_regs = saxi.register[num_header_regs + num_control_regs:]
 
     offset_reg = saxi.register[control_reg_global_offset]
-    maxi.seq(
-        maxi.global_base_addr(offset_reg)
-    )
+    for port in get_all_maxi_ports(m):
+        port.seq(
+            port.global_base_addr(offset_reg)
+        )
 
     if config['use_map_ram']:
         start = saxi.register[control_reg_start]
@@ -1369,127 +2241,334 @@ def make_controls(config, m, clk, rst, maxi, saxi,
         saxi.write(main_fsm, control_reg_start, 0)
 
     control_cache = collections.defaultdict(list)
+    stages = sorted(schedule_table.keys())
 
-    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+    if config['dataflow_segments']:
+        make_dataflow_controls(config, m, clk, rst, saxi, main_fsm,
+                               schedule_table, control_param_dict, control_cache,
+                               map_regs)
 
-        for obj in objs:
-            if not bt.is_operator(obj):
-                continue
+    else:
+        for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
 
-            if bt.is_view(obj):
-                continue
+            for obj in objs:
+                if not bt.is_operator(obj):
+                    continue
 
-            if bt.is_removable_reshape(obj):
-                continue
+                if bt.is_view(obj):
+                    continue
 
-            if (bt.is_output_chainable_operator(obj) and
-                    not obj.chain_head):
-                continue
+                if bt.is_removable_reshape(obj):
+                    continue
 
-            param_key = obj.get_stream_hash()
-            control_param_list = control_param_dict[param_key]
-            control_param_len = len(control_param_list)
+                if (bt.is_output_chainable_operator(obj) and
+                        not obj.chain_head):
+                    continue
 
-            key = obj.get_control_hash()
+                run_control(config, main_fsm, obj, control_param_dict, control_cache,
+                            map_regs, global_map_ram, local_map_ram)
 
-            if (not config['disable_control_cache'] and
-                    obj.control_cachable and len(control_cache[key]) > 0):
-                # hit
-                control, orig = control_cache[key][0]
-                if control.stream_ram_hash != key:
-                    raise ValueError("hash mismatch: '%x' != '%x'" %
-                                     (control.stream_ram_hash, key))
+            main_fsm.goto_next()
 
-                obj.copy_control(orig)
+            # read the parameters of the next stage while the stage is running
+            if stage != stages[-1]:
+                next_objs = schedule_table[stages[stages.index(stage) + 1]]
 
-            else:
-                # miss
-                obj.make_objaddr()
-                obj.make_arg_objaddrs()
+                for obj in get_control_operators(next_objs):
+                    if not obj.prefetch_target:
+                        continue
 
-                control = obj.make_control(fsm_as_module=config['fsm_as_module'])
-                control.stream_ram_hash = key
-                control_cache[key].append((control, obj))
+                    arg_global_indexes = obj.get_arg_global_indexes()
+                    arg_local_indexes = obj.get_arg_local_indexes()
+                    arg_default_local_addrs = obj.get_arg_default_local_addrs()
 
-            # bind address
-            if config['use_map_ram']:
-                gaddr = global_map_ram.read(main_fsm, obj.global_index)
-                main_fsm.set_index(main_fsm.current - 1)
-                laddr = local_map_ram.read(main_fsm, obj.local_index)
-            else:
-                gaddr = map_regs[obj.global_index]
-                laddr = obj.default_local_addr
+                    arg_addrs = {}
+                    for index in obj.get_prefetch_ram_positions().keys():
+                        arg_addrs[index] = get_global_addr(config, main_fsm, map_regs,
+                                                           global_map_ram, local_map_ram,
+                                                           arg_global_indexes[index],
+                                                           arg_local_indexes[index],
+                                                           arg_default_local_addrs[index])
 
-            if laddr != 0:
-                addr = gaddr + laddr
-            else:
-                addr = gaddr
+                    obj.prefetch_params(main_fsm, module_prefetch_maxi[m], arg_addrs)
+
+            for obj in objs:
+                if not bt.is_operator(obj):
+                    continue
+
+                if (bt.is_output_chainable_operator(obj) and
+                        not obj.chain_head):
+                    continue
+
+                obj.join_control(main_fsm)
+                obj.reset_control(main_fsm)
 
-            main_fsm(
-                obj.objaddr(addr)
-            )
             main_fsm.goto_next()
 
-            arg_global_indexes = obj.get_arg_global_indexes()
-            arg_local_indexes = obj.get_arg_local_indexes()
-            arg_default_global_addrs = obj.get_arg_default_global_addrs()
-            arg_default_local_addrs = obj.get_arg_default_local_addrs()
+    # finalize
+    main_fsm.goto_next()
 
-            for (arg_objaddr, arg_global_index, arg_local_index,
-                 arg_default_global_addr, arg_default_local_addr) in zip(
-                     obj.arg_objaddrs, arg_global_indexes, arg_local_indexes,
-                     arg_default_global_addrs, arg_default_local_addrs):
+    saxi.write(main_fsm, control_reg_busy, 0)
 
-                if config['use_map_ram']:
-                    gaddr = global_map_ram.read(main_fsm, arg_global_index)
-                    main_fsm.set_index(main_fsm.current - 1)
-                    laddr = local_map_ram.read(main_fsm, arg_local_index)
-                else:
-                    gaddr = map_regs[arg_global_index]
-                    laddr = arg_default_local_addr
+    main_fsm.goto_next()
+    main_fsm.goto_next()
+    main_fsm.goto_init()
 
-                if laddr != 0:
-                    addr = gaddr + laddr
-                else:
-                    addr = gaddr
+    return control_cache, main_fsm
 
-                main_fsm(
-                    arg_objaddr(addr)
-                )
-                main_fsm.goto_next()
 
-            # bind parameter parameters
-            obj.set_control_params(main_fsm, control_param_len,
-                                   use_param_ram=config['use_param_ram'],
-                                   min_param_ram_len=config['min_param_ram_len'])
+def run_control(config, fsm, obj, control_param_dict, control_cache,
+                map_regs, global_map_ram, local_map_ram, frame=None):
+    """
+    Bind the addresses and the control parameters of an operator,
+    and start its control thread
 
-            obj.run_control(main_fsm)
+    If frame (a register of the frame number in the dataflow mode)
+    is given, the slot of the frame is used for each value of multiple
+    frame slots.
+    """
 
-        main_fsm.goto_next()
+    param_key = obj.get_stream_hash()
+    control_param_list = control_param_dict[param_key]
+    control_param_len = len(control_param_list)
 
-        for obj in objs:
-            if not bt.is_operator(obj):
-                continue
+    key = obj.get_control_hash()
 
-            if (bt.is_output_chainable_operator(obj) and
-                    not obj.chain_head):
-                continue
+    if (not config['disable_control_cache'] and
+            obj.control_cachable and len(control_cache[key]) > 0):
+        # hit
+        control, orig = control_cache[key][0]
+        if control.stream_ram_hash != key:
+            raise ValueError("hash mismatch: '%x' != '%x'" %
+                             (control.stream_ram_hash, key))
 
-            obj.join_control(main_fsm)
-            obj.reset_control(main_fsm)
+        obj.copy_control(orig)
 
-        main_fsm.goto_next()
+    else:
+        # miss
+        obj.make_objaddr()
+        obj.make_arg_objaddrs()
 
-    # finalize
-    main_fsm.goto_next()
+        control = obj.make_control(fsm_as_module=config['fsm_as_module'])
+        control.stream_ram_hash = key
+        control_cache[key].append((control, obj))
 
-    saxi.write(main_fsm, control_reg_busy, 0)
+    # bind address
+    if obj.onchip_addr is not None:
+        addr = obj.onchip_addr
+    else:
+        # a replicated core writes a batch slice of the output of the origin
+        origin = obj.core_origin if obj.core_origin is not None else obj
+        addr = get_global_addr(config, fsm, map_regs,
+                               global_map_ram, local_map_ram,
+                               origin.global_index, origin.local_index,
+                               origin.default_local_addr)
+
+    if obj.core_addr_offset:
+        addr = addr + obj.core_addr_offset
+
+    if frame is not None and obj.frame_slots > 1:
+        addr = addr + get_frame_slot_offset(config, obj, frame)
+
+    fsm(
+        obj.objaddr(addr)
+    )
+    fsm.goto_next()
+
+    arg_global_indexes = obj.get_arg_global_indexes()
+    arg_local_indexes = obj.get_arg_local_indexes()
+    arg_default_global_addrs = obj.get_arg_default_global_addrs()
+    arg_default_local_addrs = obj.get_arg_default_local_addrs()
+
+    arg_core_addr_offsets = obj.get_core_arg_addr_offsets()
+
+    for (arg_objaddr, src, arg_global_index, arg_local_index,
+         arg_default_global_addr, arg_default_local_addr,
+         arg_core_addr_offset) in zip(
+             obj.arg_objaddrs, obj.collect_sources(),
+             arg_global_indexes, arg_local_indexes,
+             arg_default_global_addrs, arg_default_local_addrs,
+             arg_core_addr_offsets):
+
+        if src.onchip_addr is not None:
+            addr = src.onchip_addr
+        else:
+            addr = get_global_addr(config, fsm, map_regs,
+                                   global_map_ram, local_map_ram,
+                                   arg_global_index, arg_local_index,
+                                   arg_default_local_addr)
+
+        if arg_core_addr_offset:
+            addr = addr + arg_core_addr_offset
+
+        if frame is not None and get_actual_storage(src).frame_slots > 1:
+            addr = addr + get_frame_slot_offset(config, get_actual_storage(src), frame)
+
+        fsm(
+            arg_objaddr(addr)
+        )
+        fsm.goto_next()
+
+    # the parameters have been read during the previous stage
+    if obj.prefetch_enabled:
+        fsm(
+            obj.params_prefetched(1 if obj.prefetch_target else 0)
+        )
+        fsm.goto_next()
+
+    # bind parameter parameters
+    num_control_param_sets = obj.get_num_control_param_sets()
+
+    for i in range(num_control_param_sets):
+        # column tiles run one after another
+        if i > 0:
+            obj.join_control(fsm)
+            obj.reset_control(fsm)
+
+        obj.set_control_params(fsm, control_param_len,
+                               use_param_ram=config['use_param_ram'],
+                               min_param_ram_len=config['min_param_ram_len'],
+                               control_param_offset=i)
+
+        obj.run_control(fsm)
+
+
+def make_dataflow_controls(config, m, clk, rst, saxi, main_fsm,
+                           schedule_table, control_param_dict, control_cache,
+                           map_regs):
+    """
+    Make an FSM for each segment of the dataflow mode, which runs the
+    stages of the segment for each frame
+
+    A segment starts a frame when the previous segment has finished the
+    frame (or the host has queued it, for the first segment) and the later
+    segments have read the slot of the frame of each temporary to be
+    written. The main FSM starts the segments and waits for the last one,
+    so that segment i works on frame n while segment i + 1 works on frame
+    n - 1, and the throughput is bounded by the slowest segment.
+    """
+
+    num_segments = config['dataflow_segments']
+
+    frame_regs = saxi.register[module_frame_queue_regs[m]:]
+    num_frames = frame_regs[frame_queue_reg_num]
+    num_queued = frame_regs[frame_queue_reg_queued]
+
+    start = m.Reg('dataflow_start', initval=0)
+    done = [m.Reg('dataflow_done_%d' % segment, 32, initval=0)
+            for segment in range(num_segments)]
+
+    seq = vg.Seq(m, 'dataflow_seq', clk, rst)
+
+    saxi.seq(
+        frame_regs[frame_queue_reg_done](done[-1])
+    )
+
+    # segment and stages of each segment
+    segment_stages = [[] for _ in range(num_segments)]
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        control_objs = get_control_operators(objs)
+        if control_objs:
+            segment_stages[control_objs[0].dataflow_segment].append(objs)
+
+    # fewest frame slots of the temporaries of each segment for each later segment
+    segment_readers = [{} for _ in range(num_segments)]
+    for src, last_segment in get_dataflow_consumers(schedule_table).values():
+        if (bt.is_operator(src) and not src.is_output and
+                last_segment > src.dataflow_segment):
+            readers = segment_readers[src.dataflow_segment]
+            readers[last_segment] = min(readers.get(last_segment, src.frame_slots),
+                                        src.frame_slots)
+
+    fsms = []
+
+    for segment in range(num_segments):
+        fsm = vg.FSM(m, 'dataflow_fsm_%d' % segment, clk, rst,
+                     as_module=config['fsm_as_module'])
+        frame = m.Reg('dataflow_frame_%d' % segment, 32, initval=0)
+
+        fsm.If(start)(
+            frame(0)
+        )
+        fsm.If(start).goto_next()
+
+        state_frame = fsm.current
+
+        if segment == 0:
+            ready = [frame < num_queued]
+        else:
+            ready = [frame < done[segment - 1]]
+
+        for last_segment, num_slots in sorted(segment_readers[segment].items()):
+            ready.append(frame < done[last_segment] + num_slots)
 
+        fsm.If(frame >= num_frames).goto_init()
+        fsm.If(frame < num_frames, *ready).goto_next()
+
+        for objs in segment_stages[segment]:
+            for obj in get_control_operators(objs):
+                run_control(config, fsm, obj, control_param_dict, control_cache,
+                            map_regs, None, None, frame)
+
+            fsm.goto_next()
+
+            for obj in get_control_operators(objs):
+                obj.join_control(fsm)
+                obj.reset_control(fsm)
+
+            fsm.goto_next()
+
+        seq.If(fsm.here)(
+            done[segment].inc()
+        )
+        fsm(
+            frame.inc()
+        )
+        fsm.goto(state_frame)
+
+        fsms.append(fsm)
+
+    module_dataflow_fsms[m] = fsms
+
+    seq.If(main_fsm.here)(
+        *[d(0) for d in done]
+    )
+    main_fsm(
+        start(1)
+    )
     main_fsm.goto_next()
+
+    main_fsm(
+        start(0)
+    )
     main_fsm.goto_next()
-    main_fsm.goto_init()
 
-    return control_cache, main_fsm
+    main_fsm.If(done[-1] >= num_frames).goto_next()
+
+
+def get_frame_slot_offset(config, obj, frame):
+    """ offset of the slot of a frame in the space of multiple frame slots """
+
+    chunk_size = config['offchipram_chunk_bytes']
+    slot_size = align_space(obj.dtype.width, obj.get_aligned_length(), chunk_size)
+    return (frame & (obj.frame_slots - 1)) * slot_size
+
+
+def get_global_addr(config, fsm, map_regs, global_map_ram, local_map_ram,
+                    global_index, local_index, default_local_addr):
+
+    if config['use_map_ram']:
+        gaddr = global_map_ram.read(fsm, global_index)
+        fsm.set_index(fsm.current - 1)
+        laddr = local_map_ram.read(fsm, local_index)
+    else:
+        gaddr = map_regs[global_index]
+        laddr = default_local_addr
+
+    if laddr != 0:
+        return gaddr + laddr
+
+    return gaddr
 
 
 def disable_unused_ram_ports(ram_dict):
@@ -1507,7 +2586,8 @@ def disable_unused_ram_ports(ram_dict):
                         ram.disable_write(i)
 
 
-def make_reg_map(config, global_map_info, header_info):
+def make_reg_map(config, global_map_info, header_info, frame_queue_reg=None,
+                 batch_reg=None):
     reg_map = collections.OrderedDict()
 
     for i in range(num_header_regs):
@@ -1531,7 +2611,12 @@ def make_reg_map(config, global_map_info, header_info):
 
     index = index_to_bytes(control_reg_global_offset)
     default_global_addr_offset = config['default_global_addr_offset']
-    reg_map[index] = ('I', 'Global address offset (default: %d)' % default_global_addr_offset)
+    if config['maxi_ports'] > 1:
+        reg_map[index] = ('I', 'Global address offset of all AXI master ports (default: %d)' %
+                          default_global_addr_offset)
+    else:
+        reg_map[index] = ('I', 'Global address offset (default: %d)' %
+                          default_global_addr_offset)
 
     if config['use_map_ram']:
         index = index_to_bytes(control_reg_load_global_addr_map)
@@ -1548,6 +2633,24 @@ def make_reg_map(config, global_map_info, header_info):
             index = index_to_bytes(control_reg_global_addr + gindex)
             reg_map[index] = ('I', 'Address of ' + info)
 
+    if frame_queue_reg is not None:
+        index = index_to_bytes(frame_queue_reg + frame_queue_reg_slots)
+        reg_map[index] = ('O', 'Number of frame slots of each input and output (%d)' %
+                          get_num_frame_slots(config))
+
+        index = index_to_bytes(frame_queue_reg + frame_queue_reg_num)
+        reg_map[index] = ('I', 'Number of frames to process (default: 1)')
+
+        index = index_to_bytes(frame_queue_reg + frame_queue_reg_queued)
+        reg_map[index] = ('I', 'Number of frames written to the input slots (default: 1)')
+
+        index = index_to_bytes(frame_queue_reg + frame_queue_reg_done)
+        reg_map[index] = ('O', 'Number of frames written to the output slots')
+
+    if batch_reg is not None:
+        index = index_to_bytes(batch_reg)
+        reg_map[index] = ('I', 'Batch size, up to the declared size (default: the declared size)')
+
     return reg_map
 
 
@@ -1664,10 +2767,11 @@ def dump_controls(control_cache, main_fsm):
     s = []
     s.append('[Control (name (# states: num))]')
 
-    indexes = set(main_fsm.body.keys())
-    indexes.update(set(main_fsm.jump.keys()))
-    num_states = len(indexes)
-    s.append('  %s (# states: %d)' % (main_fsm.name, num_states))
+    for fsm in [main_fsm] + module_dataflow_fsms.get(main_fsm.m, []):
+        indexes = set(fsm.body.keys())
+        indexes.update(set(fsm.jump.keys()))
+        num_states = len(indexes)
+        s.append('  %s (# states: %d)' % (fsm.name, num_states))
 
     for lst in control_cache.values():
         for control, obj in lst:
@@ -1689,6 +2793,108 @@ def dump_register_map(reg_map):
     print('\n'.join(s))
 
 
+def dump_resources(estimate):
+    print(estimate.to_str())
+
+
+def dump_maxi_ports(maxi_port_map):
+    s = []
+    s.append('[AXI Master Port Assignment]')
+    s.append('  (stage) operator: %s' % ', '.join(maxi_traffic_classes))
+
+    for (stage, name), ports in maxi_port_map.items():
+        s.append('  (%d) %s: %s' %
+                 (stage, name, ', '.join([port.name for port in ports.values()])))
+
+    print('\n'.join(s))
+
+
+def dump_prefetch(schedule_table):
+    s = []
+    s.append('[Weight Prefetch]')
+
+    stages = sorted(schedule_table.keys())
+    for stage, next_stage in zip(stages[:-1], stages[1:]):
+        for obj in get_control_operators(schedule_table[next_stage]):
+            if obj.prefetch_target:
+                s.append('  (Stage %d) %s: read during Stage %d' %
+                         (next_stage, obj.name, stage))
+
+    print('\n'.join(s))
+
+
+def dump_onchip_activations(config, schedule_table):
+    chunk_size = config['offchipram_chunk_bytes']
+
+    s = []
+    s.append('[On-chip Activations] (size: %s, capacity: %s)' %
+             (size_str(get_onchip_activation_bytes(config, schedule_table)),
+              size_str(config['onchip_activation_bytes'])))
+
+    for obj in get_onchip_activations(schedule_table):
+        space_size = align_space(obj.dtype.width, obj.get_aligned_length(), chunk_size)
+        consumer = obj.consumers[0]
+        s.append('  [%d - %d]: (Stage %d) %s -> (Stage %d) %s' %
+                 (obj.onchip_addr, obj.onchip_addr + space_size - 1,
+                  obj.stage, obj.name, consumer.stage, consumer.name))
+
+    print('\n'.join(s))
+
+
+def dump_dataflow_segments(config, schedule_table):
+    s = []
+    s.append('[Dataflow Segments] (frame slots: %d)' % get_num_frame_slots(config))
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            s.append('  (Stage %d) %s: Segment %d' %
+                     (stage, obj.name, obj.dataflow_segment))
+
+    for src, last_segment in get_dataflow_consumers(schedule_table).values():
+        if bt.is_operator(src) and not src.is_output and src.frame_slots > 1:
+            s.append('  %s: %d frame slots (Segment %d -> Segment %d)' %
+                     (src.name, src.frame_slots, src.dataflow_segment, last_segment))
+
+    print('\n'.join(s))
+
+
+def dump_dynamic_batch(schedule_table):
+    s = []
+    s.append('[Dynamic Batch]')
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            if obj.dynamic_batch is not None:
+                s.append('  (Stage %d) %s: max batch %d, %s' %
+                         (stage, obj.name, obj.dynamic_batch,
+                          ', '.join(sorted(obj.dynamic_batch_params.keys()))))
+
+    print('\n'.join(s))
+
+
+def dump_weight_compression(schedule_table):
+    s = []
+    s.append('[Weight Compression]')
+
+    for stage, objs in sorted(schedule_table.items(), key=lambda x: x[0]):
+        for obj in get_control_operators(objs):
+            filter = obj.args[1] if bt.is_operator(obj) and len(obj.args) > 1 else None
+            if filter is None or filter.compression_block is None:
+                continue
+
+            num_blocks = filter.shape[0]
+            dense_size = filter.compression_block * num_blocks
+            table_size = bt.to_byte(filter.maxi.datawidth) * num_blocks
+            num_nonzero = (filter.compression_size - table_size) // filter.compression_block
+            s.append('  (Stage %d) %s: %s %d bytes -> %d bytes (ratio: %.2f), '
+                     'zero filters: %d/%d' %
+                     (stage, obj.name, filter.name, dense_size, filter.compression_size,
+                      dense_size / filter.compression_size,
+                      num_blocks - num_nonzero, num_blocks))
+
+    print('\n'.join(s))
+
+
 def dump_memory_map(mem_map):
     max_gaddr = 0
     min_gaddr = 0
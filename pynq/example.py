@@ -16,7 +16,7 @@ def run_my_cnn(path, name):
     for i in range(len(buf)):
         buf[i] = i
 
-    ip.set_global_buffer(buf)
+    ip.set_global_offset(buf)
     ip.run()
     ip.wait()
 
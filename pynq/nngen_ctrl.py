@@ -67,8 +67,13 @@ class NNgenIP(object):
 
     def wait(self):
         reg = self.WORDSIZE_REG * (self.REG_START + self.num_headers)
+        start = True
+        while start:
+            start = self.base_ip.read(reg)
+
+        reg = self.WORDSIZE_REG * (self.REG_BUSY + self.num_headers)
         busy = True
-        while True:
+        while busy:
             busy = self.base_ip.read(reg)
 
     def wait_extern(self):
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.resource as resource
+
+
+def run(act_shape=(1, 8, 8, 8), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=4, device_budget=resource.Resources(lut=40000, ff=80000,
+                                                       bram18=120, dsp=48),
+        axi_datawidth=32, processes=1, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    # create target hardware
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 3, 3, num_och),
+                          name='weight1')
+
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype, name='conv0')
+    pool = ng.max_pool_serial(conv0, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    conv1 = ng.conv2d(pool, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      dtype=out_dtype, name='conv1')
+    add = ng.add(conv1, pool, dtype=out_dtype, name='add')
+    out = ng.relu(add, dtype=out_dtype, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+
+    config = {'maxi_datawidth': axi_datawidth}
+    result = ng.autotune([out], device_budget, config=config,
+                         processes=processes, silent=silent)
+
+    ok = True
+
+    if result.latency >= result.initial_latency:
+        ok = False
+
+    if not result.estimate.fits():
+        ok = False
+
+    # the attributes are applied to the graph
+    if (conv0.par_och != result.attributes[conv0]['par_och'] or
+            conv1.par_ich != result.attributes[conv1]['par_ich'] or
+            pool.par != result.attributes[pool]['par']):
+        ok = False
+
+    # the latencies are reported for the same operator objects
+    if not all([obj in result.attributes for obj in result.op_latencies.keys()]):
+        ok = False
+
+    if not all([obj in result.op_latencies for obj in (conv0, pool, conv1)]):
+        ok = False
+
+    # the alignment requests of the arguments follow the attributes
+    if pool.word_alignment < max(conv1.par_ich, conv0.par_och, pool.par):
+        ok = False
+
+    # chained operators keep the same par
+    if add.par != out.par:
+        ok = False
+
+    try:
+        ng.autotune([out], 'no_such_device', config=config, processes=1)
+        ok = False
+    except ValueError:
+        pass
+
+    # unnamed operators are reported one by one
+    unnamed_act = ng.placeholder(act_dtype, shape=act_shape, name='unnamed_act')
+    x = unnamed_act
+    unnamed_convs = []
+    for i in range(3):
+        weight = ng.variable(weight_dtype, shape=(num_och, 3, 3, x.shape[-1]))
+        weight.set_value(np.arange(weight.length,
+                                   dtype=np.int64).reshape(weight.shape) % [7] - [3])
+        x = ng.conv2d(x, weight, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype)
+        unnamed_convs.append(x)
+    unnamed_pool = ng.max_pool(x, (1, 2, 2, 1), (1, 2, 2, 1))
+
+    unnamed_result = ng.autotune([unnamed_pool], device_budget, config=config,
+                                 processes=1, silent=True)
+
+    unnamed_ops = unnamed_convs + [unnamed_pool]
+    if (list(unnamed_result.attributes.keys()) != unnamed_ops or
+            list(unnamed_result.op_latencies.keys()) != unnamed_ops):
+        ok = False
+
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_autotune', silent=silent,
+                            config=config)
+
+    # the RAMs and substreams are allocated as the tuner evaluated
+    total = ng.estimate_resources(targ).total()
+    if (total.bram18 != result.estimate.total().bram18 or
+            total.dsp != result.estimate.total().dsp):
+        ok = False
+
+    try:
+        ng.autotune([out], device_budget, config=config, processes=1)
+        ok = False
+    except ValueError:
+        pass
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# execution cycles: %d' % cycles)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
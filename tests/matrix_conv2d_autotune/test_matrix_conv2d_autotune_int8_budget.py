@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.resource as resource
+import veriloggen
+
+import matrix_conv2d_autotune
+
+
+act_shape = (1, 8, 8, 8)
+num_och = 16
+act_dtype = ng.int8
+weight_dtype = ng.int8
+out_dtype = ng.int8
+rshift_out = 4
+device_budget = resource.Resources(lut=40000, ff=80000, bram18=120, dsp=48)
+axi_datawidth = 32
+processes = 1
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = matrix_conv2d_autotune.run(act_shape, num_och,
+                                      act_dtype, weight_dtype, out_dtype,
+                                      rshift_out, device_budget,
+                                      axi_datawidth, processes, silent,
+                                      simtype=simtype)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_conv2d_autotune.run(act_shape, num_och,
+                                      act_dtype, weight_dtype, out_dtype,
+                                      rshift_out, device_budget,
+                                      axi_datawidth, processes, silent=False)
+    print(rslt)
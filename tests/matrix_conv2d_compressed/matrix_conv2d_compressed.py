@@ -0,0 +1,203 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.tlsim as tlsim
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight1')
+
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    out = ng.conv2d(conv0, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data: pruned filters of the output channels
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    vweight0[1::2] = 0
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    vweight1[np.arange(num_och) % 4 != 0] = 0
+    weight1.set_value(vweight1)
+
+    return act, (weight0, weight1), (conv0, out)
+
+
+def make_matmul_graph(act_dtype, weight_dtype, out_dtype, rshift_out):
+
+    a = ng.placeholder(act_dtype, shape=(4, 32), name='a')
+    b = ng.variable(weight_dtype, shape=(16, 32), name='b')
+    out = ng.matmul(a, b, transposed_b=True, rshift_out=rshift_out,
+                    dtype=out_dtype, name='fc')
+
+    vb = np.arange(b.length, dtype=np.int64).reshape(b.shape) % [5] - [2]
+    vb[4:] = 0
+    b.set_value(vb)
+
+    return a, b, out
+
+
+def make_shared_graph(act_dtype, weight_dtype, out_dtype, rshift_out):
+
+    # the RAMs of the matmul are shared with the depthwise_conv2d and avg_pool
+    a = ng.placeholder(act_dtype, shape=(1, 8, 8, 16), name='a')
+    w = ng.variable(weight_dtype, shape=(3, 3, 16), name='w')
+    dw = ng.depthwise_conv2d(a, w, (1, 1, 1, 1), rshift_out=rshift_out,
+                             dtype=out_dtype, name='dw')
+    pool = ng.avg_pool(dw, (1, 2, 2, 1), (1, 2, 2, 1), dtype=out_dtype, name='pool')
+    flat = ng.reshape(pool, [1, -1], name='flat')
+    b = ng.variable(weight_dtype, shape=(10, flat.shape[-1]), name='b')
+    out = ng.matmul(flat, b, transposed_b=True, rshift_out=rshift_out,
+                    dtype=out_dtype, name='fc')
+
+    vw = np.arange(w.length, dtype=np.int64).reshape(w.shape) % [7] - [3]
+    w.set_value(vw)
+    vb = np.arange(b.length, dtype=np.int64).reshape(b.shape) % [5] - [2]
+    vb[1::2] = 0
+    b.set_value(vb)
+
+    return a, b, out
+
+
+def read_bytes(sim, names):
+    return sum([t.size for t in sim.transactions
+                if t.kind == 'read' and t.name in names])
+
+
+def run(act_shape=(1, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'weight_compression': True}
+
+    act, weights, objs = make_graph(*args)
+    out = objs[-1]
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_compressed', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # the images of the pruned filters are smaller than the dense ones
+    for weight in weights:
+        if weight.compression_block is None:
+            ok = False
+        elif weight.compression_size >= weight.compression_block * weight.shape[0]:
+            ok = False
+
+    base_config = dict(config, weight_compression=False)
+    base_act, base_weights, base_objs = make_graph(*args)
+    base_targ = ng.to_veriloggen([base_objs[-1]], 'matrix_conv2d_compressed_base',
+                                 silent=True, config=base_config)
+
+    for base_weight in base_weights:
+        if base_weight.compression_block is not None:
+            ok = False
+
+    try:
+        ng.to_veriloggen([make_graph(*args)[2][-1]], 'matrix_conv2d_compressed_error',
+                         silent=True, config=dict(config, weight_prefetch=True))
+        ok = False
+    except ValueError:
+        pass
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    # the pruned filters are not read
+    sim = tlsim.simulate([out], act=vact)
+    base_sim = tlsim.simulate([base_objs[-1]], act=vact)
+
+    if not np.array_equal(sim.outputs[0], vout):
+        ok = False
+
+    names = ["'%s'" % weight.name for weight in weights]
+    if read_bytes(sim, names) >= read_bytes(base_sim, names):
+        ok = False
+
+    # so are the rows of a fully connected layer
+    a, b, fc = make_matmul_graph(act_dtype, weight_dtype, out_dtype, rshift_out)
+    ng.to_veriloggen([fc], 'matrix_conv2d_compressed_matmul', silent=True,
+                     config=config)
+    va = np.arange(a.length, dtype=np.int64).reshape(a.shape) % [11] - [5]
+    fc_sim = tlsim.simulate([fc], a=va)
+
+    if b.compression_block is None:
+        ok = False
+
+    if not np.array_equal(fc_sim.outputs[0], ng.eval([fc], a=va)[0]):
+        ok = False
+
+    # a filter in the RAMs shared with the other operators
+    a, b, fc = make_shared_graph(act_dtype, weight_dtype, out_dtype, rshift_out)
+    ng.to_veriloggen([fc], 'matrix_conv2d_compressed_shared', silent=True,
+                     config=config)
+    va = np.arange(a.length, dtype=np.int64).reshape(a.shape) % [11] - [5]
+    fc_sim = tlsim.simulate([fc], a=va)
+
+    if b.compression_block is None:
+        ok = False
+
+    if not np.array_equal(fc_sim.outputs[0], ng.eval([fc], a=va)[0]):
+        ok = False
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    base_outs, base_cycles = ng.sim.run(base_targ, {base_act: vact},
+                                        simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# filter reads: %d bytes (compressed), %d bytes (dense)' %
+              (read_bytes(sim, names), read_bytes(base_sim, names)))
+        print('# execution cycles: %d (compressed), %d (dense)' %
+              (cycles, base_cycles))
+
+    if not np.array_equal(base_outs[0], vout):
+        ok = False
+
+    # a value with more nonzero filters does not fit in the image
+    weights[0].set_value(np.ones(weights[0].shape, dtype=np.int64))
+    try:
+        ng.export_ndarray([out])
+        ok = False
+    except ValueError:
+        pass
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import math
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(act_shape[-1], 1, 1, num_och),
+                          name='weight1')
+
+    # the batch of both convolutions is split among the cores
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    out = ng.conv2d(conv0, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                    residual=act, dtype=out_dtype,
+                    par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+
+    return act, out
+
+
+def run(act_shape=(4, 6, 6, 8), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        num_cores=2, axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'num_cores': num_cores}
+
+    act, out = make_graph(*args)
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_cores', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # AXI master ports of each core
+    for i in range(1, num_cores):
+        if 'maxi_core%d_araddr' % i not in targ.get_ports():
+            ok = False
+
+    # a copy of each convolution per core
+    core_num_bat = int(math.ceil(act_shape[0] / num_cores))
+    num_used_cores = int(math.ceil(act_shape[0] / core_num_bat))
+    estimate = ng.estimate_resources(targ)
+    names = [op.name for op in estimate.operators]
+    for name in ('conv0', 'out'):
+        if names.count(name) != 0:
+            ok = False
+        for i in range(num_used_cores):
+            if '%s_core%d' % (name, i) not in names:
+                ok = False
+
+    single_config = dict(config, num_cores=1)
+    single_act, single_out = make_graph(*args)
+    single_targ = ng.to_veriloggen([single_out], 'matrix_conv2d_cores_single',
+                                   silent=True, config=single_config)
+
+    if estimate.total().dsp <= ng.estimate_resources(single_targ).total().dsp:
+        ok = False
+
+    try:
+        ng.to_veriloggen([make_graph(*args)[1]], 'matrix_conv2d_cores_error',
+                         silent=True, config=dict(config, num_cores=0))
+        ok = False
+    except ValueError:
+        pass
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    # the batch elements are computed concurrently
+    single_outs, single_cycles = ng.sim.run(single_targ, {single_act: vact},
+                                            simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# execution cycles: %d (%d cores), %d (1 core)' %
+              (cycles, num_cores, single_cycles))
+
+    if cycles >= single_cycles:
+        ok = False
+
+    if not np.array_equal(single_outs[0], vout):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
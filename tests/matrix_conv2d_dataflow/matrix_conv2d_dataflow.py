@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 3, 3, num_och),
+                          name='weight1')
+    weight2 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight2')
+
+    # conv0 is read by conv1 and add, which are in different segments
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    conv1 = ng.conv2d(conv0, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='conv1')
+    add = ng.add(conv0, conv1, dtype=out_dtype, name='add')
+    pool = ng.max_pool_serial(add, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    out = ng.conv2d(pool, weight2, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+    vweight2 = np.arange(weight2.length,
+                         dtype=np.int64).reshape(weight2.shape) % [5] - [2]
+    weight2.set_value(vweight2)
+
+    return act, (conv0, conv1, add, pool, out)
+
+
+def run(act_shape=(1, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        dataflow_segments=3, axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'dataflow_segments': dataflow_segments}
+
+    act, objs = make_graph(*args)
+    out = objs[-1]
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_dataflow', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # each segment has its own AXI master port
+    ports = targ.get_ports()
+    for segment in range(1, dataflow_segments):
+        if 'maxi_segment%d_araddr' % segment not in ports:
+            ok = False
+
+    segments = [obj.dataflow_segment for obj in objs]
+    if segments != sorted(segments) or segments[-1] != dataflow_segments - 1:
+        ok = False
+
+    # a slot for each frame in flight
+    num_frames = ng.verilog.get_num_frame_slots(config)
+    if act.frame_slots != num_frames or out.frame_slots != num_frames:
+        ok = False
+
+    base_config = dict(config, dataflow_segments=0)
+    base_act, base_objs = make_graph(*args)
+    base_targ = ng.to_veriloggen([base_objs[-1]], 'matrix_conv2d_dataflow_base',
+                                 silent=True, config=base_config)
+
+    for error_config in (dict(config, weight_prefetch=True),
+                         dict(config, dataflow_segments=len(objs) + 1)):
+        try:
+            ng.to_veriloggen([make_graph(*args)[1][-1]], 'matrix_conv2d_dataflow_error',
+                             silent=True, config=error_config)
+            ok = False
+        except ValueError:
+            pass
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    vacts = [np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11 + i] - [5]
+             for i in range(num_frames)]
+    vouts = [ng.eval([out], act=vact)[0] for vact in vacts]
+
+    # a single frame by default
+    outs, cycles = ng.sim.run(targ, {act: vacts[0]}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vouts[0].shape or not np.array_equal(outs[0], vouts[0]):
+        ok = False
+
+    # the segments work on consecutive frames concurrently
+    outs, frames_cycles = ng.sim.run(targ, {act: np.stack(vacts)}, simtype=simtype,
+                                     cache_dir=cache_dir, num_frames=num_frames)
+
+    if not np.array_equal(outs[0], np.stack(vouts)):
+        ok = False
+
+    base_outs, base_cycles = ng.sim.run(base_targ, {base_act: vacts[0]},
+                                        simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# execution cycles of %d frames: %d (dataflow), %d (sequential)' %
+              (num_frames, frames_cycles, base_cycles * num_frames))
+
+    if frames_cycles >= base_cycles * num_frames:
+        ok = False
+
+    if not np.array_equal(base_outs[0], vouts[0]):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
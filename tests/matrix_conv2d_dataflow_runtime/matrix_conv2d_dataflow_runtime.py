@@ -0,0 +1,137 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.runtime as runtime
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 3, 3, num_och),
+                          name='weight1')
+    weight2 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight2')
+
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    conv1 = ng.conv2d(conv0, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv1')
+    out = ng.conv2d(conv1, weight2, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+    vweight2 = np.arange(weight2.length,
+                         dtype=np.int64).reshape(weight2.shape) % [5] - [2]
+    weight2.set_value(vweight2)
+
+    return act, out
+
+
+def run(act_shape=(1, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        dataflow_segments=3, axi_datawidth=32, silent=False):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'dataflow_segments': dataflow_segments}
+
+    act, out = make_graph(*args)
+    ng.to_veriloggen([out], 'matrix_conv2d_dataflow_runtime', silent=silent,
+                     config=config)
+
+    layout = runtime.make_memory_layout([out])
+    device = runtime.SimulatedDevice([out], layout, latency=1e-3)
+    rt = runtime.Runtime(device, layout)
+
+    ok = True
+
+    # a slot for each frame in flight
+    num_slots = ng.verilog.get_num_frame_slots(config)
+    if rt.num_frame_slots != num_slots or len(rt.frame_outputs) != num_slots:
+        ok = False
+
+    # more frames than the slots are streamed through them
+    num_frames = num_slots * 2 + 1
+    vacts = [np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11 + i] - [5]
+             for i in range(num_frames)]
+    vouts = [ng.eval([out], act=vact)[0] for vact in vacts]
+
+    rslts = [outs[0] for outs in rt.run_frames([[vact] for vact in vacts], timeout=10.0)]
+
+    # a single frame by default, in slot 0
+    rslts.append(rt.run(vacts[1], timeout=10.0)[0].copy())
+    vouts.append(vouts[1])
+
+    if rt.frames_done() != 1:
+        ok = False
+
+    # the frames not queued yet are not processed
+    rt.set_frame_inputs(0, act=vacts[2])
+    rt.start_frames(2, 1)
+    if rt.wait_frames(1, timeout=10.0) != 1 or not rt.is_busy():
+        ok = False
+
+    rt.set_frame_inputs(1, vacts[3])
+    rt.queue_frames(2)
+    if rt.wait_frames(2, timeout=10.0) != 2:
+        ok = False
+    rt.wait(timeout=10.0)
+
+    for frame in range(2):
+        rslts.append(rt.get_frame_outputs(frame)[0].copy())
+        vouts.append(vouts[frame + 2])
+
+    for i, (rslt, vout) in enumerate(zip(rslts, vouts)):
+        if rslt.shape != vout.shape or not np.array_equal(rslt, vout):
+            ok = False
+            if not silent:
+                print('NG (frame %d)' % i)
+
+    # frames require the dataflow mode
+    base_act, base_out = make_graph(*args)
+    ng.to_veriloggen([base_out], 'matrix_conv2d_dataflow_runtime_base', silent=True,
+                     config=dict(config, dataflow_segments=0))
+    base_layout = runtime.make_memory_layout([base_out])
+    base_rt = runtime.Runtime(runtime.SimulatedDevice([base_out], base_layout), base_layout)
+
+    if base_rt.num_frame_slots != 1:
+        ok = False
+
+    try:
+        base_rt.run_frames([[vacts[0]]])
+        ok = False
+    except ValueError:
+        pass
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
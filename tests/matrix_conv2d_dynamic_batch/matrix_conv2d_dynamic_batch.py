@@ -0,0 +1,132 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight1')
+    weight2 = ng.variable(weight_dtype,
+                          shape=(num_och, num_och * (act_shape[1] // 2) * (act_shape[2] // 2)),
+                          name='weight2')
+
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    add = ng.add(conv0, conv0, dtype=out_dtype, name='add')
+    pool = ng.max_pool_serial(add, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    conv1 = ng.conv2d(pool, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='conv1')
+    # the rows of the left matrix are the batch
+    flat = ng.reshape(conv1, [act_shape[0], -1], name='flat')
+    out = ng.matmul(flat, weight2, transposed_b=True, rshift_out=rshift_out,
+                    dtype=out_dtype, par_left_col=par_ich, par_out_col=par_och,
+                    name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+    vweight2 = np.arange(weight2.length,
+                         dtype=np.int64).reshape(weight2.shape) % [3] - [1]
+    weight2.set_value(vweight2)
+
+    return act, (conv0, add, pool, conv1, out)
+
+
+def run(act_shape=(4, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        batch=2, axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'dynamic_batch': True}
+
+    act, objs = make_graph(*args)
+    out = objs[-1]
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_dynamic_batch', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # the batch size is read from the register by all the operators
+    for obj in objs:
+        if obj.dynamic_batch != act_shape[0] or obj.dynamic_batch_reg is None:
+            ok = False
+
+    if targ not in ng.verilog.module_dynamic_batch_regs:
+        ok = False
+
+    # a row of the left matrix per batch
+    values = out.to_dynamic_batch_values(out.collect_all_control_param_values())
+    if values['max_row_count'] != 1:
+        ok = False
+
+    # a concatenation along the batch is not supported
+    error_act, error_objs = make_graph(*args)
+    error_out = ng.concat([error_objs[-1], error_objs[-1]], axis=3, name='error_out')
+    for error_config, error_outs in ((dict(config, num_cores=2), [make_graph(*args)[1][-1]]),
+                                     (config, [error_out])):
+        try:
+            ng.to_veriloggen(error_outs, 'matrix_conv2d_dynamic_batch_error',
+                             silent=True, config=error_config)
+            ok = False
+        except ValueError:
+            pass
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    # the declared size by default
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    # the first slices of the batch without a new bitstream
+    outs, batch_cycles = ng.sim.run(targ, {act: vact[:batch]}, simtype=simtype,
+                                    cache_dir=cache_dir, batch=batch)
+
+    if outs[0].shape != vout[:batch].shape or not np.array_equal(outs[0], vout[:batch]):
+        ok = False
+
+    if not silent:
+        print('# execution cycles: %d (batch %d), %d (batch %d)' %
+              (batch_cycles, batch, cycles, act_shape[0]))
+
+    if batch < act_shape[0] and batch_cycles >= cycles:
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
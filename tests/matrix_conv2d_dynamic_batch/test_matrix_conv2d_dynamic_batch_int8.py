@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_conv2d_dynamic_batch
+
+
+act_shape = (4, 8, 8, 16)
+num_och = 16
+act_dtype = ng.int8
+weight_dtype = ng.int8
+out_dtype = ng.int8
+rshift_out = 6
+par_ich = 1
+par_och = 1
+batch = 2
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = matrix_conv2d_dynamic_batch.run(act_shape, num_och,
+                                           act_dtype, weight_dtype, out_dtype,
+                                           rshift_out, par_ich, par_och,
+                                           batch, axi_datawidth, silent,
+                                           simtype=simtype)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_conv2d_dynamic_batch.run(act_shape, num_och,
+                                           act_dtype, weight_dtype, out_dtype,
+                                           rshift_out, par_ich, par_och,
+                                           batch, axi_datawidth, silent=False)
+    print(rslt)
@@ -0,0 +1,124 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.runtime as runtime
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight1')
+
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    pool = ng.max_pool_serial(conv0, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    out = ng.conv2d(pool, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+
+    return act, out
+
+
+def run(act_shape=(4, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        batch=2, axi_datawidth=32, silent=False):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'dynamic_batch': True}
+
+    act, out = make_graph(*args)
+    ng.to_veriloggen([out], 'matrix_conv2d_dynamic_batch_runtime', silent=silent,
+                     config=config)
+
+    layout = runtime.make_memory_layout([out])
+    device = runtime.SimulatedDevice([out], layout)
+    rt = runtime.Runtime(device, layout)
+
+    ok = True
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    rslts = []
+    vouts = []
+
+    # the declared size by default
+    rslts.append(rt.run(vact, timeout=10.0)[0].copy())
+    vouts.append(vout)
+
+    # the first slices of the batch, and the others are not written
+    rt.outputs['out'][...] = 0
+    rslts.append(rt.run(vact[:batch], batch=batch, timeout=10.0)[0].copy())
+    vouts.append(vout[:batch])
+
+    if np.any(rt.outputs['out'][batch:]):
+        ok = False
+
+    if device.read_reg(layout.registers.batch_reg) != batch:
+        ok = False
+
+    # back to the declared size
+    rt.set_batch(None)
+    rslts.append(rt.run(vact, timeout=10.0)[0].copy())
+    vouts.append(vout)
+
+    for value in (0, act_shape[0] + 1):
+        try:
+            rt.set_batch(value)
+            ok = False
+        except ValueError:
+            pass
+
+    for i, (rslt, vout) in enumerate(zip(rslts, vouts)):
+        if rslt.shape != vout.shape or not np.array_equal(rslt, vout):
+            ok = False
+            if not silent:
+                print('NG (run %d)' % i)
+
+    # the batch size requires the dynamic batch mode
+    base_act, base_out = make_graph(*args)
+    ng.to_veriloggen([base_out], 'matrix_conv2d_dynamic_batch_runtime_base', silent=True,
+                     config=dict(config, dynamic_batch=False))
+    base_layout = runtime.make_memory_layout([base_out])
+    base_rt = runtime.Runtime(runtime.SimulatedDevice([base_out], base_layout), base_layout)
+
+    try:
+        base_rt.run(vact[:batch], batch=batch)
+        ok = False
+    except ValueError:
+        pass
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
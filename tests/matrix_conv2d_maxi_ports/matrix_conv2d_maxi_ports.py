@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def make_graph(act_shape, weight_shape, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=weight_shape, name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=weight_shape, name='weight1')
+
+    # two convolutions of a stage run concurrently if max_parallel_ops > 1
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    conv1 = ng.conv2d(act, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv1')
+    out = ng.add(conv0, conv1, dtype=out_dtype, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+
+    return act, out
+
+
+def run(act_shape=(1, 7, 7, 7), weight_shape=(8, 3, 3, 7),
+        act_dtype=ng.int16, weight_dtype=ng.int16, out_dtype=ng.int16,
+        rshift_out=4, par_ich=1, par_och=1,
+        maxi_ports=3, maxi_port_policy='traffic', max_parallel_ops=1,
+        axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, weight_shape, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'maxi_ports': maxi_ports,
+              'maxi_port_policy': maxi_port_policy,
+              'max_parallel_ops': max_parallel_ops}
+
+    act, out = make_graph(*args)
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_maxi_ports', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # an AXI master interface per port
+    for i in range(1, maxi_ports):
+        if 'maxi%d_araddr' % i not in targ.get_ports():
+            ok = False
+
+    # the interfaces are counted by the estimate
+    single_config = dict(config, maxi_ports=1)
+    single_act, single_out = make_graph(*args)
+    single_targ = ng.to_veriloggen([single_out], 'matrix_conv2d_maxi_ports_single',
+                                   silent=True, config=single_config)
+
+    if (ng.estimate_resources(targ).total().lut <=
+            ng.estimate_resources(single_targ).total().lut):
+        ok = False
+
+    for policy in ('no_such_policy', {'act': 0, 'param': maxi_ports, 'output': 0},
+                   {'act': 0, 'param': 0}):
+        try:
+            ng.to_veriloggen([make_graph(*args)[1]], 'matrix_conv2d_maxi_ports_error',
+                             silent=True, config=dict(config, maxi_port_policy=policy))
+            ok = False
+        except ValueError:
+            pass
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    # the weights and the activations are transferred concurrently
+    single_outs, single_cycles = ng.sim.run(single_targ, {single_act: vact},
+                                            simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# execution cycles: %d (%d ports), %d (1 port)' %
+              (cycles, maxi_ports, single_cycles))
+
+    if cycles >= single_cycles:
+        ok = False
+
+    if not np.array_equal(single_outs[0], vout):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
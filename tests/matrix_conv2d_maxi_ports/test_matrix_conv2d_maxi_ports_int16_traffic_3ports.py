@@ -0,0 +1,53 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_conv2d_maxi_ports
+
+
+act_shape = (1, 7, 7, 7)
+weight_shape = (8, 3, 3, 7)
+act_dtype = ng.int16
+weight_dtype = ng.int16
+out_dtype = ng.int16
+rshift_out = 4
+par_ich = 1
+par_och = 1
+maxi_ports = 3
+maxi_port_policy = 'traffic'
+max_parallel_ops = 1
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = matrix_conv2d_maxi_ports.run(act_shape, weight_shape,
+                                        act_dtype, weight_dtype, out_dtype,
+                                        rshift_out, par_ich, par_och,
+                                        maxi_ports, maxi_port_policy, max_parallel_ops,
+                                        axi_datawidth, silent,
+                                        simtype=simtype)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_conv2d_maxi_ports.run(act_shape, weight_shape,
+                                        act_dtype, weight_dtype, out_dtype,
+                                        rshift_out, par_ich, par_och,
+                                        maxi_ports, maxi_port_policy, max_parallel_ops,
+                                        axi_datawidth, silent=False)
+    print(rslt)
@@ -0,0 +1,155 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.tlsim as tlsim
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 3, 3, num_och),
+                          name='weight1')
+    weight2 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight2')
+
+    # conv0 is read by conv1 and add, the others by a single operator
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    conv1 = ng.conv2d(conv0, weight1, (1, 1, 1, 1), rshift_out=rshift_out,
+                      dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='conv1')
+    add = ng.add(conv0, conv1, dtype=out_dtype, name='add')
+    pool = ng.max_pool_serial(add, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    out = ng.conv2d(pool, weight2, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+    vweight2 = np.arange(weight2.length,
+                         dtype=np.int64).reshape(weight2.shape) % [5] - [2]
+    weight2.set_value(vweight2)
+
+    return act, (conv0, conv1, add, pool, out)
+
+
+def offchip_bytes(sim):
+    return sum([t.size for t in sim.transactions if t.kind in ('read', 'write')])
+
+
+def run(act_shape=(1, 8, 8, 16), num_och=16,
+        act_dtype=ng.int8, weight_dtype=ng.int8, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        onchip_activation_bytes=4096, axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'onchip_activation_bytes': onchip_activation_bytes}
+
+    act, (conv0, conv1, add, pool, out) = make_graph(*args)
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_onchip', silent=silent,
+                            config=config)
+
+    ok = True
+
+    # temporaries of a single consumer only, without off-chip addresses
+    if conv0.onchip_addr is not None or out.onchip_addr is not None:
+        ok = False
+
+    for obj in (conv1, add, pool):
+        if obj.onchip_addr is None or obj.global_index is not None:
+            ok = False
+
+    # the space of conv1 is reused after add
+    if pool.onchip_addr != conv1.onchip_addr:
+        ok = False
+
+    base_config = dict(config, onchip_activation_bytes=0)
+    base_act, base_objs = make_graph(*args)
+    base_targ = ng.to_veriloggen([base_objs[-1]], 'matrix_conv2d_onchip_base',
+                                 silent=True, config=base_config)
+
+    # a smaller capacity keeps the smaller temporaries only
+    small_act, small_objs = make_graph(*args)
+    ng.to_veriloggen([small_objs[-1]], 'matrix_conv2d_onchip_small', silent=True,
+                     config=dict(config, onchip_activation_bytes=tlsim._memory_size(pool)))
+    if [obj.onchip_addr is not None for obj in small_objs] != [False, False, False,
+                                                                True, False]:
+        ok = False
+
+    try:
+        ng.to_veriloggen([make_graph(*args)[1][-1]], 'matrix_conv2d_onchip_error',
+                         silent=True, config=dict(config, onchip_activation_bytes=-1))
+        ok = False
+    except ValueError:
+        pass
+
+    # the on-chip memory is counted by the estimate
+    if (ng.estimate_resources(targ).total().bram18 <=
+            ng.estimate_resources(base_targ).total().bram18):
+        ok = False
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    # the off-chip memory traffic of the temporaries is removed
+    sim = tlsim.simulate([out], act=vact)
+    base_sim = tlsim.simulate([base_objs[-1]], act=vact)
+
+    if not np.array_equal(sim.outputs[0], vout):
+        ok = False
+
+    if offchip_bytes(sim) >= offchip_bytes(base_sim):
+        ok = False
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    base_outs, base_cycles = ng.sim.run(base_targ, {base_act: vact},
+                                        simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# off-chip traffic: %d bytes (on-chip), %d bytes (off-chip)' %
+              (offchip_bytes(sim), offchip_bytes(base_sim)))
+        print('# execution cycles: %d (on-chip), %d (off-chip)' %
+              (cycles, base_cycles))
+
+    if cycles >= base_cycles:
+        ok = False
+
+    if not np.array_equal(base_outs[0], vout):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def make_graph(act_shape, num_och, act_dtype, weight_dtype, bias_dtype, out_dtype,
+               rshift_out, par_ich, par_och):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight0 = ng.variable(weight_dtype, shape=(num_och, 3, 3, act_shape[-1]),
+                          name='weight0')
+    weight1 = ng.variable(weight_dtype, shape=(num_och, 3, 3, num_och),
+                          name='weight1')
+    bias1 = ng.variable(bias_dtype, shape=(num_och,), name='bias1')
+    scale1 = ng.variable(bias_dtype, shape=(num_och,), name='scale1')
+    weight2 = ng.variable(weight_dtype, shape=(num_och, 1, 1, num_och),
+                          name='weight2')
+
+    # the parameters of conv1 and conv2 are read during the previous stages
+    conv0 = ng.conv2d(act, weight0, (1, 1, 1, 1), rshift_out=rshift_out,
+                      act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv0')
+    conv1 = ng.conv2d(conv0, weight1, (1, 1, 1, 1), bias1, scale1,
+                      rshift_out=rshift_out, act_func=ng.relu, dtype=out_dtype,
+                      par_ich=par_ich, par_och=par_och, name='conv1')
+    out = ng.conv2d(conv1, weight2, (1, 1, 1, 1), rshift_out=rshift_out,
+                    dtype=out_dtype, par_ich=par_ich, par_och=par_och, name='out')
+
+    # verification data
+    vweight0 = np.arange(weight0.length,
+                         dtype=np.int64).reshape(weight0.shape) % [7] - [3]
+    weight0.set_value(vweight0)
+    vweight1 = np.arange(weight1.length,
+                         dtype=np.int64).reshape(weight1.shape) % [5] - [2]
+    weight1.set_value(vweight1)
+    vbias1 = np.arange(bias1.length, dtype=np.int64).reshape(bias1.shape) % [9] - [4]
+    bias1.set_value(vbias1)
+    vscale1 = np.arange(scale1.length, dtype=np.int64).reshape(scale1.shape) % [3] + [1]
+    scale1.set_value(vscale1)
+    vweight2 = np.arange(weight2.length,
+                         dtype=np.int64).reshape(weight2.shape) % [5] - [2]
+    weight2.set_value(vweight2)
+
+    return act, (conv0, conv1, out)
+
+
+def run(act_shape=(1, 4, 4, 8), num_och=32,
+        act_dtype=ng.int8, weight_dtype=ng.int8,
+        bias_dtype=ng.int16, out_dtype=ng.int8,
+        rshift_out=6, par_ich=1, par_och=1,
+        axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    args = (act_shape, num_och, act_dtype, weight_dtype, bias_dtype, out_dtype,
+            rshift_out, par_ich, par_och)
+
+    config = {'maxi_datawidth': axi_datawidth,
+              'weight_prefetch': True}
+
+    act, (conv0, conv1, out) = make_graph(*args)
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_prefetch', silent=silent,
+                            config=config)
+
+    ok = True
+
+    if 'maxi_prefetch_araddr' not in targ.get_ports():
+        ok = False
+
+    # the first stage has no previous stage to overlap
+    if conv0.prefetch_target or not conv1.prefetch_target or not out.prefetch_target:
+        ok = False
+
+    # the parameter RAMs are not used by the previous stage
+    for prev, obj in ((conv0, conv1), (conv1, out)):
+        prev_rams = set([id(ram) for ram in
+                         list(prev.input_rams) + list(prev.output_rams)])
+        for positions in obj.get_prefetch_ram_positions().values():
+            for pos in positions:
+                if id(obj.input_rams[pos]) in prev_rams:
+                    ok = False
+
+    base_config = dict(config, weight_prefetch=False)
+    base_act, base_objs = make_graph(*args)
+    base_targ = ng.to_veriloggen([base_objs[-1]], 'matrix_conv2d_prefetch_base',
+                                 silent=True, config=base_config)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11] - [5]
+    vout = ng.eval([out], act=vact)[0]
+
+    outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+
+    # the parameters are read while the previous stage is computing
+    base_outs, base_cycles = ng.sim.run(base_targ, {base_act: vact},
+                                        simtype=simtype, cache_dir=cache_dir)
+
+    if not silent:
+        print('# execution cycles: %d (prefetch), %d (no prefetch)' %
+              (cycles, base_cycles))
+
+    if cycles >= base_cycles:
+        ok = False
+
+    if not np.array_equal(base_outs[0], vout):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,156 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+from nngen.quantizer import QuantizeCache
+
+
+def make_graph(act_shape, num_och, num_layers, act_dtype, weight_dtype,
+               weight_values):
+
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+
+    layers = []
+    x = act
+    for i in range(num_layers):
+        weight = ng.variable(weight_dtype, shape=(num_och, 3, 3, x.shape[-1]),
+                             name='weight%d' % i)
+        weight.set_value(weight_values[i])
+        x = ng.conv2d(x, weight, (1, 1, 1, 1),
+                      act_func=ng.relu if i < num_layers - 1 else None,
+                      dtype=act_dtype, name='conv%d' % i)
+        layers.append(x)
+
+    return act, layers
+
+
+def make_weight_values(act_shape, num_och, num_layers, seed):
+    rand = np.random.RandomState(seed)
+
+    values = []
+    num_ich = act_shape[-1]
+    for i in range(num_layers):
+        values.append(rand.normal(size=(num_och, 3, 3, num_ich)))
+        num_ich = num_och
+
+    return values
+
+
+def get_results(layers):
+    """ the attributes which the quantizer determines for each layer """
+
+    results = []
+    for layer in layers:
+        results.append((layer.args[1].value.copy(), layer.args[1].scale_factor,
+                        layer.scale_factor, layer.cshamt_mul, layer.cshamt_sum,
+                        layer.cshamt_out))
+
+    return results
+
+
+def is_same_results(a, b):
+    if len(a) != len(b):
+        return False
+
+    for ra, rb in zip(a, b):
+        if not np.array_equal(ra[0], rb[0]):
+            return False
+        if tuple(ra[1:]) != tuple(rb[1:]):
+            return False
+
+    return True
+
+
+def run(act_shape=(1, 7, 7, 3), num_och=4, num_layers=4,
+        act_dtype=ng.int8, weight_dtype=ng.int8,
+        changed_layer=2, num_trials=3, seed=1, silent=False):
+
+    value_ranges = {'act': (-120, 120)}
+    weight_values = make_weight_values(act_shape, num_och, num_layers, 0)
+
+    # the global random state differs in each call, and is kept by the quantizer
+    random_states = []
+
+    def quantize(weight_values, cache=None, seed=None):
+        np.random.seed(len(random_states))
+        random_state = np.random.get_state()
+
+        act, layers = make_graph(act_shape, num_och, num_layers,
+                                 act_dtype, weight_dtype, weight_values)
+        ng.quantize([layers[-1]], value_ranges, num_trials, cache=cache, seed=seed)
+
+        state = np.random.get_state()
+        random_states.append(all([np.array_equal(a, b)
+                                  for a, b in zip(random_state, state)]))
+        return get_results(layers)
+
+    ok = True
+
+    ref_rslts = quantize(weight_values, seed=seed)
+
+    cache_dir = tempfile.mkdtemp()
+    cache = QuantizeCache(cache_dir)
+
+    # miss: every layer is quantized, and the same as without the cache
+    rslts = quantize(weight_values, cache, seed)
+    if cache.hits != 0 or cache.misses != num_layers:
+        ok = False
+    if not is_same_results(rslts, ref_rslts):
+        ok = False
+        if not silent:
+            print('NG (miss)')
+
+    # hit: a new graph with the same weights is read from the directory
+    cache = QuantizeCache(cache_dir)
+    rslts = quantize(weight_values, cache, seed)
+    if cache.hits != num_layers or cache.misses != 0:
+        ok = False
+    if not is_same_results(rslts, ref_rslts):
+        ok = False
+        if not silent:
+            print('NG (hit)')
+
+    # the changed layer and its downstream layers are recomputed
+    changed_values = list(weight_values)
+    changed_values[changed_layer] = make_weight_values(
+        act_shape, num_och, num_layers, 1)[changed_layer]
+
+    changed_ref_rslts = quantize(changed_values, seed=seed)
+
+    cache = QuantizeCache(cache_dir)
+    rslts = quantize(changed_values, cache, seed)
+    if cache.hits != changed_layer or cache.misses != num_layers - changed_layer:
+        ok = False
+        if not silent:
+            print('NG (hits: %d, misses: %d)' % (cache.hits, cache.misses))
+    if not is_same_results(rslts, changed_ref_rslts):
+        ok = False
+        if not silent:
+            print('NG (changed)')
+
+    if not all(random_states):
+        ok = False
+        if not silent:
+            print('NG (random state)')
+
+    shutil.rmtree(cache_dir)
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,44 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_conv2d_quantize_cache
+
+
+act_shape = (1, 7, 7, 3)
+num_och = 4
+num_layers = 4
+act_dtype = ng.int16
+weight_dtype = ng.int16
+changed_layer = 0
+num_trials = 5
+seed = 1
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    rslt = matrix_conv2d_quantize_cache.run(act_shape, num_och, num_layers,
+                                            act_dtype, weight_dtype,
+                                            changed_layer, num_trials, seed,
+                                            silent=silent)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_conv2d_quantize_cache.run(act_shape, num_och, num_layers,
+                                            act_dtype, weight_dtype,
+                                            changed_layer, num_trials, seed,
+                                            silent=False)
+    print(rslt)
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.resource as resource
+
+
+def run(act_shape=(1, 7, 7, 7), weight_shape=(3, 3, 3, 7),
+        act_dtype=ng.int32, weight_dtype=ng.int32, out_dtype=ng.int32,
+        stride=(1, 1, 1, 1), rshift_out=0,
+        par_ich=1, par_och=1,
+        axi_datawidth=32, device='xczu9eg', silent=False):
+
+    # create target hardware
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight = ng.variable(weight_dtype, shape=weight_shape, name='weight')
+
+    conv = ng.conv2d(act, weight, stride, rshift_out=rshift_out,
+                     act_func=ng.relu, dtype=out_dtype,
+                     par_ich=par_ich, par_och=par_och, name='conv')
+    out = ng.max_pool_serial(conv, (1, 2, 2, 1), (1, 2, 2, 1), name='out')
+
+    config = {'maxi_datawidth': axi_datawidth, 'resource_device': device}
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_resource', silent=silent,
+                            config=config)
+
+    estimate = ng.estimate_resources(targ)
+    total = estimate.total()
+
+    if not silent:
+        print(estimate.to_str('xc7z020'))
+
+    ok = True
+
+    # one multiplier per weight element of a window per parallel channel pair
+    num_mul = weight_shape[1] * weight_shape[2] * par_ich * par_och
+    x_width = act_dtype.width
+    y_width = weight_dtype.width
+    mul = resource.map_multiplier(x_width, True, y_width, True)
+    if total.dsp < num_mul * mul.dsp:
+        ok = False
+
+    # every RAM bank takes at least one 18Kb block RAM
+    num_banks = sum([spec.numbanks for spec in estimate.rams])
+    if total.bram18 < num_banks:
+        ok = False
+
+    # the attribution covers the scheduled operators
+    names = [usage.name for usage in estimate.operators]
+    if names != ['conv', 'out']:
+        ok = False
+
+    conv_usage = estimate.operator_resources(estimate.operators[0])
+    if conv_usage.dsp != total.dsp or conv_usage.bram18 > total.bram18:
+        ok = False
+
+    # the same network estimated without the module
+    other = ng.estimate_resources([out], config=config).total()
+    if other.bram18 != total.bram18 or other.dsp != total.dsp:
+        ok = False
+
+    util = estimate.utilization()
+    if not estimate.fits() or any([v > 1.0 for v in util.values()]):
+        ok = False
+
+    if ng.estimate_resources(targ, device='xc7z020').total().dsp == 0:
+        ok = False
+
+    # 7-series multipliers are narrower
+    wide = resource.map_multiplier(26, True, 18, True, '7series')
+    if wide.dsp != 2 or resource.map_multiplier(26, True, 18, True).dsp != 1:
+        ok = False
+
+    # 1Kx36 and 16Kx1 fit in one 36Kb block RAM, 512x16 in one 18Kb
+    if (resource.map_ram(36, 1024).bram18 != 2 or
+            resource.map_ram(1, 16384).bram18 != 1 or
+            resource.map_ram(16, 512).bram18 != 1):
+        ok = False
+
+    try:
+        estimate.utilization('no_such_device')
+        ok = False
+    except ValueError:
+        pass
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import asyncio
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.runtime as runtime
+
+
+def run(act_shape=(1, 7, 7, 7), weight_shape=(3, 3, 3, 7),
+        bias_shape=None,
+        act_dtype=ng.int32, weight_dtype=ng.int32,
+        bias_dtype=ng.int32, out_dtype=ng.int32,
+        stride=(1, 1, 1, 1), rshift_out=0,
+        par_ich=1, par_och=1,
+        flatten=False,
+        axi_datawidth=32, silent=False,
+        layoutfile=None):
+
+    # create target hardware
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight = ng.variable(weight_dtype, shape=weight_shape, name='weight')
+
+    if bias_shape is not None:
+        bias = ng.variable(bias_dtype, bias_shape, name='bias')
+    else:
+        bias = None
+
+    out = ng.conv2d(act, weight, stride, bias, rshift_out=rshift_out,
+                    act_func=ng.relu, dtype=out_dtype,
+                    par_ich=par_ich, par_och=par_och, name='out')
+
+    if flatten:
+        out = ng.reshape(out, [out.shape[0], -1])
+
+    # verification data
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11]
+
+    vweight = np.arange(weight.length,
+                        dtype=np.int64).reshape(weight.shape) % [7] - [3]
+    weight.set_value(vweight)
+
+    if bias is not None:
+        vbias = np.arange(bias.length,
+                          dtype=np.int64).reshape(bias.shape) % [4]
+        bias.set_value(vbias)
+
+    ng.to_veriloggen([out], 'matrix_conv2d_runtime', silent=silent,
+                     config={'maxi_datawidth': axi_datawidth})
+
+    eval_outs = ng.eval([out], act=vact)
+    vout = eval_outs[0]
+
+    # deployment: the layout and the parameter image are shipped in one file
+    if layoutfile is None:
+        layoutfile = os.path.splitext(os.path.basename(__file__))[0] + '.npz'
+
+    runtime.make_memory_layout([out]).save(layoutfile)
+    layout = runtime.load_memory_layout(layoutfile)
+    os.remove(layoutfile)
+
+    # two networks pooled in one buffer: the second one is at 'offset'
+    offset = 4096 * ((layout.size + 4095) // 4096)
+    device = runtime.SimulatedDevice([out], layout, size=offset + layout.size,
+                                     phys_addr=0x10000000)
+    rt = runtime.Runtime(device, layout, offset=offset)
+
+    rslts = []
+
+    # blocking
+    rslts.append(rt.run(vact)[0].copy())
+
+    # polling with backoff
+    rt.inputs['act'][...] = 0
+    rslts.append(rt.run(act=vact, min_interval=1e-6, max_interval=1e-4)[0].copy())
+
+    # asyncio
+    rslts.append(asyncio.run(rt.run_async(vact, timeout=10.0))[0].copy())
+
+    ok = np.shares_memory(rt.inputs['act'], device.memory)
+
+    # register indices of the runtime follow the hardware
+    for name in ('control_reg_start', 'control_reg_busy', 'control_reg_reset',
+                 'control_reg_extern_send', 'control_reg_extern_recv',
+                 'control_reg_global_offset', 'control_reg_global_addr'):
+        if getattr(runtime, name) != getattr(ng, name):
+            ok = False
+
+    # so does the number of registers of the software model
+    if device.regs.size != layout.registers.num_regs:
+        ok = False
+
+    for i, rslt in enumerate(rslts):
+        if rslt.shape != vout.shape or not np.array_equal(rslt, vout):
+            ok = False
+            if not silent:
+                print('NG (run %d)' % i)
+
+    # nothing is written below the offset
+    if np.any(device.memory[:offset]):
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
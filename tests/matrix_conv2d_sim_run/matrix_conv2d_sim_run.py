@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+
+
+def run(act_shape=(1, 7, 7, 7), weight_shape=(3, 3, 3, 7),
+        bias_shape=None,
+        act_dtype=ng.int32, weight_dtype=ng.int32,
+        bias_dtype=ng.int32, out_dtype=ng.int32,
+        stride=(1, 1, 1, 1), rshift_out=0,
+        par_ich=1, par_och=1,
+        axi_datawidth=32, silent=False,
+        simtype='iverilog', cache_dir=None):
+
+    # create target hardware
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight = ng.variable(weight_dtype, shape=weight_shape, name='weight')
+
+    if bias_shape is not None:
+        bias = ng.variable(bias_dtype, bias_shape, name='bias')
+    else:
+        bias = None
+
+    conv = ng.conv2d(act, weight, stride, bias, rshift_out=rshift_out,
+                     act_func=ng.relu, dtype=out_dtype,
+                     par_ich=par_ich, par_och=par_och, name='conv')
+    out = ng.reshape(conv, [conv.shape[0], -1], name='out')
+
+    # verification data
+    vweight = np.arange(weight.length,
+                        dtype=np.int64).reshape(weight.shape) % [7] - [3]
+    weight.set_value(vweight)
+
+    if bias is not None:
+        vbias = np.arange(bias.length,
+                          dtype=np.int64).reshape(bias.shape) % [4]
+        bias.set_value(vbias)
+
+    targ = ng.to_veriloggen([out], 'matrix_conv2d_sim_run', silent=silent,
+                            config={'maxi_datawidth': axi_datawidth})
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_cache')
+
+    ok = True
+
+    # the second run reuses the compiled simulator with new inputs
+    for i in range(2):
+        vact = (np.arange(act.length, dtype=np.int64).reshape(act.shape) + i) % [11]
+        vout = ng.eval([out], act=vact)[0]
+
+        outs, cycles = ng.sim.run(targ, {act: vact}, simtype=simtype,
+                                  cache_dir=cache_dir)
+
+        if not silent:
+            print('# execution cycles: %d' % cycles)
+
+        if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+            ok = False
+            if not silent:
+                print('NG (run %d)' % i)
+
+    # new parameters are written to the memory image
+    vweight = -vweight
+    vout = ng.eval([out], act=vact, weight=vweight)[0]
+    outs, cycles = ng.sim.run(targ, {'act': vact}, {'weight': vweight},
+                              simtype=simtype, cache_dir=cache_dir)
+
+    if outs[0].shape != vout.shape or not np.array_equal(outs[0], vout):
+        ok = False
+        if not silent:
+            print('NG (params)')
+
+    builds = [name for name in os.listdir(cache_dir) if name.startswith(simtype)]
+    if len(builds) != 1:
+        ok = False
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_conv2d_sim_run
+
+
+act_shape = (1, 7, 7, 15)
+weight_shape = (7, 3, 3, 15)
+bias_shape = None
+act_dtype = ng.int32
+weight_dtype = ng.int32
+bias_dtype = ng.int32
+out_dtype = ng.int32
+stride = (1, 1, 1, 1)
+rshift_out = 0
+par_ich = 1
+par_och = 1
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = matrix_conv2d_sim_run.run(act_shape, weight_shape,
+                                     bias_shape,
+                                     act_dtype, weight_dtype,
+                                     bias_dtype, out_dtype,
+                                     stride, rshift_out,
+                                     par_ich, par_och,
+                                     axi_datawidth, silent,
+                                     simtype=simtype)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_conv2d_sim_run.run(act_shape, weight_shape,
+                                     bias_shape,
+                                     act_dtype, weight_dtype,
+                                     bias_dtype, out_dtype,
+                                     stride, rshift_out,
+                                     par_ich, par_och,
+                                     axi_datawidth, silent=False)
+    print(rslt)
@@ -0,0 +1,94 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.tlsim as tlsim
+
+
+def run(act_shape=(1, 7, 7, 7), weight_shape=(3, 3, 3, 7),
+        bias_shape=None,
+        act_dtype=ng.int32, weight_dtype=ng.int32,
+        bias_dtype=ng.int32, out_dtype=ng.int32,
+        stride=(1, 1, 1, 1), rshift_out=0,
+        par_ich=1, par_och=1,
+        axi_datawidth=32, silent=False):
+
+    # create target hardware
+    act = ng.placeholder(act_dtype, shape=act_shape, name='act')
+    weight = ng.variable(weight_dtype, shape=weight_shape, name='weight')
+
+    if bias_shape is not None:
+        bias = ng.variable(bias_dtype, bias_shape, name='bias')
+    else:
+        bias = None
+
+    conv = ng.conv2d(act, weight, stride, bias, rshift_out=rshift_out,
+                     act_func=ng.relu, dtype=out_dtype,
+                     par_ich=par_ich, par_och=par_och, name='conv')
+    pool = ng.max_pool_serial(conv, (1, 2, 2, 1), (1, 2, 2, 1), name='pool')
+    out = ng.reshape(pool, [pool.shape[0], -1], name='out')
+
+    # verification data
+    vact = np.arange(act.length, dtype=np.int64).reshape(act.shape) % [11]
+
+    vweight = np.arange(weight.length,
+                        dtype=np.int64).reshape(weight.shape) % [7] - [3]
+    weight.set_value(vweight)
+
+    if bias is not None:
+        vbias = np.arange(bias.length,
+                          dtype=np.int64).reshape(bias.shape) % [4]
+        bias.set_value(vbias)
+
+    ng.to_veriloggen([out], 'matrix_conv2d_tlsim', silent=silent,
+                     config={'maxi_datawidth': axi_datawidth})
+
+    eval_outs = ng.eval([out], act=vact)
+    vout = eval_outs[0]
+
+    ok = True
+
+    # default address map
+    sim = tlsim.simulate([out], act=vact)
+    if not np.array_equal(sim.outputs[0], vout):
+        ok = False
+        if not silent:
+            print('NG (default address map)')
+
+    # temporal storages moved by the host as the RTL test benches do
+    tmp_addr = sim.size + 4096
+    sim = tlsim.simulate([out], global_offset=1024, global_addrs={0: tmp_addr}, act=vact)
+    if not np.array_equal(sim.outputs[0], vout):
+        ok = False
+        if not silent:
+            print('NG (relocated temporal storages)')
+
+    if not silent:
+        for t in sim.transactions:
+            print(t)
+
+    # a layout bug: the output of conv overlaps the weight
+    conv.set_default_local_addr(weight.addr - conv.default_global_addr)
+    sim = tlsim.simulate([out], strict=False, act=vact)
+    if not sim.errors:
+        ok = False
+        if not silent:
+            print('NG (overlap not detected)')
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
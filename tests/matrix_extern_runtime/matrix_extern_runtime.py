@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+import asyncio
+import concurrent.futures
+import numpy as np
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import nngen.runtime as runtime
+
+
+def run(a_shape=(15, 15), b_shape=(15, 15),
+        a_dtype=ng.int32, b_dtype=ng.int32, c_dtype=ng.int32,
+        par=1, same_opcode=False, axi_datawidth=32, silent=False):
+
+    # create target hardware
+    a = ng.placeholder(a_dtype, shape=a_shape, name='a')
+    b = ng.placeholder(b_dtype, shape=b_shape, name='b')
+
+    d = ng.add(a, b, dtype=c_dtype, par=par)
+    e = ng.add(b, a, dtype=c_dtype, par=par)
+
+    # SW returns ng.add(x, y)
+    f = ng.extern([d, e], shape=a_shape, opcode=0x1,
+                  func=lambda x, y: x + y)
+    g = ng.sub(f, a)
+
+    # SW returns x + 1
+    opcode = 0x1 if same_opcode else 0x2
+    h = ng.extern([g], shape=a_shape, opcode=opcode,
+                  func=lambda x: x + 1)
+    c = ng.sub(h, b)
+
+    ng.to_veriloggen([c], 'matrix_extern_runtime', silent=silent,
+                     config={'maxi_datawidth': axi_datawidth})
+
+    # verification data
+    va = np.arange(a.length, dtype=np.int64).reshape(a.shape) % [16]
+    vb = np.arange(b.length, dtype=np.int64).reshape(b.shape) % [32] + [16]
+
+    if same_opcode:
+        # one handler serves both externs with the same opcode
+        f.func = h.func = lambda *xs: sum(xs) + (1 if len(xs) == 1 else 0)
+
+    eval_outs = ng.eval([c], a=va, b=vb)
+    vc = eval_outs[0]
+
+    layout = runtime.make_memory_layout([c])
+    device = runtime.SimulatedDevice([c], layout)
+    rt = runtime.Runtime(device, layout)
+
+    # each extern operator is serviced once per run
+    calls = []
+
+    def count(func):
+        def wrapper(*xs, **kwargs):
+            calls.append(None)
+            return func(*xs, **kwargs)
+        return wrapper
+
+    rslts = []
+
+    # blocking, with the functions for verification
+    rt.register_extern_funcs([c])
+    for opcode, (func, inplace) in list(rt.extern_handlers.items()):
+        rt.register_extern(opcode, count(func), inplace)
+
+    rslts.append(rt.run(va, vb)[0].copy())
+
+    # asyncio: in-place handlers in a worker thread, overlapped with another coroutine
+    def add(*xs, **kwargs):
+        out = kwargs['out']
+        np.add(xs[0], xs[1], out=out) if len(xs) == 2 else np.add(xs[0], 1, out=out)
+
+    rt.register_extern(0x1, count(add), inplace=True)
+    if not same_opcode:
+        rt.register_extern(0x2, count(add), inplace=True)
+
+    ticks = []
+
+    async def ticker(done):
+        while not done.is_set():
+            ticks.append(None)
+            await asyncio.sleep(0)
+
+    async def main():
+        done = asyncio.Event()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            task = asyncio.ensure_future(ticker(done))
+            outs = await rt.run_async(va, vb, executor=executor, timeout=10.0)
+            done.set()
+            await task
+        return outs
+
+    rslts.append(asyncio.run(main())[0].copy())
+
+    ok = (len(ticks) > 1 and len(calls) == 2 * len(rslts) and
+          not device.read_reg(runtime.control_reg_extern_send) and
+          not device.read_reg(runtime.control_reg_extern_recv))
+    for i, rslt in enumerate(rslts):
+        if not np.array_equal(rslt, vc):
+            ok = False
+            if not silent:
+                print('NG (run %d)' % i, rslt, vc)
+
+    rslt = '# verify: PASSED' if ok else '# verify: FAILED'
+    if not silent:
+        print(rslt)
+
+    return rslt
+
+
+if __name__ == '__main__':
+    rslt = run(silent=False)
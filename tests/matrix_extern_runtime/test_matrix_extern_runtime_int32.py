@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_extern_runtime
+
+
+a_shape = (15, 15)
+b_shape = (15, 15)
+a_dtype = ng.int32
+b_dtype = ng.int32
+c_dtype = ng.int32
+par = 1
+same_opcode = False
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    rslt = matrix_extern_runtime.run(a_shape, b_shape,
+                                     a_dtype, b_dtype, c_dtype,
+                                     par, same_opcode, axi_datawidth, silent)
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_extern_runtime.run(a_shape, b_shape,
+                                     a_dtype, b_dtype, c_dtype,
+                                     par, same_opcode, axi_datawidth, silent=False)
+    print(rslt)
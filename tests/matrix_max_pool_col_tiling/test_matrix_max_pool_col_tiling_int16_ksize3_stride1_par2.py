@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import matrix_max_pool_col_tiling
+
+
+act_shape = (1, 7, 23, 15)
+act_dtype = ng.int16
+out_dtype = ng.int16
+ksize = (1, 3, 3, 1)
+stride = (1, 1, 1, 1)
+par = 2
+value_ram_size = None
+out_ram_size = None
+max_onchip_ram_capacity = 2048
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = matrix_max_pool_col_tiling.run(act_shape,
+                                          act_dtype, out_dtype,
+                                          ksize, stride,
+                                          par, value_ram_size, out_ram_size,
+                                          max_onchip_ram_capacity,
+                                          axi_datawidth, silent,
+                                          filename=None, simtype=simtype,
+                                          outputfile=os.path.splitext(os.path.basename(__file__))[0] + '.out')
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = matrix_max_pool_col_tiling.run(act_shape,
+                                          act_dtype, out_dtype,
+                                          ksize, stride,
+                                          par, value_ram_size, out_ram_size,
+                                          max_onchip_ram_capacity,
+                                          axi_datawidth, silent=False,
+                                          filename='tmp.v',
+                                          outputfile=os.path.splitext(os.path.basename(__file__))[0] + '.out')
+    print(rslt)
@@ -0,0 +1,59 @@
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import sys
+
+# the next line can be removed after installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import nngen as ng
+import veriloggen
+
+import onnx_matrix_conv2d_linear_layout
+
+
+act_shape = (1, 7, 7, 3)
+weight_shape = (9, 3, 3, 3)
+linear_shape = (13, 225)
+act_dtype = ng.int32
+weight_dtype = ng.int32
+act_func = 'relu'
+optimize_layout = True
+par_ich = 1
+par_och = 1
+par_left_col = 1
+par_out_col = 1
+chunk_size = 64
+axi_datawidth = 32
+
+
+def test(request, silent=True):
+    veriloggen.reset()
+
+    simtype = request.config.getoption('--sim')
+
+    rslt = onnx_matrix_conv2d_linear_layout.run(act_shape, weight_shape, linear_shape,
+                                                act_dtype, weight_dtype,
+                                                act_func, optimize_layout,
+                                                par_ich, par_och, par_left_col, par_out_col,
+                                                chunk_size,
+                                                axi_datawidth, silent,
+                                                filename=None, simtype=simtype,
+                                                outputfile=os.path.splitext(os.path.basename(__file__))[0] + '.out')
+
+    verify_rslt = rslt.splitlines()[-1]
+    assert(verify_rslt == '# verify: PASSED')
+
+
+if __name__ == '__main__':
+    rslt = onnx_matrix_conv2d_linear_layout.run(act_shape, weight_shape, linear_shape,
+                                                act_dtype, weight_dtype,
+                                                act_func, optimize_layout,
+                                                par_ich, par_och, par_left_col, par_out_col,
+                                                chunk_size,
+                                                axi_datawidth, silent=False,
+                                                filename='tmp.v',
+                                                outputfile=os.path.splitext(os.path.basename(__file__))[0] + '.out')
+    print(rslt)